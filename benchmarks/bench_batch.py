@@ -0,0 +1,97 @@
+"""
+Compares the wall time of reviewing N repositories one /review at a time (before) with a single
+batch sharing one budget of GitHub fetches and LLM requests (after).
+
+GitHub and OpenAI are replaced by in-process stubs answering after --github-latency and --llm-latency.
+
+Usage: python -m benchmarks.bench_batch [--repositories 50] [--files 20] [--github-latency 0.05]
+                                        [--llm-latency 0.5] [--batch-llm-concurrency 32]
+"""
+import os
+import json
+import time
+import httpx
+import asyncio
+import argparse
+
+from loguru import logger
+
+os.environ.setdefault("REPO_CACHE_BACKEND", "none")
+os.environ.setdefault("LLM_CACHE_BACKEND", "none")
+os.environ.setdefault("REVIEW_SNAPSHOTS_BACKEND", "none")
+
+from benchmarks.stub_llm import create_stub_llm_app, stub_openai_client  # noqa: E402
+from benchmarks.stub_github import synthetic_repository, create_stub_github_app  # noqa: E402
+
+ASSIGNMENT = "Implement a REST API for a to-do list application with authentication and tests."
+
+
+async def run(arguments: argparse.Namespace) -> dict:
+    """Reviews the stub repositories sequentially, then as one batch."""
+    import src.services.github_fetcher as github_fetcher
+    from src.api import app as app_module
+    from src.services.review_batch import BatchBudget, review_batch
+    from src.services.data_structures import ReviewRequest, CandidateLevel
+
+    logger.remove()
+    github_fetcher.GITHUB_API_URL = "http://github.test"
+    stub_github = create_stub_github_app(synthetic_repository(arguments.files), arguments.github_latency)
+    github_client = httpx.AsyncClient(transport=httpx.ASGITransport(app=stub_github))
+
+    requests = [
+        ReviewRequest(
+            assignment_description=ASSIGNMENT,
+            github_repo_url=f"https://github.com/candidate{index}/todo-api",
+            candidate_level=CandidateLevel.junior,
+        )
+        for index in range(arguments.repositories)
+    ]
+    results = {}
+
+    stub_llm = create_stub_llm_app(arguments.llm_latency)
+    calls: list[str] = stub_llm.state.system_prompts
+    openai_client = stub_openai_client(stub_llm, max_retries=0)
+    started = time.perf_counter()
+    for request in requests:
+        await app_module.review_repository(request, github_client, openai_client)
+    results["sequential"] = {"wall_seconds": round(time.perf_counter() - started, 2), "llm_calls": len(calls)}
+
+    calls.clear()
+    os.environ["BATCH_LLM_MAX_CONCURRENCY"] = str(arguments.batch_llm_concurrency)
+    budget = BatchBudget.from_env()
+
+    async def review_one(request: ReviewRequest):
+        return await app_module.review_repository(
+            request, github_client, openai_client, limiter=budget.limiter, fetch_slots=budget.fetch_slots
+        )
+
+    started = time.perf_counter()
+    failures = [result async for result in review_batch(requests, review_one) if result.error is not None]
+    results["batch"] = {
+        "wall_seconds": round(time.perf_counter() - started, 2),
+        "llm_calls": len(calls),
+        "failures": len(failures),
+        "distinct_system_prompts": len(set(calls)),
+    }
+    results["speedup"] = round(results["sequential"]["wall_seconds"] / results["batch"]["wall_seconds"], 1)
+
+    await github_client.aclose()
+    await openai_client.close()
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--repositories", type=int, default=50)
+    parser.add_argument("--files", type=int, default=20)
+    parser.add_argument("--github-latency", type=float, default=0.05, help="stub GitHub response delay in seconds")
+    parser.add_argument("--llm-latency", type=float, default=0.5, help="stub OpenAI response delay in seconds")
+    parser.add_argument("--batch-llm-concurrency", type=int, default=32)
+    arguments = parser.parse_args()
+
+    results = asyncio.run(run(arguments))
+    print(json.dumps({"benchmark": "batch", **vars(arguments), **results}, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,121 @@
+"""
+Compares the number of LLM calls and prompt tokens of the fixed 7000-character split (before) with the
+token-aware, syntax-aware chunker (after) on sample repositories.
+
+Usage: python -m benchmarks.bench_chunking [--max-chunk-tokens 3000]
+"""
+import json
+import httpx
+import asyncio
+import argparse
+
+from pathlib import Path
+
+from openai import AsyncOpenAI
+from loguru import logger
+
+from src.services.chunker import count_tokens, tiktoken
+from src.services.gpt_code_analyzer import GPTCandidateAnalyzer, SYSTEM_PROMPT
+from src.services.data_structures import RepoFilesResponse, Content, CandidateLevel
+
+ASSIGNMENT = "Implement a REST API for a to-do list application with authentication and tests."
+REPOSITORY_ROOT = Path(__file__).resolve().parent.parent
+
+
+def this_repository() -> list[Content]:
+    """The Python sources and tests of this project."""
+    return [
+        Content(filename=str(path.relative_to(REPOSITORY_ROOT)), file_content=path.read_text())
+        for directory in ("src", "tests") for path in sorted((REPOSITORY_ROOT / directory).rglob("*.py"))
+    ]
+
+
+def many_small_files() -> list[Content]:
+    """A repository of many small modules, like a typical web application skeleton."""
+    model = "from app.base import Base\n\n\nclass Model{index}(Base):\n    name: str\n"
+    return [
+        Content(filename=f"app/module_{index}.py", file_content=model.format(index=index) * (1 + index % 4))
+        for index in range(80)
+    ]
+
+
+def few_large_files() -> list[Content]:
+    """A repository of a few large modules made of many functions."""
+    function = "def handler_{index}(request):\n" + "    value = request.get('key')\n" * 12 + "    return value\n\n\n"
+    return [
+        Content(filename=f"services/service_{number}.py",
+                file_content="".join(function.format(index=index) for index in range(60)))
+        for number in range(5)
+    ]
+
+
+def legacy_prompts(files: list[Content]) -> list[str]:
+    """Renders the prompts of the fixed 7000-character split."""
+    prompts = []
+    for content in files:
+        parts = [content.file_content[i:i + 7000] for i in range(0, len(content.file_content), 7000)]
+        for part_index, part in enumerate(parts, start=1):
+            header = f"File '{content.filename}'." if len(parts) == 1 else \
+                f"Part {part_index}/{len(parts)} of the file '{content.filename}'."
+            prompts.append(
+                f"{SYSTEM_PROMPT}\n{ASSIGNMENT}\n\n{header}\nCandidate level: CandidateLevel.junior.\nCode: {part}"
+            )
+    return prompts
+
+
+async def chunked_prompts(files: list[Content], max_chunk_tokens: int) -> list[str]:
+    """Runs the analyzer against a fake completion server and collects the per-chunk messages it sends."""
+    prompts = []
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        messages = json.loads(request.content)["messages"]
+        final = "structured report in JSON format" in messages[-1]["content"]
+        if not final:
+            prompts.append("\n".join(message["content"] for message in messages))
+        return httpx.Response(200, json={
+            "id": "bench", "object": "chat.completion", "created": 0, "model": "stub",
+            "choices": [{"index": 0, "finish_reason": "stop",
+                         "message": {"role": "assistant", "content": "{}" if final else "Looks fine."}}],
+        })
+
+    client = AsyncOpenAI(api_key="bench", base_url="http://llm.test/v1",
+                         http_client=httpx.AsyncClient(transport=httpx.MockTransport(handler)))
+    analyzer = GPTCandidateAnalyzer(
+        RepoFilesResponse(files=files, count=len(files)), CandidateLevel.junior, ASSIGNMENT,
+        client=client, max_chunk_tokens=max_chunk_tokens, duplicate_similarity=0,
+    )
+    await analyzer.analyze()
+    return prompts
+
+
+def summarize(prompts: list[str]) -> dict:
+    """Counts the calls and prompt tokens of a list of prompts."""
+    return {"llm_calls": len(prompts), "prompt_tokens": sum(count_tokens(prompt) for prompt in prompts)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--max-chunk-tokens", type=int, default=3000)
+    arguments = parser.parse_args()
+
+    logger.remove()
+
+    results = {}
+    for name, files in (("this_repository", this_repository()), ("many_small_files", many_small_files()),
+                        ("few_large_files", few_large_files())):
+        results[name] = {
+            "files": len(files),
+            "before": summarize(legacy_prompts(files)),
+            "after": summarize(asyncio.run(chunked_prompts(files, arguments.max_chunk_tokens))),
+        }
+
+    print(json.dumps({
+        "benchmark": "chunking",
+        "tokenizer": "tiktoken" if tiktoken is not None else "estimate",
+        "max_chunk_tokens": arguments.max_chunk_tokens,
+        **results,
+    }, indent=2))
+
+
+if __name__ == "__main__":
+    main()
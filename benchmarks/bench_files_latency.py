@@ -0,0 +1,101 @@
+"""
+Measures /files latency with a client per request (before) and with the shared pooled client (after).
+
+The stub GitHub server is served over TLS by default and every new connection is delayed by --connect-latency
+to model the round trips to a remote server, so per-request handshakes show up in the numbers.
+
+Usage: python -m benchmarks.bench_files_latency [--requests 200] [--files 50] [--concurrency 2] [--latency 0.02]
+                                                [--connect-latency 0.05] [--no-tls]
+"""
+import os
+import json
+import time
+import httpx
+import asyncio
+import argparse
+import statistics
+
+from loguru import logger
+
+os.environ.setdefault("REPO_CACHE_BACKEND", "none")
+
+from benchmarks.stub_github import synthetic_repository, create_stub_github_app, run_stub_server  # noqa: E402
+
+
+def percentile(values: list[float], fraction: float) -> float:
+    """Returns the value below which the given fraction of the sorted values falls."""
+    ordered = sorted(values)
+    return ordered[min(int(len(ordered) * fraction), len(ordered) - 1)]
+
+
+async def measure(app, requests: int, concurrency: int, fetch_mode: str) -> dict:
+    """Sends /files requests to the application in-process and summarizes their latency."""
+    latencies = []
+    semaphore = asyncio.Semaphore(concurrency)
+    payload = {"github_repo_url": "https://github.com/owner/repo", "fetch_mode": fetch_mode}
+
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://app") as client:
+        async def send():
+            async with semaphore:
+                started = time.perf_counter()
+                response = await client.post("/files", json=payload)
+                latencies.append(time.perf_counter() - started)
+                assert response.status_code == 200, response.text
+
+        await asyncio.gather(*(send() for _ in range(requests)))
+
+    return {
+        "requests": requests,
+        "p50_ms": round(percentile(latencies, 0.50) * 1000, 2),
+        "p99_ms": round(percentile(latencies, 0.99) * 1000, 2),
+        "mean_ms": round(statistics.mean(latencies) * 1000, 2),
+    }
+
+
+async def run(requests: int, files: int, concurrency: int, fetch_mode: str) -> dict:
+    """Runs the benchmark without and with the shared client."""
+    from src.api.app import app
+    from src.services.http_clients import create_github_client
+
+    logger.remove()
+    logger.add(sink=lambda msg: print(msg, end=""), level="WARNING")
+
+    results = {}
+
+    for name in ("per_request_client", "shared_client"):
+        if name == "shared_client":
+            app.state.github_client = create_github_client()
+        results[name] = await measure(app, requests, concurrency, fetch_mode)
+        if name == "shared_client":
+            await app.state.github_client.aclose()
+            del app.state.github_client
+
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--files", type=int, default=50)
+    parser.add_argument("--concurrency", type=int, default=2)
+    parser.add_argument("--fetch-mode", default="per_file", choices=["per_file", "archive"])
+    parser.add_argument("--latency", type=float, default=0.02, help="stub response delay in seconds")
+    parser.add_argument("--connect-latency", type=float, default=0.05, help="delay of every new connection")
+    parser.add_argument("--no-tls", dest="tls", action="store_false")
+    arguments = parser.parse_args()
+
+    files = synthetic_repository(arguments.files)
+    with run_stub_server(
+            create_stub_github_app, files, arguments.latency,
+            tls=arguments.tls, connect_latency=arguments.connect_latency,
+    ) as base_url:
+        import src.services.github_fetcher as github_fetcher
+        github_fetcher.GITHUB_API_URL = base_url
+
+        results = asyncio.run(run(arguments.requests, arguments.files, arguments.concurrency, arguments.fetch_mode))
+
+    print(json.dumps({"benchmark": "files_latency", **vars(arguments), **results}, indent=2))
+
+
+if __name__ == "__main__":
+    main()
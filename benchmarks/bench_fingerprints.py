@@ -0,0 +1,82 @@
+"""
+Measures the lookup latency of the boilerplate index once it holds many fingerprints, and the time
+taken to fingerprint a file.
+
+Usage: python -m benchmarks.bench_fingerprints [--fingerprints 200000] [--lookups 2000] [--path index.sqlite3]
+"""
+import json
+import time
+import random
+import argparse
+import statistics
+
+from loguru import logger
+
+from src.services.fingerprints import BoilerplateIndex, fingerprint
+
+WORDS = [f"name_{index}" for index in range(5000)] + ["(", ")", ":", "=", "return", "def", "self", ".", ","]
+
+
+def synthetic_file(generator: random.Random, tokens: int = 200) -> str:
+    """A random token sequence standing in for a source file."""
+    return " ".join(generator.choice(WORDS) for _ in range(tokens))
+
+
+def percentile(samples: list[float], fraction: float) -> float:
+    """Returns a percentile of the samples, in milliseconds."""
+    return round(sorted(samples)[min(len(samples) - 1, int(len(samples) * fraction))] * 1000, 3)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--fingerprints", type=int, default=200_000)
+    parser.add_argument("--lookups", type=int, default=2000)
+    parser.add_argument("--path", default=":memory:")
+    arguments = parser.parse_args()
+
+    logger.remove()
+    generator = random.Random(0)
+    index = BoilerplateIndex(arguments.path)
+
+    stored = [synthetic_file(generator) for _ in range(arguments.fingerprints)]
+    started = time.perf_counter()
+    for number, file_content in enumerate(stored):
+        index.add(file_content, f"repository-{number % 1000}")
+    fill_seconds = time.perf_counter() - started
+
+    # Half of the lookups hit stored files, a quarter near-duplicates of them, a quarter unknown files
+    queries = []
+    for number in range(arguments.lookups):
+        file_content = generator.choice(stored)
+        if number % 4 == 2:
+            words = file_content.split(" ")
+            words[generator.randrange(len(words))] = "changed"
+            file_content = " ".join(words)
+        elif number % 4 == 3:
+            file_content = synthetic_file(generator)
+        queries.append(file_content)
+
+    fingerprint_times, lookup_times = [], []
+    for file_content in queries:
+        started = time.perf_counter()
+        fingerprint(file_content)
+        fingerprint_times.append(time.perf_counter() - started)
+
+        started = time.perf_counter()
+        index.lookup(file_content)
+        lookup_times.append(time.perf_counter() - started)
+
+    # A lookup fingerprints the file first, so the index search alone is the difference
+    search_times = [lookup - fingerprint_time for lookup, fingerprint_time in zip(lookup_times, fingerprint_times)]
+    print(json.dumps({
+        "benchmark": "fingerprints",
+        "fingerprints": arguments.fingerprints,
+        "fill_seconds": round(fill_seconds, 1),
+        "fingerprint_ms": {"p50": percentile(fingerprint_times, 0.5), "p99": percentile(fingerprint_times, 0.99)},
+        "index_search_ms": {"p50": percentile(search_times, 0.5), "p99": percentile(search_times, 0.99)},
+        "index_search_mean_ms": round(statistics.mean(search_times) * 1000, 3),
+    }, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,123 @@
+"""
+Compares the time taken by get_repository_files to read a synthetic repository from the stub GitHub
+archive endpoint (before) with reading it from a local mirror, whose objects are read straight from a
+deltified packfile or from loose objects (after).
+
+The repositories are built with the git binary: two commits, the second changing one file in ten, so that
+the packfile holds delta chains. Every run opens the repository again, so no object read by a previous run
+is cached in the process; the operating system page cache is warm after the first run. The stub GitHub
+server runs in process and answers after --github-latency, so the archive timings leave out the download.
+
+Usage: python -m benchmarks.bench_local_git [--files 10000] [--file-size 2000] [--github-latency 0.0] [--runs 5]
+"""
+import json
+import time
+import httpx
+import asyncio
+import argparse
+import tempfile
+import statistics
+import subprocess
+
+from pathlib import Path
+
+from loguru import logger
+
+from benchmarks.stub_github import synthetic_repository, create_stub_github_app
+
+REPOSITORY_URL = "https://github.com/owner/repo"
+
+
+def git(directory: Path, *arguments: str, stdin: bytes | None = None) -> str:
+    """Runs a git command in a directory and returns its output."""
+    return subprocess.run(
+        ["git", "-C", str(directory), *arguments], input=stdin, check=True, capture_output=True
+    ).stdout.decode().strip()
+
+
+def fast_import_stream(files: dict[str, bytes]) -> bytes:
+    """Builds a git fast-import stream of two commits, the second changing one file in ten."""
+    def commit(message: str, changed: dict[str, bytes]) -> bytes:
+        lines = [b"commit refs/heads/main", b"committer Bench <bench@example.com> 0 +0000",
+                 b"data %d" % len(message), message.encode()]
+        for path, data in changed.items():
+            lines += [b"M 100644 inline " + path.encode(), b"data %d" % len(data), data]
+        return b"\n".join(lines) + b"\n"
+
+    changed = {path: data + b"# changed\n" for index, (path, data) in enumerate(files.items()) if index % 10 == 0}
+    return commit("First", files) + commit("Second", changed)
+
+
+def build_mirrors(root: Path, files: dict[str, bytes]) -> tuple[Path, Path]:
+    """Builds a bare mirror with a deltified pack and a copy of it with loose objects only."""
+    packed = root / "packed" / "owner" / "repo.git"
+    packed.mkdir(parents=True)
+    git(packed, "init", "-q", "--bare", "-b", "main")
+    git(packed, "fast-import", "--quiet", stdin=fast_import_stream(files))
+    git(packed, "repack", "-a", "-d", "-f", "-q", "--depth=50", "--window=10")
+    head = git(packed, "rev-parse", "HEAD")
+
+    loose = root / "loose" / "owner" / "repo.git"
+    loose.mkdir(parents=True)
+    git(loose, "init", "-q", "--bare", "-b", "main")
+    for pack in (packed / "objects" / "pack").glob("*.pack"):
+        git(loose, "unpack-objects", "-q", stdin=pack.read_bytes())
+    git(loose, "update-ref", "refs/heads/main", head)
+    return packed.parent.parent, loose.parent.parent
+
+
+async def time_runs(fetch, runs: int) -> dict:
+    """Runs a fetch several times, returning the median and the slowest wall time and the files read."""
+    timings, count = [], 0
+    for _ in range(runs):
+        started = time.perf_counter()
+        count = (await fetch()).count
+        timings.append(time.perf_counter() - started)
+    return {"files": count, "wall_seconds_median": round(statistics.median(timings), 3),
+            "wall_seconds_max": round(max(timings), 3)}
+
+
+async def run(arguments: argparse.Namespace) -> dict:
+    """Reads the repository from the stub GitHub archive endpoint, then from the packed and the loose mirror."""
+    from src.services import repo_sources
+    import src.services.github_fetcher as github_fetcher
+
+    logger.remove()
+    files = synthetic_repository(arguments.files, arguments.file_size)
+    results = {}
+
+    github_fetcher.GITHUB_API_URL = "http://github.test"
+    stub_github = create_stub_github_app(files, latency=arguments.github_latency)
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=stub_github), timeout=300.0) as client:
+        results["github_archive"] = await time_runs(
+            lambda: github_fetcher.get_repository_files(REPOSITORY_URL, client=client), arguments.runs
+        )
+
+    with tempfile.TemporaryDirectory() as directory:
+        started = time.perf_counter()
+        packed_root, loose_root = build_mirrors(Path(directory), files)
+        results["build_seconds"] = round(time.perf_counter() - started, 1)
+
+        for name, root in (("local_packed", packed_root), ("local_loose", loose_root)):
+            repo_sources.LOCAL_GIT_ROOTS = [root]
+            results[name] = await time_runs(lambda: github_fetcher.get_repository_files(REPOSITORY_URL), arguments.runs)
+            results[name]["speedup"] = round(
+                results["github_archive"]["wall_seconds_median"] / results[name]["wall_seconds_median"], 1
+            )
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--files", type=int, default=10000)
+    parser.add_argument("--file-size", type=int, default=2000)
+    parser.add_argument("--github-latency", type=float, default=0.0, help="stub GitHub delay in seconds")
+    parser.add_argument("--runs", type=int, default=5)
+    arguments = parser.parse_args()
+
+    results = asyncio.run(run(arguments))
+    print(json.dumps({"benchmark": "local_git", **vars(arguments), **results}, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,88 @@
+"""
+Compares the peak memory of serving /files for a large repository with every file content held as a
+string and the response encoded in one piece (before), with contents kept in a ContentSpool within a
+memory budget and the response streamed (after).
+
+GitHub is replaced by an in-process stub; the stub and its tarball are built before measuring, so the
+figures only cover the fetch and the encoding of the response.
+
+Usage: python -m benchmarks.bench_memory [--files 2000] [--file-size 20000] [--memory-budget 4194304]
+"""
+import os
+import json
+import time
+import httpx
+import asyncio
+import argparse
+import tracemalloc
+
+from loguru import logger
+
+os.environ.setdefault("REPO_CACHE_BACKEND", "none")
+
+from benchmarks.stub_github import synthetic_repository, create_stub_github_app  # noqa: E402
+
+MIB = 1024 * 1024
+
+
+async def measure(github_client: httpx.AsyncClient, spool) -> dict:
+    """Fetches the stub repository and encodes the /files response, tracing the memory allocated."""
+    from src.services.files_stream import encode_repo_files
+    from src.services.github_fetcher import get_repository_files
+
+    tracemalloc.start()
+    started = time.perf_counter()
+    repo_files = await get_repository_files("https://github.com/owner/repo", client=github_client, spool=spool)
+    held, _ = tracemalloc.get_traced_memory()
+
+    response_bytes = 0
+    if spool is None:
+        response_bytes = len(repo_files.model_dump_json().encode())
+    else:
+        for piece in encode_repo_files(repo_files):
+            response_bytes += len(piece)
+
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return {
+        "seconds": round(time.perf_counter() - started, 2),
+        "held_after_fetch_mib": round(held / MIB, 1),
+        "peak_mib": round(peak / MIB, 1),
+        "response_mib": round(response_bytes / MIB, 1),
+    }
+
+
+async def run(arguments: argparse.Namespace) -> dict:
+    """Serves the stub repository without, then with, a content spool."""
+    import src.services.github_fetcher as github_fetcher
+    from src.services.content_spool import ContentSpool
+
+    logger.remove()
+    github_fetcher.GITHUB_API_URL = "http://github.test"
+    stub_github = create_stub_github_app(synthetic_repository(arguments.files, arguments.file_size))
+    github_client = httpx.AsyncClient(transport=httpx.ASGITransport(app=stub_github))
+    # Warm up the stub, which builds its tarball on the first request
+    await github_fetcher.get_repository_files("https://github.com/owner/repo", client=github_client)
+
+    results = {"before": await measure(github_client, None)}
+    with ContentSpool(max_memory_bytes=arguments.memory_budget) as spool:
+        results["after"] = await measure(github_client, spool)
+        results["after"]["spilled_mib"] = round(spool.spilled_bytes / MIB, 1)
+
+    await github_client.aclose()
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--files", type=int, default=2000)
+    parser.add_argument("--file-size", type=int, default=20_000, help="approximate size of every file in bytes")
+    parser.add_argument("--memory-budget", type=int, default=4 * MIB, help="content spool memory budget in bytes")
+    arguments = parser.parse_args()
+
+    results = asyncio.run(run(arguments))
+    print(json.dumps({"benchmark": "memory", **vars(arguments), **results}, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,108 @@
+"""
+Measures the cost of the metrics instrumentation: the time taken to record one sample, and the share
+of a review spent recording the samples of its trace.
+
+GitHub and OpenAI are replaced by in-process stubs answering without delay, so the review time is
+mostly the service's own CPU time and the estimated overhead is an upper bound.
+
+Usage: python -m benchmarks.bench_metrics [--samples 200000] [--files 500]
+"""
+import os
+import json
+import time
+import httpx
+import asyncio
+import argparse
+
+from loguru import logger
+
+os.environ.setdefault("REPO_CACHE_BACKEND", "none")
+os.environ.setdefault("LLM_CACHE_BACKEND", "none")
+os.environ.setdefault("REVIEW_SNAPSHOTS_BACKEND", "none")
+
+from benchmarks.bench_batch import ASSIGNMENT  # noqa: E402
+from benchmarks.stub_llm import create_stub_llm_app, stub_openai_client  # noqa: E402
+from benchmarks.stub_github import synthetic_repository, create_stub_github_app  # noqa: E402
+
+
+def time_per_call(function, samples: int) -> float:
+    """Returns the mean duration of a call in nanoseconds."""
+    started = time.perf_counter()
+    for _ in range(samples):
+        function()
+    return round((time.perf_counter() - started) / samples * 1e9, 1)
+
+
+def measure_recording(samples: int) -> dict:
+    """Times the recording primitives with a trace active, as during a review."""
+    from src.services.metrics import ReviewTrace, observe_stage, LLM_TOKENS, GITHUB_REQUEST_SECONDS
+
+    with ReviewTrace().activate() as trace:
+        return {
+            "histogram_observe_ns": time_per_call(
+                lambda: GITHUB_REQUEST_SECONDS.observe(0.02, "blobs", "200"), samples
+            ),
+            "counter_inc_ns": time_per_call(lambda: LLM_TOKENS.inc("chunk", "prompt", amount=100), samples),
+            "trace_add_span_ns": time_per_call(lambda: trace.add_span("github_request", 0.02), samples),
+            "observe_stage_ns": time_per_call(lambda: observe_stage("fetch", 0.02), samples),
+        }
+
+
+async def measure_review(files: int) -> dict:
+    """Runs a traced review of a stub repository and counts the samples it records."""
+    import src.services.github_fetcher as github_fetcher
+    from src.api import app as app_module
+    from src.services.data_structures import ReviewRequest, CandidateLevel
+
+    logger.remove()
+    github_fetcher.GITHUB_API_URL = "http://github.test"
+    github_client = httpx.AsyncClient(transport=httpx.ASGITransport(app=create_stub_github_app(
+        synthetic_repository(files)
+    )))
+    stub_llm = create_stub_llm_app()
+    openai_client = stub_openai_client(stub_llm, max_retries=0)
+    request = ReviewRequest(
+        assignment_description=ASSIGNMENT,
+        github_repo_url="https://github.com/candidate/todo-api",
+        candidate_level=CandidateLevel.junior,
+        trace=True,
+    )
+
+    started = time.perf_counter()
+    report = await app_module.review_repository(request, github_client, openai_client)
+    wall_seconds = time.perf_counter() - started
+
+    await github_client.aclose()
+    await openai_client.close()
+    # Every span is one histogram sample; the trace counters are updated alongside their span
+    samples = sum(span.count for span in report.trace.spans)
+    return {
+        "wall_seconds": round(wall_seconds, 3),
+        "llm_calls": stub_llm.state.calls["completed"],
+        "recorded_samples": samples,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--samples", type=int, default=200_000)
+    parser.add_argument("--files", type=int, default=500)
+    arguments = parser.parse_args()
+
+    recording = measure_recording(arguments.samples)
+    review = asyncio.run(measure_review(arguments.files))
+
+    # A sample records a histogram observation, a trace span and up to a few counters
+    sample_ns = recording["observe_stage_ns"] + 3 * recording["counter_inc_ns"]
+    overhead = review["recorded_samples"] * sample_ns / 1e9 / review["wall_seconds"]
+    print(json.dumps({
+        "benchmark": "metrics",
+        **vars(arguments),
+        **recording,
+        "review": review,
+        "estimated_review_overhead_percent": round(overhead * 100, 3),
+    }, indent=2))
+
+
+if __name__ == "__main__":
+    main()
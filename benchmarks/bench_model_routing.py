@@ -0,0 +1,138 @@
+"""
+Compares the end-to-end latency of reviews sending every chunk to the strong model (before) with reviews
+routing simple chunks to a cheap model (after), with and without escalating the low-confidence answers
+of the cheap model, on this project's sources, tests and documentation, and on a synthetic repository of
+simple modules.
+
+OpenAI is replaced by the in-process stub, answering after --strong-latency or --cheap-latency depending
+on the model, and stating a low confidence in --low-confidence-rate of the cheap answers.
+
+Usage: python -m benchmarks.bench_model_routing [--strong-latency 1.0] [--cheap-latency 0.25]
+                                                [--low-confidence-rate 0.2] [--files 100] [--seed 1]
+                                                [--runs 3]
+"""
+import json
+import time
+import asyncio
+import argparse
+import statistics
+
+from pathlib import Path
+
+from loguru import logger
+
+from benchmarks.stub_llm import create_stub_llm_app, stub_openai_client
+from benchmarks.stub_github import synthetic_repository
+
+ASSIGNMENT = "Implement a REST API for a to-do list application with authentication and tests."
+REPOSITORY_ROOT = Path(__file__).resolve().parent.parent
+STRONG_MODEL, CHEAP_MODEL = "strong-model", "cheap-model"
+
+
+def this_repository():
+    """The Python sources, tests and documentation of this project."""
+    from src.services.data_structures import Content
+
+    paths = [path for directory in ("src", "tests") for path in sorted((REPOSITORY_ROOT / directory).rglob("*.py"))]
+    paths += [REPOSITORY_ROOT / name for name in ("README.md", "pyproject.toml", "Dockerfile")]
+    return [
+        Content(filename=str(path.relative_to(REPOSITORY_ROOT)), file_content=path.read_text())
+        for path in paths if path.exists()
+    ]
+
+
+async def review(files, insights, router, arguments: argparse.Namespace) -> dict:
+    """Reviews the files against the stub LLM with the given router."""
+    from src.services.metrics import ReviewTrace
+    from src.services.gpt_code_analyzer import GPTCandidateAnalyzer
+    from src.services.data_structures import RepoFilesResponse, CandidateLevel
+
+    stub_llm = create_stub_llm_app(
+        latency=arguments.strong_latency,
+        model_latency={CHEAP_MODEL: arguments.cheap_latency},
+        low_confidence_rate=arguments.low_confidence_rate,
+        seed=arguments.seed,
+    )
+    client = stub_openai_client(stub_llm, max_retries=0)
+    trace = ReviewTrace()
+
+    started = time.perf_counter()
+    analyzer = GPTCandidateAnalyzer(
+        RepoFilesResponse(files=files, count=len(files)), CandidateLevel.junior, ASSIGNMENT, client=client,
+        duplicate_similarity=0, trace=trace, insights=insights, router=router,
+    )
+    await analyzer.analyze()
+    wall_seconds = time.perf_counter() - started
+    await client.close()
+
+    counters = trace.report().counters
+    return {
+        "wall_seconds": wall_seconds,
+        "calls": dict(stub_llm.state.models),
+        "escalations": counters.get("llm_escalations", 0),
+        "prompt_tokens": counters.get("prompt_tokens", 0),
+    }
+
+
+async def run_repository(files, arguments: argparse.Namespace) -> dict:
+    """Reviews a repository without routing, with routing, and with routing and escalation."""
+    from src.services.model_routing import ModelRouter
+    from src.services.static_analysis import StaticAnalyzer
+    from src.services.data_structures import RepoFilesResponse
+
+    static_analyzer = StaticAnalyzer()
+    insights = await static_analyzer.analyze(RepoFilesResponse(files=files, count=len(files)))
+    static_analyzer.close()
+
+    scenarios = {
+        "strong_only": ModelRouter(strong_model=STRONG_MODEL),
+        "routed": ModelRouter(strong_model=STRONG_MODEL, cheap_model=CHEAP_MODEL, escalate=False),
+        "routed_with_escalation": ModelRouter(strong_model=STRONG_MODEL, cheap_model=CHEAP_MODEL),
+    }
+    results = {"files": len(files)}
+    for name, router in scenarios.items():
+        runs = [await review(files, insights, router, arguments) for _ in range(arguments.runs)]
+        results[name] = {
+            "wall_seconds_median": round(statistics.median(run["wall_seconds"] for run in runs), 3),
+            "calls": runs[0]["calls"],
+            "escalations": runs[0]["escalations"],
+            "prompt_tokens": runs[0]["prompt_tokens"],
+        }
+    baseline = results["strong_only"]["wall_seconds_median"]
+    for name in ("routed", "routed_with_escalation"):
+        results[name]["speedup"] = round(baseline / results[name]["wall_seconds_median"], 2)
+    return results
+
+
+async def run(arguments: argparse.Namespace) -> dict:
+    """Runs the scenarios on this project and on the synthetic repository."""
+    from src.services.data_structures import Content
+    import src.services.gpt_code_analyzer  # noqa: F401 - adds its log sink on import, removed below
+
+    logger.remove()
+    synthetic = [
+        Content(filename=path, file_content=content.decode())
+        for path, content in synthetic_repository(arguments.files).items()
+    ]
+    return {
+        "this_repository": await run_repository(this_repository(), arguments),
+        "synthetic": await run_repository(synthetic, arguments),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--strong-latency", type=float, default=1.0, help="stub strong model delay in seconds")
+    parser.add_argument("--cheap-latency", type=float, default=0.25, help="stub cheap model delay in seconds")
+    parser.add_argument("--low-confidence-rate", type=float, default=0.2)
+    parser.add_argument("--files", type=int, default=100, help="files of the synthetic repository")
+    parser.add_argument("--seed", type=int, default=1, help="seed of the low-confidence answers")
+    parser.add_argument("--runs", type=int, default=3)
+    arguments = parser.parse_args()
+
+    results = asyncio.run(run(arguments))
+    print(json.dumps({"benchmark": "model_routing", **vars(arguments), **results}, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,288 @@
+"""
+Replays synthetic repositories of increasing size through get_repository_files and GPTCandidateAnalyzer
+against in-process stand-ins for GitHub and OpenAI, without network access.
+
+Every scenario reports the wall time of its runs (p50/p99), the throughput in files per second, the
+client-side latency of the GitHub and OpenAI calls (p50/p99), the calls made per run by endpoint or
+outcome, the traced resource counters of a run and, unless --no-memory, the peak memory of one extra
+run traced with tracemalloc. The JSON output can be saved with --output and compared with a previous
+one with --compare.
+
+Usage: python -m benchmarks.bench_suite [--sizes 10,100,1000,10000] [--runs 3] [--modes archive,per_file]
+                                        [--file-size 2000] [--github-latency 0.0] [--github-jitter 0.0]
+                                        [--github-error-rate 0.0] [--github-rate-limit N]
+                                        [--llm-latency 0.05] [--llm-jitter 0.0] [--llm-error-rate 0.0]
+                                        [--llm-requests-per-minute N] [--llm-concurrency 8]
+                                        [--no-memory] [--output results.json] [--compare baseline.json]
+"""
+import sys
+import json
+import time
+import httpx
+import asyncio
+import argparse
+import subprocess
+import tracemalloc
+
+from typing import Awaitable, Callable
+
+from loguru import logger
+
+from benchmarks.stub_llm import create_stub_llm_app, stub_openai_client
+from benchmarks.stub_github import synthetic_repository, create_stub_github_app
+
+ASSIGNMENT = "Implement a REST API for a to-do list application with authentication and tests."
+REPOSITORY_URL = "https://github.com/owner/repo"
+MIB = 1024 * 1024
+
+
+class TimedTransport(httpx.AsyncBaseTransport):
+    """A transport recording the time taken by every call, as seen by the client."""
+
+    def __init__(self, transport: httpx.AsyncBaseTransport):
+        self.latencies: list[float] = []
+        self.__transport = transport
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        started = time.perf_counter()
+        response = await self.__transport.handle_async_request(request)
+        self.latencies.append(time.perf_counter() - started)
+        return response
+
+    async def aclose(self) -> None:
+        await self.__transport.aclose()
+
+
+def percentiles(samples: list[float], scale: float = 1.0) -> dict[str, float | None]:
+    """Returns the p50 and p99 of the samples, multiplied by scale."""
+    if not samples:
+        return {"p50": None, "p99": None}
+    ordered = sorted(samples)
+    pick = lambda fraction: round(ordered[min(int(len(ordered) * fraction), len(ordered) - 1)] * scale, 3)  # noqa: E731
+    return {"p50": pick(0.50), "p99": pick(0.99)}
+
+
+def git_version() -> str | None:
+    """Returns the commit of the benchmarked tree, so results of different versions can be told apart."""
+    try:
+        result = subprocess.run(["git", "describe", "--always", "--dirty"], capture_output=True, text=True, check=True)
+    except (OSError, subprocess.CalledProcessError):
+        return None
+    return result.stdout.strip()
+
+
+async def run_scenario(
+        name: str,
+        files: int,
+        runs: int,
+        run_once: Callable[[], Awaitable[None]],
+        transport: TimedTransport,
+        calls: Callable[[], dict[str, int]],
+        measure_memory: bool,
+) -> dict:
+    """
+    Runs a scenario several times and summarizes its timings, calls, resources and peak memory.
+
+    Args:
+        name (str): The name of the scenario.
+        files (int): The number of files of the repository.
+        runs (int): The number of timed runs.
+        run_once (Callable[[], Awaitable[None]]): Runs the scenario once.
+        transport (TimedTransport): The transport of the calls timed by the scenario.
+        calls (Callable[[], dict[str, int]]): Returns the calls received by the stub so far.
+        measure_memory (bool): Whether an extra run is traced with tracemalloc.
+
+    Returns:
+        dict: The results of the scenario.
+    """
+    from src.services.metrics import ReviewTrace
+
+    transport.latencies.clear()
+    calls_before = dict(calls())
+    wall_times, failures, counters = [], 0, {}
+    for _ in range(runs):
+        trace = ReviewTrace()
+        started = time.perf_counter()
+        try:
+            with trace.activate():
+                await run_once()
+        except Exception as ex:
+            failures += 1
+            logger.warning(f"{name} run failed: {ex}")
+        wall_times.append(time.perf_counter() - started)
+        counters = trace.report().counters
+
+    results = {
+        "scenario": name,
+        "files": files,
+        "runs": runs,
+        "failed_runs": failures,
+        "wall_seconds": percentiles(wall_times),
+        "files_per_second": round(files / percentiles(wall_times)["p50"], 1),
+        "call_latency_ms": percentiles(transport.latencies, 1000),
+        "calls_per_run": {
+            key: round((value - calls_before.get(key, 0)) / runs, 1)
+            for key, value in sorted(calls().items()) if value > calls_before.get(key, 0)
+        },
+        "trace_counters": counters,
+    }
+
+    if measure_memory:
+        tracemalloc.start()
+        try:
+            await run_once()
+        except Exception as ex:
+            logger.warning(f"{name} memory run failed: {ex}")
+        results["peak_memory_mib"] = round(tracemalloc.get_traced_memory()[1] / MIB, 1)
+        tracemalloc.stop()
+    return results
+
+
+async def run_size(arguments: argparse.Namespace, size: int) -> list[dict]:
+    """Runs the fetch and analysis scenarios on a synthetic repository of the given size."""
+    import src.services.github_fetcher as github_fetcher
+    from src.services.llm_limits import LLMRateLimiter
+    from src.services.github_http import GitHubTransport, RateLimitState
+    from src.services.gpt_code_analyzer import GPTCandidateAnalyzer
+    from src.services.data_structures import FetchMode, CandidateLevel
+
+    github_fetcher.GITHUB_API_URL = "http://github.test"
+    stub_github = create_stub_github_app(
+        synthetic_repository(size, arguments.file_size),
+        latency=arguments.github_latency,
+        jitter=arguments.github_jitter,
+        error_rate=arguments.github_error_rate,
+        rate_limit=arguments.github_rate_limit,
+    )
+    github_transport = TimedTransport(httpx.ASGITransport(app=stub_github))
+    # Conditional requests are left out, so every run downloads the repository again
+    github_client = httpx.AsyncClient(
+        transport=GitHubTransport(github_transport, state=RateLimitState(), etags=None),
+        timeout=httpx.Timeout(300.0),
+    )
+
+    stub_llm = create_stub_llm_app(
+        latency=arguments.llm_latency,
+        jitter=arguments.llm_jitter,
+        error_rate=arguments.llm_error_rate,
+        requests_per_minute=arguments.llm_requests_per_minute,
+    )
+    openai_client = stub_openai_client(stub_llm)
+    llm_transport = TimedTransport(openai_client._client._transport)
+    openai_client._client._transport = llm_transport
+
+    scenarios = []
+    for mode in arguments.modes:
+        async def fetch(fetch_mode: FetchMode = FetchMode(mode)) -> None:
+            await github_fetcher.get_repository_files(REPOSITORY_URL, fetch_mode=fetch_mode, client=github_client)
+
+        scenarios.append(await run_scenario(
+            f"fetch_{mode}", size, arguments.runs, fetch, github_transport, lambda: stub_github.state.calls,
+            arguments.memory,
+        ))
+
+    repo_files = await github_fetcher.get_repository_files(REPOSITORY_URL, client=github_client)
+
+    async def analyze() -> None:
+        analyzer = GPTCandidateAnalyzer(
+            file_contents=repo_files,
+            candidate_level=CandidateLevel.middle,
+            assignment_description=ASSIGNMENT,
+            client=openai_client,
+            limiter=LLMRateLimiter(max_concurrency=arguments.llm_concurrency),
+            # The synthetic files are alike, so near-duplicate detection would analyze a handful of them
+            duplicate_similarity=0,
+        )
+        await analyzer.analyze()
+
+    scenarios.append(await run_scenario(
+        "analyze", size, arguments.runs, analyze, llm_transport, lambda: stub_llm.state.calls, arguments.memory
+    ))
+
+    await github_client.aclose()
+    await openai_client.close()
+    return scenarios
+
+
+def compare(results: dict, baseline: dict) -> list[dict]:
+    """
+    Compares the results with those of a previous version, as ratios of the new to the old values.
+
+    Args:
+        results (dict): The results of this run.
+        baseline (dict): The results of the previous run.
+
+    Returns:
+        list[dict]: The ratios of every scenario run by both.
+    """
+    def ratio(new: float | None, old: float | None) -> float | None:
+        return round(new / old, 3) if new is not None and old else None
+
+    previous = {(scenario["scenario"], scenario["files"]): scenario for scenario in baseline["scenarios"]}
+    changes = []
+    for scenario in results["scenarios"]:
+        old = previous.get((scenario["scenario"], scenario["files"]))
+        if old is None:
+            continue
+        changes.append({
+            "scenario": scenario["scenario"],
+            "files": scenario["files"],
+            "wall_p50_ratio": ratio(scenario["wall_seconds"]["p50"], old["wall_seconds"]["p50"]),
+            "wall_p99_ratio": ratio(scenario["wall_seconds"]["p99"], old["wall_seconds"]["p99"]),
+            "call_latency_p99_ratio": ratio(scenario["call_latency_ms"]["p99"], old["call_latency_ms"]["p99"]),
+            "calls_ratio": ratio(sum(scenario["calls_per_run"].values()), sum(old["calls_per_run"].values())),
+            "peak_memory_ratio": ratio(scenario.get("peak_memory_mib"), old.get("peak_memory_mib")),
+        })
+    return changes
+
+
+async def run(arguments: argparse.Namespace) -> dict:
+    """Runs every scenario on every repository size."""
+    # Imported first, since importing the services adds their log sinks
+    import src.services.github_fetcher  # noqa: F401
+    import src.services.gpt_code_analyzer  # noqa: F401
+
+    logger.remove()
+    logger.add(sink=lambda msg: print(msg, end="", file=sys.stderr), level="WARNING")
+    scenarios = []
+    for size in arguments.sizes:
+        scenarios += await run_size(arguments, size)
+    return {"benchmark": "suite", "version": git_version(), "config": vars(arguments), "scenarios": scenarios}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=lambda value: [int(size) for size in value.split(",")],
+                        default=[10, 100, 1000, 10000], help="comma-separated numbers of files")
+    parser.add_argument("--runs", type=int, default=3)
+    parser.add_argument("--modes", type=lambda value: value.split(","), default=["archive", "per_file"],
+                        help="comma-separated fetch modes")
+    parser.add_argument("--file-size", type=int, default=2000, help="approximate size of every file in bytes")
+    parser.add_argument("--github-latency", type=float, default=0.0, help="stub GitHub response delay in seconds")
+    parser.add_argument("--github-jitter", type=float, default=0.0, help="largest random extra delay in seconds")
+    parser.add_argument("--github-error-rate", type=float, default=0.0, help="fraction of 502 responses")
+    parser.add_argument("--github-rate-limit", type=int, default=None, help="requests allowed per minute")
+    parser.add_argument("--llm-latency", type=float, default=0.05, help="stub OpenAI response delay in seconds")
+    parser.add_argument("--llm-jitter", type=float, default=0.0, help="largest random extra delay in seconds")
+    parser.add_argument("--llm-error-rate", type=float, default=0.0, help="fraction of 500 responses")
+    parser.add_argument("--llm-requests-per-minute", type=int, default=None, help="requests allowed per minute")
+    parser.add_argument("--llm-concurrency", type=int, default=8)
+    parser.add_argument("--no-memory", dest="memory", action="store_false", help="skip the tracemalloc runs")
+    parser.add_argument("--output", help="file the JSON results are written to")
+    parser.add_argument("--compare", help="JSON results of a previous run to compare with")
+    arguments = parser.parse_args()
+
+    results = asyncio.run(run(arguments))
+    if arguments.compare:
+        with open(arguments.compare) as baseline:
+            results["comparison"] = compare(results, json.load(baseline))
+
+    output = json.dumps(results, indent=2)
+    if arguments.output:
+        with open(arguments.output, "w") as file:
+            file.write(output + "\n")
+    print(output)
+
+
+if __name__ == "__main__":
+    main()
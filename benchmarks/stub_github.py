@@ -0,0 +1,257 @@
+import io
+import os
+import time
+import base64
+import random
+import socket
+import asyncio
+import tarfile
+import hashlib
+import tempfile
+import posixpath
+import collections
+import subprocess
+import multiprocessing
+
+from typing import Callable
+from contextlib import contextmanager
+
+from uvicorn import Config, Server
+from fastapi import FastAPI, Response
+from fastapi.responses import JSONResponse, StreamingResponse
+
+from src.services.github_http import github_endpoint
+
+
+def synthetic_repository(file_count: int, file_size: int = 2000) -> dict[str, bytes]:
+    """
+    Builds a synthetic repository of Python modules spread over nested packages.
+
+    Args:
+        file_count (int): The number of files in the repository.
+        file_size (int): The approximate size of every file in bytes.
+
+    Returns:
+        dict[str, bytes]: The file contents keyed by path.
+    """
+    files = {}
+    for index in range(file_count):
+        body = f"def function_{index}(value):\n    return value * {index}\n\n\n"
+        content = (body * (file_size // len(body) + 1))[:file_size]
+        files[f"package_{index % 10}/module_{index % 7}/file_{index}.py"] = content.encode()
+    return files
+
+
+def create_stub_github_app(
+        files: dict[str, bytes],
+        latency: float = 0.0,
+        jitter: float = 0.0,
+        error_rate: float = 0.0,
+        rate_limit: int | None = None,
+        rate_limit_window: float = 60.0,
+        repository: str | None = None,
+        seed: int = 0,
+) -> FastAPI:
+    """
+    Creates a stand-in for the GitHub commits, trees, blobs, contents and tarball APIs serving a fixed repository.
+
+    The number of calls to every endpoint is counted in app.state.calls.
+
+    Args:
+        files (dict[str, bytes]): The repository content keyed by path.
+        latency (float): The delay in seconds added to every response.
+        jitter (float): The largest random delay in seconds added on top of the latency.
+        error_rate (float): The fraction of requests answered with a 502, as GitHub does under load.
+        rate_limit (int | None): The number of requests allowed per window, reported in the x-ratelimit-*
+                                 headers and answered with a 403 once exhausted; None for no limit.
+        rate_limit_window (float): The length of a rate-limit window in seconds.
+        repository (str | None): The "owner/name" of the repository served, others being answered with a 404;
+                                 every repository is served if omitted.
+        seed (int): The seed of the random delays and errors.
+
+    Returns:
+        FastAPI: The stub application.
+    """
+    app = FastAPI()
+    app.state.calls = collections.Counter()
+    generator = random.Random(seed)
+    quota = {"remaining": rate_limit, "reset_at": time.time() + rate_limit_window}
+
+    shas = {path: hashlib.sha1(b"blob %d\0" % len(data) + data).hexdigest() for path, data in files.items()}
+    blobs = {shas[path]: data for path, data in files.items()}
+    tree = [{"path": path, "type": "blob", "sha": shas[path], "size": len(data)} for path, data in files.items()]
+
+    # The entries of every directory, for the contents API
+    directories: dict[str, dict[str, dict]] = collections.defaultdict(dict)
+    for path, data in files.items():
+        parent, name = posixpath.split(path)
+        directories[parent][name] = {"name": name, "path": path, "type": "file", "sha": shas[path], "size": len(data)}
+        while parent:
+            grandparent, name = posixpath.split(parent)
+            directories[grandparent][name] = {"name": name, "path": parent, "type": "dir", "sha": "", "size": 0}
+            parent = grandparent
+
+    archive = io.BytesIO()
+    # GitHub records the commit in the global pax header of its tarballs
+    with tarfile.open(fileobj=archive, mode="w:gz", format=tarfile.PAX_FORMAT,
+                      pax_headers={"comment": "stub-commit"}) as tar:
+        for path, data in files.items():
+            info = tarfile.TarInfo(f"owner-repo-stub/{path}")
+            info.size = len(data)
+            tar.addfile(info, io.BytesIO(data))
+
+    @app.middleware("http")
+    async def simulate_github(request, call_next):
+        app.state.calls[github_endpoint(request.url.path)] += 1
+        delay = latency + (generator.uniform(0, jitter) if jitter else 0.0)
+        if delay:
+            await asyncio.sleep(delay)
+
+        segments = request.url.path.strip("/").split("/")
+        if repository is not None and "/".join(segments[1:3]) != repository:
+            return JSONResponse({"message": "Not Found"}, status_code=404)
+
+        headers = {}
+        if rate_limit is not None:
+            if time.time() >= quota["reset_at"]:
+                quota.update(remaining=rate_limit, reset_at=time.time() + rate_limit_window)
+            headers = {"x-ratelimit-limit": str(rate_limit), "x-ratelimit-reset": str(int(quota["reset_at"]) + 1)}
+            if quota["remaining"] == 0:
+                headers["x-ratelimit-remaining"] = "0"
+                return JSONResponse({"message": "API rate limit exceeded"}, status_code=403, headers=headers)
+            quota["remaining"] -= 1
+            headers["x-ratelimit-remaining"] = str(quota["remaining"])
+
+        if error_rate and generator.random() < error_rate:
+            return JSONResponse({"message": "Server Error"}, status_code=502, headers=headers)
+
+        response = await call_next(request)
+        response.headers.update(headers)
+        return response
+
+    @app.get("/repos/{owner}/{repo}/commits/{ref}")
+    async def commit(owner: str, repo: str, ref: str):
+        return Response("stub-commit", media_type="text/plain")
+
+    @app.get("/repos/{owner}/{repo}/git/trees/{sha}")
+    async def git_tree(owner: str, repo: str, sha: str):
+        return {"sha": sha, "tree": tree, "truncated": False}
+
+    @app.get("/repos/{owner}/{repo}/git/blobs/{sha}")
+    async def git_blob(owner: str, repo: str, sha: str):
+        return Response(blobs[sha], media_type="application/octet-stream")
+
+    @app.get("/repos/{owner}/{repo}/contents")
+    @app.get("/repos/{owner}/{repo}/contents/{path:path}")
+    async def contents(owner: str, repo: str, path: str = ""):
+        path = path.strip("/")
+        if path in files:
+            data = files[path]
+            return {
+                "name": posixpath.basename(path), "path": path, "type": "file", "sha": shas[path], "size": len(data),
+                "encoding": "base64", "content": base64.b64encode(data).decode(),
+            }
+        if path in directories:
+            return list(directories[path].values())
+        return JSONResponse({"message": "Not Found"}, status_code=404)
+
+    @app.get("/repos/{owner}/{repo}/tarball")
+    @app.get("/repos/{owner}/{repo}/tarball/{ref}")
+    async def tarball(owner: str, repo: str, ref: str = ""):
+        # Sent in pieces, as GitHub does, so that clients decompress it piece by piece
+        data = archive.getvalue()
+        pieces = (data[start:start + 65536] for start in range(0, len(data), 65536))
+        return StreamingResponse(pieces, media_type="application/x-gzip")
+
+    return app
+
+
+async def _pipe(reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+    """Copies bytes from a reader to a writer until the reader is exhausted."""
+    try:
+        while data := await reader.read(65536):
+            writer.write(data)
+            await writer.drain()
+    except ConnectionError:
+        pass
+    finally:
+        writer.close()
+
+
+async def _serve_with_connect_latency(config: Config, port: int, connect_latency: float) -> None:
+    """Serves the application behind a proxy delaying every new connection like a network round trip would."""
+    server = Server(config)
+
+    async def proxy(client_reader: asyncio.StreamReader, client_writer: asyncio.StreamWriter) -> None:
+        await asyncio.sleep(connect_latency)
+        upstream_reader, upstream_writer = await asyncio.open_connection("127.0.0.1", config.port)
+        await asyncio.gather(_pipe(client_reader, upstream_writer), _pipe(upstream_reader, client_writer))
+
+    proxy_server = await asyncio.start_server(proxy, "127.0.0.1", port)
+    async with proxy_server:
+        await server.serve()
+
+
+def _serve(factory: Callable[..., FastAPI], arguments: tuple, port: int, connect_latency: float,
+           ssl_options: dict) -> None:
+    """Builds the application in the server process and serves it until terminated."""
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        internal_port = sock.getsockname()[1]
+
+    config = Config(factory(*arguments), host="127.0.0.1", port=internal_port, log_level="warning",
+                    access_log=False, **ssl_options)
+    asyncio.run(_serve_with_connect_latency(config, port, connect_latency))
+
+
+@contextmanager
+def run_stub_server(factory: Callable[..., FastAPI], *arguments, tls: bool = False, connect_latency: float = 0.0):
+    """
+    Serves an application on a free local port in a separate process, so it does not compete with
+    the benchmarked code for the GIL.
+
+    With TLS, a self-signed certificate is generated with the openssl binary and trusted through
+    SSL_CERT_FILE, so clients pay for real handshakes like they do against GitHub. The connect
+    latency delays every new connection to model the round trips of a remote server.
+
+    Args:
+        factory (Callable[..., FastAPI]): The function building the application to serve.
+        *arguments: The arguments passed to the factory.
+        tls (bool): Whether the server is served over HTTPS.
+        connect_latency (float): The delay in seconds added to every new connection.
+
+    Yields:
+        str: The base URL of the running server.
+    """
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        port = sock.getsockname()[1]
+
+    with tempfile.TemporaryDirectory() as directory:
+        ssl_options = {}
+        if tls:
+            key_file, cert_file = os.path.join(directory, "key.pem"), os.path.join(directory, "cert.pem")
+            subprocess.run(
+                ["openssl", "req", "-x509", "-newkey", "rsa:2048", "-nodes", "-days", "1", "-subj", "/CN=127.0.0.1",
+                 "-addext", "subjectAltName=IP:127.0.0.1", "-keyout", key_file, "-out", cert_file],
+                check=True, capture_output=True,
+            )
+            os.environ["SSL_CERT_FILE"] = cert_file
+            ssl_options = {"ssl_keyfile": key_file, "ssl_certfile": cert_file}
+
+        process = multiprocessing.Process(
+            target=_serve, args=(factory, arguments, port, connect_latency, ssl_options), daemon=True
+        )
+        process.start()
+        try:
+            while True:
+                try:
+                    socket.create_connection(("127.0.0.1", port), timeout=1).close()
+                    break
+                except OSError:
+                    time.sleep(0.05)
+
+            yield f"{'https' if tls else 'http'}://127.0.0.1:{port}"
+        finally:
+            process.terminate()
+            process.join()
@@ -0,0 +1,115 @@
+import json
+import time
+import httpx
+import random
+import asyncio
+
+from openai import AsyncOpenAI
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse
+
+FINAL_REPORT = json.dumps({"flaws": ["Stub flaw"], "rating": 4, "conclusion": "Stub conclusion"})
+
+
+def create_stub_llm_app(
+        latency: float = 0.0,
+        jitter: float = 0.0,
+        error_rate: float = 0.0,
+        requests_per_minute: int | None = None,
+        reply_tokens: int = 150,
+        seed: int = 0,
+        model_latency: dict[str, float] | None = None,
+        low_confidence_rate: float = 0.0,
+) -> FastAPI:
+    """
+    Creates a stand-in for the OpenAI chat completions API.
+
+    Final report prompts are answered with a JSON report, other prompts with a fixed-size review. The
+    token usage is estimated at four characters per token. The system prompts received are recorded in
+    app.state.system_prompts, the number of requests, by outcome, in app.state.calls and by model in
+    app.state.models. Prompts asking for a confidence line get one.
+
+    Args:
+        latency (float): The delay in seconds added to every response.
+        jitter (float): The largest random delay in seconds added on top of the latency.
+        error_rate (float): The fraction of requests answered with a 500.
+        requests_per_minute (int | None): The number of requests allowed per minute, reported in the
+                                          x-ratelimit-*-requests headers and answered with a 429 once
+                                          exhausted; None for no limit.
+        reply_tokens (int): The approximate number of tokens of a review.
+        seed (int): The seed of the random delays and errors.
+        model_latency (dict[str, float] | None): The delay in seconds of the models answering faster or slower
+                                                 than the latency.
+        low_confidence_rate (float): The fraction of the answers stating a low confidence, when asked for one.
+
+    Returns:
+        FastAPI: The stub application.
+    """
+    app = FastAPI()
+    app.state.system_prompts = []
+    app.state.calls = {"completed": 0, "rate_limited": 0, "failed": 0}
+    app.state.models = {}
+    generator = random.Random(seed)
+    quota = {"remaining": requests_per_minute, "reset_at": time.monotonic() + 60}
+    review = ("The code is readable. " * reply_tokens)[:reply_tokens * 4]
+
+    @app.post("/v1/chat/completions")
+    async def chat_completions(request: Request):
+        body = await request.json()
+        messages = body["messages"]
+        app.state.system_prompts.append(messages[0]["content"])
+
+        headers = {}
+        if requests_per_minute is not None:
+            now = time.monotonic()
+            if now >= quota["reset_at"]:
+                quota.update(remaining=requests_per_minute, reset_at=now + 60)
+            reset = f"{quota['reset_at'] - now:.3f}s"
+            headers = {"x-ratelimit-limit-requests": str(requests_per_minute), "x-ratelimit-reset-requests": reset}
+            if quota["remaining"] == 0:
+                app.state.calls["rate_limited"] += 1
+                headers.update({"x-ratelimit-remaining-requests": "0", "retry-after": str(quota["reset_at"] - now)})
+                return JSONResponse({"error": {"message": "Rate limit reached", "type": "requests"}}, 429, headers)
+            quota["remaining"] -= 1
+            headers["x-ratelimit-remaining-requests"] = str(quota["remaining"])
+
+        delay = (model_latency or {}).get(body["model"], latency) + (generator.uniform(0, jitter) if jitter else 0.0)
+        if delay:
+            await asyncio.sleep(delay)
+
+        if error_rate and generator.random() < error_rate:
+            app.state.calls["failed"] += 1
+            return JSONResponse({"error": {"message": "Stub server error", "type": "server_error"}}, 500, headers)
+
+        app.state.calls["completed"] += 1
+        app.state.models[body["model"]] = app.state.models.get(body["model"], 0) + 1
+        prompt_characters = sum(len(message["content"]) for message in messages)
+        content = FINAL_REPORT if "structured report in JSON format" in messages[-1]["content"] else review
+        if "'Confidence: low'" in messages[-1]["content"]:
+            content += "\nConfidence: " + ("low" if generator.random() < low_confidence_rate else "high")
+        return JSONResponse({
+            "id": "chatcmpl-stub", "object": "chat.completion", "created": 0, "model": body["model"],
+            "choices": [{"index": 0, "finish_reason": "stop", "message": {"role": "assistant", "content": content}}],
+            "usage": {
+                "prompt_tokens": prompt_characters // 4,
+                "completion_tokens": len(content) // 4,
+                "total_tokens": (prompt_characters + len(content)) // 4,
+            },
+        }, headers=headers)
+
+    return app
+
+
+def stub_openai_client(app: FastAPI, max_retries: int = 2) -> AsyncOpenAI:
+    """
+    Creates an OpenAI client talking to a stub application in-process.
+
+    Args:
+        app (FastAPI): The stub application.
+        max_retries (int): How many times the client retries rate-limited and failed requests.
+
+    Returns:
+        AsyncOpenAI: The client.
+    """
+    http_client = httpx.AsyncClient(transport=httpx.ASGITransport(app=app))
+    return AsyncOpenAI(api_key="stub", base_url="http://llm.test/v1", max_retries=max_retries, http_client=http_client)
@@ -1,48 +1,596 @@
+import os
+import time
+import uuid
+import httpx
+import hashlib
+import asyncio
+import tempfile
+
+from typing import Callable, Iterator, AsyncIterator
+from functools import partial
+
 from uvicorn import run
-from fastapi import FastAPI, HTTPException
+from loguru import logger
+from openai import AsyncOpenAI
+from contextlib import asynccontextmanager, contextmanager, aclosing, nullcontext
+from fastapi import FastAPI, HTTPException, Request, Depends
+from fastapi.responses import StreamingResponse, PlainTextResponse
 
-from src.services.github_fetcher import get_repository_files
+from src.services.github_fetcher import get_repository_files, resolve_repository_commit
+from src.services.github_http import github_rate_limit
+from src.services.llm_cache import LLMResponseCache, create_llm_cache
+from src.services.file_filter import FileFilter
+from src.services.files_stream import encode_repo_files
+from src.services.content_spool import ContentSpool
+from src.services.fingerprints import create_boilerplate_index
+from src.services.repo_cache import RepositoryCache, create_repository_cache
+from src.services.review_stream import ndjson_review_events
+from src.services.review_batch import BatchBudget, review_batch
+from src.services.review_snapshots import (
+    ChunkSnapshot, ReviewSnapshot, create_review_snapshot_store, REVIEW_ID_HEADER
+)
+from src.services.review_jobs import ReviewJobManager, ReviewQueueFullError, create_review_job_store
+from src.services.single_flight import create_single_flight, worker_identity
+from src.services.static_analysis import FileInsights, create_static_analyzer
+from src.services.llm_limits import LLMRateLimiter
+from src.services.metrics import (
+    ReviewTrace, current_trace, registry, create_shared_metrics, observe_stage, observe_wait, timed_stage, REVIEWS
+)
 from src.services.gpt_code_analyzer import GPTCandidateAnalyzer
-from src.services.data_structures import RepoFilesResponse, ErrorResponse, AnalysisReport, ReviewRequest, FilesRequest
+from src.services.http_clients import HTTPClientSettings, create_github_client, create_openai_client
+from src.services.data_structures import (
+    RepoFilesResponse, ErrorResponse, AnalysisReport, ReviewRequest, FilesRequest, ReviewJob, ReviewProgress,
+    ChunkAnalysis, BatchReviewRequest,
+)
+
+
+@asynccontextmanager
+async def lifespan(application: FastAPI):
+    """
+    Opens the process-wide pooled HTTP clients and LLM limits and starts the review workers, and the publishing of
+    the metrics shared with the other worker processes, on startup, and stops them on shutdown.
+
+    Args:
+        application (FastAPI): The application whose state holds the clients, the LLM limits and the review jobs.
+    """
+    settings = HTTPClientSettings.from_env()
+    application.state.github_client = create_github_client(settings)
+    application.state.openai_client = create_openai_client(settings)
+    application.state.llm_limiter = LLMRateLimiter.from_env()
+
+    async def run_review(request: ReviewRequest, report_progress: Callable[[ReviewProgress], None]) -> AnalysisReport:
+        """Run a queued review with the shared clients."""
+        return await review_repository(
+            request, application.state.github_client, application.state.openai_client, report_progress,
+            limiter=application.state.llm_limiter,
+        )
+
+    application.state.review_jobs = ReviewJobManager.from_env(review_job_store, run_review)
+    application.state.review_jobs.start()
+    publisher = asyncio.create_task(publish_metrics()) if shared_metrics is not None else None
+    try:
+        yield
+    finally:
+        if publisher is not None:
+            publisher.cancel()
+            await asyncio.gather(publisher, return_exceptions=True)
+            await asyncio.to_thread(shared_metrics.publish, stopped=True)
+        await application.state.review_jobs.stop()
+        await application.state.github_client.aclose()
+        await application.state.openai_client.close()
+        if static_analyzer is not None:
+            static_analyzer.close()
+        del application.state.github_client, application.state.openai_client, application.state.llm_limiter
+        del application.state.review_jobs
+
+
+async def publish_metrics() -> None:
+    """Writes the metrics of this worker for the other workers every publish period until cancelled."""
+    while True:
+        await asyncio.to_thread(shared_metrics.publish)
+        await asyncio.sleep(shared_metrics.publish_seconds)
+
+
+app = FastAPI(lifespan=lifespan)
+
+repository_cache = create_repository_cache()
+llm_cache = create_llm_cache()
+review_job_store = create_review_job_store()
+file_filter = FileFilter.from_env()
+review_snapshots = create_review_snapshot_store()
+boilerplate_index = create_boilerplate_index()
+single_flight = create_single_flight()
+static_analyzer = create_static_analyzer()
+shared_metrics = create_shared_metrics(worker_identity())
+
+# The state backends shared by the worker processes when SERVER_WORKERS is above 1, unless configured otherwise
+SHARED_STATE_BACKENDS = {
+    "REPO_CACHE_BACKEND": "sqlite",
+    "LLM_CACHE_BACKEND": "sqlite",
+    "REVIEW_JOBS_BACKEND": "sqlite",
+    "REVIEW_SNAPSHOTS_BACKEND": "sqlite",
+    "SINGLE_FLIGHT_BACKEND": "sqlite",
+}
+
+
+def register_state_metrics(application: FastAPI) -> None:
+    """
+    Exposes the GitHub quota, the cache statistics and the review queue in the /metrics output.
+
+    Args:
+        application (FastAPI): The application whose state holds the review jobs.
+    """
+    def caches() -> dict[str, RepositoryCache | LLMResponseCache]:
+        """The caches in use, read at collection time since they can be replaced."""
+        return {
+            name: cache for name, cache in (("repository", repository_cache), ("llm", llm_cache)) if cache is not None
+        }
+
+    def queued_reviews() -> dict[tuple, float | None]:
+        """The number of background reviews waiting for a worker, while the workers run."""
+        review_jobs = getattr(application.state, "review_jobs", None)
+        return {(): review_jobs.queued if review_jobs is not None else None}
+
+    rate_limit_metrics = [
+        ("github_rate_limit_limit", "The GitHub requests allowed per rate-limit window.", "gauge", "limit"),
+        ("github_rate_limit_remaining", "The GitHub requests left in the window.", "gauge", "remaining"),
+        ("github_rate_limit_reset_timestamp", "The epoch time at which the window resets.", "gauge", "reset_at"),
+        ("github_requests_total", "GitHub requests sent.", "counter", "requests"),
+        ("github_not_modified_total", "GitHub requests served from the ETag cache.", "counter", "not_modified"),
+        ("github_retries_total", "GitHub requests retried.", "counter", "retries"),
+        ("github_throttled_seconds_total", "Time spent pacing GitHub requests.", "counter", "throttled_seconds"),
+    ]
+    for name, documentation, kind, attribute in rate_limit_metrics:
+        registry.gauge_callback(
+            name, documentation, lambda attribute=attribute: {(): getattr(github_rate_limit, attribute)}, kind=kind
+        )
+
+    for stat in ("hits", "misses", "bytes_saved"):
+        registry.gauge_callback(
+            f"cache_{stat}_total", f"Cache {stat.replace('_', ' ')}, by cache.",
+            lambda stat=stat: {(name,): getattr(cache.stats, stat) for name, cache in caches().items()},
+            ("cache",), kind="counter",
+        )
+    registry.gauge_callback("review_jobs_queued", "Background reviews waiting for a worker.", queued_reviews)
+
+
+register_state_metrics(app)
+
+
+def get_github_client(request: Request) -> httpx.AsyncClient | None:
+    """Returns the shared GitHub client, or None if the application was started without its lifespan."""
+    return getattr(request.app.state, "github_client", None)
+
+
+def get_openai_client(request: Request) -> AsyncOpenAI | None:
+    """Returns the shared OpenAI client, or None if the application was started without its lifespan."""
+    return getattr(request.app.state, "openai_client", None)
+
+
+def get_llm_limiter(request: Request) -> LLMRateLimiter | None:
+    """Returns the process-wide LLM limits, or None if the application was started without its lifespan."""
+    return getattr(request.app.state, "llm_limiter", None)
+
+
+def get_review_jobs(request: Request) -> ReviewJobManager:
+    """Returns the review job manager, which only runs while the application lifespan is active."""
+    review_jobs = getattr(request.app.state, "review_jobs", None)
+    if review_jobs is None:
+        raise HTTPException(status_code=503, detail="Review jobs are not available")
+    return review_jobs
+
+
+def load_previous_review(request: ReviewRequest) -> ReviewSnapshot | None:
+    """
+    Finds the previous review whose analyses a re-review reuses.
+
+    Args:
+        request (ReviewRequest): The review request, possibly naming a previous review or a base commit.
+
+    Returns:
+        ReviewSnapshot | None: The previous review, or None if the request does not name one.
+
+    Raises:
+        HTTPException: If the named review or commit review is not known.
+    """
+    if request.previous_review_id is None and request.base_commit is None:
+        return None
+
+    snapshot = None
+    if review_snapshots is not None:
+        if request.previous_review_id is not None:
+            snapshot = review_snapshots.get(request.previous_review_id)
+        else:
+            snapshot = review_snapshots.find(request.github_repo_url, request.base_commit)
+
+    if snapshot is None:
+        raise HTTPException(status_code=404, detail="Previous review not found")
+    return snapshot
+
+
+def start_review(
+        request: ReviewRequest, review_id: str, commit_sha: str | None
+) -> Callable[[int, ChunkSnapshot], None] | None:
+    """
+    Stores a review as incomplete, so that its chunk analyses are checkpointed as they complete.
+
+    Args:
+        request (ReviewRequest): The review request.
+        review_id (str): The identifier of the review.
+        commit_sha (str | None): The reviewed commit, when known.
+
+    Returns:
+        Callable[[int, ChunkSnapshot], None] | None: The checkpoint of the analyzer, or None if re-reviews
+                                                     are disabled.
+    """
+    if review_snapshots is None:
+        return None
+
+    review_snapshots.put(ReviewSnapshot(
+        review_id=review_id,
+        github_repo_url=request.github_repo_url,
+        commit_sha=commit_sha,
+        assignment_description=request.assignment_description,
+        candidate_level=request.candidate_level,
+        chunks=[],
+        complete=False,
+    ))
+
+    def checkpoint(position: int, chunk: ChunkSnapshot) -> None:
+        """Store a chunk analysis of the review."""
+        review_snapshots.put_checkpoint(review_id, position, chunk)
+
+    return checkpoint
+
+
+@contextmanager
+def resumable_review(review_id: str | None) -> Iterator[None]:
+    """
+    Names a failed review in its error, so that it can be resumed by passing its id as previous_review_id.
+
+    Args:
+        review_id (str | None): The identifier of the review, or None if its analyses are not checkpointed.
+    """
+    try:
+        yield
+    except HTTPException as e:
+        if review_id is None:
+            raise
+        headers = {**(e.headers or {}), REVIEW_ID_HEADER: review_id}
+        raise HTTPException(status_code=e.status_code, detail=e.detail, headers=headers) from e
+
+
+def save_review(
+        request: ReviewRequest, analyzer: GPTCandidateAnalyzer, report: AnalysisReport, review_id: str
+) -> None:
+    """
+    Stores the snapshot of a completed review and sets the review id of its report.
+
+    Args:
+        request (ReviewRequest): The review request.
+        analyzer (GPTCandidateAnalyzer): The analyzer that ran the review.
+        report (AnalysisReport): The report of the review.
+        review_id (str): The identifier of the review.
+    """
+    if review_snapshots is None:
+        return
+
+    report.review_id = review_id
+    review_snapshots.put(ReviewSnapshot(
+        review_id=report.review_id,
+        github_repo_url=request.github_repo_url,
+        commit_sha=report.commit_sha,
+        assignment_description=request.assignment_description,
+        candidate_level=request.candidate_level,
+        chunks=analyzer.chunk_snapshots,
+    ))
+
+
+@contextmanager
+def finished_review(request: ReviewRequest, trace: ReviewTrace) -> Iterator[Callable[[AnalysisReport], None]]:
+    """
+    Records the outcome and duration of a review, and attaches its trace to the report if requested.
+
+    Args:
+        request (ReviewRequest): The review request.
+        trace (ReviewTrace): The trace of the review.
+
+    Yields:
+        Callable[[AnalysisReport], None]: Called with the report once the review completes.
+    """
+    def finish(report: AnalysisReport) -> None:
+        """Record the completed review."""
+        REVIEWS.inc("completed")
+        observe_stage("review", trace.elapsed, trace)
+        if request.trace:
+            report.trace = trace.report()
+
+    try:
+        yield finish
+    except Exception:
+        REVIEWS.inc("failed")
+        raise
+
+
+async def fetch_review_files(
+        request: ReviewRequest,
+        github_client: httpx.AsyncClient | None,
+        spool: ContentSpool,
+        fetch_slots: asyncio.Semaphore | None = None,
+        commit_sha: str | None = None,
+) -> RepoFilesResponse:
+    """
+    Fetches the files of a repository to review, leaving out the filtered files and known boilerplate.
+
+    Args:
+        request (ReviewRequest): The review to fetch the files of.
+        github_client (httpx.AsyncClient | None): The shared GitHub client.
+        spool (ContentSpool): The spool holding the file contents within the request memory budget.
+        fetch_slots (asyncio.Semaphore | None): Bounds the repositories fetched at once, e.g. within a batch.
+        commit_sha (str | None): The commit to fetch, or None for the current HEAD.
+
+    Returns:
+        RepoFilesResponse: The files to review.
+
+    Raises:
+        HTTPException: If no repository files are found.
+    """
+    waited_from = time.perf_counter()
+    async with fetch_slots or nullcontext():
+        if fetch_slots is not None:
+            observe_wait("fetch_slot", time.perf_counter() - waited_from)
+        file_contents = await get_repository_files(
+            request.github_repo_url, client=github_client, cache=repository_cache, file_filter=file_filter,
+            spool=spool, ref=commit_sha,
+        )
+    if not file_contents:
+        raise HTTPException(status_code=404, detail="No repository files found")
+
+    if boilerplate_index is not None:
+        # Fingerprinting is CPU-bound, so it runs off the event loop
+        with timed_stage("boilerplate"):
+            file_contents = await asyncio.to_thread(boilerplate_index.apply, file_contents, request.github_repo_url)
+    return file_contents
+
+
+async def analyze_statically(file_contents: RepoFilesResponse) -> dict[str, FileInsights] | None:
+    """
+    Runs the static analysis pre-pass on the Python files of a review.
+
+    Args:
+        file_contents (RepoFilesResponse): The files to review.
+
+    Returns:
+        dict[str, FileInsights] | None: The analyses keyed by file name, or None if the pre-pass is disabled.
+    """
+    if static_analyzer is None:
+        return None
+    with timed_stage("static_analysis"):
+        return await static_analyzer.analyze(file_contents)
+
+
+def review_flight_key(request: ReviewRequest, commit_sha: str) -> str:
+    """
+    Builds the key under which concurrent identical reviews of a commit are run once.
+
+    Args:
+        request (ReviewRequest): The review request.
+        commit_sha (str): The commit to review.
+
+    Returns:
+        str: The key of the review.
+    """
+    fields = [
+        request.github_repo_url.rstrip("/").lower(), commit_sha, request.candidate_level.value,
+        request.assignment_description, request.previous_review_id or "", request.base_commit or "",
+    ]
+    return "review:" + hashlib.sha256("\0".join(fields).encode()).hexdigest()
+
+
+async def run_review_pipeline(
+        request: ReviewRequest,
+        github_client: httpx.AsyncClient | None,
+        openai_client: AsyncOpenAI | None,
+        previous: ReviewSnapshot | None,
+        trace: ReviewTrace,
+        report_progress: Callable[[ReviewProgress], None] | None = None,
+        limiter: LLMRateLimiter | None = None,
+        fetch_slots: asyncio.Semaphore | None = None,
+        commit_sha: str | None = None,
+) -> AnalysisReport:
+    """
+    Fetches a repository, reviews it and saves the review.
+
+    Args:
+        request (ReviewRequest): The review to run.
+        github_client (httpx.AsyncClient | None): The shared GitHub client.
+        openai_client (AsyncOpenAI | None): The shared OpenAI client.
+        previous (ReviewSnapshot | None): The previous review whose analyses are reused.
+        trace (ReviewTrace): The trace of the review.
+        report_progress (Callable[[ReviewProgress], None] | None): Called each time the review progresses.
+        limiter (LLMRateLimiter | None): The LLM limits shared with other reviews.
+        fetch_slots (asyncio.Semaphore | None): Bounds the repositories fetched at once, e.g. within a batch.
+        commit_sha (str | None): The commit to review, or None for the current HEAD.
+
+    Returns:
+        AnalysisReport: The report of the review.
+
+    Raises:
+        HTTPException: If no repository files are found or other errors occur during analysis.
+    """
+    review_id = uuid.uuid4().hex
+
+    def chunk_progress(completed: int, total: int) -> None:
+        """Report the analysis progress, the final report being generated once every chunk is analyzed."""
+        stage = "analyzing" if completed < total else "reporting"
+        report_progress(ReviewProgress(
+            stage=stage, completed_chunks=completed, total_chunks=total,
+            review_id=review_id if checkpoint is not None else None,
+        ))
+
+    with ContentSpool() as spool:
+        file_contents = await fetch_review_files(request, github_client, spool, fetch_slots, commit_sha)
+        insights = await analyze_statically(file_contents)
+        checkpoint = start_review(request, review_id, file_contents.commit_sha)
+
+        analyzer = GPTCandidateAnalyzer(
+            file_contents=file_contents,
+            candidate_level=request.candidate_level,
+            assignment_description=request.assignment_description,
+            client=openai_client,
+            limiter=limiter,
+            cache=llm_cache,
+            progress=chunk_progress if report_progress is not None else None,
+            previous=previous,
+            trace=trace,
+            insights=insights,
+            outline_clean_files=static_analyzer is None or static_analyzer.outline_clean_files,
+            checkpoint=checkpoint,
+        )
+        with resumable_review(review_id if checkpoint is not None else None):
+            report = await analyzer.analyze()
+
+    save_review(request, analyzer, report, review_id)
+    return report
+
+
+async def review_repository(
+        request: ReviewRequest,
+        github_client: httpx.AsyncClient | None,
+        openai_client: AsyncOpenAI | None,
+        report_progress: Callable[[ReviewProgress], None] | None = None,
+        limiter: LLMRateLimiter | None = None,
+        fetch_slots: asyncio.Semaphore | None = None,
+) -> AnalysisReport:
+    """
+    Fetches a repository and reviews it.
+
+    With single-flight enabled, HEAD is resolved first and identical reviews of the same commit
+    requested at the same time, by this or another worker process, share one run. The requests of
+    this process joining a run receive its progress from then on; their trace only records the time
+    they waited, the run being traced by the request that started it.
+
+    Args:
+        request (ReviewRequest): The review to run.
+        github_client (httpx.AsyncClient | None): The shared GitHub client.
+        openai_client (AsyncOpenAI | None): The shared OpenAI client.
+        report_progress (Callable[[ReviewProgress], None] | None): Called each time the review progresses.
+        limiter (LLMRateLimiter | None): The process-wide LLM limits shared with other reviews; the review gets
+                                         its own limits from the environment if omitted.
+        fetch_slots (asyncio.Semaphore | None): Bounds the repositories fetched at once, e.g. within a batch.
+
+    Returns:
+        AnalysisReport: The structured analysis report generated from the code review.
+
+    Raises:
+        HTTPException: If no repository files are found or other errors occur during analysis.
+    """
+    previous = load_previous_review(request)
+    if report_progress is not None:
+        report_progress(ReviewProgress(stage="fetching"))
+
+    # A background review joins the trace holding its time in the queue
+    trace = current_trace() or ReviewTrace()
+    with trace.activate(), finished_review(request, trace) as finish:
+        if single_flight is None:
+            report = await run_review_pipeline(
+                request, github_client, openai_client, previous, trace, report_progress, limiter, fetch_slots
+            )
+        else:
+            async with fetch_slots or nullcontext():
+                commit_sha = await resolve_repository_commit(request.github_repo_url, github_client)
+            flight_key = review_flight_key(request, commit_sha)
+            ran = False
 
-app = FastAPI()
+            async def pipeline() -> bytes:
+                """Run the review for every request joining it, passing its progress to each of them."""
+                nonlocal ran
+                ran = True
+                shared_report = await run_review_pipeline(
+                    request, github_client, openai_client, previous, trace, partial(single_flight.notify, flight_key),
+                    limiter, fetch_slots, commit_sha,
+                )
+                return shared_report.model_dump_json().encode()
+
+            result = await single_flight.run(flight_key, pipeline, report_progress)
+            report = AnalysisReport.model_validate_json(result)
+            if not ran:
+                # The review was run for another request, whose trace holds its spans and counters
+                trace.add("single_flight_joined")
+        finish(report)
+    return report
 
 
 @app.post(
     path="/files",
     tags=["GitHub"],
     response_model=RepoFilesResponse,
-    responses={404: {"model": ErrorResponse}},
+    responses={404: {"model": ErrorResponse}, 429: {"model": ErrorResponse}, 502: {"model": ErrorResponse}},
 )
-async def fetch_files_from_the_specified_repository(request: FilesRequest) -> RepoFilesResponse:
+async def fetch_files_from_the_specified_repository(
+        request: FilesRequest,
+        github_client: httpx.AsyncClient | None = Depends(get_github_client),
+) -> StreamingResponse:
     """
     Fetch files from the specified GitHub repository.
 
+    File contents are kept within the request memory budget, larger repositories spilling to a
+    temporary file, and the JSON body is streamed file by file.
+
     Args:
-        request (FilesRequest): The request object containing the GitHub repository URL.
+        request (FilesRequest): The request object containing the GitHub repository URL and fetch options.
+        github_client (httpx.AsyncClient | None): The shared GitHub client.
 
     Returns:
-        RepoFilesResponse: A response containing the retrieved files and their count.
+        StreamingResponse: The RepoFilesResponse holding the retrieved files and their count, as JSON.
 
     Raises:
         HTTPException: If the repository URL is invalid or no files are found.
     """
-    return await get_repository_files(request.github_repo_url)
+    spool = ContentSpool()
+    try:
+        repo_files = await get_repository_files(
+            request.github_repo_url,
+            fetch_mode=request.fetch_mode,
+            client=github_client,
+            max_concurrency=request.max_concurrency,
+            prioritize_source=request.prioritize_source,
+            cache=repository_cache,
+            spool=spool,
+        )
+    except BaseException:
+        spool.close()
+        raise
+
+    def body() -> Iterator[bytes]:
+        """Encode the files piece by piece, removing the spilled contents once they are sent."""
+        with spool:
+            yield from encode_repo_files(repo_files)
+
+    return StreamingResponse(body(), media_type="application/json")
 
 
 @app.post(
     path="/review",
     tags=["Code review AI tool"],
     response_model=AnalysisReport,
-    responses={404: {"model": ErrorResponse}},
+    responses={404: {"model": ErrorResponse}, 429: {"model": ErrorResponse}, 502: {"model": ErrorResponse}},
 )
-async def review(request: ReviewRequest) -> AnalysisReport:
+async def review(
+        request: ReviewRequest,
+        github_client: httpx.AsyncClient | None = Depends(get_github_client),
+        openai_client: AsyncOpenAI | None = Depends(get_openai_client),
+        llm_limiter: LLMRateLimiter | None = Depends(get_llm_limiter),
+) -> AnalysisReport:
     """
     Perform code review analysis on the specified GitHub repository.
 
     Args:
         request (ReviewRequest): The request object containing the assignment description,
                                  GitHub repository URL, and candidate level.
+        github_client (httpx.AsyncClient | None): The shared GitHub client.
+        openai_client (AsyncOpenAI | None): The shared OpenAI client.
+        llm_limiter (LLMRateLimiter | None): The process-wide LLM limits.
 
     Returns:
         AnalysisReport: The structured analysis report generated from the code review.
@@ -50,17 +598,243 @@ async def review(request: ReviewRequest) -> AnalysisReport:
     Raises:
         HTTPException: If no repository files are found or other errors occur during analysis.
     """
-    file_contents = await get_repository_files(request.github_repo_url)
-    if not file_contents:
-        raise HTTPException(status_code=404, detail="No repository files found")
+    return await review_repository(request, github_client, openai_client, limiter=llm_limiter)
 
-    result = GPTCandidateAnalyzer(
-        file_contents=file_contents,
-        candidate_level=request.candidate_level,
-        assignment_description=request.assignment_description
+
+@app.post(
+    path="/review/stream",
+    tags=["Code review AI tool"],
+    response_class=StreamingResponse,
+    responses={
+        200: {"content": {"application/x-ndjson": {}}, "description": "The review events, one JSON object per line."},
+        404: {"model": ErrorResponse},
+        429: {"model": ErrorResponse},
+        502: {"model": ErrorResponse},
+    },
+)
+async def review_stream(
+        request: ReviewRequest,
+        github_client: httpx.AsyncClient | None = Depends(get_github_client),
+        openai_client: AsyncOpenAI | None = Depends(get_openai_client),
+        llm_limiter: LLMRateLimiter | None = Depends(get_llm_limiter),
+) -> StreamingResponse:
+    """
+    Perform code review analysis on the specified GitHub repository, streaming the results as NDJSON.
+
+    Once the files are fetched, every line is an "analysis" event as soon as a chunk of files is
+    analyzed, a "heartbeat" event while nothing else is sent, then a last "report" event holding the
+    AnalysisReport, or an "error" event. The analysis is cancelled if the client disconnects.
+
+    Args:
+        request (ReviewRequest): The request object containing the assignment description,
+                                 GitHub repository URL, and candidate level.
+        github_client (httpx.AsyncClient | None): The shared GitHub client.
+        openai_client (AsyncOpenAI | None): The shared OpenAI client.
+        llm_limiter (LLMRateLimiter | None): The process-wide LLM limits.
+
+    Returns:
+        StreamingResponse: The stream of review events.
+
+    Raises:
+        HTTPException: If the repository files cannot be fetched.
+    """
+    previous = load_previous_review(request)
+    review_id = uuid.uuid4().hex
+    trace = ReviewTrace()
+    spool = ContentSpool()
+    try:
+        with trace.activate(), finished_review(request, trace):
+            file_contents = await fetch_review_files(request, github_client, spool)
+            insights = await analyze_statically(file_contents)
+            checkpoint = start_review(request, review_id, file_contents.commit_sha)
+
+            analyzer = GPTCandidateAnalyzer(
+                file_contents=file_contents,
+                candidate_level=request.candidate_level,
+                assignment_description=request.assignment_description,
+                client=openai_client,
+                limiter=llm_limiter,
+                cache=llm_cache,
+                previous=previous,
+                trace=trace,
+                insights=insights,
+                outline_clean_files=static_analyzer is None or static_analyzer.outline_clean_files,
+                checkpoint=checkpoint,
+            )
+    except BaseException:
+        spool.close()
+        raise
+
+    async def events() -> AsyncIterator[ChunkAnalysis | AnalysisReport]:
+        """Stream the analysis, saving the review before its report is sent."""
+        with spool, finished_review(request, trace) as finish, \
+                resumable_review(review_id if checkpoint is not None else None):
+            async with aclosing(analyzer.analyze_stream()) as analysis_events:
+                async for event in analysis_events:
+                    if isinstance(event, AnalysisReport):
+                        save_review(request, analyzer, event, review_id)
+                        finish(event)
+                    yield event
+
+    return StreamingResponse(ndjson_review_events(events()), media_type="application/x-ndjson")
+
+
+@app.post(
+    path="/review/batch",
+    tags=["Code review AI tool"],
+    response_class=StreamingResponse,
+    responses={
+        200: {"content": {"application/x-ndjson": {}}, "description": "The review results, one JSON object per line."},
+    },
+)
+async def review_batch_stream(
+        request: BatchReviewRequest,
+        github_client: httpx.AsyncClient | None = Depends(get_github_client),
+        openai_client: AsyncOpenAI | None = Depends(get_openai_client),
+        llm_limiter: LLMRateLimiter | None = Depends(get_llm_limiter),
+) -> StreamingResponse:
+    """
+    Perform code review analysis on many repositories solving the same assignment, streaming the results as NDJSON.
+
+    The reviews run concurrently within one budget of GitHub fetches and LLM requests, whatever the
+    number of repositories, drawn from the process-wide LLM limits. Every line is a "result" event
+    as soon as a review finishes, holding its report or its error and the number of reviews finished
+    so far, or a "heartbeat" event while nothing else is sent. The reviews are cancelled if the
+    client disconnects.
+
+    Args:
+        request (BatchReviewRequest): The reviews to run, all with the same assignment description.
+        github_client (httpx.AsyncClient | None): The shared GitHub client.
+        openai_client (AsyncOpenAI | None): The shared OpenAI client.
+        llm_limiter (LLMRateLimiter | None): The process-wide LLM limits.
+
+    Returns:
+        StreamingResponse: The stream of review results.
+    """
+    budget = BatchBudget.from_env(llm_limiter)
+
+    async def review_one(review_request: ReviewRequest) -> AnalysisReport:
+        """Run one review of the batch within the batch budget."""
+        return await review_repository(
+            review_request, github_client, openai_client, limiter=budget.limiter, fetch_slots=budget.fetch_slots
+        )
+
+    return StreamingResponse(
+        ndjson_review_events(review_batch(request.reviews, review_one)), media_type="application/x-ndjson"
+    )
+
+
+@app.get(path="/metrics", tags=["Monitoring"], response_class=PlainTextResponse)
+async def get_metrics() -> PlainTextResponse:
+    """
+    Get the metrics of the service in the Prometheus text exposition format.
+
+    Stage, GitHub request and LLM request durations are histograms; bytes downloaded and tokens are
+    counters; the GitHub quota, the cache statistics and the review queue are read when scraped. With
+    several worker processes, the counters and histograms are summed over the workers and the gauges
+    are listed per worker, whichever worker answers.
+
+    Returns:
+        PlainTextResponse: The metrics.
+    """
+    metrics = registry.render() if shared_metrics is None else await asyncio.to_thread(shared_metrics.render)
+    return PlainTextResponse(metrics, media_type="text/plain; version=0.0.4; charset=utf-8")
+
+
+@app.post(
+    path="/reviews",
+    tags=["Code review AI tool"],
+    status_code=202,
+    response_model=ReviewJob,
+    responses={429: {"model": ErrorResponse}, 503: {"model": ErrorResponse}},
+)
+async def submit_review(request: ReviewRequest, review_jobs: ReviewJobManager = Depends(get_review_jobs)) -> ReviewJob:
+    """
+    Queue a code review of the specified GitHub repository, to be run in the background.
+
+    Args:
+        request (ReviewRequest): The request object containing the assignment description,
+                                 GitHub repository URL, and candidate level.
+        review_jobs (ReviewJobManager): The manager running the reviews.
+
+    Returns:
+        ReviewJob: The queued job, whose id is used to poll GET /reviews/{job_id}.
+
+    Raises:
+        HTTPException: If the review queue is full.
+    """
+    try:
+        return review_jobs.submit(request)
+    except ReviewQueueFullError:
+        raise HTTPException(status_code=429, detail="Too many reviews queued. Please try again later.")
+
+
+@app.get(
+    path="/reviews/{job_id}",
+    tags=["Code review AI tool"],
+    response_model=ReviewJob,
+    responses={404: {"model": ErrorResponse}, 503: {"model": ErrorResponse}},
+)
+async def get_review(job_id: str, review_jobs: ReviewJobManager = Depends(get_review_jobs)) -> ReviewJob:
+    """
+    Get the status, progress and, once completed, the report of a queued review.
+
+    Args:
+        job_id (str): The identifier returned by POST /reviews.
+        review_jobs (ReviewJobManager): The manager running the reviews.
+
+    Returns:
+        ReviewJob: The current state of the job.
+
+    Raises:
+        HTTPException: If the job is unknown.
+    """
+    job = review_jobs.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Review job not found")
+    return job
+
+
+def serve() -> None:
+    """
+    Runs the service with uvicorn, configured through the environment.
+
+    SERVER_HOST (default 127.0.0.1) and SERVER_PORT (default 8000) set the listening address,
+    SERVER_WORKERS (default 1) the number of worker processes and SERVER_RELOAD (default false)
+    whether a single worker restarts on code changes. With several workers, the caches, review jobs,
+    review snapshots and single-flight leases default to the SQLite backends, shared by the workers
+    through their database files, since the workers would otherwise each keep their own, and the
+    workers publish their metrics to METRICS_DIR, a new temporary directory by default, emptied of
+    the files of previous runs.
+    """
+    workers = int(os.getenv("SERVER_WORKERS", 1))
+    reload = os.getenv("SERVER_RELOAD", "false").lower() == "true"
+
+    if workers > 1:
+        for variable, backend in SHARED_STATE_BACKENDS.items():
+            os.environ.setdefault(variable, backend)
+        private = [variable for variable in SHARED_STATE_BACKENDS if os.environ[variable] == "memory"]
+        if private:
+            logger.warning(f"{', '.join(private)} keep per-worker state with {workers} workers")
+        if reload:
+            logger.warning("SERVER_RELOAD is ignored with several workers")
+            reload = False
+
+        metrics_dir = os.getenv("METRICS_DIR") or tempfile.mkdtemp(prefix="code-review-metrics-")
+        os.environ["METRICS_DIR"] = metrics_dir
+        os.makedirs(metrics_dir, exist_ok=True)
+        for entry in os.scandir(metrics_dir):
+            if entry.name.endswith(".json"):
+                os.remove(entry.path)
+
+    run(
+        app="src.api.app:app",
+        host=os.getenv("SERVER_HOST", "127.0.0.1"),
+        port=int(os.getenv("SERVER_PORT", 8000)),
+        workers=workers,
+        reload=reload,
     )
-    return result.analysis_report
 
 
 if __name__ == '__main__':
-    run(app="src.api.app:app", reload=True)
+    serve()
@@ -0,0 +1,282 @@
+import os
+import ast
+import zlib
+
+from functools import lru_cache
+from dataclasses import dataclass, field
+
+from loguru import logger
+from dotenv import load_dotenv
+
+from src.services.data_structures import Content
+
+load_dotenv()
+
+try:
+    import tiktoken
+except ImportError:  # pragma: no cover - optional dependency
+    tiktoken = None
+
+CHUNK_MAX_TOKENS = int(os.getenv("LLM_CHUNK_MAX_TOKENS", 3000))
+
+# Tokens taken by the file name and part header of every file in a prompt
+FILE_HEADER_TOKENS = 16
+
+# About one file in PACK_ANCHOR_INTERVAL closes the chunk it is packed in, see _is_pack_anchor
+PACK_ANCHOR_INTERVAL = 8
+
+
+@lru_cache(maxsize=8)
+def _encoding(model: str):
+    """Returns the tiktoken encoding of a model, or None if tiktoken is not installed or cannot load it."""
+    if tiktoken is None:
+        logger.warning("tiktoken is not installed, token counts are estimated; install the tokenizer extra")
+        return None
+    try:
+        try:
+            return tiktoken.encoding_for_model(model)
+        except KeyError:
+            return tiktoken.get_encoding("cl100k_base")
+    except Exception as e:
+        logger.warning(f"Could not load the tiktoken encoding of {model}, token counts are estimated: {e}")
+        return None
+
+
+def count_tokens(text: str, model: str = "gpt-4-turbo") -> int:
+    """
+    Counts the model tokens of a text.
+
+    The count is exact when the optional tiktoken package is installed and estimated at about one
+    token per four characters otherwise.
+
+    Args:
+        text (str): The text to measure.
+        model (str): The model whose tokenizer is used.
+
+    Returns:
+        int: The number of tokens.
+    """
+    encoding = _encoding(model)
+    if encoding is None:
+        return len(text) // 4 + 1
+    return len(encoding.encode(text, disallowed_special=()))
+
+
+@dataclass
+class ChunkPart:
+    """
+    A file, or a part of a file, included in a chunk.
+
+    Only the position of the part is kept; its code is read from the file when the prompt is built,
+    so chunking a repository does not copy its contents.
+
+    Attributes:
+        content (Content): The file the part belongs to.
+        start (int): The position of the first character of the part in the file.
+        end (int | None): The position after the last character of the part, or None for the end of the file.
+        part_index (int): The position of the part in the file, starting at 1.
+        total_parts (int): The number of parts the file was split into.
+    """
+    content: Content
+    start: int = 0
+    end: int | None = None
+    part_index: int = 1
+    total_parts: int = 1
+
+    @property
+    def text(self) -> str:
+        """The code of the part."""
+        return self.content.file_content[self.start:self.end]
+
+
+@dataclass
+class Chunk:
+    """
+    The code sent to the model in a single request: one part of a large file or several small files.
+
+    Attributes:
+        parts (list[ChunkPart]): The parts of the chunk.
+        tokens (int): The number of tokens of the code in the chunk.
+    """
+    parts: list[ChunkPart] = field(default_factory=list)
+    tokens: int = 0
+
+
+def _pack(segments: list[str], max_tokens: int) -> list[str]:
+    """Concatenates consecutive segments into pieces of at most max_tokens tokens."""
+    pieces: list[str] = []
+    current: list[str] = []
+    current_tokens = 0
+
+    for segment in segments:
+        tokens = count_tokens(segment)
+        if current and current_tokens + tokens > max_tokens:
+            pieces.append("".join(current))
+            current, current_tokens = [], 0
+        current.append(segment)
+        current_tokens += tokens
+
+    if current:
+        pieces.append("".join(current))
+
+    return pieces
+
+
+def _split_lines(lines: list[str], max_tokens: int) -> list[str]:
+    """Splits lines on line boundaries, cutting only lines that alone exceed the budget."""
+    segments = []
+    max_chars = max_tokens * 4
+
+    for line in lines:
+        if count_tokens(line) > max_tokens:
+            segments.extend(line[i:i + max_chars] for i in range(0, len(line), max_chars))
+        else:
+            segments.append(line)
+
+    return _pack(segments, max_tokens)
+
+
+def _node_start(node: ast.stmt, lines: list[str], lower_bound: int) -> int:
+    """Returns the 0-based line where a statement starts, including its decorators and leading comments."""
+    start = min([node.lineno] + [decorator.lineno for decorator in getattr(node, "decorator_list", [])]) - 1
+    while start - 1 > lower_bound and lines[start - 1].lstrip().startswith("#"):
+        start -= 1
+    return start
+
+
+def _split_python_nodes(lines: list[str], nodes: list[ast.stmt], begin: int, end: int, max_tokens: int) -> list[str]:
+    """Splits lines[begin:end] on the boundaries of the given statements, descending into oversized classes."""
+    # Each segment runs from the start of a statement to the start of the next one; the first also
+    # holds whatever precedes the first statement, such as a class header or a module docstring
+    segments_nodes: list[tuple[int, ast.stmt | None]] = [(begin, None)]
+    for node in nodes:
+        start = _node_start(node, lines, segments_nodes[-1][0])
+        if start > segments_nodes[-1][0]:
+            segments_nodes.append((start, node))
+        elif segments_nodes[-1][1] is None:
+            segments_nodes[-1] = (segments_nodes[-1][0], node)
+
+    segments = []
+    for index, (start, node) in enumerate(segments_nodes):
+        stop = segments_nodes[index + 1][0] if index + 1 < len(segments_nodes) else end
+        text = "".join(lines[start:stop])
+        if count_tokens(text) <= max_tokens:
+            segments.append(text)
+            continue
+
+        body = getattr(node, "body", None)
+        if isinstance(node, (ast.ClassDef, ast.FunctionDef, ast.AsyncFunctionDef)) and len(body) > 1:
+            segments.extend(_split_python_nodes(lines, body, start, stop, max_tokens))
+        else:
+            segments.extend(_split_lines(lines[start:stop], max_tokens))
+
+    return _pack(segments, max_tokens)
+
+
+def _split_by_indentation(lines: list[str], max_tokens: int) -> list[str]:
+    """Splits code on top-level blocks, i.e. unindented lines following a blank line."""
+    blocks: list[list[str]] = [[]]
+    for index, line in enumerate(lines):
+        starts_block = index > 0 and not lines[index - 1].strip() and line.strip() and not line[0].isspace()
+        if starts_block and blocks[-1]:
+            blocks.append([])
+        blocks[-1].append(line)
+
+    segments = []
+    for block in blocks:
+        text = "".join(block)
+        if count_tokens(text) <= max_tokens:
+            segments.append(text)
+        else:
+            segments.extend(_split_lines(block, max_tokens))
+
+    return _pack(segments, max_tokens)
+
+
+def split_code(filename: str, text: str, max_tokens: int = CHUNK_MAX_TOKENS) -> list[str]:
+    """
+    Splits a file into parts of at most max_tokens tokens without cutting definitions in half.
+
+    Python files are split on top-level statements, descending into classes that do not fit;
+    other files are split on top-level blocks, and on lines as a last resort.
+
+    Args:
+        filename (str): The name of the file, used to detect its language.
+        text (str): The content of the file.
+        max_tokens (int): The maximum number of tokens of a part.
+
+    Returns:
+        list[str]: The parts of the file, which concatenate back to the original text.
+    """
+    if count_tokens(text) <= max_tokens:
+        return [text]
+
+    lines = text.splitlines(keepends=True)
+    if filename.endswith((".py", ".pyi")):
+        try:
+            tree = ast.parse(text)
+            return _split_python_nodes(lines, tree.body, 0, len(lines), max_tokens)
+        except (SyntaxError, ValueError) as ex:
+            logger.debug(f"Could not parse {filename}, splitting on indentation: {ex}")
+
+    return _split_by_indentation(lines, max_tokens)
+
+
+def _is_pack_anchor(filename: str) -> bool:
+    """
+    Tells whether a file closes the chunk it is packed in, based on its name only.
+
+    These content-defined boundaries keep packing stable across commits: a file that grows or
+    shrinks can only shift the files packed up to the next anchor, so the other chunks produce the
+    same prompts as before and are served from the LLM response cache.
+    """
+    return zlib.crc32(filename.encode()) % PACK_ANCHOR_INTERVAL == 0
+
+
+def build_chunks(files: list[Content], max_tokens: int = CHUNK_MAX_TOKENS) -> list[Chunk]:
+    """
+    Groups repository files into chunks of at most max_tokens tokens.
+
+    Files too large for one chunk are split into parts with split_code, each sent on its own;
+    small files are packed together to reduce the number of requests, a chunk also being closed
+    after each anchor file so that edits to one file leave the other chunks unchanged.
+
+    Args:
+        files (list[Content]): The files to group.
+        max_tokens (int): The maximum number of code tokens per chunk.
+
+    Returns:
+        list[Chunk]: The chunks; the parts of a file always follow each other in order.
+    """
+    chunks: list[Chunk] = []
+    pending = Chunk()
+
+    for content in files:
+        file_content = content.file_content
+        tokens = count_tokens(file_content) + FILE_HEADER_TOKENS
+        if tokens <= max_tokens:
+            if pending.parts and pending.tokens + tokens > max_tokens:
+                chunks.append(pending)
+                pending = Chunk()
+            pending.parts.append(ChunkPart(content=content))
+            pending.tokens += tokens
+            if _is_pack_anchor(content.filename):
+                chunks.append(pending)
+                pending = Chunk()
+            continue
+
+        parts = split_code(content.filename, file_content, max_tokens - FILE_HEADER_TOKENS)
+        start = 0
+        for part_index, part in enumerate(parts, start=1):
+            chunks.append(Chunk(
+                parts=[ChunkPart(
+                    content=content, start=start, end=start + len(part), part_index=part_index, total_parts=len(parts)
+                )],
+                tokens=count_tokens(part) + FILE_HEADER_TOKENS,
+            ))
+            start += len(part)
+
+    if pending.parts:
+        chunks.append(pending)
+
+    return chunks
@@ -0,0 +1,171 @@
+import os
+import codecs
+import tempfile
+import threading
+
+from typing import Iterator
+
+from loguru import logger
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# The file contents a request keeps in memory; the others are spilled to a temporary file
+CONTENT_MEMORY_BYTES = int(os.getenv("CONTENT_MEMORY_BYTES", 32 * 1024 * 1024))
+# Files larger than this are always spilled
+CONTENT_SPILL_BYTES = int(os.getenv("CONTENT_SPILL_BYTES", 256 * 1024))
+READ_CHUNK_BYTES = 64 * 1024
+
+
+class SpooledBlob:
+    """
+    The raw content of a file held by a ContentSpool, either in memory or in its temporary file.
+
+    Attributes:
+        size (int): The size of the content in bytes.
+    """
+    __slots__ = ("size", "_spool", "_data", "_offset")
+
+    def __init__(self, spool: "ContentSpool", size: int, data: bytes | None = None, offset: int = 0):
+        self.size = size
+        self._spool = spool
+        self._data = data
+        self._offset = offset
+
+    @property
+    def spilled(self) -> bool:
+        """Whether the content lives in the temporary file rather than in memory."""
+        return self._data is None
+
+    def iter_bytes(self, chunk_size: int = READ_CHUNK_BYTES) -> Iterator[bytes]:
+        """
+        Reads the content piece by piece, so spilled files are never loaded whole.
+
+        Args:
+            chunk_size (int): The maximum size of a piece in bytes.
+
+        Yields:
+            bytes: The pieces of the content, in order.
+        """
+        for start in range(0, self.size, chunk_size):
+            length = min(chunk_size, self.size - start)
+            if self._data is not None:
+                yield self._data[start:start + length]
+            else:
+                yield self._spool.read(self._offset + start, length)
+
+    def read(self) -> bytes:
+        """
+        Reads the whole content.
+
+        Returns:
+            bytes: The content.
+        """
+        if self._data is not None:
+            return self._data
+        return self._spool.read(self._offset, self.size)
+
+    def text(self) -> str:
+        """
+        Decodes the whole content as UTF-8, replacing invalid bytes.
+
+        Returns:
+            str: The decoded content.
+        """
+        return self.read().decode("utf-8", "replace")
+
+    def iter_text(self, chunk_size: int = READ_CHUNK_BYTES) -> Iterator[str]:
+        """
+        Decodes the content piece by piece as UTF-8, replacing invalid bytes.
+
+        Args:
+            chunk_size (int): The maximum size of a piece in bytes before decoding.
+
+        Yields:
+            str: The decoded pieces, which concatenate to text().
+        """
+        decoder = codecs.getincrementaldecoder("utf-8")("replace")
+        for data in self.iter_bytes(chunk_size):
+            if text := decoder.decode(data):
+                yield text
+        if text := decoder.decode(b"", final=True):
+            yield text
+
+
+class ContentSpool:
+    """
+    Holds the file contents of one request within a memory budget.
+
+    Contents are kept in memory until max_memory_bytes is reached; later contents, and any content
+    larger than spill_bytes, are appended to an anonymous temporary file and read back on demand,
+    so the memory a request keeps does not grow with the size of the repository. The temporary file
+    is removed when the spool is closed.
+
+    Attributes:
+        max_memory_bytes (int): The total size of the contents kept in memory.
+        spill_bytes (int): The size above which a content is always spilled.
+        memory_bytes (int): The size of the contents held in memory.
+        spilled_bytes (int): The size of the contents held in the temporary file.
+    """
+
+    def __init__(self, max_memory_bytes: int = CONTENT_MEMORY_BYTES, spill_bytes: int = CONTENT_SPILL_BYTES):
+        self.max_memory_bytes = max_memory_bytes
+        self.spill_bytes = spill_bytes
+        self.memory_bytes = 0
+        self.spilled_bytes = 0
+
+        self.__file = None
+        self.__lock = threading.Lock()
+
+    def store(self, data: bytes) -> SpooledBlob:
+        """
+        Stores a content.
+
+        Args:
+            data (bytes): The raw content of a file.
+
+        Returns:
+            SpooledBlob: The handle to read the content back.
+        """
+        if len(data) <= self.spill_bytes and self.memory_bytes + len(data) <= self.max_memory_bytes:
+            self.memory_bytes += len(data)
+            return SpooledBlob(self, len(data), data=data)
+
+        with self.__lock:
+            if self.__file is None:
+                self.__file = tempfile.TemporaryFile(prefix="content-spool-")
+                logger.debug(f"Spilling file contents to disk after {self.memory_bytes} bytes in memory")
+            offset = self.spilled_bytes
+            os.pwrite(self.__file.fileno(), data, offset)
+            self.spilled_bytes += len(data)
+        return SpooledBlob(self, len(data), offset=offset)
+
+    def read(self, offset: int, length: int) -> bytes:
+        """
+        Reads spilled bytes back from the temporary file.
+
+        Args:
+            offset (int): The position of the bytes in the file.
+            length (int): The number of bytes to read.
+
+        Returns:
+            bytes: The bytes read.
+
+        Raises:
+            ValueError: If the spool is closed.
+        """
+        if self.__file is None or self.__file.closed:
+            raise ValueError("The content spool is closed")
+        return os.pread(self.__file.fileno(), length, offset)
+
+    def close(self) -> None:
+        """Removes the temporary file; spilled contents can no longer be read."""
+        with self.__lock:
+            if self.__file is not None:
+                self.__file.close()
+
+    def __enter__(self) -> "ContentSpool":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
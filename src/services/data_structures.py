@@ -1,17 +1,90 @@
 from enum import Enum
-from pydantic import BaseModel
+from typing import Any, Iterator
+from pydantic import BaseModel, Field, PrivateAttr, computed_field, field_validator, model_validator
+from pydantic.functional_validators import ModelWrapValidatorHandler
+
+from src.services.content_spool import SpooledBlob, READ_CHUNK_BYTES
 
 
 class Content(BaseModel):
     """
     Represents the content of a file in a GitHub repository.
 
+    The content is either a string or a blob held by the ContentSpool of the request, in memory or
+    spilled to disk; it is decoded each time file_content is read, so spilled files are only loaded
+    while they are used.
+
     Attributes:
         filename (str): The name of the file.
         file_content (str): The content of the file as a string.
+        sha (str | None): The git blob SHA of the file, when known.
+    """
+    filename: str
+    sha: str | None = None
+
+    _file_content: str | SpooledBlob = PrivateAttr(default="")
+
+    @model_validator(mode="wrap")
+    @classmethod
+    def _keep_file_content(cls, data: Any, handler: ModelWrapValidatorHandler["Content"]) -> "Content":
+        """Keeps the string or spooled blob given as file_content, which is not a stored field."""
+        if not isinstance(data, dict):
+            return handler(data)
+
+        data = dict(data)
+        file_content = data.pop("file_content", "")
+        content = handler(data)
+        content._file_content = file_content
+        return content
+
+    @computed_field
+    @property
+    def file_content(self) -> str:
+        """The content of the file as a string."""
+        if isinstance(self._file_content, str):
+            return self._file_content
+        return self._file_content.text()
+
+    @property
+    def size(self) -> int:
+        """The size of the content in bytes, known without reading a spooled blob."""
+        if isinstance(self._file_content, str):
+            return len(self._file_content.encode(errors="surrogatepass"))
+        return self._file_content.size
+
+    def read_bytes(self) -> bytes:
+        """The raw content of a spooled blob, or the string encoded as UTF-8."""
+        if isinstance(self._file_content, str):
+            return self._file_content.encode(errors="surrogatepass")
+        return self._file_content.read()
+
+    def iter_text(self, chunk_size: int = READ_CHUNK_BYTES) -> Iterator[str]:
+        """
+        Reads the content piece by piece, without loading spilled files whole.
+
+        Args:
+            chunk_size (int): The approximate size of a piece.
+
+        Yields:
+            str: The pieces of the content, which concatenate to file_content.
+        """
+        if isinstance(self._file_content, str):
+            for start in range(0, len(self._file_content), chunk_size):
+                yield self._file_content[start:start + chunk_size]
+        else:
+            yield from self._file_content.iter_text(chunk_size)
+
+
+class SkippedFile(BaseModel):
+    """
+    Represents a repository file left out of the review.
+
+    Attributes:
+        filename (str): The name of the file.
+        reason (str): Why the file was left out.
     """
     filename: str
-    file_content: str
+    reason: str
 
 
 class RepoFilesResponse(BaseModel):
@@ -21,9 +94,13 @@ class RepoFilesResponse(BaseModel):
     Attributes:
         files (list[Content]): A list of Content objects representing the files.
         count (int): The total number of files retrieved.
+        commit_sha (str | None): The commit the files were retrieved from, when known.
+        skipped_files (list[SkippedFile]): The files left out by the file filter, with their reasons.
     """
     files: list[Content]
     count: int
+    commit_sha: str | None = None
+    skipped_files: list[SkippedFile] = Field(default_factory=list)
 
 
 class ErrorResponse(BaseModel):
@@ -50,6 +127,36 @@ class CandidateLevel(Enum):
     senior = "senior"
 
 
+class TraceSpan(BaseModel):
+    """
+    Represents the timed steps of a review sharing the same name, e.g. every GitHub request.
+
+    Attributes:
+        name (str): The name of the step.
+        count (int): The number of times the step ran.
+        total_seconds (float): The total duration of the step; steps running concurrently overlap.
+        max_seconds (float): The longest duration of the step.
+    """
+    name: str
+    count: int
+    total_seconds: float
+    max_seconds: float
+
+
+class ReviewTraceReport(BaseModel):
+    """
+    Represents the breakdown of the time and resources spent by a review.
+
+    Attributes:
+        total_seconds (float): The duration of the review.
+        spans (list[TraceSpan]): The timed steps of the review, in order of first occurrence.
+        counters (dict[str, int]): The resources used, e.g. GitHub requests, bytes downloaded and LLM tokens.
+    """
+    total_seconds: float
+    spans: list[TraceSpan] = Field(default_factory=list)
+    counters: dict[str, int] = Field(default_factory=dict)
+
+
 class AnalysisReport(BaseModel):
     """
     Represents the analysis report generated from the code review.
@@ -57,11 +164,43 @@ class AnalysisReport(BaseModel):
     Attributes:
         project_files (list[str]): A list of filenames involved in the analysis.
         full_report (str): A detailed report of the analysis.
-        conclusion_and_assessment (str): The final assessment and conclusion of the review.
+        conclusion_and_assessment (dict | str): The final assessment and conclusion of the review.
+        skipped_files (list[SkippedFile]): The files left out of the review, with their reasons.
+        review_id (str | None): The identifier to pass as previous_review_id to re-review the repository later.
+        commit_sha (str | None): The reviewed commit, when known.
+        reused_files (list[str]): The files whose analyses were reused from the previous review.
+        duplicate_files (dict[str, str]): The files reviewed through a copy of them, mapped to that copy.
+        static_findings (dict[str, list[str]]): The issues found by the static analysis, by file.
+        trace (ReviewTraceReport | None): The breakdown of the time spent by the review, if it was requested.
     """
     project_files: list[str]
     full_report: str
-    conclusion_and_assessment: str
+    conclusion_and_assessment: dict | str
+    skipped_files: list[SkippedFile] = Field(default_factory=list)
+    review_id: str | None = None
+    commit_sha: str | None = None
+    reused_files: list[str] = Field(default_factory=list)
+    duplicate_files: dict[str, str] = Field(default_factory=dict)
+    static_findings: dict[str, list[str]] = Field(default_factory=dict)
+    trace: ReviewTraceReport | None = None
+
+
+class ChunkAnalysis(BaseModel):
+    """
+    Represents the analysis of one chunk of a repository, streamed as soon as it completes.
+
+    Attributes:
+        index (int): The position of the chunk in the report, starting at 0.
+        total (int): The number of chunks of the review.
+        files (list[str]): The files covered by the chunk.
+        label (str): The description of the files and part covered by the chunk, as used in the report.
+        analysis (str): The analysis of the chunk.
+    """
+    index: int
+    total: int
+    files: list[str]
+    label: str
+    analysis: str
 
 
 class ReviewRequest(BaseModel):
@@ -72,10 +211,72 @@ class ReviewRequest(BaseModel):
         assignment_description (str): Description of the assignment to be analyzed.
         github_repo_url (str): The URL of the GitHub repository to analyze.
         candidate_level (CandidateLevel): The level of the candidate being evaluated.
+        previous_review_id (str | None): A previous review of the repository whose analyses of unchanged
+                                         files are reused.
+        base_commit (str | None): A previously reviewed commit whose latest review is reused, if no
+                                  previous_review_id is given.
+        trace (bool): Whether the report holds the breakdown of the time spent by the review.
     """
     assignment_description: str
     github_repo_url: str
     candidate_level: CandidateLevel
+    previous_review_id: str | None = None
+    base_commit: str | None = None
+    trace: bool = False
+
+
+class BatchReviewRequest(BaseModel):
+    """
+    Represents a request for the code review of many repositories solving the same assignment.
+
+    Attributes:
+        reviews (list[ReviewRequest]): The reviews to run, all with the same assignment description.
+    """
+    reviews: list[ReviewRequest] = Field(min_length=1, max_length=500)
+
+    @field_validator("reviews")
+    @classmethod
+    def same_assignment(cls, reviews: list[ReviewRequest]) -> list[ReviewRequest]:
+        """Checks that every review is about the same assignment."""
+        if len({review.assignment_description for review in reviews}) > 1:
+            raise ValueError("All reviews of a batch must share the same assignment_description")
+        return reviews
+
+
+class BatchReviewResult(BaseModel):
+    """
+    Represents the outcome of one review of a batch, streamed as soon as it finishes.
+
+    Attributes:
+        index (int): The position of the review in the batch request.
+        github_repo_url (str): The URL of the reviewed repository.
+        completed (int): The number of reviews of the batch finished so far, this one included.
+        total (int): The number of reviews of the batch.
+        report (AnalysisReport | None): The report, if the review succeeded.
+        status_code (int | None): The HTTP status code of the error, if the review failed.
+        error (str | None): A description of the error, if the review failed.
+        review_id (str | None): The failed review, to resume by passing it as previous_review_id.
+    """
+    index: int
+    github_repo_url: str
+    completed: int
+    total: int
+    report: AnalysisReport | None = None
+    status_code: int | None = None
+    error: str | None = None
+    review_id: str | None = None
+
+
+class FetchMode(Enum):
+    """
+    Enumeration for repository fetch strategies.
+
+    Values:
+        archive: Downloads the repository tarball once and reads the files from it.
+        per_file: Lists the repository tree once and downloads every blob separately through the GitHub API.
+    """
+    archive = "archive"
+    per_file = "per_file"
 
 
 class FilesRequest(BaseModel):
@@ -84,5 +285,64 @@ class FilesRequest(BaseModel):
 
     Attributes:
         github_repo_url (str): The URL of the GitHub repository.
+        fetch_mode (FetchMode): The strategy used to download the repository files.
+        max_concurrency (int): The maximum number of blob downloads in flight in per-file mode.
+        prioritize_source (bool): Whether source files are downloaded before other files in per-file mode.
     """
     github_repo_url: str
+    fetch_mode: FetchMode = FetchMode.archive
+    max_concurrency: int = Field(default=8, ge=1, le=64)
+    prioritize_source: bool = True
+
+
+class ReviewJobStatus(Enum):
+    """
+    Enumeration for the states of a review job.
+
+    Values:
+        queued: The job waits for a free worker.
+        running: A worker is fetching or analyzing the repository.
+        completed: The review finished and its report is available.
+        failed: The review failed and its error is available.
+    """
+    queued = "queued"
+    running = "running"
+    completed = "completed"
+    failed = "failed"
+
+
+class ReviewProgress(BaseModel):
+    """
+    Represents the progress of a running review.
+
+    Attributes:
+        stage (str): The current stage: "queued", "fetching", "analyzing", "reporting" or "done".
+        completed_chunks (int): The number of analysis requests completed.
+        total_chunks (int): The number of analysis requests of the review, 0 until the files are fetched.
+        review_id (str | None): The identifier of the review, whose completed analyses are checkpointed; a
+                                failed review is resumed by passing it as previous_review_id.
+    """
+    stage: str = "queued"
+    completed_chunks: int = 0
+    total_chunks: int = 0
+    review_id: str | None = None
+
+
+class ReviewJob(BaseModel):
+    """
+    Represents a review running in the background.
+
+    Attributes:
+        id (str): The identifier of the job.
+        status (ReviewJobStatus): The state of the job.
+        request (ReviewRequest): The review requested.
+        progress (ReviewProgress): The progress of the review.
+        result (AnalysisReport | None): The report, once the review is completed.
+        error (str | None): A description of the error, if the review failed.
+    """
+    id: str
+    status: ReviewJobStatus = ReviewJobStatus.queued
+    request: ReviewRequest
+    progress: ReviewProgress = Field(default_factory=ReviewProgress)
+    result: AnalysisReport | None = None
+    error: str | None = None
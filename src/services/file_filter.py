@@ -0,0 +1,316 @@
+import os
+import re
+import posixpath
+
+from functools import lru_cache
+from dataclasses import dataclass, field
+
+from loguru import logger
+from dotenv import load_dotenv
+
+from src.services.chunker import count_tokens
+from src.services.data_structures import Content, RepoFilesResponse, SkippedFile
+
+load_dotenv()
+
+SOURCE_EXTENSIONS = {
+    ".py", ".pyi", ".js", ".jsx", ".ts", ".tsx", ".java", ".kt", ".go", ".rs", ".c", ".h", ".cpp", ".hpp",
+    ".cs", ".rb", ".php", ".swift", ".scala", ".sql", ".sh", ".html", ".css", ".scss", ".vue",
+}
+TEXT_EXTENSIONS = {
+    ".md", ".rst", ".txt", ".toml", ".ini", ".cfg", ".yaml", ".yml", ".json", ".xml", ".dockerfile",
+}
+BINARY_EXTENSIONS = {
+    ".png", ".jpg", ".jpeg", ".gif", ".bmp", ".ico", ".webp", ".tiff", ".psd", ".pdf", ".zip", ".gz", ".tgz",
+    ".bz2", ".xz", ".7z", ".rar", ".tar", ".jar", ".war", ".class", ".pyc", ".pyo", ".so", ".dll", ".dylib",
+    ".exe", ".o", ".a", ".woff", ".woff2", ".ttf", ".otf", ".eot", ".mp3", ".mp4", ".wav", ".ogg", ".mov",
+    ".avi", ".webm", ".db", ".sqlite", ".sqlite3", ".npy", ".npz", ".pkl", ".parquet", ".xls", ".xlsx",
+    ".doc", ".docx", ".ppt", ".pptx",
+}
+LOCKFILE_NAMES = {
+    "poetry.lock", "pipfile.lock", "uv.lock", "pdm.lock", "package-lock.json", "npm-shrinkwrap.json", "yarn.lock",
+    "pnpm-lock.yaml", "bun.lockb", "cargo.lock", "composer.lock", "gemfile.lock", "go.sum", "packages.lock.json",
+}
+VENDOR_DIRECTORIES = {
+    "node_modules", "bower_components", "vendor", "third_party", "site-packages", ".venv", "venv", "__pycache__",
+    ".git", ".idea", ".vscode", "dist", "build", ".next", ".nuxt", "coverage", ".pytest_cache", ".mypy_cache",
+}
+GENERATED_PATTERNS = (
+    "**/migrations/[0-9][0-9][0-9][0-9]_*.py", "*_pb2.py", "*_pb2_grpc.py", "*.pb.go", "*.generated.*",
+    "*.min.js", "*.min.css", "*.map",
+)
+GENERATED_MARKERS = ("@generated", "DO NOT EDIT", "Code generated by", "Generated by Django", "autogenerated")
+
+# Only the beginning of a file is inspected by the content sniffers
+SNIFF_CHARS = 8192
+
+
+def blob_priority(path: str) -> int:
+    """
+    Computes the download priority of a file, lower values being fetched first.
+
+    Args:
+        path (str): The path of the file in the repository.
+
+    Returns:
+        int: 0 for source files, 1 for documentation and configuration, 2 for everything else.
+    """
+    _, extension = os.path.splitext(path.lower())
+    if extension in SOURCE_EXTENSIONS:
+        return 0
+    if extension in TEXT_EXTENSIONS:
+        return 1
+    return 2
+
+
+@lru_cache(maxsize=1024)
+def _compile_pattern(pattern: str) -> re.Pattern:
+    """Translates a .gitignore-style pattern into a regular expression matched against full paths."""
+    directory_only = pattern.endswith("/")
+    pattern = pattern.strip("/") if directory_only else pattern
+    # Patterns without a slash match at any depth, the others are relative to the repository root
+    anchored = "/" in pattern.lstrip("/") or pattern.startswith("/")
+    pattern = pattern.lstrip("/")
+
+    regex = ""
+    index = 0
+    while index < len(pattern):
+        if pattern.startswith("**/", index):
+            regex += "(?:.*/)?"
+            index += 3
+        elif pattern.startswith("**", index):
+            regex += ".*"
+            index += 2
+        elif pattern[index] == "*":
+            regex += "[^/]*"
+            index += 1
+        elif pattern[index] == "?":
+            regex += "[^/]"
+            index += 1
+        elif pattern[index] == "[" and "]" in pattern[index + 1:]:
+            end = pattern.index("]", index + 1)
+            regex += "[" + pattern[index + 1:end].replace("!", "^", 1) + "]"
+            index = end + 1
+        else:
+            regex += re.escape(pattern[index])
+            index += 1
+
+    prefix = "" if anchored else "(?:.*/)?"
+    # A pattern matching a directory also matches everything below it; directory-only patterns
+    # must be followed by a path separator
+    suffix = "/.*" if directory_only else "(?:/.*)?"
+    return re.compile(f"{prefix}{regex}{suffix}")
+
+
+def match_patterns(patterns: list[str], path: str) -> str | None:
+    """
+    Matches a path against .gitignore-style patterns, the last matching pattern winning.
+
+    Patterns starting with "!" negate the earlier patterns, as in .gitignore.
+
+    Args:
+        patterns (list[str]): The patterns, in order.
+        path (str): The path of the file in the repository.
+
+    Returns:
+        str | None: The last matching pattern, or None if no pattern matches or the last one is negated.
+    """
+    matched = None
+    for pattern in patterns:
+        negated = pattern.startswith("!")
+        if _compile_pattern(pattern[1:] if negated else pattern).fullmatch(path):
+            matched = None if negated else pattern
+    return matched
+
+
+@dataclass
+class FileFilter:
+    """
+    Selects the repository files worth reviewing before they are downloaded and analyzed.
+
+    Paths and sizes are checked against the tree listing, so skipped blobs are never fetched;
+    contents are sniffed after download, and the remaining files are ranked by relevance to fit
+    the token budget.
+
+    Attributes:
+        include (list[str]): .gitignore-style patterns of the files to review; every file if empty.
+        exclude (list[str]): .gitignore-style patterns of the files never reviewed.
+        max_file_bytes (int | None): The size above which a file is skipped, or None for no limit.
+        token_budget (int | None): The total number of tokens of the reviewed files, or None for no limit.
+        skip_lockfiles (bool): Whether dependency lockfiles are skipped.
+        skip_vendored (bool): Whether vendored, build and tool directories are skipped.
+        skip_generated (bool): Whether generated and minified files are skipped.
+        skip_binary (bool): Whether binary files are skipped.
+    """
+    include: list[str] = field(default_factory=list)
+    exclude: list[str] = field(default_factory=list)
+    max_file_bytes: int | None = 200 * 1024
+    token_budget: int | None = 200_000
+    skip_lockfiles: bool = True
+    skip_vendored: bool = True
+    skip_generated: bool = True
+    skip_binary: bool = True
+
+    @classmethod
+    def from_env(cls) -> "FileFilter":
+        """
+        Reads the filter from REVIEW_INCLUDE and REVIEW_EXCLUDE (comma-separated patterns),
+        REVIEW_MAX_FILE_BYTES and REVIEW_TOKEN_BUDGET (0 for no limit), using the defaults for the missing ones.
+
+        Returns:
+            FileFilter: The configured filter.
+        """
+        defaults = cls()
+
+        def patterns(name: str) -> list[str]:
+            """Split a comma-separated list of patterns."""
+            return [pattern.strip() for pattern in os.getenv(name, "").split(",") if pattern.strip()]
+
+        def limit(name: str, default: int | None) -> int | None:
+            """Read a limit, 0 meaning no limit."""
+            value = int(os.getenv(name, default or 0))
+            return value or None
+
+        return cls(
+            include=patterns("REVIEW_INCLUDE"),
+            exclude=patterns("REVIEW_EXCLUDE"),
+            max_file_bytes=limit("REVIEW_MAX_FILE_BYTES", defaults.max_file_bytes),
+            token_budget=limit("REVIEW_TOKEN_BUDGET", defaults.token_budget),
+        )
+
+    def check_path(self, path: str, size: int | None = None) -> str | None:
+        """
+        Checks a file by its path and size only, before it is downloaded.
+
+        Args:
+            path (str): The path of the file in the repository.
+            size (int | None): The size of the file in bytes, when known.
+
+        Returns:
+            str | None: The reason the file is skipped, or None if it is kept.
+        """
+        pattern = match_patterns(self.exclude, path)
+        if pattern is not None:
+            return f"excluded by pattern '{pattern}'"
+        if self.include and match_patterns(self.include, path) is None:
+            return "not matched by the include patterns"
+
+        name = posixpath.basename(path).lower()
+        _, extension = os.path.splitext(name)
+        if self.skip_lockfiles and name in LOCKFILE_NAMES:
+            return "lockfile"
+        if self.skip_vendored and any(part in VENDOR_DIRECTORIES for part in path.split("/")[:-1]):
+            return "vendored or build directory"
+        if self.skip_generated and match_patterns(list(GENERATED_PATTERNS), path) is not None:
+            return "generated or minified"
+        if self.skip_binary and extension in BINARY_EXTENSIONS:
+            return "binary"
+        if self.max_file_bytes is not None and size is not None and size > self.max_file_bytes:
+            return f"larger than {self.max_file_bytes} bytes"
+        return None
+
+    def check_content(self, content: Content) -> str | None:
+        """
+        Checks a downloaded file by its content.
+
+        Only the beginning of the content is read, so spilled files are not loaded whole.
+
+        Args:
+            content (Content): The downloaded file.
+
+        Returns:
+            str | None: The reason the file is skipped, or None if it is kept.
+        """
+        head = next(content.iter_text(SNIFF_CHARS), "")[:SNIFF_CHARS]
+        if self.skip_binary and ("\0" in head or head.count("\ufffd") > len(head) // 100 + 1):
+            return "binary"
+
+        if self.skip_generated:
+            if any(marker in head[:1024] for marker in GENERATED_MARKERS):
+                return "generated or minified"
+            lines = head.count("\n") + 1
+            if len(head) >= 2000 and len(head) / lines > 500:
+                return "generated or minified"
+
+        if self.max_file_bytes is not None and content.size > self.max_file_bytes:
+            return f"larger than {self.max_file_bytes} bytes"
+        return None
+
+    def partition_entries(self, entries: list[dict]) -> tuple[list[dict], list[SkippedFile]]:
+        """
+        Splits tree entries into the ones to download and the skipped ones.
+
+        Args:
+            entries (list[dict]): The tree entries, each with "path" and "size" keys.
+
+        Returns:
+            tuple[list[dict], list[SkippedFile]]: The kept entries and the skipped files.
+        """
+        kept: list[dict] = []
+        skipped: list[SkippedFile] = []
+        for entry in entries:
+            reason = self.check_path(entry["path"], entry.get("size"))
+            if reason is None:
+                kept.append(entry)
+            else:
+                skipped.append(SkippedFile(filename=entry["path"], reason=reason))
+        return kept, skipped
+
+    @staticmethod
+    def relevance(path: str) -> tuple:
+        """
+        Ranks a file for the token budget, lower values being kept first.
+
+        Source files come first, then documentation and configuration; tests come after the code
+        they test, and files closer to the repository root before deeply nested ones.
+
+        Args:
+            path (str): The path of the file in the repository.
+
+        Returns:
+            tuple: The sort key of the file.
+        """
+        parts = path.lower().split("/")
+        is_test = any(part in ("test", "tests", "spec", "__tests__") for part in parts[:-1]) or (
+            parts[-1].startswith("test_") or ".test." in parts[-1] or ".spec." in parts[-1]
+        )
+        return blob_priority(path), is_test, len(parts), path
+
+    def apply(self, repo_files: RepoFilesResponse) -> RepoFilesResponse:
+        """
+        Filters downloaded files by path and content, then keeps the most relevant ones within the token budget.
+
+        The kept files stay in their original order. Token counting is CPU-bound, so callers in
+        the event loop run this method in a worker thread.
+
+        Args:
+            repo_files (RepoFilesResponse): The downloaded files.
+
+        Returns:
+            RepoFilesResponse: The kept files, with every skipped file and its reason.
+        """
+        skipped = list(repo_files.skipped_files)
+        candidates: list[Content] = []
+        for content in repo_files.files:
+            reason = self.check_path(content.filename) or self.check_content(content)
+            if reason is None:
+                candidates.append(content)
+            else:
+                skipped.append(SkippedFile(filename=content.filename, reason=reason))
+
+        kept = {content.filename for content in candidates}
+        if self.token_budget is not None:
+            remaining = self.token_budget
+            for content in sorted(candidates, key=lambda item: self.relevance(item.filename)):
+                tokens = count_tokens(content.file_content)
+                if tokens > remaining:
+                    kept.discard(content.filename)
+                    skipped.append(SkippedFile(filename=content.filename, reason="over the token budget"))
+                else:
+                    remaining -= tokens
+
+        files = [content for content in candidates if content.filename in kept]
+        logger.info(f"Kept {len(files)} files for review, skipped {len(skipped)}")
+        return RepoFilesResponse(
+            files=files, count=len(files), commit_sha=repo_files.commit_sha, skipped_files=skipped
+        )
@@ -0,0 +1,34 @@
+import json
+
+from typing import Iterator
+
+from src.services.content_spool import READ_CHUNK_BYTES
+from src.services.data_structures import RepoFilesResponse
+
+
+def encode_repo_files(repo_files: RepoFilesResponse, chunk_size: int = READ_CHUNK_BYTES) -> Iterator[bytes]:
+    """
+    Encodes a RepoFilesResponse as JSON piece by piece.
+
+    File contents are read and escaped in pieces of chunk_size, so the body of a large repository is
+    never built in memory, and spilled files are never loaded whole. The document is the same as
+    repo_files.model_dump_json().
+
+    Args:
+        repo_files (RepoFilesResponse): The files to encode.
+        chunk_size (int): The size of the content pieces read at once.
+
+    Yields:
+        bytes: The pieces of the JSON document.
+    """
+    yield b'{"files":['
+    for position, content in enumerate(repo_files.files):
+        header = json.dumps({"filename": content.filename, "sha": content.sha})[:-1]
+        yield f'{"," if position else ""}{header}, "file_content": "'.encode()
+        for text in content.iter_text(chunk_size):
+            # Escaping is done character by character, so escaped pieces concatenate to the escaped whole
+            yield json.dumps(text)[1:-1].encode()
+        yield b'"}'
+
+    tail = repo_files.model_dump(mode="json", exclude={"files"})
+    yield f'], {json.dumps(tail)[1:]}'.encode()
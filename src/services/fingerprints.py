@@ -0,0 +1,359 @@
+import os
+import re
+import sqlite3
+import hashlib
+import threading
+
+from dataclasses import dataclass
+
+from loguru import logger
+from dotenv import load_dotenv
+
+from src.services.data_structures import Content, RepoFilesResponse, SkippedFile
+
+load_dotenv()
+
+# Files at least this similar are reviewed once, 0 disabling the grouping of near-duplicates
+DUPLICATE_SIMILARITY = float(os.getenv("REVIEW_DUPLICATE_SIMILARITY", 0.9))
+
+SHINGLE_TOKENS = 5
+SIGNATURE_SIZE = 64
+# The signature is split into bands for locality-sensitive hashing: files sharing any band are
+# compared, which finds pairs above ~0.77 similarity while keeping the candidate lists short
+LSH_BANDS = 8
+LSH_ROWS = SIGNATURE_SIZE // LSH_BANDS
+
+_TOKEN_PATTERN = re.compile(r"[A-Za-z_]\w*|\d+(?:\.\d+)?|\S")
+_COMMENT_PATTERN = re.compile(r"(?m)(?:^|\s)(?:#|//)[^\n]*|(?s:/\*.*?\*/)")
+# Bin values keep the hash bits left after choosing the bin
+_BIN_BITS = 58
+
+
+@dataclass(frozen=True)
+class Fingerprint:
+    """
+    The fingerprint of a file's content, insensitive to whitespace and comments.
+
+    Attributes:
+        digest (bytes): The hash of the normalized tokens, equal for exact duplicates.
+        signature (tuple[int, ...]): The MinHash signature of the token shingles, close for near-duplicates.
+    """
+    digest: bytes
+    signature: tuple[int, ...]
+
+    def similarity(self, other: "Fingerprint") -> float:
+        """
+        Estimates the Jaccard similarity of the token shingles of two files.
+
+        Args:
+            other (Fingerprint): The fingerprint to compare with.
+
+        Returns:
+            float: The estimated similarity, from 0 to 1.
+        """
+        if self.digest == other.digest:
+            return 1.0
+        return sum(a == b for a, b in zip(self.signature, other.signature)) / SIGNATURE_SIZE
+
+    def bands(self) -> list[int]:
+        """
+        Hashes the bands of the signature into the keys of the locality-sensitive index.
+
+        Returns:
+            list[int]: One signed 64-bit key per band.
+        """
+        return [
+            int.from_bytes(hashlib.blake2b(
+                repr((band, self.signature[band * LSH_ROWS:(band + 1) * LSH_ROWS])).encode(), digest_size=8
+            ).digest(), "big", signed=True)
+            for band in range(LSH_BANDS)
+        ]
+
+
+def normalize_tokens(file_content: str) -> list[str]:
+    """
+    Splits source code into tokens, dropping whitespace and line and block comments.
+
+    Args:
+        file_content (str): The content of the file.
+
+    Returns:
+        list[str]: The tokens.
+    """
+    return _TOKEN_PATTERN.findall(_COMMENT_PATTERN.sub(" ", file_content))
+
+
+def fingerprint(file_content: str) -> Fingerprint:
+    """
+    Fingerprints the content of a file.
+
+    The signature is a one-permutation MinHash: every shingle of SHINGLE_TOKENS tokens is hashed once
+    and spread over SIGNATURE_SIZE bins by its low bits, each bin keeping its smallest hash. Empty bins
+    borrow the value of the next non-empty one, so short files still get comparable signatures.
+
+    Args:
+        file_content (str): The content of the file.
+
+    Returns:
+        Fingerprint: The fingerprint.
+    """
+    tokens = normalize_tokens(file_content)
+    normalized = "\0".join(tokens)
+    digest = hashlib.sha256(normalized.encode()).digest()
+
+    shingles = {
+        "\0".join(tokens[index:index + SHINGLE_TOKENS])
+        for index in range(max(1, len(tokens) - SHINGLE_TOKENS + 1))
+    }
+    bins: list[int | None] = [None] * SIGNATURE_SIZE
+    for shingle in shingles:
+        value = int.from_bytes(hashlib.blake2b(shingle.encode(), digest_size=8).digest(), "big")
+        position, value = value % SIGNATURE_SIZE, value // SIGNATURE_SIZE
+        if bins[position] is None or value < bins[position]:
+            bins[position] = value
+
+    signature = []
+    for position in range(SIGNATURE_SIZE):
+        offset = 0
+        while bins[(position + offset) % SIGNATURE_SIZE] is None:
+            offset += 1
+        # Borrowed values are tagged with the distance they were borrowed from
+        signature.append(bins[(position + offset) % SIGNATURE_SIZE] + (offset << _BIN_BITS))
+
+    return Fingerprint(digest=digest, signature=tuple(signature))
+
+
+def find_duplicates(files: list[Content], min_similarity: float = DUPLICATE_SIMILARITY) -> dict[str, str]:
+    """
+    Groups the exact and near-duplicate files of a repository.
+
+    Each group is represented by its first file in repository order; files are compared only when
+    they share an LSH band, so grouping stays linear in the number of files.
+
+    Args:
+        files (list[Content]): The repository files, in order.
+        min_similarity (float): The estimated similarity from which files are duplicates, 0 disabling
+                                the grouping.
+
+    Returns:
+        dict[str, str]: The path of every duplicate file, mapped to the path of the file it duplicates.
+    """
+    if not min_similarity:
+        return {}
+
+    duplicates: dict[str, str] = {}
+    originals: dict[bytes, str] = {}
+    buckets: dict[int, list[tuple[str, Fingerprint]]] = {}
+
+    for content in files:
+        file_fingerprint = fingerprint(content.file_content)
+        original = originals.get(file_fingerprint.digest)
+
+        bands = file_fingerprint.bands()
+        if original is None:
+            candidates = {
+                path: candidate for band in bands for path, candidate in buckets.get(band, ())
+            }
+            best = max(candidates.items(), key=lambda item: file_fingerprint.similarity(item[1]), default=None)
+            if best is not None and file_fingerprint.similarity(best[1]) >= min_similarity:
+                original = best[0]
+
+        if original is not None:
+            duplicates[content.filename] = original
+            continue
+
+        originals[file_fingerprint.digest] = content.filename
+        for band in bands:
+            buckets.setdefault(band, []).append((content.filename, file_fingerprint))
+
+    if duplicates:
+        logger.info(f"Found {len(duplicates)} duplicate files, each reviewed once")
+    return duplicates
+
+
+class BoilerplateIndex:
+    """
+    A persistent cross-repository index of file fingerprints recognizing framework boilerplate.
+
+    Every reviewed file is recorded with the repository it was found in; near-duplicates join the
+    fingerprint they resemble. A file whose fingerprint was found in at least min_repositories other
+    repositories is boilerplate and is not reviewed. Lookups go through the indexed LSH bands, so they
+    stay well under a millisecond with hundreds of thousands of fingerprints.
+
+    Attributes:
+        path (str): The path of the SQLite database file, ":memory:" for an index lost on restart.
+        min_repositories (int): The number of other repositories a file must be found in to be boilerplate.
+        min_similarity (float): The estimated similarity from which a file matches a stored fingerprint.
+    """
+
+    def __init__(self, path: str = ":memory:", min_repositories: int = 5, min_similarity: float = 0.9):
+        self.path = path
+        self.min_repositories = min_repositories
+        self.min_similarity = min_similarity
+
+        self.__lock = threading.Lock()
+        self.__connection = sqlite3.connect(path, check_same_thread=False, isolation_level=None, timeout=30)
+        self.__connection.execute("PRAGMA journal_mode=WAL")
+        self.__connection.execute("PRAGMA synchronous=NORMAL")
+        self.__connection.executescript(
+            "CREATE TABLE IF NOT EXISTS fingerprints ("
+            "id INTEGER PRIMARY KEY, digest BLOB NOT NULL UNIQUE, signature BLOB NOT NULL, "
+            "repositories INTEGER NOT NULL DEFAULT 0);"
+            "CREATE TABLE IF NOT EXISTS fingerprint_bands ("
+            "band INTEGER NOT NULL, fingerprint INTEGER NOT NULL, PRIMARY KEY (band, fingerprint)) WITHOUT ROWID;"
+            "CREATE TABLE IF NOT EXISTS fingerprint_repositories ("
+            "fingerprint INTEGER NOT NULL, repository TEXT NOT NULL, PRIMARY KEY (fingerprint, repository))"
+            " WITHOUT ROWID;"
+        )
+
+    @staticmethod
+    def __pack(signature: tuple[int, ...]) -> bytes:
+        """Serializes a signature."""
+        return b"".join(value.to_bytes(8, "big") for value in signature)
+
+    @staticmethod
+    def __unpack(data: bytes) -> tuple[int, ...]:
+        """Deserializes a signature."""
+        return tuple(int.from_bytes(data[index:index + 8], "big") for index in range(0, len(data), 8))
+
+    def __match(self, file_fingerprint: Fingerprint) -> tuple[int, int] | None:
+        """Finds the stored fingerprint matching a file, returning its id and repository count."""
+        row = self.__connection.execute(
+            "SELECT id, repositories FROM fingerprints WHERE digest = ?", (file_fingerprint.digest,)
+        ).fetchone()
+        if row is not None:
+            return row
+
+        bands = file_fingerprint.bands()
+        rows = self.__connection.execute(
+            "SELECT id, signature, repositories FROM fingerprints WHERE id IN ("
+            f"SELECT fingerprint FROM fingerprint_bands WHERE band IN ({', '.join('?' * len(bands))}))",
+            bands,
+        ).fetchall()
+        best, best_similarity = None, self.min_similarity
+        for fingerprint_id, signature, repositories in rows:
+            similarity = file_fingerprint.similarity(Fingerprint(digest=b"", signature=self.__unpack(signature)))
+            if similarity >= best_similarity:
+                best, best_similarity = (fingerprint_id, repositories), similarity
+        return best
+
+    def lookup(self, file_content: str) -> int:
+        """
+        Counts the repositories a file or a near-duplicate of it was found in.
+
+        Args:
+            file_content (str): The content of the file.
+
+        Returns:
+            int: The number of repositories, 0 for an unknown file.
+        """
+        with self.__lock:
+            match = self.__match(fingerprint(file_content))
+        return match[1] if match is not None else 0
+
+    def add(self, file_content: str, repository: str) -> int:
+        """
+        Records that a file was found in a repository.
+
+        Args:
+            file_content (str): The content of the file.
+            repository (str): The repository the file was found in.
+
+        Returns:
+            int: The number of other repositories the file or a near-duplicate of it was found in before.
+        """
+        file_fingerprint = fingerprint(file_content)
+        with self.__lock:
+            self.__connection.execute("BEGIN")
+            try:
+                repositories = self.__add(file_fingerprint, repository)
+                self.__connection.execute("COMMIT")
+            except BaseException:
+                self.__connection.execute("ROLLBACK")
+                raise
+        return repositories
+
+    def __add(self, file_fingerprint: Fingerprint, repository: str) -> int:
+        """Records a fingerprint within the current transaction, returning its count of other repositories."""
+        match = self.__match(file_fingerprint)
+        if match is None:
+            fingerprint_id = self.__connection.execute(
+                "INSERT INTO fingerprints (digest, signature) VALUES (?, ?)",
+                (file_fingerprint.digest, self.__pack(file_fingerprint.signature)),
+            ).lastrowid
+            self.__connection.executemany(
+                "INSERT OR IGNORE INTO fingerprint_bands (band, fingerprint) VALUES (?, ?)",
+                [(band, fingerprint_id) for band in file_fingerprint.bands()],
+            )
+            repositories = 0
+        else:
+            fingerprint_id, repositories = match
+
+        inserted = self.__connection.execute(
+            "INSERT OR IGNORE INTO fingerprint_repositories (fingerprint, repository) VALUES (?, ?)",
+            (fingerprint_id, repository),
+        ).rowcount
+        if not inserted:
+            return repositories - 1
+
+        self.__connection.execute(
+            "UPDATE fingerprints SET repositories = repositories + 1 WHERE id = ?", (fingerprint_id,)
+        )
+        return repositories
+
+    def apply(self, repo_files: RepoFilesResponse, repository: str) -> RepoFilesResponse:
+        """
+        Records the files of a repository and drops the ones that are known boilerplate.
+
+        Args:
+            repo_files (RepoFilesResponse): The files of the repository.
+            repository (str): The repository the files come from.
+
+        Returns:
+            RepoFilesResponse: The files to review, the boilerplate files being listed as skipped.
+        """
+        repository = repository.rstrip("/")
+        files: list[Content] = []
+        skipped = list(repo_files.skipped_files)
+        for content in repo_files.files:
+            if self.add(content.file_content, repository) >= self.min_repositories:
+                skipped.append(SkippedFile(filename=content.filename, reason="known boilerplate"))
+            else:
+                files.append(content)
+
+        if len(files) < len(repo_files.files):
+            logger.info(f"Skipped {len(repo_files.files) - len(files)} known boilerplate files")
+        return RepoFilesResponse(
+            files=files, count=len(files), commit_sha=repo_files.commit_sha, skipped_files=skipped
+        )
+
+    def close(self) -> None:
+        """Closes the database connection."""
+        with self.__lock:
+            self.__connection.close()
+
+
+def create_boilerplate_index() -> BoilerplateIndex | None:
+    """
+    Creates the boilerplate index configured through the environment.
+
+    BOILERPLATE_INDEX_BACKEND selects "memory", "sqlite" or "none" (default); BOILERPLATE_INDEX_PATH sets
+    the SQLite database file and BOILERPLATE_MIN_REPOSITORIES the number of other repositories a file
+    must be found in to be skipped as boilerplate.
+
+    Returns:
+        BoilerplateIndex | None: The configured index, or None if boilerplate is reviewed like any file.
+    """
+    backend = os.getenv("BOILERPLATE_INDEX_BACKEND", "none")
+    min_repositories = int(os.getenv("BOILERPLATE_MIN_REPOSITORIES", 5))
+
+    if backend == "none":
+        return None
+    if backend == "sqlite":
+        path = os.getenv("BOILERPLATE_INDEX_PATH", "boilerplate_index.sqlite3")
+        logger.info(f"Using SQLite boilerplate index at {path}")
+        return BoilerplateIndex(path, min_repositories=min_repositories)
+    if backend == "memory":
+        return BoilerplateIndex(min_repositories=min_repositories)
+
+    raise ValueError(f"Unknown boilerplate index backend: {backend}")
@@ -0,0 +1,500 @@
+import re
+import mmap
+import zlib
+import struct
+
+from pathlib import Path
+from typing import Callable, Iterator
+from collections import OrderedDict
+
+SHA_PATTERN = re.compile(r"[0-9a-fA-F]{40}")
+
+# The object types of a pack entry header, deltas excepted
+PACK_OBJECT_TYPES = {1: "commit", 2: "tree", 3: "blob", 4: "tag"}
+OFS_DELTA = 6
+REF_DELTA = 7
+
+PACK_INDEX_MAGIC = b"\377tOc"
+# Tree entry modes of the regular files, read as blobs; symlinks and submodules are skipped like in archives
+FILE_MODES = {b"100644", b"100755", b"100664", b"644"}
+TREE_MODE = b"40000"
+
+# The most bytes of delta bases kept decompressed per pack, like git's core.deltaBaseCacheLimit
+DELTA_BASE_CACHE_BYTES = 32 * 1024 * 1024
+# Compressed data read past the inflated size of an object, for zlib headers and incompressible blocks
+INFLATE_SLACK_BYTES = 1024
+
+
+class GitObjectError(Exception):
+    """Raised when a repository, a revision or an object cannot be read."""
+
+
+def apply_delta(base: bytes, delta: bytes) -> bytes:
+    """
+    Rebuilds an object from its delta base and a git delta of copy and insert instructions.
+
+    Args:
+        base (bytes): The content of the base object.
+        delta (bytes): The delta data.
+
+    Returns:
+        bytes: The content of the object.
+
+    Raises:
+        GitObjectError: If the delta does not apply to the base.
+    """
+    def size_at(position: int) -> tuple[int, int]:
+        """Reads a little-endian base-128 size."""
+        size = shift = 0
+        while True:
+            byte = delta[position]
+            position += 1
+            size |= (byte & 0x7f) << shift
+            shift += 7
+            if not byte & 0x80:
+                return size, position
+
+    source_size, position = size_at(0)
+    target_size, position = size_at(position)
+    if source_size != len(base):
+        raise GitObjectError(f"Delta expects a base of {source_size} bytes, got {len(base)}")
+
+    source = memoryview(base)
+    target = bytearray()
+    end = len(delta)
+    while position < end:
+        command = delta[position]
+        position += 1
+        if command & 0x80:
+            offset = size = 0
+            for index in range(4):
+                if command & (1 << index):
+                    offset |= delta[position] << (8 * index)
+                    position += 1
+            for index in range(3):
+                if command & (0x10 << index):
+                    size |= delta[position] << (8 * index)
+                    position += 1
+            target += source[offset:offset + (size or 0x10000)]
+        elif command:
+            target += delta[position:position + command]
+            position += command
+        else:
+            raise GitObjectError("Invalid delta instruction")
+
+    if len(target) != target_size:
+        raise GitObjectError(f"Delta produced {len(target)} bytes instead of {target_size}")
+    return bytes(target)
+
+
+class PackFile:
+    """
+    Reads the objects of a packfile through its version 2 index, both memory-mapped.
+
+    Objects are looked up by binary search in the index and decompressed only when read; delta
+    chains are resolved against a bounded cache of recently used bases.
+    """
+
+    def __init__(self, index_path: Path, read_base: Callable[[str], tuple[str, bytes]]):
+        """
+        Maps the index of a pack; the pack itself is mapped on the first read.
+
+        Args:
+            index_path (Path): The .idx file of the pack.
+            read_base (Callable[[str], tuple[str, bytes]]): Reads an object by SHA, for the bases of REF_DELTA
+                                                            entries stored elsewhere.
+
+        Raises:
+            GitObjectError: If the index is not a version 2 pack index.
+        """
+        self.path = index_path.with_suffix(".pack")
+        self.__read_base = read_base
+        self.__pack: mmap.mmap | None = None
+        self.__bases: OrderedDict[int, tuple[str, bytes]] = OrderedDict()
+        self.__bases_bytes = 0
+
+        with open(index_path, "rb") as file:
+            self.__index = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        if self.__index[:8] != PACK_INDEX_MAGIC + struct.pack(">I", 2):
+            self.close()
+            raise GitObjectError(f"{index_path.name} is not a version 2 pack index")
+        self.__fanout = struct.unpack_from(">256I", self.__index, 8)
+        count = self.__fanout[255]
+        self.__names = 8 + 256 * 4
+        self.__offsets = self.__names + count * 24
+        self.__large_offsets = self.__offsets + count * 4
+
+    def close(self) -> None:
+        """Unmaps the index and the pack."""
+        self.__index.close()
+        if self.__pack is not None:
+            self.__pack.close()
+        self.__bases.clear()
+
+    def offset(self, binary_sha: bytes) -> int | None:
+        """
+        Finds where an object is stored in the pack.
+
+        Args:
+            binary_sha (bytes): The 20-byte SHA of the object.
+
+        Returns:
+            int | None: The offset of the object in the pack, or None if the pack does not hold it.
+        """
+        first = binary_sha[0]
+        low = self.__fanout[first - 1] if first else 0
+        high = self.__fanout[first]
+        index = self.__index
+        while low < high:
+            middle = (low + high) // 2
+            start = self.__names + middle * 20
+            name = index[start:start + 20]
+            if name < binary_sha:
+                low = middle + 1
+            elif name > binary_sha:
+                high = middle
+            else:
+                offset = struct.unpack_from(">I", index, self.__offsets + middle * 4)[0]
+                if offset & 0x80000000:
+                    large = self.__large_offsets + (offset & 0x7fffffff) * 8
+                    offset = struct.unpack_from(">Q", index, large)[0]
+                return offset
+        return None
+
+    def read(self, offset: int) -> tuple[str, bytes]:
+        """
+        Reads the object stored at an offset, resolving its delta chain.
+
+        Args:
+            offset (int): The offset of the object in the pack.
+
+        Returns:
+            tuple[str, bytes]: The type of the object ("commit", "tree", "blob" or "tag") and its content.
+
+        Raises:
+            GitObjectError: If the pack is corrupt.
+        """
+        if self.__pack is None:
+            with open(self.path, "rb") as file:
+                self.__pack = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+
+        # Walk down the chain to a cached or whole base, then apply the deltas back up
+        deltas: list[tuple[int, int, int]] = []
+        while True:
+            cached = self.__bases.get(offset)
+            if cached is not None:
+                self.__bases.move_to_end(offset)
+                object_type, data = cached
+                break
+
+            type_number, size, position = self.__entry_header(offset)
+            if type_number == OFS_DELTA:
+                base_offset, position = self.__ofs_delta_base(position, offset)
+                deltas.append((offset, position, size))
+                offset = base_offset
+            elif type_number == REF_DELTA:
+                base_sha = self.__pack[position:position + 20].hex()
+                deltas.append((offset, position + 20, size))
+                # The base may be stored in another pack, so it is cached there rather than here
+                offset = None
+                object_type, data = self.__read_base(base_sha)
+                break
+            elif type_number in PACK_OBJECT_TYPES:
+                object_type, data = PACK_OBJECT_TYPES[type_number], self.__inflate(position, size)
+                break
+            else:
+                raise GitObjectError(f"Unknown object type {type_number} at offset {offset} of {self.path.name}")
+
+        for delta_offset, position, size in reversed(deltas):
+            if offset is not None:
+                self.__cache_base(offset, object_type, data)
+            data = apply_delta(data, self.__inflate(position, size))
+            offset = delta_offset
+        return object_type, data
+
+    def __entry_header(self, offset: int) -> tuple[int, int, int]:
+        """Reads the type and inflated size of the entry at an offset, and where its data starts."""
+        pack = self.__pack
+        byte = pack[offset]
+        type_number, size, shift = (byte >> 4) & 7, byte & 0x0f, 4
+        offset += 1
+        while byte & 0x80:
+            byte = pack[offset]
+            offset += 1
+            size |= (byte & 0x7f) << shift
+            shift += 7
+        return type_number, size, offset
+
+    def __ofs_delta_base(self, position: int, offset: int) -> tuple[int, int]:
+        """Reads the negative base offset of an OFS_DELTA entry, returning the base offset and the data start."""
+        pack = self.__pack
+        byte = pack[position]
+        position += 1
+        distance = byte & 0x7f
+        while byte & 0x80:
+            byte = pack[position]
+            position += 1
+            distance = ((distance + 1) << 7) | (byte & 0x7f)
+        return offset - distance, position
+
+    def __inflate(self, position: int, size: int) -> bytes:
+        """Decompresses the zlib stream of an entry, reading only as much of the pack as it needs."""
+        decompressor = zlib.decompressobj()
+        parts = []
+        window = size + INFLATE_SLACK_BYTES
+        while not decompressor.eof:
+            compressed = self.__pack[position:position + window]
+            if not compressed:
+                raise GitObjectError(f"Truncated object in {self.path.name}")
+            parts.append(decompressor.decompress(compressed))
+            position += len(compressed)
+        data = b"".join(parts)
+        if len(data) != size:
+            raise GitObjectError(f"Object of {len(data)} bytes instead of {size} in {self.path.name}")
+        return data
+
+    def __cache_base(self, offset: int, object_type: str, data: bytes) -> None:
+        """Keeps a delta base, evicting the least recently used ones beyond the cache size."""
+        if offset in self.__bases or len(data) > DELTA_BASE_CACHE_BYTES:
+            return
+        self.__bases[offset] = (object_type, data)
+        self.__bases_bytes += len(data)
+        while self.__bases_bytes > DELTA_BASE_CACHE_BYTES:
+            _, (_, evicted) = self.__bases.popitem(last=False)
+            self.__bases_bytes -= len(evicted)
+
+
+class GitRepository:
+    """
+    Reads commits, trees and blobs straight from the object database of a local clone, bare or not.
+
+    Objects are read from the packfiles and from the loose objects, including those of the alternate
+    object directories. Nothing is written to the repository and the git binary is not needed.
+    """
+
+    def __init__(self, path: str | Path):
+        """
+        Opens a repository.
+
+        Args:
+            path (str | Path): The working tree of a clone, its .git directory, or a bare repository.
+
+        Raises:
+            GitObjectError: If the path is not a git repository.
+        """
+        path = Path(path)
+        git_dir = path / ".git"
+        if git_dir.is_file():
+            content = git_dir.read_text().strip()
+            if not content.startswith("gitdir: "):
+                raise GitObjectError(f"{git_dir} does not point to a git directory")
+            git_dir = (path / content[len("gitdir: "):]).resolve()
+        elif not git_dir.is_dir():
+            git_dir = path
+        if not (git_dir / "HEAD").is_file():
+            raise GitObjectError(f"{path} is not a git repository")
+
+        # Linked worktrees share the objects and refs of the main repository
+        common_dir = git_dir / "commondir"
+        self.git_dir = git_dir
+        self.common_dir = (git_dir / common_dir.read_text().strip()).resolve() if common_dir.is_file() else git_dir
+        self.__object_dirs = self.__find_object_dirs(self.common_dir / "objects")
+        self.__packs: list[PackFile] | None = None
+        self.__packed_refs: dict[str, str] | None = None
+
+    def __enter__(self) -> "GitRepository":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+    def close(self) -> None:
+        """Unmaps the packfiles."""
+        for pack in self.__packs or []:
+            pack.close()
+        self.__packs = None
+
+    def resolve(self, revision: str | None = None) -> str:
+        """
+        Resolves a revision to the commit it designates, peeling annotated tags.
+
+        Args:
+            revision (str | None): A full commit SHA, a branch, a tag or a ref name, or None for HEAD.
+
+        Returns:
+            str: The commit SHA.
+
+        Raises:
+            GitObjectError: If the revision does not designate a commit of the repository.
+        """
+        revision = revision or "HEAD"
+        if SHA_PATTERN.fullmatch(revision):
+            sha = revision.lower()
+        else:
+            if ".." in revision or revision.startswith("/") or "\\" in revision:
+                raise GitObjectError(f"Invalid revision {revision}")
+            candidates = (revision, f"refs/{revision}", f"refs/tags/{revision}", f"refs/heads/{revision}",
+                          f"refs/remotes/{revision}", f"refs/remotes/{revision}/HEAD")
+            sha = next(filter(None, map(self.__read_ref, candidates)), None)
+            if sha is None:
+                raise GitObjectError(f"Unknown revision {revision}")
+
+        object_type, data = self.read_object(sha)
+        while object_type == "tag":
+            sha = data[len(b"object "):len(b"object ") + 40].decode()
+            object_type, data = self.read_object(sha)
+        if object_type != "commit":
+            raise GitObjectError(f"{revision} is a {object_type}, not a commit")
+        return sha
+
+    def commit_tree(self, commit_sha: str) -> str:
+        """
+        Reads the root tree of a commit.
+
+        Args:
+            commit_sha (str): The commit SHA.
+
+        Returns:
+            str: The SHA of its tree.
+
+        Raises:
+            GitObjectError: If the object is not a commit.
+        """
+        object_type, data = self.read_object(commit_sha)
+        if object_type != "commit" or not data.startswith(b"tree "):
+            raise GitObjectError(f"{commit_sha} is not a commit")
+        return data[len(b"tree "):len(b"tree ") + 40].decode()
+
+    def walk_tree(self, tree_sha: str, prefix: str = "") -> Iterator[tuple[str, str]]:
+        """
+        Lists the regular files of a tree and its subtrees, depth first in tree order.
+
+        Args:
+            tree_sha (str): The SHA of the tree.
+            prefix (str): The path of the tree in the repository, prepended to the file paths.
+
+        Yields:
+            tuple[str, str]: The path and the blob SHA of each file.
+
+        Raises:
+            GitObjectError: If the object is not a tree.
+        """
+        object_type, data = self.read_object(tree_sha)
+        if object_type != "tree":
+            raise GitObjectError(f"{tree_sha} is not a tree")
+
+        position, end = 0, len(data)
+        while position < end:
+            space = data.index(b" ", position)
+            nul = data.index(b"\0", space)
+            mode = data[position:space]
+            name = data[space + 1:nul].decode("utf-8", "surrogateescape")
+            sha = data[nul + 1:nul + 21].hex()
+            position = nul + 21
+            if mode == TREE_MODE:
+                yield from self.walk_tree(sha, f"{prefix}{name}/")
+            elif mode in FILE_MODES:
+                yield f"{prefix}{name}", sha
+
+    def read_blob(self, sha: str) -> bytes:
+        """
+        Reads the content of a file.
+
+        Args:
+            sha (str): The blob SHA.
+
+        Returns:
+            bytes: The content.
+
+        Raises:
+            GitObjectError: If the object is missing or is not a blob.
+        """
+        object_type, data = self.read_object(sha)
+        if object_type != "blob":
+            raise GitObjectError(f"{sha} is a {object_type}, not a blob")
+        return data
+
+    def read_object(self, sha: str) -> tuple[str, bytes]:
+        """
+        Reads an object from the packfiles or the loose objects.
+
+        Args:
+            sha (str): The SHA of the object.
+
+        Returns:
+            tuple[str, bytes]: The type of the object ("commit", "tree", "blob" or "tag") and its content.
+
+        Raises:
+            GitObjectError: If the repository does not hold the object.
+        """
+        binary_sha = bytes.fromhex(sha)
+        for pack in self.__open_packs():
+            offset = pack.offset(binary_sha)
+            if offset is not None:
+                return pack.read(offset)
+
+        for object_dir in self.__object_dirs:
+            path = object_dir / sha[:2] / sha[2:]
+            try:
+                data = zlib.decompress(path.read_bytes())
+            except FileNotFoundError:
+                continue
+            except zlib.error as e:
+                raise GitObjectError(f"Corrupt loose object {sha}: {e}")
+            header, _, content = data.partition(b"\0")
+            object_type, _, size = header.decode().partition(" ")
+            if int(size) != len(content):
+                raise GitObjectError(f"Loose object {sha} has {len(content)} bytes instead of {size}")
+            return object_type, content
+        raise GitObjectError(f"Object {sha} not found")
+
+    def __open_packs(self) -> list[PackFile]:
+        """Maps the indexes of the packfiles, the most recent first, on the first object read."""
+        if self.__packs is None:
+            indexes = [
+                index for object_dir in self.__object_dirs for index in (object_dir / "pack").glob("pack-*.idx")
+                if index.with_suffix(".pack").is_file()
+            ]
+            indexes.sort(key=lambda index: index.stat().st_mtime, reverse=True)
+            self.__packs = [PackFile(index, self.read_object) for index in indexes]
+        return self.__packs
+
+    def __read_ref(self, name: str, depth: int = 0) -> str | None:
+        """Reads a loose or packed ref, following symbolic refs."""
+        if depth > 5:
+            raise GitObjectError(f"Symbolic ref loop at {name}")
+        # HEAD and the other per-worktree refs live in the git directory, the branches and tags in the common one
+        for directory in dict.fromkeys((self.git_dir, self.common_dir)):
+            path = directory / name
+            if path.is_file():
+                content = path.read_text().strip()
+                if content.startswith("ref: "):
+                    return self.__read_ref(content[len("ref: "):], depth + 1)
+                return content.lower() if SHA_PATTERN.fullmatch(content) else None
+
+        if self.__packed_refs is None:
+            self.__packed_refs = {}
+            packed_refs = self.common_dir / "packed-refs"
+            if packed_refs.is_file():
+                for line in packed_refs.read_text().splitlines():
+                    if line and line[0] not in "#^":
+                        sha, _, ref_name = line.partition(" ")
+                        self.__packed_refs[ref_name] = sha
+        return self.__packed_refs.get(name)
+
+    @staticmethod
+    def __find_object_dirs(objects: Path) -> list[Path]:
+        """Lists the object directory and its alternates, as found in objects/info/alternates."""
+        object_dirs, pending = [], [objects]
+        while pending:
+            object_dir = pending.pop(0).resolve()
+            if object_dir in object_dirs or not object_dir.is_dir():
+                continue
+            object_dirs.append(object_dir)
+            alternates = object_dir / "info" / "alternates"
+            if alternates.is_file():
+                pending += [
+                    object_dir / line.strip() for line in alternates.read_text().splitlines()
+                    if line.strip() and not line.startswith("#")
+                ]
+        return object_dirs
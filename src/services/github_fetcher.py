@@ -1,19 +1,33 @@
 import os
+import sys
+import time
+import zlib
 import httpx
 import asyncio
+import tarfile
+
+from typing import Iterator
 
 from loguru import logger
 from dotenv import load_dotenv
 from fastapi import HTTPException
 
-from src.services.data_structures import RepoFilesResponse, Content
+from src.services.file_filter import FileFilter, blob_priority
+from src.services.content_spool import ContentSpool
+from src.services.metrics import current_trace, observe_stage, timed_stage
+from src.services.data_structures import RepoFilesResponse, Content, FetchMode, SkippedFile
+from src.services.repo_cache import RepositoryCache, git_blob_sha
+from src.services.git_objects import GitObjectError
+from src.services.repo_sources import find_repository_source
+from src.services.github_http import GitHubRateLimitError, GitHubUnavailableError, github_rate_limit
+from src.services.http_clients import HTTPClientSettings, create_github_client
 
 logger.remove()
 logger.add(sink=lambda msg: print(msg, end=""), colorize=True)
 
 load_dotenv()
 
-GITHUB_API_URL = "https://api.github.com"
+GITHUB_API_URL = os.getenv("GITHUB_API_URL", "https://api.github.com")
 
 GITHUB_TOKEN = os.getenv('GITHUB_ACCESS_TOKEN')
 HEADERS = {
@@ -21,14 +35,560 @@ HEADERS = {
     "Accept": "application/vnd.github.v3+json"
 }
 
+TAR_BLOCK_SIZE = 512
+# The most archive data decompressed at once, however well the chunk received compresses
+INFLATE_CHUNK_BYTES = 1024 * 1024
+
+
+class ArchiveFetchError(Exception):
+    """Raised when the repository archive cannot be downloaded or read."""
 
-async def get_repository_files(repo_url: str) -> RepoFilesResponse:
+
+class TarballStreamReader:
     """
-    Fetches files from a specified GitHub repository using the GitHub API.
+    Incrementally decompresses a gzipped tarball and extracts its regular files.
+
+    Data is fed chunk by chunk as it arrives from the network, so the archive is never
+    written to disk and only the member currently being read is held in memory.
+
+    Attributes:
+        commit_sha (str | None): The commit SHA stored by GitHub in the global pax header.
+    """
+
+    def __init__(self):
+        self.__inflater = zlib.decompressobj(16 + zlib.MAX_WBITS)
+        self.__buffer = bytearray()
+        self.__member: tarfile.TarInfo | None = None
+        self.__long_name: str | None = None
+        self.__finished = False
+
+        self.commit_sha: str | None = None
+
+    def feed(self, data: bytes) -> Iterator[tuple[str, bytes]]:
+        """
+        Consumes a chunk of the compressed archive.
+
+        The chunk is decompressed at most INFLATE_CHUNK_BYTES at a time and the files are yielded as
+        they are completed, so a chunk that compresses well never expands in memory all at once.
+
+        Args:
+            data (bytes): The next chunk of the gzipped tarball.
+
+        Yields:
+            tuple[str, bytes]: The regular files completed by this chunk, as (path, data) pairs.
+
+        Raises:
+            ArchiveFetchError: If the archive is corrupted.
+        """
+        while not self.__finished:
+            try:
+                self.__buffer += self.__inflater.decompress(data, INFLATE_CHUNK_BYTES)
+            except zlib.error as ex:
+                raise ArchiveFetchError(f"Corrupted archive: {ex}") from ex
+
+            yield from self.__read_members()
+            data = self.__inflater.unconsumed_tail
+            if not data:
+                return
+
+    def close(self) -> None:
+        """
+        Verifies that the whole archive has been consumed.
+
+        Raises:
+            ArchiveFetchError: If the archive ended before its end-of-archive marker.
+        """
+        if not self.__finished:
+            raise ArchiveFetchError("Archive ended unexpectedly")
+
+    def __read_members(self) -> list[tuple[str, bytes]]:
+        """Parses every complete header and member body currently buffered."""
+        files = []
+
+        while not self.__finished:
+            if self.__member is None:
+                if len(self.__buffer) < TAR_BLOCK_SIZE:
+                    break
+
+                header = bytes(self.__buffer[:TAR_BLOCK_SIZE])
+                del self.__buffer[:TAR_BLOCK_SIZE]
+
+                if header == bytes(TAR_BLOCK_SIZE):
+                    self.__finished = True
+                    break
+
+                try:
+                    self.__member = tarfile.TarInfo.frombuf(header, "utf-8", "surrogateescape")
+                except tarfile.HeaderError as ex:
+                    raise ArchiveFetchError(f"Invalid archive header: {ex}") from ex
+                continue
+
+            padded_size = -(-self.__member.size // TAR_BLOCK_SIZE) * TAR_BLOCK_SIZE
+            if len(self.__buffer) < padded_size:
+                break
+
+            payload = bytes(self.__buffer[:self.__member.size])
+            del self.__buffer[:padded_size]
+
+            member, self.__member = self.__member, None
+            entry = self.__handle_member(member, payload)
+            if entry is not None:
+                files.append(entry)
+
+        return files
+
+    def __handle_member(self, member: tarfile.TarInfo, payload: bytes) -> tuple[str, bytes] | None:
+        """Interprets a member, returning (path, data) for regular files and tracking metadata otherwise."""
+        if member.type == tarfile.XGLTYPE:
+            self.commit_sha = self.__parse_pax_records(payload).get("comment", self.commit_sha)
+            return None
+
+        if member.type == tarfile.XHDTYPE:
+            self.__long_name = self.__parse_pax_records(payload).get("path")
+            return None
+
+        if member.type == tarfile.GNUTYPE_LONGNAME:
+            self.__long_name = payload.rstrip(b"\0").decode("utf-8", "surrogateescape")
+            return None
+
+        name, self.__long_name = self.__long_name or member.name, None
+        if member.type not in tarfile.REGULAR_TYPES:
+            return None
+
+        # GitHub archives wrap everything into a single "<owner>-<repo>-<sha>/" directory
+        _, _, path = name.partition("/")
+        if not path:
+            return None
+
+        return path, payload
+
+    @staticmethod
+    def __parse_pax_records(payload: bytes) -> dict[str, str]:
+        """Parses the "<length> <key>=<value>\\n" records of a pax header."""
+        records = {}
+        position = 0
+
+        while position < len(payload):
+            length, _, _ = payload[position:].partition(b" ")
+            if not length.isdigit():
+                break
+
+            record = payload[position:position + int(length)]
+            key, _, value = record.split(b" ", 1)[1].rstrip(b"\n").partition(b"=")
+            records[key.decode("utf-8")] = value.decode("utf-8", "surrogateescape")
+            position += int(length)
+
+        return records
+
+
+def make_content(filename: str, data: bytes, sha: str, spool: ContentSpool | None = None) -> Content:
+    """
+    Builds the Content of a downloaded file.
+
+    Args:
+        filename (str): The path of the file in the repository.
+        data (bytes): The raw content of the file.
+        sha (str): The blob SHA of the file.
+        spool (ContentSpool | None): The spool holding the contents of the request; the content is
+                                     decoded into a string if omitted.
+
+    Returns:
+        Content: The file.
+    """
+    file_content = spool.store(data) if spool is not None else data.decode("utf-8", "replace")
+    return Content(filename=filename, file_content=file_content, sha=sha)
+
+
+async def fetch_archive_files(
+        client: httpx.AsyncClient,
+        owner: str,
+        repo_name: str,
+        ref: str | None = None,
+        file_filter: FileFilter | None = None,
+        spool: ContentSpool | None = None,
+) -> RepoFilesResponse:
+    """
+    Downloads the repository tarball in a single request and builds the file list from its entries.
+
+    Args:
+        client (httpx.AsyncClient): The HTTPX client used for the request.
+        owner (str): The owner of the repository.
+        repo_name (str): The name of the repository.
+        ref (str | None): The commit or branch to download, or None for the default branch.
+        file_filter (FileFilter | None): The filter whose skipped files are dropped without being decoded.
+        spool (ContentSpool | None): The spool holding the file contents within the request memory budget.
+
+    Returns:
+        RepoFilesResponse: The files contained in the archive.
+
+    Raises:
+        ArchiveFetchError: If the archive cannot be downloaded or read.
+    """
+    api_url = f"{GITHUB_API_URL}/repos/{owner}/{repo_name}/tarball" + (f"/{ref}" if ref else "")
+    reader = TarballStreamReader()
+    file_contents: list[Content] = []
+    skipped_files: list[SkippedFile] = []
+
+    # The time spent extracting files, as opposed to waiting for the download
+    extract_seconds = 0.0
+    async with client.stream("GET", api_url, headers=HEADERS, follow_redirects=True) as response:
+        if response.status_code != 200:
+            raise ArchiveFetchError(f"Failed to download repository archive: {response.status_code}")
+
+        async for chunk in response.aiter_bytes():
+            started = time.perf_counter()
+            for path, data in reader.feed(chunk):
+                reason = file_filter.check_path(path, len(data)) if file_filter is not None else None
+                if reason is not None:
+                    skipped_files.append(SkippedFile(filename=path, reason=reason))
+                    continue
+
+                logger.debug(f"Extracted file: {path}")
+                file_contents.append(make_content(path, data, git_blob_sha(data), spool))
+            extract_seconds += time.perf_counter() - started
+
+    reader.close()
+    observe_stage("archive_extract", extract_seconds)
+    logger.debug(f"Archive of commit {reader.commit_sha} contained {len(file_contents)} files")
+    return RepoFilesResponse(
+        files=file_contents, count=len(file_contents), commit_sha=reader.commit_sha, skipped_files=skipped_files
+    )
+
+
+async def resolve_head_sha(client: httpx.AsyncClient, owner: str, repo_name: str, ref: str = "HEAD") -> str:
+    """
+    Resolves a branch, tag or HEAD reference to a commit SHA.
+
+    Args:
+        client (httpx.AsyncClient): The HTTPX client used for the request.
+        owner (str): The owner of the repository.
+        repo_name (str): The name of the repository.
+        ref (str): The reference to resolve (default is "HEAD").
+
+    Returns:
+        str: The commit SHA the reference points to.
+
+    Raises:
+        HTTPException: If the reference cannot be resolved.
+    """
+    api_url = f"{GITHUB_API_URL}/repos/{owner}/{repo_name}/commits/{ref}"
+    response = await client.get(api_url, headers={**HEADERS, "Accept": "application/vnd.github.sha"})
+    if response.status_code != 200:
+        logger.error(f"Failed to resolve {ref} of {owner}/{repo_name}: {response.status_code}")
+        raise HTTPException(status_code=404, detail="Failed to fetch repository files")
+
+    return response.text.strip()
+
+
+async def list_repository_tree(client: httpx.AsyncClient, owner: str, repo_name: str, commit_sha: str) -> list[dict]:
+    """
+    Lists every blob of a commit with a single recursive Git Trees API call.
+
+    Args:
+        client (httpx.AsyncClient): The HTTPX client used for the request.
+        owner (str): The owner of the repository.
+        repo_name (str): The name of the repository.
+        commit_sha (str): The commit whose tree is listed.
+
+    Returns:
+        list[dict]: The blob entries of the tree, each with "path", "sha" and "size" keys.
+
+    Raises:
+        HTTPException: If the tree cannot be listed.
+    """
+    api_url = f"{GITHUB_API_URL}/repos/{owner}/{repo_name}/git/trees/{commit_sha}"
+    with timed_stage("tree_walk"):
+        response = await client.get(api_url, headers=HEADERS, params={"recursive": "1"})
+        if response.status_code != 200:
+            logger.error(f"Failed to fetch repository tree: {response.status_code}")
+            raise HTTPException(status_code=404, detail="Failed to fetch repository files")
+
+        tree = response.json()
+    if tree.get("truncated"):
+        logger.warning(f"Tree of {owner}/{repo_name}@{commit_sha} is truncated, some files will be missing")
+
+    return [entry for entry in tree["tree"] if entry["type"] == "blob"]
+
+
+async def fetch_blobs(
+        client: httpx.AsyncClient,
+        owner: str,
+        repo_name: str,
+        entries: list[dict],
+        max_concurrency: int = 8,
+        prioritize_source: bool = True,
+        spool: ContentSpool | None = None,
+) -> list[Content]:
+    """
+    Downloads blobs through the Git Blobs API with a bounded number of requests in flight.
+
+    Args:
+        client (httpx.AsyncClient): The HTTPX client used for the requests.
+        owner (str): The owner of the repository.
+        repo_name (str): The name of the repository.
+        entries (list[dict]): The tree entries to download.
+        max_concurrency (int): The maximum number of downloads in flight.
+        prioritize_source (bool): Whether source files are scheduled before other files.
+        spool (ContentSpool | None): The spool holding the file contents within the request memory budget.
+
+    Returns:
+        list[Content]: The downloaded files in scheduling order; blobs that failed to download are skipped.
+    """
+    if prioritize_source:
+        entries = sorted(entries, key=lambda entry: (blob_priority(entry["path"]), entry["path"]))
+
+    semaphore = asyncio.Semaphore(max_concurrency)
+    headers = {**HEADERS, "Accept": "application/vnd.github.raw"}
+
+    async def fetch_blob(entry: dict) -> Content | None:
+        """Fetch a single blob once a concurrency slot is free."""
+        async with semaphore:
+            try:
+                logger.debug(f"Fetching file: {entry['path']}")
+                api_url = f"{GITHUB_API_URL}/repos/{owner}/{repo_name}/git/blobs/{entry['sha']}"
+                blob_response = await client.get(api_url, headers=headers)
+                if blob_response.status_code != 200:
+                    logger.error(f"Failed to fetch file {entry['path']}: {blob_response.status_code}")
+                    return None
+                return make_content(entry["path"], blob_response.content, entry["sha"], spool)
+            except httpx.HTTPError as ex:
+                logger.error(f"Error fetching file {entry['path']}: {ex}")
+                return None
+
+    # Semaphore waiters are woken in FIFO order, so downloads start in the order tasks are created
+    results = await asyncio.gather(*(fetch_blob(entry) for entry in entries))
+    return [content for content in results if content is not None]
+
+
+async def fetch_files_per_file(
+        client: httpx.AsyncClient,
+        owner: str,
+        repo_name: str,
+        max_concurrency: int = 8,
+        prioritize_source: bool = True,
+        file_filter: FileFilter | None = None,
+        spool: ContentSpool | None = None,
+        ref: str | None = None,
+) -> RepoFilesResponse:
+    """
+    Lists the repository tree once and downloads every file separately.
+
+    Args:
+        client (httpx.AsyncClient): The HTTPX client used for the requests.
+        owner (str): The owner of the repository.
+        repo_name (str): The name of the repository.
+        max_concurrency (int): The maximum number of blob downloads in flight.
+        prioritize_source (bool): Whether source files are downloaded before other files.
+        file_filter (FileFilter | None): The filter whose skipped files are not downloaded.
+        spool (ContentSpool | None): The spool holding the file contents within the request memory budget.
+        ref (str | None): The commit or branch to fetch, or None for the default branch.
+
+    Returns:
+        RepoFilesResponse: The files retrieved from the repository.
+
+    Raises:
+        HTTPException: If the repository tree cannot be listed.
+    """
+    commit_sha = await resolve_head_sha(client, owner, repo_name, ref or "HEAD")
+    entries = await list_repository_tree(client, owner, repo_name, commit_sha)
+    logger.debug(f"Tree of commit {commit_sha} lists {len(entries)} files")
+
+    skipped_files: list[SkippedFile] = []
+    if file_filter is not None:
+        entries, skipped_files = file_filter.partition_entries(entries)
+
+    file_contents = await fetch_blobs(client, owner, repo_name, entries, max_concurrency, prioritize_source, spool)
+    return RepoFilesResponse(
+        files=file_contents, count=len(file_contents), commit_sha=commit_sha, skipped_files=skipped_files
+    )
+
+
+async def fetch_files_cached(
+        client: httpx.AsyncClient,
+        owner: str,
+        repo_name: str,
+        cache: RepositoryCache,
+        fetch_mode: FetchMode = FetchMode.archive,
+        max_concurrency: int = 8,
+        prioritize_source: bool = True,
+        file_filter: FileFilter | None = None,
+        spool: ContentSpool | None = None,
+        ref: str | None = None,
+) -> RepoFilesResponse:
+    """
+    Fetches the repository files through the content-addressed cache.
+
+    HEAD is resolved first; a commit whose tree and blobs are all cached is served without further
+    requests. Otherwise only the blobs missing from the cache are downloaded, or the whole archive
+    when most of them are missing and archive mode is requested.
+
+    Args:
+        client (httpx.AsyncClient): The HTTPX client used for the requests.
+        owner (str): The owner of the repository.
+        repo_name (str): The name of the repository.
+        cache (RepositoryCache): The cache holding previously fetched trees and blobs.
+        fetch_mode (FetchMode): The strategy used to download the missing files.
+        max_concurrency (int): The maximum number of blob downloads in flight.
+        prioritize_source (bool): Whether source files are listed and downloaded before other files.
+        file_filter (FileFilter | None): The filter whose skipped files are neither looked up nor downloaded.
+        spool (ContentSpool | None): The spool holding the file contents within the request memory budget.
+        ref (str | None): The commit or branch to fetch, or None for the default branch.
+
+    Returns:
+        RepoFilesResponse: The files of the repository at its current HEAD, or at ref.
+
+    Raises:
+        HTTPException: If HEAD or the repository tree cannot be retrieved.
+    """
+    commit_sha = await resolve_head_sha(client, owner, repo_name, ref or "HEAD")
+
+    entries = cache.get_tree(owner, repo_name, commit_sha)
+    if entries is None:
+        entries = await list_repository_tree(client, owner, repo_name, commit_sha)
+        cache.put_tree(owner, repo_name, commit_sha, entries)
+
+    skipped_files: list[SkippedFile] = []
+    if file_filter is not None:
+        entries, skipped_files = file_filter.partition_entries(entries)
+
+    if prioritize_source:
+        entries = sorted(entries, key=lambda entry: (blob_priority(entry["path"]), entry["path"]))
+
+    files_by_path, missing = cache.lookup(entries, spool)
+    logger.debug(f"Cache holds {len(files_by_path)}/{len(entries)} files of {owner}/{repo_name}@{commit_sha}")
+
+    # The blobs are cached as downloaded, so without a request spool they are held by an in-memory one
+    # until they are stored, rather than decoded first
+    fetch_spool = spool if spool is not None else ContentSpool(max_memory_bytes=sys.maxsize, spill_bytes=sys.maxsize)
+    fetched: list[Content] = []
+    if missing and fetch_mode == FetchMode.archive and len(missing) * 2 > len(entries):
+        try:
+            fetched = (
+                await fetch_archive_files(client, owner, repo_name, commit_sha, file_filter, fetch_spool)
+            ).files
+            missing = []
+        except (ArchiveFetchError, httpx.HTTPError) as ex:
+            logger.warning(f"Archive download failed, falling back to per-file fetching: {ex}")
+
+    if missing:
+        fetched = await fetch_blobs(
+            client, owner, repo_name, missing, max_concurrency, prioritize_source=False, spool=fetch_spool
+        )
+
+    for content in fetched:
+        data = content.read_bytes()
+        cache.put_blob(content.sha, data)
+        if spool is None:
+            content = make_content(content.filename, data, content.sha)
+        files_by_path.setdefault(content.filename, content)
+
+    file_contents = [files_by_path[entry["path"]] for entry in entries if entry["path"] in files_by_path]
+    return RepoFilesResponse(
+        files=file_contents, count=len(file_contents), commit_sha=commit_sha, skipped_files=skipped_files
+    )
+
+
+def parse_repository_url(repo_url: str) -> tuple[str, str]:
+    """
+    Extracts the owner and the name of a repository from its GitHub URL.
 
     Args:
         repo_url (str): The URL of the GitHub repository.
 
+    Returns:
+        tuple[str, str]: The owner and the name of the repository.
+
+    Raises:
+        HTTPException: If the URL is not a GitHub repository URL.
+    """
+    parts = repo_url.split("/")
+    if len(parts) < 5 or parts[2] != "github.com":
+        raise HTTPException(status_code=404, detail="Invalid GitHub repository URL")
+    return parts[3], parts[4]
+
+
+async def resolve_repository_commit(repo_url: str, client: httpx.AsyncClient | None = None) -> str:
+    """
+    Resolves the commit the default branch of a repository points to.
+
+    Repositories with a local clone are resolved from it, the others through the GitHub API.
+
+    Args:
+        repo_url (str): The URL of the GitHub repository, or of a local clone.
+        client (httpx.AsyncClient | None): The HTTPX client to use; a temporary one is created if omitted.
+
+    Returns:
+        str: The commit SHA.
+
+    Raises:
+        HTTPException: If the repository URL is invalid, its default branch cannot be resolved or GitHub is
+                       rate limited or unavailable.
+    """
+    try:
+        source = find_repository_source(repo_url)
+        if source is not None:
+            return await source.resolve_commit()
+
+        owner, repo_name = parse_repository_url(repo_url)
+        if client is None:
+            async with create_github_client() as own_client:
+                return await resolve_head_sha(own_client, owner, repo_name)
+        return await resolve_head_sha(client, owner, repo_name)
+
+    except ValueError as ve:
+        logger.error(f"Validation error: {ve}")
+        raise HTTPException(status_code=400, detail=str(ve))
+
+    except GitHubRateLimitError as rle:
+        logger.error(f"Rate limit error: {rle}")
+        raise HTTPException(status_code=429, detail="GitHub rate limit exceeded. Please try again later.")
+
+    except GitHubUnavailableError as gue:
+        logger.error(f"GitHub unavailable: {gue}")
+        raise HTTPException(status_code=502, detail="GitHub is unavailable. Please try again later.")
+
+    except GitObjectError as goe:
+        logger.error(f"Local repository error: {goe}")
+        raise HTTPException(status_code=404, detail="Failed to fetch repository files")
+
+    except Exception as ex:
+        logger.error(f"Error: {ex}")
+        raise HTTPException(status_code=404, detail="Failed to fetch repository files")
+
+
+async def get_repository_files(
+        repo_url: str,
+        fetch_mode: FetchMode = FetchMode.archive,
+        client: httpx.AsyncClient | None = None,
+        max_concurrency: int = 8,
+        prioritize_source: bool = True,
+        cache: RepositoryCache | None = None,
+        file_filter: FileFilter | None = None,
+        spool: ContentSpool | None = None,
+        ref: str | None = None,
+) -> RepoFilesResponse:
+    """
+    Fetches files from a specified GitHub repository using the GitHub API.
+
+    In archive mode the repository tarball is downloaded once and streamed; if that fails,
+    the tree is listed and the files are fetched one by one instead. With a cache, only the
+    files changed since a previously fetched commit are downloaded. Repositories claimed by
+    another source, such as a local clone under LOCAL_GIT_ROOTS, are read from it instead and
+    the GitHub options are ignored.
+
+    Args:
+        repo_url (str): The URL of the GitHub repository, or of a local clone.
+        fetch_mode (FetchMode): The strategy used to download the repository files.
+        client (httpx.AsyncClient | None): The HTTPX client to use; a temporary one is created if omitted.
+        max_concurrency (int): The maximum number of blob downloads in flight in per-file mode.
+        prioritize_source (bool): Whether source files are downloaded before other files in per-file mode.
+        cache (RepositoryCache | None): The repository cache to serve and store files, or None to bypass it.
+        file_filter (FileFilter | None): The filter selecting the files to review; skipped files are not
+                                         downloaded when possible and are listed in the response.
+        spool (ContentSpool | None): The spool holding the file contents within the request memory budget;
+                                     every content is kept in memory as a string if omitted.
+        ref (str | None): The commit or branch to fetch, or None for the default branch.
+
     Returns:
         RepoFilesResponse: A response object containing the list of files and their count.
 
@@ -38,85 +598,90 @@ async def get_repository_files(repo_url: str) -> RepoFilesResponse:
     try:
         logger.info(f"Fetching files from repository: {repo_url}")
 
-        # Extract owner and repository name from URL
-        parts = repo_url.split("/")
-        if len(parts) < 5 or parts[2] != "github.com":
-            raise HTTPException(status_code=404, detail="Invalid GitHub repository URL")
-
-        owner = parts[3]
-        repo_name = parts[4]
-        logger.debug(f"Owner: {owner}, Repository: {repo_name}")
-
-        # Fetch repository contents from GitHub API
-        api_url = f"{GITHUB_API_URL}/repos/{owner}/{repo_name}/contents"
-        async with httpx.AsyncClient() as client:
-            response = await client.get(api_url, headers=HEADERS)
-            if response.status_code != 200:
-                logger.error(f"Failed to fetch repository contents: {response.status_code}")
-                raise HTTPException(status_code=404, detail="Failed to fetch repository files")
-
-            root_contents = response.json()
-
-        file_contents: list[Content] = []
-
-        async def get_files_in_directory(contents, client, current_path="", depth=0, max_depth=100):
-            """
-            Recursive function to traverse repository directories with depth control.
-
-            Args:
-                contents: The contents of the current directory.
-                client: Shared HTTPX client for making requests.
-                current_path (str): The path of the current directory being traversed.
-                depth (int): The current depth of recursion.
-                max_depth (int): The maximum allowed recursion depth.
-            """
-            if depth > max_depth:
-                logger.error(f"Maximum recursion depth {max_depth} reached at {current_path}")
-                return
+        source = find_repository_source(repo_url)
+        if source is None:
+            owner, repo_name = parse_repository_url(repo_url)
+            logger.debug(f"Owner: {owner}, Repository: {repo_name}")
+        else:
+            repo_name = repo_url.rstrip("/").rsplit("/", 1)[-1]
 
-            tasks = []
-            for content in contents:
-                if content["type"] == "dir":
-                    logger.debug(f"Traversing directory: {content['path']}")
-                    tasks.append(fetch_directory_content(content["url"], client, current_path, depth, max_depth))
-                else:
-                    tasks.append(fetch_file_content(content, client, current_path))
-
-            await asyncio.gather(*tasks)
-
-        async def fetch_directory_content(url, client, current_path, depth, max_depth):
-            """Fetch contents of a directory and recursively call get_files_in_directory."""
-            dir_response = await client.get(url, headers=HEADERS)
-            if dir_response.status_code != 200:
-                logger.error(f"Failed to fetch directory contents: {dir_response.status_code}")
-                return
-            dir_contents = dir_response.json()
-            await get_files_in_directory(dir_contents, client, current_path, depth + 1, max_depth)
+        with timed_stage("fetch"):
+            if source is not None:
+                repo_files = await source.fetch_files(ref, file_filter, spool)
+            elif client is None:
+                settings = HTTPClientSettings(
+                    max_connections=max_concurrency, max_keepalive_connections=max_concurrency
+                )
+                async with create_github_client(settings) as own_client:
+                    repo_files = await _fetch_files(
+                        own_client, owner, repo_name, fetch_mode, max_concurrency, prioritize_source, cache,
+                        file_filter, spool, ref,
+                    )
+            else:
+                repo_files = await _fetch_files(
+                    client, owner, repo_name, fetch_mode, max_concurrency, prioritize_source, cache, file_filter,
+                    spool, ref,
+                )
 
-        async def fetch_file_content(content, client, current_path):
-            """Fetch the content of a file and append it to file_contents."""
-            try:
-                full_path = current_path + content["name"]
-                logger.debug(f"Fetching file: {full_path}")
-                file_response = await client.get(content["download_url"], headers=HEADERS)
-                if file_response.status_code != 200:
-                    logger.error(f"Failed to fetch file: {file_response.status_code}")
-                    return
-                file_contents.append(Content(filename=full_path, file_content=file_response.text))
-            except Exception as ex:
-                logger.error(f"Error fetching file {content['path']}: {ex}")
-
-        # Recursively fetch files starting from the root directory
-        async with httpx.AsyncClient() as client:
-            await get_files_in_directory(root_contents, client)
-
-        logger.info(f"Retrieved {len(file_contents)} files from repository {repo_name}")
-        return RepoFilesResponse(files=file_contents, count=len(file_contents))
+        if file_filter is not None:
+            with timed_stage("filter"):
+                repo_files = await asyncio.to_thread(file_filter.apply, repo_files)
+
+        trace = current_trace()
+        if trace is not None:
+            trace.add("files", repo_files.count)
+
+        logger.info(f"Retrieved {repo_files.count} files from repository {repo_name}")
+        if cache is not None:
+            logger.debug(f"Repository cache stats: {cache.stats}, full hits: {cache.full_hits}")
+        logger.debug(f"GitHub quota: {github_rate_limit.remaining}/{github_rate_limit.limit} requests remaining")
+        return repo_files
 
     except ValueError as ve:
         logger.error(f"Validation error: {ve}")
         raise HTTPException(status_code=400, detail=str(ve))
 
+    except GitHubRateLimitError as rle:
+        logger.error(f"Rate limit error: {rle}")
+        raise HTTPException(status_code=429, detail="GitHub rate limit exceeded. Please try again later.")
+
+    except GitHubUnavailableError as gue:
+        logger.error(f"GitHub unavailable: {gue}")
+        raise HTTPException(status_code=502, detail="GitHub is unavailable. Please try again later.")
+
+    except GitObjectError as goe:
+        logger.error(f"Local repository error: {goe}")
+        raise HTTPException(status_code=404, detail="Failed to fetch repository files")
+
     except Exception as ex:
         logger.error(f"Error: {ex}")
         raise HTTPException(status_code=404, detail="Failed to fetch repository files")
+
+
+async def _fetch_files(
+        client: httpx.AsyncClient,
+        owner: str,
+        repo_name: str,
+        fetch_mode: FetchMode,
+        max_concurrency: int,
+        prioritize_source: bool,
+        cache: RepositoryCache | None,
+        file_filter: FileFilter | None = None,
+        spool: ContentSpool | None = None,
+        ref: str | None = None,
+) -> RepoFilesResponse:
+    """Fetches the repository files with the requested mode, falling back to per-file requests."""
+    if cache is not None:
+        return await fetch_files_cached(
+            client, owner, repo_name, cache, fetch_mode, max_concurrency, prioritize_source, file_filter, spool, ref
+        )
+
+    if fetch_mode == FetchMode.archive:
+        try:
+            return await fetch_archive_files(client, owner, repo_name, ref, file_filter=file_filter, spool=spool)
+        except (ArchiveFetchError, httpx.HTTPError) as ex:
+            logger.warning(f"Archive download failed, falling back to per-file fetching: {ex}")
+
+    return await fetch_files_per_file(
+        client, owner, repo_name, max_concurrency, prioritize_source, file_filter, spool, ref
+    )
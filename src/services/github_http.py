@@ -0,0 +1,321 @@
+import json
+import time
+import httpx
+import random
+import asyncio
+
+from typing import Awaitable, Callable, AsyncIterator
+from datetime import datetime, timezone
+from dataclasses import dataclass
+from email.utils import parsedate_to_datetime
+
+from loguru import logger
+
+from src.services.kv_store import KeyValueStore, MemoryKeyValueStore
+from src.services.metrics import (
+    ReviewTrace, current_trace, observe_wait, GITHUB_REQUEST_SECONDS, GITHUB_RESPONSE_BYTES
+)
+
+RETRYABLE_STATUS_CODES = {429, 500, 502, 503, 504}
+
+
+class GitHubRateLimitError(Exception):
+    """Raised when GitHub keeps rejecting requests because the rate limit is exhausted."""
+
+
+class GitHubUnavailableError(Exception):
+    """Raised when GitHub keeps failing requests with server errors."""
+
+
+def _retry_after_seconds(value: str) -> float | None:
+    """
+    Parses a Retry-After header, either a number of seconds or an HTTP date.
+
+    Args:
+        value (str): The header value.
+
+    Returns:
+        float | None: The number of seconds to wait, or None if the value is neither.
+    """
+    try:
+        return max(float(value), 0.0)
+    except ValueError:
+        pass
+
+    try:
+        retry_at = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    if retry_at.tzinfo is None:
+        retry_at = retry_at.replace(tzinfo=timezone.utc)
+    return max((retry_at - datetime.now(timezone.utc)).total_seconds(), 0.0)
+
+
+@dataclass
+class RateLimitState:
+    """
+    The GitHub quota as last reported by the rate-limit response headers.
+
+    Attributes:
+        limit (int | None): The number of requests allowed per window.
+        remaining (int | None): The number of requests left in the current window.
+        reset_at (float | None): The epoch time at which the window resets.
+        requests (int): The number of requests sent.
+        not_modified (int): The number of requests answered by a 304 and served from the ETag cache.
+        retries (int): The number of requests retried after a rate-limit or server error.
+        throttled_seconds (float): The total time spent waiting before sending requests.
+    """
+    limit: int | None = None
+    remaining: int | None = None
+    reset_at: float | None = None
+    requests: int = 0
+    not_modified: int = 0
+    retries: int = 0
+    throttled_seconds: float = 0.0
+
+    def update(self, headers: httpx.Headers) -> None:
+        """
+        Updates the quota from the headers of a response.
+
+        Args:
+            headers (httpx.Headers): The response headers.
+        """
+        if "x-ratelimit-limit" in headers:
+            self.limit = int(headers["x-ratelimit-limit"])
+        if "x-ratelimit-remaining" in headers:
+            self.remaining = int(headers["x-ratelimit-remaining"])
+        if "x-ratelimit-reset" in headers:
+            self.reset_at = float(headers["x-ratelimit-reset"])
+
+
+def github_endpoint(path: str) -> str:
+    """
+    Names the GitHub API endpoint of a request path, keeping the metric labels few.
+
+    Args:
+        path (str): The path of the request URL, e.g. "/repos/owner/repo/git/blobs/sha".
+
+    Returns:
+        str: "commits", "trees", "blobs", "tarball", "contents" or "other".
+    """
+    segments = path.strip("/").split("/")
+    if len(segments) < 4 or segments[0] != "repos":
+        return "other"
+    resource = segments[4] if segments[3] == "git" and len(segments) > 4 else segments[3]
+    return resource if resource in ("commits", "trees", "blobs", "tarball", "contents") else "other"
+
+
+class MeteredStream(httpx.AsyncByteStream):
+    """
+    The body of a GitHub response, recording the duration and size of the request once it is closed.
+
+    The duration covers the whole body, so streamed downloads such as tarballs are timed to their end.
+    """
+
+    def __init__(self, stream: httpx.AsyncByteStream, endpoint: str, status: int, started: float,
+                 trace: ReviewTrace | None):
+        self.__stream = stream
+        self.__labels = (endpoint, str(status))
+        self.__started = started
+        self.__trace = trace
+        self.__bytes = 0
+        self.__recorded = False
+
+    async def __aiter__(self) -> AsyncIterator[bytes]:
+        async for chunk in self.__stream:
+            self.__bytes += len(chunk)
+            yield chunk
+
+    async def aclose(self) -> None:
+        await self.__stream.aclose()
+        if self.__recorded:
+            return
+
+        self.__recorded = True
+        elapsed = time.perf_counter() - self.__started
+        GITHUB_REQUEST_SECONDS.observe(elapsed, *self.__labels)
+        GITHUB_RESPONSE_BYTES.inc(self.__labels[0], amount=self.__bytes)
+        if self.__trace is not None:
+            self.__trace.add_span("github_request", elapsed)
+            self.__trace.add("github_requests")
+            self.__trace.add("github_bytes", self.__bytes)
+
+
+github_rate_limit = RateLimitState()
+etag_store = MemoryKeyValueStore(max_bytes=64 * 1024 * 1024)
+
+
+class GitHubTransport(httpx.AsyncBaseTransport):
+    """
+    An HTTPX transport adding conditional requests and rate-limit handling to GitHub calls.
+
+    ETags of GET responses are stored per URL and replayed with If-None-Match, so unchanged
+    resources come back as 304s, which do not count against the quota, and are served from the
+    stored body. Requests are paced when the remaining quota runs low and retried with jittered
+    exponential backoff on rate-limit and server errors. The duration and size of every request are
+    recorded in the metrics and in the trace of the review sending it.
+
+    Attributes:
+        state (RateLimitState): The quota state shared by every client using the same token.
+    """
+
+    def __init__(
+            self,
+            transport: httpx.AsyncBaseTransport,
+            state: RateLimitState = github_rate_limit,
+            etags: KeyValueStore | None = etag_store,
+            max_retries: int = 3,
+            base_delay: float = 1.0,
+            max_delay: float = 60.0,
+            min_remaining: int = 50,
+            max_cached_body: int = 1024 * 1024,
+            sleep: Callable[[float], Awaitable[None]] = asyncio.sleep,
+    ):
+        """
+        Initializes the transport.
+
+        Args:
+            transport (httpx.AsyncBaseTransport): The transport actually sending the requests.
+            state (RateLimitState): The quota state to update.
+            etags (KeyValueStore | None): The store for ETags and bodies, or None to disable conditional requests.
+            max_retries (int): How many times a rejected request is retried.
+            base_delay (float): The initial backoff delay in seconds.
+            max_delay (float): The longest wait in seconds before giving up on a request.
+            min_remaining (int): The remaining quota below which requests are spread until the window resets.
+            max_cached_body (int): The largest response body in bytes stored with its ETag.
+            sleep (Callable[[float], Awaitable[None]]): The coroutine used to wait.
+        """
+        self.__transport = transport
+        self.__etags = etags
+        self.__max_retries = max_retries
+        self.__base_delay = base_delay
+        self.__max_delay = max_delay
+        self.__min_remaining = min_remaining
+        self.__max_cached_body = max_cached_body
+        self.__sleep = sleep
+
+        self.state = state
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        cache_key = self.__cache_key(request)
+        cached = self.__load(cache_key) if cache_key else None
+        if cached is not None:
+            request.headers["If-None-Match"] = cached[0]
+
+        trace = current_trace()
+        endpoint = github_endpoint(request.url.path)
+        for attempt in range(self.__max_retries + 1):
+            await self.__pace()
+
+            self.state.requests += 1
+            started = time.perf_counter()
+            response = await self.__transport.handle_async_request(request)
+            response.stream = MeteredStream(response.stream, endpoint, response.status_code, started, trace)
+            self.state.update(response.headers)
+
+            if response.status_code == 304 and cached is not None:
+                await response.aclose()
+                self.state.not_modified += 1
+                return httpx.Response(200, headers=cached[1], content=cached[2], request=request)
+
+            delay = self.__retry_delay(response, attempt)
+            if delay is None:
+                return await self.__store(cache_key, request, response)
+
+            await response.aclose()
+            if attempt == self.__max_retries or delay > self.__max_delay:
+                if self.__rate_limited(response):
+                    raise GitHubRateLimitError(f"GitHub rejected {request.url} with status {response.status_code}")
+                raise GitHubUnavailableError(f"GitHub failed {request.url} with status {response.status_code}")
+
+            logger.warning(f"GitHub answered {response.status_code}, retrying {request.url} in {delay:.1f}s")
+            self.state.retries += 1
+            await self.__wait(delay)
+
+        raise GitHubRateLimitError(f"GitHub rejected {request.url}")
+
+    async def aclose(self) -> None:
+        await self.__transport.aclose()
+
+    async def __pace(self) -> None:
+        """Spreads the remaining quota over the rest of the window once it runs low."""
+        remaining, reset_at = self.state.remaining, self.state.reset_at
+        if remaining is None or reset_at is None or remaining >= self.__min_remaining:
+            return
+
+        window = reset_at - time.time()
+        if window <= 0:
+            return
+
+        delay = window / max(remaining, 1) if remaining > 0 else window
+        if delay > self.__max_delay:
+            raise GitHubRateLimitError(f"GitHub quota exhausted until {time.ctime(reset_at)}")
+
+        await self.__wait(delay)
+
+    @staticmethod
+    def __rate_limited(response: httpx.Response) -> bool:
+        """Tells whether a response rejects its request because of the primary or secondary rate limit."""
+        headers = response.headers
+        return response.status_code == 429 or response.status_code == 403 and (
+                headers.get("x-ratelimit-remaining") == "0" or "retry-after" in headers
+        )
+
+    def __retry_delay(self, response: httpx.Response, attempt: int) -> float | None:
+        """Returns how long to wait before retrying the response's request, or None if it succeeded."""
+        headers = response.headers
+        if not self.__rate_limited(response) and response.status_code not in RETRYABLE_STATUS_CODES:
+            return None
+
+        retry_after = _retry_after_seconds(headers["retry-after"]) if "retry-after" in headers else None
+        if retry_after is not None:
+            return retry_after
+        if headers.get("x-ratelimit-remaining") == "0" and "x-ratelimit-reset" in headers:
+            return max(float(headers["x-ratelimit-reset"]) - time.time(), 0.0)
+
+        backoff = min(self.__base_delay * 2 ** attempt, self.__max_delay)
+        return random.uniform(backoff / 2, backoff)
+
+    async def __wait(self, delay: float) -> None:
+        """Sleeps and accounts for the time spent throttled."""
+        self.state.throttled_seconds += delay
+        observe_wait("github_throttle", delay)
+        await self.__sleep(delay)
+
+    @staticmethod
+    def __cache_key(request: httpx.Request) -> str | None:
+        """Builds the ETag cache key of a request, or None if it is not cacheable."""
+        if request.method != "GET":
+            return None
+        return f"etag:{request.headers.get('accept', '')}:{request.url}"
+
+    def __load(self, cache_key: str) -> tuple[str, list[tuple[str, str]], bytes] | None:
+        """Loads the ETag, headers and body stored for a request."""
+        if self.__etags is None:
+            return None
+
+        data = self.__etags.get(cache_key)
+        if data is None:
+            return None
+
+        meta, _, body = data.partition(b"\n")
+        meta = json.loads(meta)
+        return meta["etag"], [tuple(header) for header in meta["headers"]], body
+
+    async def __store(self, cache_key: str | None, request: httpx.Request, response: httpx.Response) -> httpx.Response:
+        """Stores a small successful response with its ETag, returning a response still readable by the caller."""
+        etag = response.headers.get("etag")
+        length = response.headers.get("content-length")
+        if (
+                self.__etags is None or cache_key is None or etag is None or response.status_code != 200
+                or length is None or int(length) > self.__max_cached_body
+        ):
+            return response
+
+        body = await response.aread()
+        headers = [
+            (name, value) for name, value in response.headers.multi_items()
+            if name.lower() not in ("content-encoding", "transfer-encoding", "content-length")
+        ]
+        self.__etags.set(cache_key, json.dumps({"etag": etag, "headers": headers}).encode() + b"\n" + body)
+        return httpx.Response(200, headers=headers, content=body, request=request)
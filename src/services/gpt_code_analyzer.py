@@ -1,30 +1,115 @@
 import os
 import json
-
-from openai import OpenAI
+import time
+import random
+import asyncio
+import hashlib
+import itertools
+import posixpath
+
+from typing import Callable, AsyncIterator
+from functools import lru_cache
+from contextlib import aclosing
+
+from openai import AsyncOpenAI, NOT_GIVEN
+from openai.types import CompletionUsage
 from loguru import logger
 from dotenv import load_dotenv
 from fastapi import HTTPException
 
-from src.services.data_structures import CandidateLevel, AnalysisReport, RepoFilesResponse, Content
+from src.services.llm_cache import LLMResponseCache
+from src.services.fingerprints import find_duplicates, DUPLICATE_SIMILARITY
+from src.services.llm_limits import LLMRateLimiter
+from src.services.metrics import (
+    ReviewTrace, current_trace, observe_wait, timed_stage, LLM_ESCALATIONS, LLM_REQUEST_SECONDS, LLM_RETRIES,
+    LLM_TIER_SECONDS, LLM_TOKENS,
+)
+from src.services.chunker import Chunk, build_chunks, count_tokens, CHUNK_MAX_TOKENS
+from src.services.report_reducer import ReportNode, reduce_report, REPORT_MAX_TOKENS
+from src.services.review_snapshots import ChunkSnapshot, ReviewSnapshot
+from src.services.http_clients import create_openai_client
+from src.services.static_analysis import FileInsights
+from src.services.model_routing import ModelRouter, split_confidence, CHEAP_TIER, STRONG_TIER, CONFIDENCE_REQUEST
+from src.services.data_structures import CandidateLevel, AnalysisReport, RepoFilesResponse, ChunkAnalysis, Content
 
 load_dotenv()
 
 logger.remove()
 logger.add(sink=lambda msg: print(msg, end=""), colorize=True)
 
+SYSTEM_PROMPT = "You are a code reviewer."
 
-class GPTCandidateAnalyzer:
-    __CLIENT = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
+# How many times a failed chunk analysis is sent again, and the delay before the first retry, doubled after each
+CHUNK_RETRIES = int(os.getenv("LLM_CHUNK_RETRIES", 2))
+RETRY_BACKOFF_SECONDS = float(os.getenv("LLM_RETRY_BACKOFF_SECONDS", 1.0))
+
+
+@lru_cache(maxsize=1)
+def get_default_client() -> AsyncOpenAI:
+    """
+    Returns the process-wide pooled OpenAI client, creating it on first use.
 
-    def __init__(self, file_contents: RepoFilesResponse, candidate_level: CandidateLevel, assignment_description: str):
+    Returns:
+        AsyncOpenAI: The shared client.
+    """
+    return create_openai_client()
+
+
+class GPTCandidateAnalyzer:
+    def __init__(
+            self,
+            file_contents: RepoFilesResponse,
+            candidate_level: CandidateLevel,
+            assignment_description: str,
+            client: AsyncOpenAI | None = None,
+            limiter: LLMRateLimiter | None = None,
+            max_chunk_tokens: int = CHUNK_MAX_TOKENS,
+            cache: LLMResponseCache | None = None,
+            max_report_tokens: int = REPORT_MAX_TOKENS,
+            progress: Callable[[int, int], None] | None = None,
+            previous: ReviewSnapshot | None = None,
+            duplicate_similarity: float = DUPLICATE_SIMILARITY,
+            trace: ReviewTrace | None = None,
+            insights: dict[str, FileInsights] | None = None,
+            outline_clean_files: bool = True,
+            checkpoint: Callable[[int, ChunkSnapshot], None] | None = None,
+            chunk_retries: int = CHUNK_RETRIES,
+            retry_backoff: float = RETRY_BACKOFF_SECONDS,
+            router: ModelRouter | None = None,
+    ):
         """
         Initializes the GPTCandidateAnalyzer with file contents, candidate level, and assignment description.
 
+        The analysis itself is started by awaiting analyze().
+
         Args:
             file_contents (RepoFilesResponse): The contents of the repository files to analyze.
             candidate_level (CandidateLevel): The level of the candidate (e.g., junior, middle, senior).
             assignment_description (str): A description of the assignment for context in analysis.
+            client (AsyncOpenAI | None): The OpenAI client to use; the shared pooled client is used if omitted.
+            limiter (LLMRateLimiter | None): The in-flight and tokens-per-minute limits of the LLM calls;
+                                             configured from the environment if omitted.
+            max_chunk_tokens (int): The maximum number of code tokens sent in a single request.
+            cache (LLMResponseCache | None): The cache of LLM responses; every prompt is sent if omitted.
+            max_report_tokens (int): The maximum number of analysis tokens sent in a single report prompt.
+            progress (Callable[[int, int], None] | None): Called with the numbers of completed and total
+                                                          chunks each time a chunk analysis completes.
+            previous (ReviewSnapshot | None): A previous review whose analyses of unchanged files are reused.
+            duplicate_similarity (float): The estimated similarity from which files are analyzed once,
+                                          0 analyzing every file.
+            trace (ReviewTrace | None): The trace recording the LLM requests and the stages of the analysis;
+                                        the trace of the calling task is used if omitted.
+            insights (dict[str, FileInsights] | None): The static analysis of the Python files, keyed by file
+                                                       name; its findings are given to GPT with the code.
+            outline_clean_files (bool): Whether the files found clean by the static analysis are sent as their
+                                        outline rather than their code.
+            checkpoint (Callable[[int, ChunkSnapshot], None] | None): Called with the number of analyses
+                                                                    completed before and the snapshot of each
+                                                                    chunk analysis as soon as it completes.
+            chunk_retries (int): How many times a failed chunk analysis is sent again.
+            retry_backoff (float): The delay in seconds before the first retry of a chunk, doubled after each.
+            router (ModelRouter | None): Chooses the model tier of each chunk; configured from the environment
+                                         if omitted.
 
         Raises:
             HTTPException: If the file contents are missing.
@@ -32,24 +117,73 @@ class GPTCandidateAnalyzer:
         if not file_contents.files:
             raise HTTPException(status_code=400, detail="The file content is missing. Please check the repository URL.")
 
+        self.__client = client or get_default_client()
+        self.__limiter = limiter or LLMRateLimiter.from_env()
+        self.__router = router or ModelRouter.from_env()
+        self.__max_chunk_tokens = max_chunk_tokens
+        self.__cache = cache
+        self.__max_report_tokens = max_report_tokens
+        self.__progress = progress
         self.__files_contents = file_contents.files
+        self.__skipped_files = file_contents.skipped_files
+        self.__commit_sha = file_contents.commit_sha
+        self.__previous = previous
+        self.__duplicate_similarity = duplicate_similarity
+        self.__trace = trace or current_trace()
+        self.__checkpoint = checkpoint
+        self.__chunk_retries = chunk_retries
+        self.__retry_backoff = retry_backoff
+        self.__insights = insights or {}
+        self.__outlined_files = {
+            filename for filename, insight in self.__insights.items() if outline_clean_files and insight.clean
+        }
         self.__candidate_level = candidate_level
         self.__assignment_description = assignment_description
+        # The assignment and level lead every request, so reviews of the same assignment share a prompt
+        # prefix that the provider caches, and the chunk prompts only carry the code
+        self.__system_prompt = (
+            f"{SYSTEM_PROMPT}\n\nAssignment:\n{assignment_description}\n\nCandidate level: {candidate_level}."
+        )
+        self.__prompt_cache_key = hashlib.sha256(self.__system_prompt.encode()).hexdigest()[:32]
 
         self.file_analysis_parts: list[str] = []
         self.project_files: list[str] = []
+        self.chunk_snapshots: list[ChunkSnapshot] = []
+        self.reused_files: list[str] = []
+        self.duplicate_files: dict[str, str] = {}
+        reviewed = {content.filename for content in self.__files_contents}
+        self.static_findings: dict[str, list[str]] = {
+            filename: insight.findings + insight.style for filename, insight in self.__insights.items()
+            if filename in reviewed and insight.findings + insight.style
+        }
 
         self.analysis_report: AnalysisReport | None = None
 
-        self.__start()
-
-    def __gpt_api_response(self, prompt: str, model: str = "gpt-4-turbo") -> str:
+    async def __gpt_api_response(
+            self,
+            prompt: str,
+            kind: str = "chunk",
+            json_mode: bool = False,
+            tier: str = STRONG_TIER,
+            cacheable: Callable[[str], bool] | None = None,
+    ) -> str:
         """
         Sends a prompt to the GPT model and retrieves the response.
 
+        Responses are served from the cache when the same prompt was already answered, so unchanged
+        chunks of a re-reviewed repository cost no API call. Requests sharing the system prompt carry
+        the same prompt cache key, so the provider routes them to the servers holding its cached prefix.
+        The wait for a request slot, the request latency and the token usage are recorded in the
+        metrics and in the trace.
+
         Args:
             prompt (str): The prompt to send to the GPT model.
-            model (str): The model to use for the request (default is "gpt-4-turbo").
+            kind (str): What the prompt asks for, "chunk", "summary", "report" or "repair", used to label the
+                        metrics.
+            json_mode (bool): Whether the model is constrained to answer with a JSON object.
+            tier (str): The model tier answering the prompt, CHEAP_TIER or STRONG_TIER.
+            cacheable (Callable[[str], bool] | None): Tells whether a response may be cached; every response
+                                                      is cached if omitted.
 
         Returns:
             str: The content of the GPT response.
@@ -57,29 +191,83 @@ class GPTCandidateAnalyzer:
         Raises:
             HTTPException: If an error occurs during the API call.
         """
-        try:
-            response = self.__CLIENT.chat.completions.create(
-                model=model,
-                messages=[
-                    {"role": "system", "content": "You are a code reviewer."},
-                    {"role": "user", "content": prompt}
-                ]
-            )
+        sent = False
+        model = self.__router.model(tier)
+
+        async def create() -> str:
+            """Send the prompt to the API within the rate limits."""
+            nonlocal sent
+            sent = True
+            waited_from = time.perf_counter()
+            async with self.__limiter.slot(count_tokens(prompt, model)):
+                started = time.perf_counter()
+                observe_wait("llm_slot", started - waited_from, self.__trace)
+                response = await self.__client.chat.completions.create(
+                    model=model,
+                    messages=[
+                        {"role": "system", "content": self.__system_prompt},
+                        {"role": "user", "content": prompt}
+                    ],
+                    response_format={"type": "json_object"} if json_mode else NOT_GIVEN,
+                    extra_body={"prompt_cache_key": self.__prompt_cache_key},
+                )
+                elapsed = time.perf_counter() - started
+            self.__record_request(kind, tier, elapsed, response.usage)
             return response.choices[0].message.content
 
+        try:
+            if self.__cache is None:
+                return await create()
+
+            response = await self.__cache.get_or_create(model, self.__system_prompt, prompt, create, cacheable)
+            if not sent and self.__trace is not None:
+                self.__trace.add("llm_cached_responses")
+            return response
+
         except Exception as e:
             logger.error(f"Error during GPT analysis: {e}")
             raise HTTPException(status_code=500, detail="An internal error occurred while processing the analysis.")
 
-    def __analyze_file_part(self, content: Content, part: str, part_index: int, total_parts: int) -> str:
+    def __record_request(self, kind: str, tier: str, elapsed: float, usage: CompletionUsage | None) -> None:
         """
-        Analyzes a specific part of a file and generates a prompt for GPT.
+        Records the latency and token usage of an LLM request.
 
         Args:
-            content (Content): The content of the file being analyzed.
-            part (str): The part of the file content to analyze.
-            part_index (int): The index of the part being analyzed.
-            total_parts (int): The total number of parts in the file.
+            kind (str): What the prompt asked for, "chunk", "summary", "report" or "repair".
+            tier (str): The model tier that answered, CHEAP_TIER or STRONG_TIER.
+            elapsed (float): The latency of the request in seconds.
+            usage (CompletionUsage | None): The token usage reported by the API, if any.
+        """
+        LLM_REQUEST_SECONDS.observe(elapsed, kind)
+        LLM_TIER_SECONDS.observe(elapsed, tier)
+        tokens = {}
+        if usage is not None:
+            details = usage.prompt_tokens_details
+            tokens = {
+                "prompt": usage.prompt_tokens,
+                "completion": usage.completion_tokens,
+                "cached_prompt": (details.cached_tokens or 0) if details is not None else 0,
+            }
+            for token_type, amount in tokens.items():
+                LLM_TOKENS.inc(kind, token_type, amount=amount)
+
+        if self.__trace is not None:
+            self.__trace.add_span(f"llm_{kind}", elapsed)
+            self.__trace.add("llm_requests")
+            self.__trace.add(f"llm_{tier}_requests")
+            self.__trace.add_span(f"llm_tier_{tier}", elapsed)
+            for token_type, amount in tokens.items():
+                self.__trace.add(f"{token_type}_tokens", amount)
+
+    async def __analyze_chunk(self, chunk: Chunk) -> str:
+        """
+        Analyzes a chunk, either a part of a file or several small files, and generates a prompt for GPT.
+
+        The chunk is sent to the model tier chosen by the router. The cheap tier states its confidence,
+        and its low-confidence answers are sent again to the strong tier if escalation is enabled.
+
+        Args:
+            chunk (Chunk): The chunk to analyze.
 
         Returns:
             str: The analysis result from GPT.
@@ -87,48 +275,217 @@ class GPTCandidateAnalyzer:
         Raises:
             HTTPException: If an error occurs during the analysis.
         """
-        if total_parts == 1:
+        if len(chunk.parts) > 1:
+            outlined = " (outline only, it passed static analysis)"
+            code = "\n".join(
+                f"File '{part.content.filename}'{outlined if part.content.filename in self.__outlined_files else ''}:"
+                f"\n{part.text}"
+                for part in chunk.parts
+            )
             prompt = f"""
-            {self.__assignment_description}\n\n
-            File '{content.filename}'.
-            Candidate level: {self.__candidate_level}.
-            Code: {part}
+            Files {", ".join(f"'{part.content.filename}'" for part in chunk.parts)}.
+            Code: {code}
             """
         else:
-            prompt = f"""
-            {self.__assignment_description}\n\n
-            Part {part_index}/{total_parts} of the file '{content.filename}'.
-            Candidate level: {self.__candidate_level}.
-            Code: {part}
+            part = chunk.parts[0]
+            if part.content.filename in self.__outlined_files:
+                prompt = f"""
+            File '{part.content.filename}', which passed static analysis, so only its outline is given.
+            Outline: {part.text}
+            """
+            elif part.total_parts == 1:
+                prompt = f"""
+            File '{part.content.filename}'.
+            Code: {part.text}
+            """
+            else:
+                prompt = f"""
+            Part {part.part_index}/{part.total_parts} of the file '{part.content.filename}'.
+            Code: {part.text}
             """
 
-        return self.__gpt_api_response(prompt)
+        findings = self.__static_findings(chunk)
+        if findings is not None:
+            prompt += f"""
+            Static analysis already found the following issues, which are added to the report on their own and
+            need not be repeated; focus on design, correctness and how the code meets the assignment.
+            {findings}
+            """
+        if self.__router.route(chunk, self.__insights) == STRONG_TIER:
+            return await self.__gpt_api_response(prompt, kind="chunk")
+
+        answer = await self.__gpt_api_response(prompt + CONFIDENCE_REQUEST, kind="chunk", tier=CHEAP_TIER)
+        analysis, confidence = split_confidence(answer)
+        if confidence != "low" or not self.__router.escalate:
+            return analysis
+
+        logger.debug(f"Escalating {self.__chunk_label(chunk)} to the strong model tier")
+        LLM_ESCALATIONS.inc()
+        if self.__trace is not None:
+            self.__trace.add("llm_escalations")
+        return await self.__gpt_api_response(prompt, kind="chunk")
+
+    def __static_findings(self, chunk: Chunk) -> str | None:
+        """
+        Lists the static analysis findings of the files of a chunk for its prompt.
+
+        Args:
+            chunk (Chunk): The chunk whose files are listed.
+
+        Returns:
+            str | None: The findings, one per line, or None if the static analysis found nothing in the files.
+        """
+        lines = []
+        for part in chunk.parts:
+            insight = self.__insights.get(part.content.filename)
+            if insight is not None and part.part_index == 1:
+                lines += [f"- {insight.filename} {finding}" for finding in insight.findings + insight.style]
+        return "\n".join(lines) if lines else None
+
+    def __outline(self, content: Content) -> Content:
+        """
+        Replaces a file found clean by the static analysis with its outline, keeping its name and blob SHA.
+
+        Files made of many tiny definitions are sent as their code, their outline saving too little to
+        make up for the code left out.
+
+        Args:
+            content (Content): The file to send.
+
+        Returns:
+            Content: The outline of the file, or the file itself if its code has to be sent.
+        """
+        if content.filename not in self.__outlined_files:
+            return content
+
+        outline = self.__insights[content.filename].outline
+        if 2 * len(outline) > len(content.file_content):
+            self.__outlined_files.discard(content.filename)
+            return content
+        return Content(filename=content.filename, file_content=outline, sha=content.sha)
+
+    @staticmethod
+    def __chunk_label(chunk: Chunk) -> str:
+        """
+        Describes the files and part covered by a chunk, as used in the report.
+
+        Args:
+            chunk (Chunk): The chunk to describe.
+
+        Returns:
+            str: The label of the chunk.
+        """
+        if len(chunk.parts) > 1:
+            return "Files " + ", ".join(part.content.filename for part in chunk.parts)
+
+        part = chunk.parts[0]
+        if part.total_parts > 1:
+            return f"File {part.content.filename}, part {part.part_index}/{part.total_parts}"
+        return f"File {part.content.filename}"
 
     @staticmethod
-    def __parse_json_response(response: str) -> dict:
+    def __parse_json_response(response: str) -> dict | None:
         """
-        Parses the JSON response from GPT.
+        Parses the JSON response from GPT, tolerating text or a Markdown code fence around the object.
 
         Args:
             response (str): The string response to parse.
 
         Returns:
-            dict: The parsed JSON data.
+            dict | None: The parsed JSON data, or None if the response holds no JSON object.
+        """
+        for candidate in (response, response[response.find("{"):response.rfind("}") + 1]):
+            try:
+                json_data = json.loads(candidate)
+            except json.JSONDecodeError:
+                continue
+            if isinstance(json_data, dict):
+                return json_data
+        return None
+
+    async def __structured_report(self, prompt: str) -> dict:
+        """
+        Asks for the final report as a JSON object, and asks once more to repair a malformed answer.
+
+        Only answers that parse are cached, so resuming a review whose report was malformed asks again
+        rather than getting the same answer back from the cache.
+
+        Args:
+            prompt (str): The prompt of the final report.
+
+        Returns:
+            dict: The parsed report.
 
         Raises:
-            HTTPException: If JSON parsing fails.
+            HTTPException: If an error occurs during the API calls, or if the repaired answer is not JSON either.
         """
-        try:
-            json_data = json.loads(response)
-            return json_data
-
-        except json.JSONDecodeError as e:
-            logger.error(f"Error parsing JSON response: {e}")
+        def parses(answer: str) -> bool:
+            """Tell whether an answer holds the JSON object of the report."""
+            return self.__parse_json_response(answer) is not None
+
+        response = await self.__gpt_api_response(prompt, kind="report", json_mode=True, cacheable=parses)
+        structured_data = self.__parse_json_response(response)
+        if structured_data is not None:
+            return structured_data
+
+        logger.warning(f"The report is not a JSON object: {response[:200]!r}")
+        LLM_RETRIES.inc("report")
+        if self.__trace is not None:
+            self.__trace.add("llm_retries")
+        repair_prompt = f"""
+        The following answer was meant to be a single JSON object with the fields 'flaws', 'rating' and 'conclusion',
+        but it is not valid JSON. Return its content as that JSON object only.
+
+        Answer:
+        {response}
+        """
+        repaired = await self.__gpt_api_response(repair_prompt, kind="repair", json_mode=True, cacheable=parses)
+        structured_data = self.__parse_json_response(repaired)
+        if structured_data is None:
+            logger.warning(f"The repaired report is not a JSON object: {repaired[:200]!r}")
             raise HTTPException(status_code=422, detail="The analysis could not be completed. Please try again.")
+        return structured_data
 
-    def __analyze_files(self) -> None:
+    def __reusable_chunks(self) -> list[ChunkSnapshot]:
         """
-        Analyzes all files provided in the file contents, sending each part to GPT for evaluation.
+        Selects the chunk analyses of the previous review whose files all kept the same blob SHA.
+
+        Returns:
+            list[ChunkSnapshot]: The reusable analyses, in the order of the previous review.
+        """
+        if self.__previous is None:
+            return []
+
+        if (self.__previous.assignment_description != self.__assignment_description
+                or self.__previous.candidate_level != self.__candidate_level):
+            logger.info(f"Review {self.__previous.review_id} was made for another assignment, analyzing every file")
+            return []
+
+        shas = {content.filename: content.sha for content in self.__files_contents}
+        return [
+            chunk for chunk in self.__previous.chunks
+            if all(sha is not None and shas.get(path) == sha for path, sha in chunk.files.items())
+        ]
+
+    async def __iter_analyses(self) -> AsyncIterator[ChunkAnalysis]:
+        """
+        Analyzes all files provided in the file contents, sending the chunks to GPT concurrently.
+
+        Files are split into token-bounded chunks on definition boundaries, small files being packed
+        together. The number of chunks in flight is bounded by the rate limiter, and the analyses are
+        yielded in the order in which they complete. Chunk prompts are built within the prompt slots of
+        the limiter, so only as many prompts as requests in flight are held in memory, across every
+        review sharing the limiter. Closing the iterator early cancels the chunks
+        still being analyzed.
+
+        With a previous review, the analyses of chunks whose files are all unchanged are reused and
+        yielded first, and only the other files are sent to GPT. Exact and near-duplicate files are
+        sent once, their copies referring to the analysis of the first one. With static analysis
+        insights, files found clean are sent as their outline, and the findings of each file are
+        sent with its first part.
+
+        Yields:
+            ChunkAnalysis: The analysis of each chunk.
 
         Raises:
             HTTPException: If no files are available for analysis or if an error occurs during analysis.
@@ -136,42 +493,201 @@ class GPTCandidateAnalyzer:
         if not self.__files_contents:
             raise HTTPException(status_code=404, detail="No files available for analysis. Please check the repository.")
 
+        async def analyze_chunk(index: int, chunk: Chunk) -> ChunkAnalysis:
+            """Analyze a single chunk, retrying with backoff, and label it with its files and position."""
+            label = self.__chunk_label(chunk)
+            logger.debug(f"Sending {label} for analysis")
+            for attempt in itertools.count():
+                try:
+                    async with self.__limiter.prompt_slot():
+                        analysis_part = await self.__analyze_chunk(chunk)
+                    break
+                except Exception as e:
+                    if attempt >= self.__chunk_retries:
+                        logger.error(f"Error analyzing {label}: {e}")
+                        raise HTTPException(status_code=500,
+                                            detail="An error occurred while analyzing the file. Please try again.")
+
+                    delay = random.uniform(0.5, 1.0) * self.__retry_backoff * 2 ** attempt
+                    logger.warning(f"Error analyzing {label}, retrying in {delay:.1f}s: {e}")
+                    LLM_RETRIES.inc("chunk")
+                    if self.__trace is not None:
+                        self.__trace.add("llm_retries")
+                    await asyncio.sleep(delay)
+
+            return ChunkAnalysis(
+                index=index,
+                total=total,
+                files=[part.content.filename for part in chunk.parts],
+                label=label,
+                analysis=analysis_part,
+            )
+
         for content in self.__files_contents:
             self.project_files.append(content.filename)
             logger.info(f"Analyzing file: {content.filename}")
 
-            split_file_content = [
-                content.file_content[i:i + 7000] for i in range(0, len(content.file_content), 7000)
+        reused = self.__reusable_chunks()
+        reused_paths = {path for chunk in reused for path in chunk.files}
+        self.reused_files = [content.filename for content in self.__files_contents if content.filename in reused_paths]
+
+        with timed_stage("chunking", self.__trace):
+            # Fingerprinting every file is CPU-bound, so it runs in a thread rather than stalling other requests
+            self.duplicate_files = await asyncio.to_thread(
+                find_duplicates, self.__files_contents, self.__duplicate_similarity
+            )
+            to_analyze = [
+                content for content in self.__files_contents
+                if content.filename not in reused_paths and content.filename not in self.duplicate_files
             ]
+            chunks = build_chunks([self.__outline(content) for content in to_analyze], self.__max_chunk_tokens)
+        if self.__trace is not None:
+            self.__trace.add("chunks", len(chunks))
+            self.__trace.add("outlined_files", sum(content.filename in self.__outlined_files for content in to_analyze))
+        logger.debug(f"Split {len(to_analyze)} files into {len(chunks)} chunks, reusing {len(reused)} analyses")
+
+        # Reused and new chunks are reported in the order of their first file
+        positions = {content.filename: position for position, content in enumerate(self.__files_contents)}
+        slots: list[tuple[tuple[int, int], ChunkSnapshot | Chunk]] = [
+            ((positions[next(iter(snapshot.files))], order), snapshot) for order, snapshot in enumerate(reused)
+        ]
+        slots += [((positions[chunk.parts[0].content.filename], chunk.parts[0].part_index), chunk) for chunk in chunks]
+        slots.sort(key=lambda slot: slot[0])
+        total = len(slots)
+
+        shas = {content.filename: content.sha for content in self.__files_contents}
+        chunk_snapshots: list[ChunkSnapshot | None] = [None] * total
+        completed = 0
+
+        def record(analysis: ChunkAnalysis) -> ChunkAnalysis:
+            """Keep the analysis for the final report and the review snapshot, checkpoint it and report the progress."""
+            nonlocal completed
+            chunk_snapshots[analysis.index] = ChunkSnapshot(
+                files={filename: shas[filename] for filename in analysis.files},
+                label=analysis.label,
+                analysis=analysis.analysis,
+            )
+            if self.__checkpoint is not None:
+                self.__checkpoint(completed, chunk_snapshots[analysis.index])
+            completed += 1
+            if self.__progress is not None:
+                self.__progress(completed, total)
+            return analysis
+
+        for index, (_, item) in enumerate(slots):
+            if isinstance(item, ChunkSnapshot):
+                yield record(ChunkAnalysis(
+                    index=index, total=total, files=list(item.files), label=item.label, analysis=item.analysis
+                ))
+
+        # Only as many chunks as can be sent at once are scheduled, and their prompts are built within the
+        # prompt slots of the limiter, so the prompts of every review sharing it never outnumber its requests
+        queued = ((index, item) for index, (_, item) in enumerate(slots) if isinstance(item, Chunk))
+        pending: set[asyncio.Task] = set()
+        try:
+            while True:
+                for index, chunk in itertools.islice(queued, self.__limiter.max_concurrency - len(pending)):
+                    pending.add(asyncio.create_task(analyze_chunk(index, chunk)))
+                if not pending:
+                    break
+
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    yield record(task.result())
+
+        finally:
+            for task in pending:
+                task.cancel()
+            await asyncio.gather(*pending, return_exceptions=True)
+
+        self.chunk_snapshots = chunk_snapshots
+        logger.info("File analysis completed.")
 
-            total_parts = len(split_file_content)
+    def __static_findings_notes(self) -> list[ReportNode]:
+        """
+        Lists the static analysis findings of every reviewed file for the report, since the chunk analyses
+        leave them out.
 
-            for part_index, part in enumerate(split_file_content, start=1):
-                logger.debug(f"Sending part {part_index} of file {content.filename} for analysis")
+        Returns:
+            list[ReportNode]: A note per file with findings, in the directory of the file.
+        """
+        return [
+            ReportNode(
+                directory=posixpath.dirname(filename),
+                text=f"Static analysis of '{filename}':\n" + "\n".join(f"- {finding}" for finding in findings),
+            )
+            for filename, findings in self.static_findings.items()
+        ]
 
-                try:
-                    analysis_part = self.__analyze_file_part(content, part, part_index, total_parts)
-                    self.file_analysis_parts.append(
-                        f"File {content.filename}, part {part_index}/{total_parts}:\n{analysis_part}"
-                        if total_parts > 1 else
-                        f"File {content.filename}:\n{analysis_part}"
-                    )
+    def __duplicates_note(self) -> str | None:
+        """
+        Lists the duplicate files for the report, whose copies were not analyzed on their own.
 
-                except Exception as e:
-                    logger.error(f"Error analyzing part {part_index} of file {content.filename}: {e}")
-                    raise HTTPException(status_code=500,
-                                        detail="An error occurred while analyzing the file. Please try again.")
+        Returns:
+            str | None: The note, or None if the repository has no duplicate files.
+        """
+        if not self.duplicate_files:
+            return None
+        lines = "\n".join(f"- {path} duplicates {original}" for path, original in self.duplicate_files.items())
+        return f"Duplicate files, reviewed through the file they copy:\n{lines}"
 
-        logger.info("File analysis completed.")
+    async def __summarize_directory(self, directory: str, notes: list[str]) -> str:
+        """
+        Merges the analyses of a directory into a shorter summary for the final report.
 
-    def __generate_final_report(self) -> None:
+        Args:
+            directory (str): The directory the analyses are about, "" for the project root.
+            notes (list[str]): The analyses to merge.
+
+        Returns:
+            str: The summary.
+
+        Raises:
+            HTTPException: If an error occurs during the API call.
+        """
+        notes_text = "\n\n".join(notes)
+        subject = f"the directory '{directory}'" if directory else "the project"
+        prompt = f"""
+        Summarize the following code review notes about {subject}.
+        Keep every specific flaw with the file it was found in, and the observations on the overall code quality,
+        in a concise form. The candidate's level is '{self.__candidate_level}'.
+
+        Notes:
+        {notes_text}
+        """
+        return await self.__gpt_api_response(prompt, kind="summary")
+
+    async def __generate_final_report(self, full_report: str) -> None:
         """
         Generates a final report based on the analysis of all file parts.
 
+        When the analyses do not fit in a single prompt, they are first summarized per directory and
+        merged up the directory tree.
+
+        Args:
+            full_report (str): The full report returned with the final assessment.
+
         Raises:
             HTTPException: If an error occurs while generating the final report.
         """
-        full_report = "\n\n".join(self.file_analysis_parts)
+        try:
+            report_nodes = [
+                ReportNode(
+                    directory=posixpath.dirname(next(iter(chunk.files))), text=f"{chunk.label}:\n{chunk.analysis}"
+                )
+                for chunk in self.chunk_snapshots
+            ]
+            report_nodes += self.__static_findings_notes()
+            duplicates_note = self.__duplicates_note()
+            if duplicates_note is not None:
+                report_nodes.append(ReportNode(directory="", text=duplicates_note))
+            notes = await reduce_report(report_nodes, self.__summarize_directory, self.__max_report_tokens)
+
+        except Exception as e:
+            # The directory summaries run in a task group, whose failures arrive together as an ExceptionGroup
+            logger.error(f"Error during final report reduction: {e!r}")
+            raise HTTPException(status_code=500, detail="An internal error occurred while processing the analysis.")
+
         prompt = f"""
         Please analyze the following code and provide a structured report in JSON format with the following fields:
         - 'flaws': A list of specific issues found in the code.
@@ -179,17 +695,20 @@ class GPTCandidateAnalyzer:
         - 'conclusion': A final assessment of the code quality and areas for improvement.
 
         The analysis is based on the candidate's level '{self.__candidate_level}' and the following code analysis:
-        {full_report}
+        {notes}
         """
 
+        structured_data = await self.__structured_report(prompt)
         try:
-            overall_analysis = self.__gpt_api_response(prompt)
-            structured_data = self.__parse_json_response(overall_analysis)
-
             self.analysis_report = AnalysisReport(
                 project_files=self.project_files,
                 full_report=full_report,
                 conclusion_and_assessment=structured_data,
+                skipped_files=self.__skipped_files,
+                commit_sha=self.__commit_sha,
+                reused_files=self.reused_files,
+                duplicate_files=self.duplicate_files,
+                static_findings=self.static_findings,
             )
             logger.info("Final structured conclusion and candidate rating in JSON format received.")
 
@@ -197,9 +716,51 @@ class GPTCandidateAnalyzer:
             logger.error(f"Error generating final report: {e}")
             raise HTTPException(status_code=500, detail="An error occurred while generating the final report.")
 
-    def __start(self) -> None:
+    async def analyze(self) -> AnalysisReport:
         """
-        Initiates the analysis process by analyzing files and generating the final report.
+        Runs the analysis by analyzing the files and generating the final report.
+
+        Returns:
+            AnalysisReport: The structured analysis report.
+
+        Raises:
+            HTTPException: If the analysis or the final report fails.
+        """
+        parts: list[str | None] = []
+        with timed_stage("analyze", self.__trace):
+            async with aclosing(self.__iter_analyses()) as analyses:
+                async for analysis in analyses:
+                    parts.extend([None] * (analysis.total - len(parts)))
+                    parts[analysis.index] = f"{analysis.label}:\n{analysis.analysis}"
+
+        parts += [node.text for node in self.__static_findings_notes()]
+        duplicates_note = self.__duplicates_note()
+        self.file_analysis_parts.extend(parts if duplicates_note is None else [*parts, duplicates_note])
+        with timed_stage("report", self.__trace):
+            await self.__generate_final_report("\n\n".join(self.file_analysis_parts))
+        return self.analysis_report
+
+    async def analyze_stream(self) -> AsyncIterator[ChunkAnalysis | AnalysisReport]:
+        """
+        Runs the analysis, yielding each chunk analysis as soon as it completes and the final report last.
+
+        The full report of the final AnalysisReport is left empty, since every part was already yielded,
+        so the analyses are not joined into file_analysis_parts. They are still kept in chunk_snapshots
+        until the end, the final report and the review snapshot being made from them, so memory grows
+        with the number of chunks as in analyze(). Closing the iterator early cancels the requests in
+        flight.
+
+        Yields:
+            ChunkAnalysis | AnalysisReport: The chunk analyses, in completion order, then the report.
+
+        Raises:
+            HTTPException: If the analysis or the final report fails.
         """
-        self.__analyze_files()
-        self.__generate_final_report()
+        with timed_stage("analyze", self.__trace):
+            async with aclosing(self.__iter_analyses()) as analyses:
+                async for analysis in analyses:
+                    yield analysis
+
+        with timed_stage("report", self.__trace):
+            await self.__generate_final_report("")
+        yield self.analysis_report
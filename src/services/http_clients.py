@@ -0,0 +1,105 @@
+import os
+import httpx
+import importlib.util
+
+from dataclasses import dataclass
+
+from loguru import logger
+from openai import AsyncOpenAI
+from dotenv import load_dotenv
+
+from src.services.github_http import GitHubTransport
+
+load_dotenv()
+
+HTTP2_AVAILABLE = importlib.util.find_spec("h2") is not None
+
+
+@dataclass
+class HTTPClientSettings:
+    """
+    Connection pool and timeout settings of the outgoing HTTP clients.
+
+    Attributes:
+        max_connections (int): The maximum number of open connections per client.
+        max_keepalive_connections (int): The maximum number of idle connections kept alive.
+        keepalive_expiry (float): How long in seconds an idle connection is kept alive.
+        timeout (float): The read, write and pool timeout in seconds.
+        connect_timeout (float): The connection timeout in seconds.
+        http2 (bool): Whether HTTP/2 is negotiated; requires the optional h2 package.
+    """
+    max_connections: int = 100
+    max_keepalive_connections: int = 20
+    keepalive_expiry: float = 30.0
+    timeout: float = 30.0
+    connect_timeout: float = 10.0
+    http2: bool = HTTP2_AVAILABLE
+
+    @classmethod
+    def from_env(cls) -> "HTTPClientSettings":
+        """
+        Reads the settings from the HTTP_* environment variables, using the defaults for the missing ones.
+
+        Returns:
+            HTTPClientSettings: The configured settings.
+        """
+        defaults = cls()
+        http2 = os.getenv("HTTP2", str(defaults.http2)).lower() in ("1", "true", "yes")
+        if http2 and not HTTP2_AVAILABLE:
+            logger.warning("HTTP2 is enabled but the h2 package is not installed, using HTTP/1.1")
+        return cls(
+            max_connections=int(os.getenv("HTTP_MAX_CONNECTIONS", defaults.max_connections)),
+            max_keepalive_connections=int(
+                os.getenv("HTTP_MAX_KEEPALIVE_CONNECTIONS", defaults.max_keepalive_connections)
+            ),
+            keepalive_expiry=float(os.getenv("HTTP_KEEPALIVE_EXPIRY", defaults.keepalive_expiry)),
+            timeout=float(os.getenv("HTTP_TIMEOUT", defaults.timeout)),
+            connect_timeout=float(os.getenv("HTTP_CONNECT_TIMEOUT", defaults.connect_timeout)),
+            http2=http2 and HTTP2_AVAILABLE,
+        )
+
+    @property
+    def limits(self) -> httpx.Limits:
+        """The connection pool limits."""
+        return httpx.Limits(
+            max_connections=self.max_connections,
+            max_keepalive_connections=self.max_keepalive_connections,
+            keepalive_expiry=self.keepalive_expiry,
+        )
+
+    @property
+    def timeouts(self) -> httpx.Timeout:
+        """The request timeouts."""
+        return httpx.Timeout(self.timeout, connect=self.connect_timeout)
+
+
+def create_github_client(settings: HTTPClientSettings | None = None) -> httpx.AsyncClient:
+    """
+    Creates a pooled HTTPX client for GitHub that reuses its connections, over HTTP/2 when available.
+
+    Requests go through a GitHubTransport, so they are conditional and rate-limit aware.
+
+    Args:
+        settings (HTTPClientSettings | None): The pool settings, read from the environment if omitted.
+
+    Returns:
+        httpx.AsyncClient: The configured client.
+    """
+    settings = settings or HTTPClientSettings.from_env()
+    transport = GitHubTransport(httpx.AsyncHTTPTransport(http2=settings.http2, limits=settings.limits))
+    return httpx.AsyncClient(transport=transport, timeout=settings.timeouts)
+
+
+def create_openai_client(settings: HTTPClientSettings | None = None) -> AsyncOpenAI:
+    """
+    Creates an asynchronous OpenAI client backed by a pooled HTTPX client.
+
+    Args:
+        settings (HTTPClientSettings | None): The pool settings, read from the environment if omitted.
+
+    Returns:
+        AsyncOpenAI: The configured client.
+    """
+    settings = settings or HTTPClientSettings.from_env()
+    http_client = httpx.AsyncClient(http2=settings.http2, limits=settings.limits, timeout=settings.timeouts)
+    return AsyncOpenAI(api_key=os.getenv("OPENAI_API_KEY"), http_client=http_client)
@@ -0,0 +1,243 @@
+import time
+import sqlite3
+import threading
+
+from abc import ABC, abstractmethod
+from dataclasses import dataclass
+from collections import OrderedDict
+
+from loguru import logger
+
+
+@dataclass
+class CacheStats:
+    """
+    Counters describing how effective a cache is.
+
+    Attributes:
+        hits (int): The number of lookups served from the cache.
+        misses (int): The number of lookups that had to be fetched.
+        bytes_saved (int): The number of bytes served from the cache instead of being downloaded.
+    """
+    hits: int = 0
+    misses: int = 0
+    bytes_saved: int = 0
+
+
+class KeyValueStore(ABC):
+    """
+    Base class for the byte-oriented key-value stores backing the service caches.
+
+    Implementations must be safe to share between the coroutines and threads of one process.
+    """
+
+    @abstractmethod
+    def get(self, key: str) -> bytes | None:
+        """
+        Retrieves a value.
+
+        Args:
+            key (str): The key to look up.
+
+        Returns:
+            bytes | None: The stored value, or None if it is missing or expired.
+        """
+
+    @abstractmethod
+    def set(self, key: str, value: bytes) -> None:
+        """
+        Stores a value, replacing any previous value of the key.
+
+        Args:
+            key (str): The key to store the value under.
+            value (bytes): The value to store.
+        """
+
+    @abstractmethod
+    def delete(self, key: str) -> None:
+        """
+        Removes a value if it exists.
+
+        Args:
+            key (str): The key to remove.
+        """
+
+
+class MemoryKeyValueStore(KeyValueStore):
+    """
+    An in-process LRU store evicting the least recently used values once a byte budget is exceeded.
+
+    Attributes:
+        max_bytes (int): The maximum total size of the stored values.
+        ttl_seconds (float | None): How long values stay valid, or None to keep them until evicted.
+    """
+
+    def __init__(self, max_bytes: int = 256 * 1024 * 1024, ttl_seconds: float | None = None):
+        self.max_bytes = max_bytes
+        self.ttl_seconds = ttl_seconds
+
+        self.__values: OrderedDict[str, tuple[bytes, float | None]] = OrderedDict()
+        self.__size = 0
+        self.__lock = threading.Lock()
+
+    @property
+    def size(self) -> int:
+        """The total size in bytes of the stored values."""
+        return self.__size
+
+    def get(self, key: str) -> bytes | None:
+        with self.__lock:
+            item = self.__values.get(key)
+            if item is None:
+                return None
+
+            value, expires_at = item
+            if expires_at is not None and expires_at <= time.monotonic():
+                self.__remove(key)
+                return None
+
+            self.__values.move_to_end(key)
+            return value
+
+    def set(self, key: str, value: bytes) -> None:
+        if len(value) > self.max_bytes:
+            logger.debug(f"Value of {key} exceeds the store capacity and is not cached")
+            return
+
+        expires_at = time.monotonic() + self.ttl_seconds if self.ttl_seconds is not None else None
+        with self.__lock:
+            self.__remove(key)
+            self.__values[key] = (value, expires_at)
+            self.__size += len(value)
+
+            while self.__size > self.max_bytes:
+                self.__remove(next(iter(self.__values)))
+
+    def delete(self, key: str) -> None:
+        with self.__lock:
+            self.__remove(key)
+
+    def __remove(self, key: str) -> None:
+        """Removes a key while the lock is held."""
+        item = self.__values.pop(key, None)
+        if item is not None:
+            self.__size -= len(item[0])
+
+
+class SQLiteKeyValueStore(KeyValueStore):
+    """
+    A persistent store kept in a SQLite database, surviving restarts and shared by every process using the file.
+
+    The database is read through a memory map, so hot values are served from the page cache.
+
+    Attributes:
+        path (str): The path of the database file.
+        max_bytes (int | None): The maximum total size of the stored values, or None for no limit.
+        ttl_seconds (float | None): How long values stay valid, or None to keep them until evicted.
+    """
+
+    def __init__(self, path: str, max_bytes: int | None = None, ttl_seconds: float | None = None):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.ttl_seconds = ttl_seconds
+
+        self.__lock = threading.Lock()
+        self.__connection = sqlite3.connect(path, check_same_thread=False, isolation_level=None, timeout=30)
+        self.__connection.execute("PRAGMA journal_mode=WAL")
+        self.__connection.execute("PRAGMA synchronous=NORMAL")
+        self.__connection.execute(f"PRAGMA mmap_size={256 * 1024 * 1024}")
+        self.__connection.execute(
+            "CREATE TABLE IF NOT EXISTS kv ("
+            "key TEXT PRIMARY KEY, value BLOB NOT NULL, expires_at REAL, accessed_at REAL NOT NULL)"
+        )
+        self.__connection.execute("CREATE INDEX IF NOT EXISTS kv_accessed_at ON kv (accessed_at)")
+        # The total size of the values is kept in one row, updated by triggers in the statement changing the values,
+        # so that writes stay constant-time as the store fills and every process sharing the file sees the same total
+        with self.__lock:
+            self.__connection.execute("BEGIN IMMEDIATE")
+            try:
+                self.__connection.execute(
+                    "CREATE TABLE IF NOT EXISTS kv_size (id INTEGER PRIMARY KEY CHECK (id = 0), size INTEGER NOT NULL)"
+                )
+                self.__connection.execute(
+                    "INSERT OR IGNORE INTO kv_size (id, size) SELECT 0, COALESCE(SUM(LENGTH(value)), 0) FROM kv"
+                )
+                self.__connection.execute(
+                    "CREATE TRIGGER IF NOT EXISTS kv_size_insert AFTER INSERT ON kv BEGIN "
+                    "UPDATE kv_size SET size = size + LENGTH(NEW.value) WHERE id = 0; END"
+                )
+                self.__connection.execute(
+                    "CREATE TRIGGER IF NOT EXISTS kv_size_update AFTER UPDATE OF value ON kv BEGIN "
+                    "UPDATE kv_size SET size = size - LENGTH(OLD.value) + LENGTH(NEW.value) WHERE id = 0; END"
+                )
+                self.__connection.execute(
+                    "CREATE TRIGGER IF NOT EXISTS kv_size_delete AFTER DELETE ON kv BEGIN "
+                    "UPDATE kv_size SET size = size - LENGTH(OLD.value) WHERE id = 0; END"
+                )
+                self.__connection.execute("COMMIT")
+            except BaseException:
+                self.__connection.execute("ROLLBACK")
+                raise
+
+    @property
+    def size(self) -> int:
+        """The total size in bytes of the stored values."""
+        with self.__lock:
+            (size,) = self.__connection.execute("SELECT size FROM kv_size WHERE id = 0").fetchone()
+        return size
+
+    def get(self, key: str) -> bytes | None:
+        now = time.time()
+        with self.__lock:
+            row = self.__connection.execute("SELECT value, expires_at FROM kv WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                return None
+
+            value, expires_at = row
+            if expires_at is not None and expires_at <= now:
+                self.__connection.execute("DELETE FROM kv WHERE key = ?", (key,))
+                return None
+
+            self.__connection.execute("UPDATE kv SET accessed_at = ? WHERE key = ?", (now, key))
+            return bytes(value)
+
+    def set(self, key: str, value: bytes) -> None:
+        now = time.time()
+        expires_at = now + self.ttl_seconds if self.ttl_seconds is not None else None
+        with self.__lock:
+            # An upsert rather than INSERT OR REPLACE, whose implicit delete would not fire the size trigger
+            self.__connection.execute(
+                "INSERT INTO kv (key, value, expires_at, accessed_at) VALUES (?, ?, ?, ?) "
+                "ON CONFLICT (key) DO UPDATE SET "
+                "value = excluded.value, expires_at = excluded.expires_at, accessed_at = excluded.accessed_at",
+                (key, value, expires_at, now),
+            )
+            if self.max_bytes is not None:
+                self.__evict()
+
+    def delete(self, key: str) -> None:
+        with self.__lock:
+            self.__connection.execute("DELETE FROM kv WHERE key = ?", (key,))
+
+    def close(self) -> None:
+        """Closes the database connection."""
+        with self.__lock:
+            self.__connection.close()
+
+    def __evict(self) -> None:
+        """Deletes the least recently used values until the byte budget is met, while the lock is held."""
+        (size,) = self.__connection.execute("SELECT size FROM kv_size WHERE id = 0").fetchone()
+        if size <= self.max_bytes:
+            return
+
+        # Read lazily through the index, since only the oldest values are usually evicted
+        rows = self.__connection.execute("SELECT key, LENGTH(value) FROM kv ORDER BY accessed_at")
+        evicted = []
+        for key, length in rows:
+            if size <= self.max_bytes:
+                break
+            evicted.append((key,))
+            size -= length
+        rows.close()
+
+        self.__connection.executemany("DELETE FROM kv WHERE key = ?", evicted)
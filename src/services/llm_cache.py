@@ -0,0 +1,143 @@
+import os
+import asyncio
+import hashlib
+
+from typing import Awaitable, Callable
+
+from loguru import logger
+from dotenv import load_dotenv
+
+from src.services.kv_store import KeyValueStore, MemoryKeyValueStore, SQLiteKeyValueStore, CacheStats
+
+load_dotenv()
+
+
+class LLMResponseCache:
+    """
+    Caches LLM responses by a hash of the model, system prompt and rendered prompt.
+
+    Identical prompts sent concurrently are coalesced: only the first one reaches the API and the
+    others wait for its response. Failed calls, and responses the caller finds unusable, are never
+    cached; a call cancelled with its caller, e.g. a client disconnecting, is made again by one of
+    the waiters rather than failing them.
+
+    Attributes:
+        store (KeyValueStore): The store holding the responses.
+        stats (CacheStats): Hit, miss and bytes-saved counters.
+        coalesced (int): The number of calls that waited for an identical call already in flight.
+    """
+
+    def __init__(self, store: KeyValueStore):
+        self.store = store
+        self.stats = CacheStats()
+        self.coalesced = 0
+
+        self.__in_flight: dict[str, asyncio.Future] = {}
+
+    @staticmethod
+    def key(model: str, system_prompt: str, prompt: str) -> str:
+        """
+        Builds the cache key of a request.
+
+        Args:
+            model (str): The model the prompt is sent to.
+            system_prompt (str): The system message of the request.
+            prompt (str): The rendered user prompt.
+
+        Returns:
+            str: The cache key.
+        """
+        digest = hashlib.sha256()
+        for value in (model, system_prompt, prompt):
+            digest.update(value.encode())
+            digest.update(b"\0")
+        return f"llm:{digest.hexdigest()}"
+
+    async def get_or_create(
+            self,
+            model: str,
+            system_prompt: str,
+            prompt: str,
+            create: Callable[[], Awaitable[str]],
+            cacheable: Callable[[str], bool] | None = None,
+    ) -> str:
+        """
+        Returns the cached response of a request, calling the API only on a miss.
+
+        Args:
+            model (str): The model the prompt is sent to.
+            system_prompt (str): The system message of the request.
+            prompt (str): The rendered user prompt.
+            create (Callable[[], Awaitable[str]]): The coroutine function calling the API.
+            cacheable (Callable[[str], bool] | None): Tells whether a response may be cached; every response
+                                                      is cached if omitted.
+
+        Returns:
+            str: The response.
+        """
+        key = self.key(model, system_prompt, prompt)
+
+        while True:
+            cached = self.store.get(key)
+            if cached is not None:
+                self.stats.hits += 1
+                self.stats.bytes_saved += len(cached)
+                return cached.decode()
+
+            in_flight = self.__in_flight.get(key)
+            if in_flight is None:
+                break
+            self.coalesced += 1
+            response = await asyncio.shield(in_flight)
+            if response is not None:
+                return response
+            # The call was cancelled along with its caller, so the waiters do not fail with it: one calls again
+
+        self.stats.misses += 1
+        future = asyncio.get_running_loop().create_future()
+        self.__in_flight[key] = future
+        try:
+            response = await create()
+        except asyncio.CancelledError:
+            future.set_result(None)
+            raise
+        except BaseException as ex:
+            future.set_exception(ex)
+            # Retrieve the exception so that it is not reported as never retrieved when nobody waits
+            future.exception()
+            raise
+        else:
+            future.set_result(response)
+            if cacheable is None or cacheable(response):
+                self.store.set(key, response.encode())
+            return response
+        finally:
+            del self.__in_flight[key]
+
+
+def create_llm_cache() -> LLMResponseCache | None:
+    """
+    Creates the LLM response cache configured through the environment.
+
+    LLM_CACHE_BACKEND selects "memory" (default), "sqlite" or "none"; LLM_CACHE_MAX_BYTES bounds the
+    cache size, LLM_CACHE_TTL sets how long responses stay valid in seconds and LLM_CACHE_PATH sets
+    the SQLite database file.
+
+    Returns:
+        LLMResponseCache | None: The configured cache, or None if caching is disabled.
+    """
+    backend = os.getenv("LLM_CACHE_BACKEND", "memory")
+    max_bytes = int(os.getenv("LLM_CACHE_MAX_BYTES", 64 * 1024 * 1024))
+    ttl = os.getenv("LLM_CACHE_TTL", 7 * 24 * 3600)
+    ttl_seconds = float(ttl) if ttl else None
+
+    if backend == "none":
+        return None
+    if backend == "sqlite":
+        path = os.getenv("LLM_CACHE_PATH", "llm_cache.sqlite3")
+        logger.info(f"Using SQLite LLM response cache at {path}")
+        return LLMResponseCache(SQLiteKeyValueStore(path, max_bytes=max_bytes, ttl_seconds=ttl_seconds))
+    if backend == "memory":
+        return LLMResponseCache(MemoryKeyValueStore(max_bytes=max_bytes, ttl_seconds=ttl_seconds))
+
+    raise ValueError(f"Unknown LLM cache backend: {backend}")
@@ -0,0 +1,131 @@
+import os
+import time
+import asyncio
+
+from typing import Awaitable, Callable, AsyncIterator
+from contextlib import asynccontextmanager
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+
+class TokenBucket:
+    """
+    A token bucket spreading LLM prompt tokens over time to honour a tokens-per-minute budget.
+
+    The bucket starts full, so short bursts are sent immediately, and refills continuously.
+
+    Attributes:
+        tokens_per_minute (int): The budget refilled every minute, which is also the bucket capacity.
+    """
+
+    def __init__(
+            self,
+            tokens_per_minute: int,
+            clock: Callable[[], float] = time.monotonic,
+            sleep: Callable[[float], Awaitable[None]] = asyncio.sleep,
+    ):
+        self.tokens_per_minute = tokens_per_minute
+
+        self.__clock = clock
+        self.__sleep = sleep
+        self.__available = float(tokens_per_minute)
+        self.__updated_at = clock()
+        self.__lock = asyncio.Lock()
+
+    async def acquire(self, tokens: int) -> None:
+        """
+        Waits until the given number of tokens can be spent and spends them.
+
+        Requests larger than the whole budget wait for a full bucket instead of blocking forever.
+
+        Args:
+            tokens (int): The number of tokens to spend.
+        """
+        tokens = min(tokens, self.tokens_per_minute)
+
+        # The lock keeps waiters in FIFO order, so large requests are not starved by small ones
+        async with self.__lock:
+            while True:
+                now = self.__clock()
+                refill = (now - self.__updated_at) * self.tokens_per_minute / 60
+                self.__available = min(self.__available + refill, self.tokens_per_minute)
+                self.__updated_at = now
+
+                if self.__available >= tokens:
+                    self.__available -= tokens
+                    return
+
+                await self.__sleep((tokens - self.__available) * 60 / self.tokens_per_minute)
+
+
+class LLMRateLimiter:
+    """
+    Bounds the LLM requests in flight and the prompt tokens sent per minute.
+
+    One limiter can be shared by several analyzers to enforce a global budget, and a limiter can draw
+    from a parent one, e.g. the limits of a batch within those of the process. The analyzers sharing a
+    limiter also build at most max_concurrency chunk prompts at once between them.
+
+    Attributes:
+        max_concurrency (int): The maximum number of requests in flight.
+        token_bucket (TokenBucket | None): The tokens-per-minute budget, or None for no budget.
+        parent (LLMRateLimiter | None): The limiter every request also waits for, if any.
+    """
+
+    def __init__(
+            self,
+            max_concurrency: int = 8,
+            tokens_per_minute: int | None = None,
+            parent: "LLMRateLimiter | None" = None,
+    ):
+        self.max_concurrency = max_concurrency
+        self.token_bucket = TokenBucket(tokens_per_minute) if tokens_per_minute else None
+        self.parent = parent
+
+        self.__semaphore = asyncio.Semaphore(max_concurrency)
+        self.__prompts = asyncio.Semaphore(max_concurrency)
+
+    @classmethod
+    def from_env(cls) -> "LLMRateLimiter":
+        """
+        Creates a limiter from LLM_MAX_CONCURRENCY (default 8) and LLM_TOKENS_PER_MINUTE (default unlimited).
+
+        Returns:
+            LLMRateLimiter: The configured limiter.
+        """
+        tokens_per_minute = os.getenv("LLM_TOKENS_PER_MINUTE")
+        return cls(
+            max_concurrency=int(os.getenv("LLM_MAX_CONCURRENCY", 8)),
+            tokens_per_minute=int(tokens_per_minute) if tokens_per_minute else None,
+        )
+
+    @asynccontextmanager
+    async def slot(self, tokens: int) -> AsyncIterator[None]:
+        """
+        Waits for a free request slot and enough token budget, holding the slot while the request runs.
+
+        Args:
+            tokens (int): The estimated number of prompt tokens of the request.
+        """
+        async with self.__semaphore:
+            if self.token_bucket is not None:
+                await self.token_bucket.acquire(tokens)
+            if self.parent is None:
+                yield
+            else:
+                async with self.parent.slot(tokens):
+                    yield
+
+    @asynccontextmanager
+    async def prompt_slot(self) -> AsyncIterator[None]:
+        """
+        Waits until fewer than max_concurrency prompts are held by the analyzers sharing this limiter.
+
+        An analyzer holds it from building a chunk prompt until the answer arrives, so the prompts kept
+        in memory by every review drawing from the limiter, e.g. all reviews of a batch, stay bounded
+        whatever the number of reviews.
+        """
+        async with self.__prompts:
+            yield
@@ -0,0 +1,529 @@
+import os
+import json
+import time
+import bisect
+import threading
+
+from typing import Callable, Iterator
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from src.services.data_structures import ReviewTraceReport, TraceSpan
+
+# Latency buckets in seconds, from a cached GitHub call to a slow final report
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0)
+
+Labels = tuple[str, ...]
+
+
+def _escape(value: str) -> str:
+    """Escapes a label value for the Prometheus text format."""
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(names: Labels, values: Labels, extra: str = "") -> str:
+    """Formats the labels of a sample in the Prometheus text format."""
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _format_value(value: float) -> str:
+    """Formats a sample value, integers without a decimal part."""
+    return str(int(value)) if float(value).is_integer() else repr(float(value))
+
+
+class Counter:
+    """
+    A monotonically increasing count, per combination of label values.
+
+    Attributes:
+        name (str): The name of the metric.
+        documentation (str): The help text of the metric.
+        labelnames (tuple[str, ...]): The names of the labels.
+    """
+
+    def __init__(self, name: str, documentation: str, labelnames: Labels = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = labelnames
+
+        self.__values: dict[Labels, float] = {}
+        self.__lock = threading.Lock()
+
+    def inc(self, *labels: str, amount: float = 1) -> None:
+        """
+        Increments the count.
+
+        Args:
+            *labels (str): The label values, in the order of labelnames.
+            amount (float): The increment.
+        """
+        with self.__lock:
+            self.__values[labels] = self.__values.get(labels, 0) + amount
+
+    def value(self, *labels: str) -> float:
+        """Returns the count for the given label values."""
+        return self.__values.get(labels, 0)
+
+    def samples(self) -> dict[Labels, list[float]]:
+        """Returns the count of each combination of label values."""
+        with self.__lock:
+            return {labels: [value] for labels, value in self.__values.items()}
+
+    def render(self, samples: dict[Labels, list[float]] | None = None) -> list[str]:
+        """Renders the metric, or the given samples of it, in the Prometheus text format."""
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} counter"]
+        values = sorted((samples if samples is not None else self.samples()).items())
+        lines += [f"{self.name}{_format_labels(self.labelnames, labels)} {_format_value(v)}" for labels, (v,) in values]
+        return lines
+
+
+class Histogram:
+    """
+    A distribution of observed values in fixed buckets, per combination of label values.
+
+    Observing a value is a bisection and a few additions, cheap enough for every request.
+
+    Attributes:
+        name (str): The name of the metric.
+        documentation (str): The help text of the metric.
+        labelnames (tuple[str, ...]): The names of the labels.
+        buckets (tuple[float, ...]): The upper bounds of the buckets, in increasing order.
+    """
+
+    def __init__(self, name: str, documentation: str, labelnames: Labels = (), buckets: tuple = LATENCY_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = labelnames
+        self.buckets = buckets
+
+        # Per label values: the count of each bucket, not cumulated, the last one being +Inf, then the sum
+        self.__values: dict[Labels, list[float]] = {}
+        self.__lock = threading.Lock()
+
+    def observe(self, value: float, *labels: str) -> None:
+        """
+        Records a value.
+
+        Args:
+            value (float): The observed value.
+            *labels (str): The label values, in the order of labelnames.
+        """
+        index = bisect.bisect_left(self.buckets, value)
+        with self.__lock:
+            counts = self.__values.get(labels)
+            if counts is None:
+                counts = self.__values[labels] = [0] * (len(self.buckets) + 2)
+            counts[index] += 1
+            counts[-1] += value
+
+    def count(self, *labels: str) -> int:
+        """Returns the number of values observed for the given label values."""
+        counts = self.__values.get(labels)
+        return int(sum(counts[:-1])) if counts is not None else 0
+
+    def samples(self) -> dict[Labels, list[float]]:
+        """Returns the bucket counts, not cumulated, followed by the sum of each combination of label values."""
+        with self.__lock:
+            return {labels: list(counts) for labels, counts in self.__values.items()}
+
+    def render(self, samples: dict[Labels, list[float]] | None = None) -> list[str]:
+        """Renders the metric, or the given samples of it, in the Prometheus text format."""
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} histogram"]
+        values = sorted((samples if samples is not None else self.samples()).items())
+
+        for labels, counts in values:
+            cumulative = 0
+            for bound, count in zip([*map(repr, self.buckets), "+Inf"], counts[:-1]):
+                cumulative += count
+                bucket_labels = _format_labels(self.labelnames, labels, f'le="{bound}"')
+                lines.append(f"{self.name}_bucket{bucket_labels} {_format_value(cumulative)}")
+            lines.append(f"{self.name}_sum{_format_labels(self.labelnames, labels)} {_format_value(counts[-1])}")
+            lines.append(f"{self.name}_count{_format_labels(self.labelnames, labels)} {_format_value(cumulative)}")
+        return lines
+
+
+class GaugeCallback:
+    """
+    A metric read from the state of the service each time the metrics are collected.
+
+    Attributes:
+        name (str): The name of the metric.
+        documentation (str): The help text of the metric.
+        labelnames (tuple[str, ...]): The names of the labels.
+        kind (str): The Prometheus type of the metric, "gauge" or "counter".
+    """
+
+    def __init__(
+            self,
+            name: str,
+            documentation: str,
+            callback: Callable[[], dict[Labels, float | None]],
+            labelnames: Labels = (),
+            kind: str = "gauge",
+    ):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = labelnames
+        self.kind = kind
+
+        self.__callback = callback
+
+    def samples(self) -> dict[Labels, list[float]]:
+        """Reads the current values, leaving out the unknown ones."""
+        return {labels: [value] for labels, value in self.__callback().items() if value is not None}
+
+    def render(self, samples: dict[Labels, list[float]] | None = None, labelnames: Labels | None = None) -> list[str]:
+        """
+        Renders the current values, or the given samples, in the Prometheus text format.
+
+        Args:
+            samples (dict[Labels, list[float]] | None): The samples to render; the current values if omitted.
+            labelnames (tuple[str, ...] | None): The names of the labels of the samples, if not labelnames.
+
+        Returns:
+            list[str]: The lines of the metric.
+        """
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        lines += [
+            f"{self.name}{_format_labels(labelnames or self.labelnames, labels)} {_format_value(value)}"
+            for labels, (value,) in sorted((samples if samples is not None else self.samples()).items())
+        ]
+        return lines
+
+
+class MetricsRegistry:
+    """
+    The metrics of the process, rendered in the Prometheus text exposition format by GET /metrics.
+
+    Attributes:
+        metrics (list[Counter | Histogram | GaugeCallback]): The registered metrics, in registration order.
+    """
+
+    def __init__(self):
+        self.metrics: list[Counter | Histogram | GaugeCallback] = []
+
+    def counter(self, name: str, documentation: str, labelnames: Labels = ()) -> Counter:
+        """Registers a counter."""
+        return self.__register(Counter(name, documentation, labelnames))
+
+    def histogram(
+            self, name: str, documentation: str, labelnames: Labels = (), buckets: tuple = LATENCY_BUCKETS
+    ) -> Histogram:
+        """Registers a histogram."""
+        return self.__register(Histogram(name, documentation, labelnames, buckets))
+
+    def gauge_callback(
+            self,
+            name: str,
+            documentation: str,
+            callback: Callable[[], dict[Labels, float | None]],
+            labelnames: Labels = (),
+            kind: str = "gauge",
+    ) -> GaugeCallback:
+        """Registers a metric read from the state of the service, replacing any metric of the same name."""
+        self.metrics = [metric for metric in self.metrics if metric.name != name]
+        return self.__register(GaugeCallback(name, documentation, callback, labelnames, kind))
+
+    def render(self) -> str:
+        """
+        Renders every metric.
+
+        Returns:
+            str: The metrics in the Prometheus text exposition format.
+        """
+        return "\n".join(line for metric in self.metrics for line in metric.render()) + "\n"
+
+    def snapshot(self) -> dict[str, list]:
+        """
+        Reads the samples of every metric.
+
+        Returns:
+            dict[str, list]: The [label values, values] pairs of each metric, keyed by metric name.
+        """
+        return {
+            metric.name: [[list(labels), values] for labels, values in metric.samples().items()]
+            for metric in self.metrics
+        }
+
+    def __register(self, metric):
+        """Adds a metric to the registry."""
+        self.metrics.append(metric)
+        return metric
+
+
+class SharedMetrics:
+    """
+    Aggregates the metrics of the worker processes of the service through a directory they share.
+
+    Every worker writes the samples of its registry to its own file, periodically and each time it
+    renders the metrics, so any worker answers GET /metrics for all of them. Counters and histograms
+    are summed over every file, those of stopped workers included so that totals never decrease;
+    gauges are listed per live worker with a worker label.
+
+    Attributes:
+        directory (str): The directory holding a file per worker.
+        registry (MetricsRegistry): The metrics of this worker.
+        worker (str): The identifier of this worker.
+        publish_seconds (float): How often the samples of this worker are written.
+    """
+
+    def __init__(self, directory: str, registry: "MetricsRegistry", worker: str, publish_seconds: float = 5.0):
+        self.directory = directory
+        self.registry = registry
+        self.worker = worker
+        self.publish_seconds = publish_seconds
+
+        os.makedirs(directory, exist_ok=True)
+        self.__path = os.path.join(directory, worker.replace(os.sep, "_").replace(":", "_") + ".json")
+
+    def publish(self, stopped: bool = False) -> None:
+        """
+        Writes the samples of this worker, replacing its file at once so readers never see it half-written.
+
+        Args:
+            stopped (bool): Whether the worker is stopping, its gauges being left out from then on.
+        """
+        data = {
+            "worker": self.worker,
+            "published_at": time.time(),
+            "stopped": stopped,
+            "metrics": self.registry.snapshot(),
+        }
+        temporary = f"{self.__path}.tmp"
+        with open(temporary, "w") as file:
+            json.dump(data, file)
+        os.replace(temporary, self.__path)
+
+    def render(self) -> str:
+        """
+        Renders the metrics of every worker.
+
+        Returns:
+            str: The aggregated metrics in the Prometheus text exposition format.
+        """
+        self.publish()
+        metrics = {metric.name: metric for metric in self.registry.metrics}
+        merged: dict[str, dict[Labels, list[float]]] = {name: {} for name in metrics}
+
+        for entry in os.scandir(self.directory):
+            if not entry.name.endswith(".json"):
+                continue
+            try:
+                with open(entry.path) as file:
+                    data = json.load(file)
+            except (OSError, ValueError):
+                continue
+            # A worker that crashed stops refreshing its file, and its gauges are left out after a few periods
+            live = not data["stopped"] and time.time() - data["published_at"] <= 3 * self.publish_seconds
+
+            for name, samples in data["metrics"].items():
+                metric = metrics.get(name)
+                if metric is None:
+                    continue
+                for labels, values in samples:
+                    if self.__per_worker(metric):
+                        if live:
+                            merged[name][(*labels, data["worker"])] = values
+                        continue
+                    total = merged[name].setdefault(tuple(labels), [0] * len(values))
+                    for index, value in enumerate(values[:len(total)]):
+                        total[index] += value
+
+        lines = []
+        for name, metric in metrics.items():
+            if self.__per_worker(metric):
+                lines += metric.render(merged[name], (*metric.labelnames, "worker"))
+            else:
+                lines += metric.render(merged[name])
+        return "\n".join(lines) + "\n"
+
+    @staticmethod
+    def __per_worker(metric: "Counter | Histogram | GaugeCallback") -> bool:
+        """Tells whether a metric is a gauge, whose values are not summed over the workers."""
+        return isinstance(metric, GaugeCallback) and metric.kind == "gauge"
+
+
+class ReviewTrace:
+    """
+    The breakdown of the time and resources spent by one review.
+
+    Spans of the same name, e.g. every GitHub request, are aggregated into their count, total and
+    longest duration, so a trace stays small whatever the size of the repository. The trace of the
+    running review is found through current_trace(), so shared clients can record into it.
+    """
+
+    def __init__(self):
+        self.__started = time.perf_counter()
+        self.__spans: dict[str, list[float]] = {}
+        self.__counters: dict[str, int] = {}
+
+    @property
+    def elapsed(self) -> float:
+        """The number of seconds since the trace started."""
+        return time.perf_counter() - self.__started
+
+    def add_span(self, name: str, seconds: float) -> None:
+        """
+        Records a timed step of the review.
+
+        Args:
+            name (str): The name of the step, e.g. "github_request".
+            seconds (float): The duration of the step.
+        """
+        span = self.__spans.get(name)
+        if span is None:
+            self.__spans[name] = [1, seconds, seconds]
+        else:
+            span[0] += 1
+            span[1] += seconds
+            span[2] = max(span[2], seconds)
+
+    def add(self, name: str, amount: int = 1) -> None:
+        """
+        Increments a counter of the review.
+
+        Args:
+            name (str): The name of the counter, e.g. "github_bytes".
+            amount (int): The increment.
+        """
+        self.__counters[name] = self.__counters.get(name, 0) + amount
+
+    @contextmanager
+    def activate(self) -> Iterator["ReviewTrace"]:
+        """Makes this trace the current trace of the calling task and of the tasks it creates."""
+        token = _current_trace.set(self)
+        try:
+            yield self
+        finally:
+            _current_trace.reset(token)
+
+    def report(self) -> ReviewTraceReport:
+        """
+        Builds the breakdown returned with the review.
+
+        Returns:
+            ReviewTraceReport: The spans, in order of first occurrence, and the counters.
+        """
+        return ReviewTraceReport(
+            total_seconds=round(self.elapsed, 6),
+            spans=[
+                TraceSpan(name=name, count=int(count), total_seconds=round(total, 6), max_seconds=round(longest, 6))
+                for name, (count, total, longest) in self.__spans.items()
+            ],
+            counters=dict(self.__counters),
+        )
+
+
+_current_trace: ContextVar[ReviewTrace | None] = ContextVar("review_trace", default=None)
+
+
+def current_trace() -> ReviewTrace | None:
+    """Returns the trace of the review running in the calling task, if any."""
+    return _current_trace.get()
+
+
+registry = MetricsRegistry()
+
+STAGE_SECONDS = registry.histogram(
+    "review_stage_seconds", "Duration of the stages of reviews and file fetches.", ("stage",)
+)
+QUEUE_WAIT_SECONDS = registry.histogram(
+    "review_queue_wait_seconds", "Time spent waiting for a review worker, a fetch slot or an LLM request slot.",
+    ("queue",),
+)
+GITHUB_REQUEST_SECONDS = registry.histogram(
+    "github_request_seconds", "Duration of GitHub API requests, body included.", ("endpoint", "status")
+)
+GITHUB_RESPONSE_BYTES = registry.counter(
+    "github_response_bytes_total", "Bytes downloaded from the GitHub API.", ("endpoint",)
+)
+LLM_REQUEST_SECONDS = registry.histogram(
+    "llm_request_seconds", "Duration of LLM API requests.", ("kind",)
+)
+LLM_TOKENS = registry.counter(
+    "llm_tokens_total", "Tokens of LLM requests, as reported by the API.", ("kind", "type")
+)
+LLM_TIER_SECONDS = registry.histogram(
+    "llm_tier_request_seconds", "Duration of LLM API requests by model tier, cheap or strong.", ("tier",)
+)
+LLM_ESCALATIONS = registry.counter(
+    "llm_escalations_total", "Chunk analyses of the cheap tier sent again to the strong tier for low confidence."
+)
+REVIEWS = registry.counter("reviews_total", "Reviews finished, by outcome.", ("outcome",))
+LLM_RETRIES = registry.counter(
+    "llm_retries_total", "LLM requests sent again: chunk analyses that failed, and final reports that were not JSON.",
+    ("kind",),
+)
+SINGLE_FLIGHT = registry.counter(
+    "single_flight_total",
+    "Reviews by role: leader runs, joined in-process or on another worker, or served from a recent run.",
+    ("role",),
+)
+
+
+def create_shared_metrics(worker: str) -> SharedMetrics | None:
+    """
+    Creates the aggregation of the metrics of the worker processes configured through the environment.
+
+    METRICS_DIR sets the directory shared by the workers, set by serve() when SERVER_WORKERS is above 1,
+    and METRICS_PUBLISH_SECONDS how often each worker writes its samples (default 5).
+
+    Args:
+        worker (str): The identifier of this worker.
+
+    Returns:
+        SharedMetrics | None: The aggregation, or None if the metrics are those of this process only.
+    """
+    directory = os.getenv("METRICS_DIR")
+    if not directory:
+        return None
+    return SharedMetrics(directory, registry, worker, float(os.getenv("METRICS_PUBLISH_SECONDS", 5)))
+
+
+def observe_stage(name: str, seconds: float, trace: ReviewTrace | None = None) -> None:
+    """
+    Records the duration of a stage in the stage histogram and in the review trace.
+
+    Args:
+        name (str): The name of the stage.
+        seconds (float): The duration of the stage.
+        trace (ReviewTrace | None): The trace to record into; the current trace if omitted.
+    """
+    STAGE_SECONDS.observe(seconds, name)
+    trace = trace or _current_trace.get()
+    if trace is not None:
+        trace.add_span(name, seconds)
+
+
+def observe_wait(queue: str, seconds: float, trace: ReviewTrace | None = None) -> None:
+    """
+    Records the time spent waiting in a queue in the wait histogram and in the review trace.
+
+    Args:
+        queue (str): The name of the queue, e.g. "llm_slot".
+        seconds (float): The time spent waiting.
+        trace (ReviewTrace | None): The trace to record into; the current trace if omitted.
+    """
+    QUEUE_WAIT_SECONDS.observe(seconds, queue)
+    trace = trace or _current_trace.get()
+    if trace is not None:
+        trace.add_span(f"{queue}_wait", seconds)
+
+
+@contextmanager
+def timed_stage(name: str, trace: ReviewTrace | None = None) -> Iterator[None]:
+    """
+    Times the enclosed block as a stage, whether it succeeds or fails.
+
+    Args:
+        name (str): The name of the stage.
+        trace (ReviewTrace | None): The trace to record into; the current trace if omitted.
+    """
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        observe_stage(name, time.perf_counter() - started, trace)
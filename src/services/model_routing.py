@@ -0,0 +1,145 @@
+import os
+import re
+
+from dataclasses import dataclass
+
+from dotenv import load_dotenv
+
+from src.services.chunker import Chunk, count_tokens
+from src.services.file_filter import blob_priority
+from src.services.static_analysis import FileInsights, MAX_COMPLEXITY
+
+load_dotenv()
+
+CHEAP_TIER = "cheap"
+STRONG_TIER = "strong"
+
+# A chunk scoring at least this is sent to the strong tier
+ROUTING_THRESHOLD = float(os.getenv("LLM_ROUTING_THRESHOLD", 0.5))
+# The code tokens from which size alone makes a chunk complex
+COMPLEX_CHUNK_TOKENS = 1500
+
+# Rough counts of branches and definitions, for the files without static analysis
+BRANCH_PATTERN = re.compile(r"\b(?:if|elif|else if|for|while|case|catch|except|and|or)\b|&&|\|\||\?")
+DEFINITION_PATTERN = re.compile(r"\b(?:def|function|func|fn|class)\b")
+
+# The last line the cheap tier is asked to end its answer with
+CONFIDENCE_PATTERN = re.compile(r"\n?\s*Confidence:\s*(high|medium|low)\W*\s*$", re.IGNORECASE)
+CONFIDENCE_REQUEST = """
+            End your answer with a last line 'Confidence: high', 'Confidence: medium' or 'Confidence: low',
+            stating how sure you are that the review is complete and correct.
+            """
+
+
+@dataclass
+class ModelRouter:
+    """
+    Sends each chunk analysis to a model tier, from a score computed locally before the request.
+
+    Documentation and configuration files score 0; code scores with its size and the cyclomatic
+    complexity of its functions, taken from the static analysis when available and estimated from its
+    branches otherwise. Chunks scoring below the threshold go to the cheap tier, which states its
+    confidence; a low-confidence answer is escalated to the strong tier. Summaries and the final report
+    always use the strong tier.
+
+    Attributes:
+        strong_model (str): The model of the strong tier.
+        cheap_model (str | None): The model of the cheap tier, or None to send every prompt to the strong tier.
+        threshold (float): The score, between 0 and 1, from which a chunk goes to the strong tier.
+        escalate (bool): Whether low-confidence answers of the cheap tier are sent again to the strong tier.
+    """
+    strong_model: str = "gpt-4-turbo"
+    cheap_model: str | None = None
+    threshold: float = ROUTING_THRESHOLD
+    escalate: bool = True
+
+    @classmethod
+    def from_env(cls) -> "ModelRouter":
+        """
+        Creates a router from LLM_STRONG_MODEL (default gpt-4-turbo), LLM_CHEAP_MODEL (default none, which
+        disables routing), LLM_ROUTING_THRESHOLD (default 0.5) and LLM_ESCALATE_LOW_CONFIDENCE (default true).
+
+        Returns:
+            ModelRouter: The configured router.
+        """
+        return cls(
+            strong_model=os.getenv("LLM_STRONG_MODEL", "gpt-4-turbo"),
+            cheap_model=os.getenv("LLM_CHEAP_MODEL") or None,
+            threshold=ROUTING_THRESHOLD,
+            escalate=os.getenv("LLM_ESCALATE_LOW_CONFIDENCE", "true").lower() == "true",
+        )
+
+    def model(self, tier: str) -> str:
+        """
+        Returns the model of a tier.
+
+        Args:
+            tier (str): CHEAP_TIER or STRONG_TIER.
+
+        Returns:
+            str: The model name.
+        """
+        return self.cheap_model if tier == CHEAP_TIER and self.cheap_model else self.strong_model
+
+    def route(self, chunk: Chunk, insights: dict[str, FileInsights] | None = None) -> str:
+        """
+        Chooses the tier analyzing a chunk.
+
+        Args:
+            chunk (Chunk): The chunk to analyze.
+            insights (dict[str, FileInsights] | None): The static analysis of the Python files, by file name.
+
+        Returns:
+            str: CHEAP_TIER or STRONG_TIER.
+        """
+        if self.cheap_model is None:
+            return STRONG_TIER
+        return CHEAP_TIER if score_chunk(chunk, insights) < self.threshold else STRONG_TIER
+
+
+def score_chunk(chunk: Chunk, insights: dict[str, FileInsights] | None = None) -> float:
+    """
+    Scores how demanding the review of a chunk is, the score of its most demanding file or part.
+
+    Args:
+        chunk (Chunk): The chunk to score.
+        insights (dict[str, FileInsights] | None): The static analysis of the Python files, by file name.
+
+    Returns:
+        float: The score, from 0 for documentation and configuration to 1 for large or complex code.
+    """
+    insights = insights or {}
+    scores = [0.0]
+    for part in chunk.parts:
+        filename = part.content.filename
+        if blob_priority(filename) > 0:
+            continue
+
+        text = part.text
+        insight = insights.get(filename)
+        if insight is not None and insight.outline:
+            complexity = insight.max_complexity
+        else:
+            complexity = 1 + len(BRANCH_PATTERN.findall(text)) / max(1, len(DEFINITION_PATTERN.findall(text)))
+
+        size = min(count_tokens(text) / COMPLEX_CHUNK_TOKENS, 1.0)
+        # Simple code is reviewed well by a cheap model whatever its length, so complexity weighs most
+        scores.append(0.25 * size + 0.75 * min(complexity / MAX_COMPLEXITY, 1.0))
+    return max(scores)
+
+
+def split_confidence(answer: str) -> tuple[str, str | None]:
+    """
+    Separates the analysis of a cheap tier answer from its last confidence line.
+
+    Args:
+        answer (str): The answer.
+
+    Returns:
+        tuple[str, str | None]: The analysis, and the confidence ("high", "medium" or "low"), or None if
+                                the answer does not state one.
+    """
+    match = CONFIDENCE_PATTERN.search(answer)
+    if match is None:
+        return answer, None
+    return answer[:match.start()].rstrip(), match.group(1).lower()
@@ -0,0 +1,161 @@
+import os
+import json
+import hashlib
+
+from loguru import logger
+from dotenv import load_dotenv
+
+from src.services.data_structures import Content
+from src.services.content_spool import ContentSpool
+from src.services.kv_store import KeyValueStore, MemoryKeyValueStore, SQLiteKeyValueStore, CacheStats
+
+load_dotenv()
+
+
+def git_blob_sha(data: bytes) -> str:
+    """
+    Computes the SHA git assigns to a blob with the given content.
+
+    Args:
+        data (bytes): The content of the file.
+
+    Returns:
+        str: The hex-encoded blob SHA.
+    """
+    return hashlib.sha1(b"blob %d\0" % len(data) + data).hexdigest()
+
+
+class RepositoryCache:
+    """
+    A content-addressed cache of repository trees keyed by commit SHA and file contents keyed by blob SHA.
+
+    Since commits and blobs are immutable, cached entries never need to be invalidated; the
+    underlying store only evicts them to respect its size budget.
+
+    Attributes:
+        store (KeyValueStore): The store holding the cached trees and blobs.
+        stats (CacheStats): Blob-level hit, miss and bytes-saved counters.
+        full_hits (int): The number of repositories served entirely from the cache.
+    """
+
+    def __init__(self, store: KeyValueStore):
+        self.store = store
+        self.stats = CacheStats()
+        self.full_hits = 0
+
+    def get_tree(self, owner: str, repo_name: str, commit_sha: str) -> list[dict] | None:
+        """
+        Retrieves the blob entries of a commit tree.
+
+        Args:
+            owner (str): The owner of the repository.
+            repo_name (str): The name of the repository.
+            commit_sha (str): The commit whose tree is requested.
+
+        Returns:
+            list[dict] | None: The cached tree entries, or None if the tree is not cached.
+        """
+        data = self.store.get(f"tree:{owner}/{repo_name}@{commit_sha}")
+        return json.loads(data) if data is not None else None
+
+    def put_tree(self, owner: str, repo_name: str, commit_sha: str, entries: list[dict]) -> None:
+        """
+        Stores the blob entries of a commit tree.
+
+        Args:
+            owner (str): The owner of the repository.
+            repo_name (str): The name of the repository.
+            commit_sha (str): The commit whose tree is stored.
+            entries (list[dict]): The tree entries, each with "path", "sha" and "size" keys.
+        """
+        entries = [{"path": entry["path"], "sha": entry["sha"], "size": entry.get("size")} for entry in entries]
+        self.store.set(f"tree:{owner}/{repo_name}@{commit_sha}", json.dumps(entries).encode())
+
+    def __get_blob_data(self, sha: str) -> bytes | None:
+        """Retrieves the raw content of a blob and updates the hit and miss counters."""
+        data = self.store.get(f"blob:{sha}")
+        if data is None:
+            self.stats.misses += 1
+            return None
+
+        self.stats.hits += 1
+        self.stats.bytes_saved += len(data)
+        return data
+
+    def get_blob(self, sha: str) -> str | None:
+        """
+        Retrieves the content of a blob and updates the hit and miss counters.
+
+        Args:
+            sha (str): The blob SHA.
+
+        Returns:
+            str | None: The cached content, or None if the blob is not cached.
+        """
+        data = self.__get_blob_data(sha)
+        return data.decode("utf-8", "replace") if data is not None else None
+
+    def put_blob(self, sha: str, data: bytes) -> None:
+        """
+        Stores the content of a blob.
+
+        Args:
+            sha (str): The blob SHA.
+            data (bytes): The raw content of the blob, as downloaded.
+        """
+        self.store.set(f"blob:{sha}", data)
+
+    def lookup(
+            self, entries: list[dict], spool: ContentSpool | None = None
+    ) -> tuple[dict[str, Content], list[dict]]:
+        """
+        Splits tree entries into the ones available in the cache and the ones that must be fetched.
+
+        Args:
+            entries (list[dict]): The tree entries to look up.
+            spool (ContentSpool | None): The spool holding the file contents within the request memory budget;
+                                         the contents are kept in memory as strings if omitted.
+
+        Returns:
+            tuple[dict[str, Content], list[dict]]: The cached files keyed by path and the missing entries.
+        """
+        cached: dict[str, Content] = {}
+        missing: list[dict] = []
+
+        for entry in entries:
+            data = self.__get_blob_data(entry["sha"])
+            if data is None:
+                missing.append(entry)
+            else:
+                file_content = spool.store(data) if spool is not None else data.decode("utf-8", "replace")
+                cached[entry["path"]] = Content(filename=entry["path"], file_content=file_content, sha=entry["sha"])
+
+        if entries and not missing:
+            self.full_hits += 1
+
+        return cached, missing
+
+
+def create_repository_cache() -> RepositoryCache | None:
+    """
+    Creates the repository cache configured through the environment.
+
+    REPO_CACHE_BACKEND selects "memory" (default), "sqlite" or "none"; REPO_CACHE_MAX_BYTES bounds
+    the cache size and REPO_CACHE_PATH sets the SQLite database file.
+
+    Returns:
+        RepositoryCache | None: The configured cache, or None if caching is disabled.
+    """
+    backend = os.getenv("REPO_CACHE_BACKEND", "memory")
+    max_bytes = int(os.getenv("REPO_CACHE_MAX_BYTES", 256 * 1024 * 1024))
+
+    if backend == "none":
+        return None
+    if backend == "sqlite":
+        path = os.getenv("REPO_CACHE_PATH", "repo_cache.sqlite3")
+        logger.info(f"Using SQLite repository cache at {path}")
+        return RepositoryCache(SQLiteKeyValueStore(path, max_bytes=max_bytes))
+    if backend == "memory":
+        return RepositoryCache(MemoryKeyValueStore(max_bytes=max_bytes))
+
+    raise ValueError(f"Unknown repository cache backend: {backend}")
@@ -0,0 +1,225 @@
+import os
+import asyncio
+
+from pathlib import Path
+from typing import Callable
+from urllib.parse import unquote, urlparse
+from abc import ABC, abstractmethod
+
+from loguru import logger
+from dotenv import load_dotenv
+
+from src.services.file_filter import FileFilter
+from src.services.content_spool import ContentSpool
+from src.services.git_objects import GitRepository
+from src.services.metrics import timed_stage
+from src.services.data_structures import RepoFilesResponse, Content, SkippedFile
+
+load_dotenv()
+
+# The directories holding the local clones that may be reviewed, e.g. internal mirrors of GitHub repositories
+LOCAL_GIT_ROOTS = [Path(root.strip()) for root in os.getenv("LOCAL_GIT_ROOTS", "").split(",") if root.strip()]
+
+
+class RepositorySource(ABC):
+    """
+    Base class for the places other than the GitHub API that repository files are read from.
+
+    Implementations return the same RepoFilesResponse as a GitHub fetch, blob SHAs and commit SHA included,
+    so that caches, snapshots and re-reviews work alike whatever the source.
+    """
+
+    @abstractmethod
+    async def resolve_commit(self, ref: str | None = None) -> str:
+        """
+        Resolves a revision to a commit.
+
+        Args:
+            ref (str | None): The commit, branch or tag, or None for the default branch.
+
+        Returns:
+            str: The commit SHA.
+        """
+
+    @abstractmethod
+    async def fetch_files(
+            self,
+            ref: str | None = None,
+            file_filter: FileFilter | None = None,
+            spool: ContentSpool | None = None,
+    ) -> RepoFilesResponse:
+        """
+        Reads the files of a commit.
+
+        Args:
+            ref (str | None): The commit, branch or tag, or None for the default branch.
+            file_filter (FileFilter | None): The filter whose skipped files are not read.
+            spool (ContentSpool | None): The spool holding the file contents within the request memory budget.
+
+        Returns:
+            RepoFilesResponse: The files of the commit.
+        """
+
+
+class LocalGitSource(RepositorySource):
+    """
+    Reads repository files straight from the object database of a local clone, without any network access.
+
+    The object reads are blocking file and decompression work, so they run in a thread.
+    """
+
+    def __init__(self, path: str | Path):
+        """
+        Initializes the source with the clone to read.
+
+        Args:
+            path (str | Path): The working tree of a clone, its .git directory, or a bare repository.
+        """
+        self.path = Path(path)
+
+    async def resolve_commit(self, ref: str | None = None) -> str:
+        """
+        Resolves a revision to a commit of the clone.
+
+        Args:
+            ref (str | None): A full commit SHA, a branch, a tag or a ref name, or None for HEAD.
+
+        Returns:
+            str: The commit SHA.
+
+        Raises:
+            GitObjectError: If the revision does not designate a commit of the clone.
+        """
+        def resolve() -> str:
+            """Resolve the revision in the worker thread."""
+            with GitRepository(self.path) as repository:
+                return repository.resolve(ref)
+
+        return await asyncio.to_thread(resolve)
+
+    async def fetch_files(
+            self,
+            ref: str | None = None,
+            file_filter: FileFilter | None = None,
+            spool: ContentSpool | None = None,
+    ) -> RepoFilesResponse:
+        """
+        Reads the regular files of a commit of the clone, in tree order.
+
+        Args:
+            ref (str | None): A full commit SHA, a branch, a tag or a ref name, or None for HEAD.
+            file_filter (FileFilter | None): The filter whose skipped files are not read.
+            spool (ContentSpool | None): The spool holding the file contents within the request memory budget;
+                                         every content is decoded into a string if omitted.
+
+        Returns:
+            RepoFilesResponse: The files of the commit.
+
+        Raises:
+            GitObjectError: If the revision or an object cannot be read.
+        """
+        return await asyncio.to_thread(self.__read_files, ref, file_filter, spool)
+
+    def __read_files(
+            self, ref: str | None, file_filter: FileFilter | None, spool: ContentSpool | None
+    ) -> RepoFilesResponse:
+        """Reads the files of a commit, in the worker thread."""
+        file_contents: list[Content] = []
+        skipped_files: list[SkippedFile] = []
+        with GitRepository(self.path) as repository:
+            commit_sha = repository.resolve(ref)
+            with timed_stage("tree_walk"):
+                entries = list(repository.walk_tree(repository.commit_tree(commit_sha)))
+
+            for path, sha in entries:
+                # Paths are checked before the blob is read, sizes once it is
+                reason = file_filter.check_path(path) if file_filter is not None else None
+                if reason is None:
+                    data = repository.read_blob(sha)
+                    reason = file_filter.check_path(path, len(data)) if file_filter is not None else None
+                if reason is not None:
+                    skipped_files.append(SkippedFile(filename=path, reason=reason))
+                    continue
+
+                file_content = spool.store(data) if spool is not None else data.decode("utf-8", "replace")
+                file_contents.append(Content(filename=path, file_content=file_content, sha=sha))
+
+        logger.debug(f"Read {len(file_contents)} files of {self.path}@{commit_sha}")
+        return RepoFilesResponse(
+            files=file_contents, count=len(file_contents), commit_sha=commit_sha, skipped_files=skipped_files
+        )
+
+
+def find_local_repository(repo_url: str, roots: list[Path] | None = None) -> Path | None:
+    """
+    Finds the local clone of a repository under the configured roots.
+
+    A file:// URL designates a clone directly; a GitHub URL is served from a mirror found at
+    <root>/<owner>/<repo>.git or <root>/<owner>/<repo>. Paths resolving outside every root are ignored.
+
+    Args:
+        repo_url (str): The URL of the repository.
+        roots (list[Path] | None): The directories holding the clones; LOCAL_GIT_ROOTS if omitted.
+
+    Returns:
+        Path | None: The clone, or None if the repository has no local clone.
+
+    Raises:
+        ValueError: If a file:// URL designates a path outside the roots.
+    """
+    roots = [root.resolve() for root in (LOCAL_GIT_ROOTS if roots is None else roots)]
+    if repo_url.startswith("file://"):
+        path = Path(unquote(urlparse(repo_url).path)).resolve()
+        if not any(path.is_relative_to(root) for root in roots):
+            raise ValueError("Local repositories must be under one of LOCAL_GIT_ROOTS")
+        return path
+
+    parts = repo_url.rstrip("/").split("/")
+    if len(parts) < 5 or parts[2] != "github.com" or not roots:
+        return None
+    owner, repo_name = parts[3], parts[4].removesuffix(".git")
+    for root in roots:
+        for candidate in (root / owner / f"{repo_name}.git", root / owner / repo_name):
+            candidate = candidate.resolve()
+            if candidate.is_relative_to(root) and candidate.is_dir():
+                return candidate
+    return None
+
+
+def find_local_source(repo_url: str) -> RepositorySource | None:
+    """
+    Serves a repository from its local clone, if it has one under LOCAL_GIT_ROOTS.
+
+    Args:
+        repo_url (str): The URL of the repository.
+
+    Returns:
+        RepositorySource | None: The local source, or None if the repository has no local clone.
+    """
+    path = find_local_repository(repo_url)
+    return LocalGitSource(path) if path is not None else None
+
+
+# Finds the source of a repository URL, in order; repositories no finder claims are fetched from GitHub
+SOURCE_FINDERS: list[Callable[[str], RepositorySource | None]] = [find_local_source]
+
+
+def find_repository_source(repo_url: str) -> RepositorySource | None:
+    """
+    Finds the source of a repository other than the GitHub API.
+
+    Args:
+        repo_url (str): The URL of the repository.
+
+    Returns:
+        RepositorySource | None: The first source claiming the repository, or None to fetch it from GitHub.
+
+    Raises:
+        ValueError: If the URL designates a source that may not be read.
+    """
+    for find_source in SOURCE_FINDERS:
+        source = find_source(repo_url)
+        if source is not None:
+            return source
+    return None
+
@@ -0,0 +1,135 @@
+import os
+import asyncio
+import posixpath
+
+from typing import Awaitable, Callable
+from dataclasses import dataclass
+
+from loguru import logger
+from dotenv import load_dotenv
+
+from src.services.chunker import count_tokens
+
+load_dotenv()
+
+REPORT_MAX_TOKENS = int(os.getenv("LLM_REPORT_MAX_TOKENS", 12000))
+
+# Levels after which notes that still do not fit are truncated instead of summarized again
+MAX_REDUCE_LEVELS = 16
+
+
+@dataclass
+class ReportNode:
+    """
+    Review notes about a directory of the project, either a chunk analysis or a summary of several notes.
+
+    Attributes:
+        directory (str): The directory the notes are about, "" for the project root.
+        text (str): The notes.
+    """
+    directory: str
+    text: str
+
+
+def parent_directory(directory: str) -> str:
+    """
+    Returns the directory containing another one, the root being its own parent.
+
+    Args:
+        directory (str): The directory, "" for the project root.
+
+    Returns:
+        str: The parent directory.
+    """
+    return posixpath.dirname(directory)
+
+
+def _truncate(text: str, max_tokens: int) -> str:
+    """Cuts a text to about max_tokens tokens."""
+    if count_tokens(text) <= max_tokens:
+        return text
+    return text[:max_tokens * 4]
+
+
+def group_nodes(nodes: list[ReportNode], max_tokens: int) -> list[list[ReportNode]]:
+    """
+    Groups the notes of each directory into batches of at most max_tokens tokens.
+
+    Args:
+        nodes (list[ReportNode]): The notes to group, in report order.
+        max_tokens (int): The maximum number of tokens of the notes of a batch.
+
+    Returns:
+        list[list[ReportNode]]: The batches, ordered by the first appearance of their directory.
+    """
+    by_directory: dict[str, list[ReportNode]] = {}
+    for node in nodes:
+        by_directory.setdefault(node.directory, []).append(node)
+
+    batches: list[list[ReportNode]] = []
+    for directory_nodes in by_directory.values():
+        batch: list[ReportNode] = []
+        batch_tokens = 0
+        for node in directory_nodes:
+            tokens = count_tokens(node.text)
+            if batch and batch_tokens + tokens > max_tokens:
+                batches.append(batch)
+                batch, batch_tokens = [], 0
+            batch.append(node)
+            batch_tokens += tokens
+        batches.append(batch)
+
+    return batches
+
+
+async def reduce_report(
+        nodes: list[ReportNode],
+        summarize: Callable[[str, list[str]], Awaitable[str]],
+        max_tokens: int = REPORT_MAX_TOKENS,
+) -> str:
+    """
+    Reduces review notes until they fit in max_tokens tokens, merging them up the directory tree.
+
+    Notes that already fit are returned joined, as they are. Otherwise the notes of each directory
+    are summarized in parallel batches that each fit in max_tokens, and the summaries move up to the
+    parent directory to be merged with their siblings, until everything fits. The number of levels,
+    and so the latency of the reduction, grows logarithmically with the number of notes.
+
+    Args:
+        nodes (list[ReportNode]): The notes to reduce, in report order.
+        summarize (Callable[[str, list[str]], Awaitable[str]]): Summarizes the notes of a directory.
+        max_tokens (int): The maximum number of tokens of the notes sent in any single prompt.
+
+    Returns:
+        str: The joined notes, of at most about max_tokens tokens.
+    """
+    nodes = [ReportNode(node.directory, _truncate(node.text, max_tokens)) for node in nodes]
+
+    for level in range(MAX_REDUCE_LEVELS):
+        notes = "\n\n".join(node.text for node in nodes)
+        if count_tokens(notes) <= max_tokens:
+            return notes
+
+        batches = group_nodes(nodes, max_tokens)
+        at_root = all(node.directory == "" for node in nodes)
+        logger.debug(f"Reducing {len(nodes)} report notes into {len(batches)} summaries (level {level + 1})")
+
+        async def reduce_batch(batch: list[ReportNode]) -> ReportNode:
+            """Summarize a batch, or only move it up when it is a single note that can still be merged higher."""
+            directory = batch[0].directory
+            if len(batch) == 1 and not at_root:
+                return ReportNode(parent_directory(directory), batch[0].text)
+
+            summary = await summarize(directory, [node.text for node in batch])
+            label = f"Directory {directory}" if directory else "Project"
+            return ReportNode(parent_directory(directory), _truncate(f"{label}:\n{summary}", max_tokens))
+
+        tasks = []
+        async with asyncio.TaskGroup() as task_group:
+            for batch in batches:
+                tasks.append(task_group.create_task(reduce_batch(batch)))
+
+        nodes = [task.result() for task in tasks]
+
+    logger.warning(f"Report notes still exceed {max_tokens} tokens after {MAX_REDUCE_LEVELS} levels, truncating")
+    return _truncate("\n\n".join(node.text for node in nodes), max_tokens)
@@ -0,0 +1,101 @@
+import os
+import asyncio
+
+from typing import Awaitable, Callable, AsyncIterator
+from dataclasses import dataclass
+
+from loguru import logger
+from dotenv import load_dotenv
+from fastapi import HTTPException
+
+from src.services.llm_limits import LLMRateLimiter
+from src.services.review_snapshots import REVIEW_ID_HEADER
+from src.services.data_structures import AnalysisReport, BatchReviewResult, ReviewRequest
+
+load_dotenv()
+
+
+@dataclass
+class BatchBudget:
+    """
+    The limits shared by every review of a batch, whatever the number of repositories.
+
+    Attributes:
+        fetch_slots (asyncio.Semaphore): Bounds the repositories being fetched from GitHub at once.
+        limiter (LLMRateLimiter): Bounds the LLM requests in flight and the prompt tokens per minute.
+    """
+    fetch_slots: asyncio.Semaphore
+    limiter: LLMRateLimiter
+
+    @classmethod
+    def from_env(cls, limiter: LLMRateLimiter | None = None) -> "BatchBudget":
+        """
+        Creates a budget from BATCH_MAX_FETCHES (default 4) and BATCH_LLM_MAX_CONCURRENCY (default 16).
+
+        Args:
+            limiter (LLMRateLimiter | None): The process-wide LLM limits the batch draws from; the batch
+                                             applies LLM_TOKENS_PER_MINUTE (default unlimited) itself if omitted.
+
+        Returns:
+            BatchBudget: The configured budget.
+        """
+        tokens_per_minute = os.getenv("LLM_TOKENS_PER_MINUTE")
+        return cls(
+            fetch_slots=asyncio.Semaphore(int(os.getenv("BATCH_MAX_FETCHES", 4))),
+            limiter=LLMRateLimiter(
+                max_concurrency=int(os.getenv("BATCH_LLM_MAX_CONCURRENCY", 16)),
+                tokens_per_minute=int(tokens_per_minute) if tokens_per_minute and limiter is None else None,
+                parent=limiter,
+            ),
+        )
+
+
+async def review_batch(
+        requests: list[ReviewRequest],
+        review: Callable[[ReviewRequest], Awaitable[AnalysisReport]],
+) -> AsyncIterator[BatchReviewResult]:
+    """
+    Runs the reviews of a batch concurrently, yielding each result as soon as its review finishes.
+
+    Every review starts at once and waits on the budget its review function draws from, so the GitHub
+    fetches of some repositories overlap the LLM requests of others. A failing review is reported in
+    its result without stopping the others. Closing the iterator early cancels the running reviews.
+
+    Args:
+        requests (list[ReviewRequest]): The reviews to run.
+        review (Callable[[ReviewRequest], Awaitable[AnalysisReport]]): Runs one review within the batch budget.
+
+    Yields:
+        BatchReviewResult: The result of each review, in completion order.
+    """
+    async def run(index: int, request: ReviewRequest) -> BatchReviewResult:
+        """Run one review, turning its failure into a result."""
+        result = BatchReviewResult(index=index, github_repo_url=request.github_repo_url, completed=0, total=total)
+        try:
+            result.report = await review(request)
+        except HTTPException as e:
+            result.status_code, result.error = e.status_code, e.detail
+            result.review_id = (e.headers or {}).get(REVIEW_ID_HEADER)
+        except Exception as e:
+            logger.error(f"Error reviewing {request.github_repo_url} in a batch: {e}")
+            result.status_code, result.error = 500, "An internal error occurred while processing the analysis."
+        return result
+
+    total = len(requests)
+    completed = 0
+    pending = {asyncio.create_task(run(index, request)) for index, request in enumerate(requests)}
+    try:
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                completed += 1
+                result = task.result()
+                result.completed = completed
+                yield result
+
+    finally:
+        for task in pending:
+            task.cancel()
+        await asyncio.gather(*pending, return_exceptions=True)
+
+    logger.info(f"Batch of {total} reviews completed")
@@ -0,0 +1,382 @@
+import os
+import time
+import uuid
+import asyncio
+import sqlite3
+import threading
+
+from abc import ABC, abstractmethod
+from typing import Awaitable, Callable
+from collections import OrderedDict
+
+from loguru import logger
+from dotenv import load_dotenv
+from fastapi import HTTPException
+
+from src.services.metrics import ReviewTrace, observe_wait
+from src.services.single_flight import LeaseStore, MemoryLeaseStore, SQLiteLeaseStore, worker_identity
+from src.services.data_structures import ReviewJob, ReviewJobStatus, ReviewProgress, ReviewRequest, AnalysisReport
+
+load_dotenv()
+
+ReviewRunner = Callable[[ReviewRequest, Callable[[ReviewProgress], None]], Awaitable[AnalysisReport]]
+
+
+class ReviewQueueFullError(Exception):
+    """Raised when a review is submitted while the job queue is full."""
+
+
+class ReviewJobStore(ABC):
+    """
+    Base class for the stores keeping the state of review jobs.
+
+    Implementations must be safe to share between the coroutines and threads of one process.
+    """
+
+    @abstractmethod
+    def get(self, job_id: str) -> ReviewJob | None:
+        """
+        Retrieves a job.
+
+        Args:
+            job_id (str): The identifier of the job.
+
+        Returns:
+            ReviewJob | None: The job, or None if it is unknown.
+        """
+
+    @abstractmethod
+    def put(self, job: ReviewJob) -> None:
+        """
+        Stores a job, replacing its previous state.
+
+        Args:
+            job (ReviewJob): The job to store.
+        """
+
+    @abstractmethod
+    def unfinished(self) -> list[ReviewJob]:
+        """
+        Lists the jobs that are queued or running, oldest first.
+
+        Returns:
+            list[ReviewJob]: The unfinished jobs.
+        """
+
+
+class MemoryReviewJobStore(ReviewJobStore):
+    """
+    An in-process job store forgetting the oldest finished jobs once more than max_jobs are kept.
+
+    Attributes:
+        max_jobs (int): The maximum number of jobs kept.
+    """
+
+    def __init__(self, max_jobs: int = 10000):
+        self.max_jobs = max_jobs
+
+        self.__jobs: OrderedDict[str, ReviewJob] = OrderedDict()
+        self.__lock = threading.Lock()
+
+    def get(self, job_id: str) -> ReviewJob | None:
+        with self.__lock:
+            job = self.__jobs.get(job_id)
+            return job.model_copy(deep=True) if job is not None else None
+
+    def put(self, job: ReviewJob) -> None:
+        with self.__lock:
+            self.__jobs[job.id] = job.model_copy(deep=True)
+
+            if len(self.__jobs) > self.max_jobs:
+                finished = [
+                    job_id for job_id, stored in self.__jobs.items()
+                    if stored.status in (ReviewJobStatus.completed, ReviewJobStatus.failed)
+                ]
+                for job_id in finished[:len(self.__jobs) - self.max_jobs]:
+                    del self.__jobs[job_id]
+
+    def unfinished(self) -> list[ReviewJob]:
+        with self.__lock:
+            return [
+                job.model_copy(deep=True) for job in self.__jobs.values()
+                if job.status in (ReviewJobStatus.queued, ReviewJobStatus.running)
+            ]
+
+
+class SQLiteReviewJobStore(ReviewJobStore):
+    """
+    A persistent job store kept in a SQLite database, so that unfinished jobs are resumed after a restart.
+
+    Attributes:
+        path (str): The path of the database file.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+
+        self.__lock = threading.Lock()
+        self.__connection = sqlite3.connect(path, check_same_thread=False, isolation_level=None, timeout=30)
+        self.__connection.execute("PRAGMA journal_mode=WAL")
+        self.__connection.execute("PRAGMA synchronous=NORMAL")
+        self.__connection.execute(
+            "CREATE TABLE IF NOT EXISTS review_jobs ("
+            "id TEXT PRIMARY KEY, status TEXT NOT NULL, data TEXT NOT NULL, created_at REAL NOT NULL)"
+        )
+        self.__connection.execute("CREATE INDEX IF NOT EXISTS review_jobs_status ON review_jobs (status)")
+
+    def get(self, job_id: str) -> ReviewJob | None:
+        with self.__lock:
+            row = self.__connection.execute("SELECT data FROM review_jobs WHERE id = ?", (job_id,)).fetchone()
+        return ReviewJob.model_validate_json(row[0]) if row is not None else None
+
+    def put(self, job: ReviewJob) -> None:
+        with self.__lock:
+            self.__connection.execute(
+                "INSERT INTO review_jobs (id, status, data, created_at) VALUES (?, ?, ?, ?) "
+                "ON CONFLICT (id) DO UPDATE SET status = excluded.status, data = excluded.data",
+                (job.id, job.status.value, job.model_dump_json(), time.time()),
+            )
+
+    def unfinished(self) -> list[ReviewJob]:
+        with self.__lock:
+            rows = self.__connection.execute(
+                "SELECT data FROM review_jobs WHERE status IN (?, ?) ORDER BY created_at",
+                (ReviewJobStatus.queued.value, ReviewJobStatus.running.value),
+            ).fetchall()
+        return [ReviewJob.model_validate_json(data) for (data,) in rows]
+
+    def close(self) -> None:
+        """Closes the database connection."""
+        with self.__lock:
+            self.__connection.close()
+
+
+class ReviewJobManager:
+    """
+    Runs reviews in the background on a bounded pool of worker tasks.
+
+    Reviews spend their time waiting on GitHub and OpenAI, so the workers are asyncio tasks sharing
+    the application's pooled clients rather than processes.
+
+    Several service processes can share one persistent store: a job is run by the process holding
+    its lease, renewed while the job runs, and every process periodically queues the unfinished jobs
+    whose lease expired, so the jobs of a stopped or crashed process are run by the others.
+
+    Attributes:
+        store (ReviewJobStore): The store keeping the state of the jobs.
+        workers (int): The number of reviews run at the same time.
+        max_queued (int): The maximum number of jobs submitted to this process waiting for a worker; the
+                          jobs it queues on behalf of other processes are not counted.
+        leases (LeaseStore): The leases of the running jobs, shared by the processes sharing the store.
+        lease_seconds (float): How long a job lease lasts without being renewed.
+    """
+
+    def __init__(
+            self,
+            store: ReviewJobStore,
+            runner: ReviewRunner,
+            workers: int = 4,
+            max_queued: int = 100,
+            leases: LeaseStore | None = None,
+            lease_seconds: float = 30.0,
+    ):
+        self.store = store
+        self.workers = workers
+        self.max_queued = max_queued
+        self.leases = leases or MemoryLeaseStore()
+        self.lease_seconds = lease_seconds
+
+        self.__runner = runner
+        self.__owner = worker_identity()
+        # The queued job ids with the time they were queued at
+        self.__queue: asyncio.Queue[tuple[str, float]] = asyncio.Queue()
+        # The jobs queued or running in this process
+        self.__pending: set[str] = set()
+        # The jobs submitted to this process and not yet taken by one of its workers
+        self.__submitted: set[str] = set()
+        self.__tasks: list[asyncio.Task] = []
+
+    @classmethod
+    def from_env(cls, store: ReviewJobStore, runner: ReviewRunner) -> "ReviewJobManager":
+        """
+        Creates a manager from REVIEW_WORKERS (default 4), REVIEW_QUEUE_SIZE (default 100) and
+        REVIEW_JOBS_LEASE_SECONDS (default 30).
+
+        The job leases are kept next to the jobs of a SQLite store, so that every process using the
+        database shares them.
+
+        Args:
+            store (ReviewJobStore): The store keeping the state of the jobs.
+            runner (ReviewRunner): Runs a review, reporting its progress.
+
+        Returns:
+            ReviewJobManager: The configured manager.
+        """
+        return cls(
+            store,
+            runner,
+            workers=int(os.getenv("REVIEW_WORKERS", 4)),
+            max_queued=int(os.getenv("REVIEW_QUEUE_SIZE", 100)),
+            leases=SQLiteLeaseStore(store.path) if isinstance(store, SQLiteReviewJobStore) else None,
+            lease_seconds=float(os.getenv("REVIEW_JOBS_LEASE_SECONDS", 30)),
+        )
+
+    @property
+    def queued(self) -> int:
+        """The number of jobs submitted to this process waiting for a worker."""
+        return len(self.__submitted)
+
+    def start(self) -> None:
+        """Starts the workers, first queueing again the jobs left unfinished by a previous run."""
+        self.__recover()
+        self.__tasks = [asyncio.create_task(self.__work()) for _ in range(self.workers)]
+        self.__tasks.append(asyncio.create_task(self.__watch()))
+
+    async def stop(self) -> None:
+        """Stops the workers; running jobs stay unfinished and are resumed by a persistent store."""
+        for task in self.__tasks:
+            task.cancel()
+        await asyncio.gather(*self.__tasks, return_exceptions=True)
+        self.__tasks = []
+
+    def submit(self, request: ReviewRequest) -> ReviewJob:
+        """
+        Queues a review.
+
+        Args:
+            request (ReviewRequest): The review to run.
+
+        Returns:
+            ReviewJob: The queued job.
+
+        Raises:
+            ReviewQueueFullError: If max_queued jobs are already waiting.
+        """
+        if len(self.__submitted) >= self.max_queued:
+            raise ReviewQueueFullError(f"{self.max_queued} review jobs are already queued")
+
+        job = ReviewJob(id=uuid.uuid4().hex, request=request)
+        self.store.put(job)
+        self.__submitted.add(job.id)
+        self.__enqueue(job.id)
+        logger.info(f"Queued review job {job.id} for {request.github_repo_url}")
+        return job
+
+    def get(self, job_id: str) -> ReviewJob | None:
+        """
+        Retrieves the current state of a job.
+
+        Args:
+            job_id (str): The identifier of the job.
+
+        Returns:
+            ReviewJob | None: The job, or None if it is unknown.
+        """
+        return self.store.get(job_id)
+
+    def __enqueue(self, job_id: str) -> None:
+        """Queues a job in this process."""
+        self.__pending.add(job_id)
+        self.__queue.put_nowait((job_id, time.perf_counter()))
+
+    def __recover(self) -> None:
+        """Queues the unfinished jobs not handled by this process, which run unless another process holds them."""
+        for job in self.store.unfinished():
+            if job.id not in self.__pending:
+                logger.info(f"Resuming review job {job.id}")
+                self.__enqueue(job.id)
+
+    async def __watch(self) -> None:
+        """Picks up the jobs of stopped or crashed processes until cancelled."""
+        while True:
+            await asyncio.sleep(self.lease_seconds)
+            self.__recover()
+
+    async def __renew(self, job_id: str) -> None:
+        """Renews the lease of a running job until cancelled."""
+        while True:
+            await asyncio.sleep(self.lease_seconds / 3)
+            if not self.leases.renew(f"review_job:{job_id}", self.__owner, self.lease_seconds):
+                logger.warning(f"Lost the lease of review job {job_id}, another process may run it too")
+
+    async def __work(self) -> None:
+        """Runs queued jobs one after the other until cancelled."""
+        while True:
+            job_id, queued_at = await self.__queue.get()
+            self.__submitted.discard(job_id)
+            lease = f"review_job:{job_id}"
+            try:
+                if not self.leases.acquire(lease, self.__owner, self.lease_seconds):
+                    continue
+                try:
+                    # Read once leased, since another process may have finished the job meanwhile
+                    job = self.store.get(job_id)
+                    if job is not None and job.status in (ReviewJobStatus.queued, ReviewJobStatus.running):
+                        heartbeat = asyncio.create_task(self.__renew(job_id))
+                        try:
+                            # The review joins the trace holding its time in the queue
+                            with ReviewTrace().activate():
+                                observe_wait("review_queue", time.perf_counter() - queued_at)
+                                await self.__run(job)
+                        finally:
+                            heartbeat.cancel()
+                finally:
+                    self.leases.release(lease, self.__owner)
+            finally:
+                self.__pending.discard(job_id)
+                self.__queue.task_done()
+
+    async def __run(self, job: ReviewJob) -> None:
+        """
+        Runs a job and stores its outcome.
+
+        Args:
+            job (ReviewJob): The job to run.
+        """
+        def report_progress(progress: ReviewProgress) -> None:
+            """Store the progress of the running job."""
+            job.progress = progress
+            self.store.put(job)
+
+        job.status = ReviewJobStatus.running
+        job.progress = ReviewProgress()
+        self.store.put(job)
+
+        try:
+            job.result = await self.__runner(job.request, report_progress)
+            job.status = ReviewJobStatus.completed
+            job.progress.stage = "done"
+
+        except HTTPException as e:
+            job.status = ReviewJobStatus.failed
+            job.error = e.detail
+
+        except Exception as e:
+            logger.error(f"Review job {job.id} failed: {e}")
+            job.status = ReviewJobStatus.failed
+            job.error = "An internal error occurred while processing the review."
+
+        self.store.put(job)
+        logger.info(f"Review job {job.id} {job.status.value}")
+
+
+def create_review_job_store() -> ReviewJobStore:
+    """
+    Creates the review job store configured through the environment.
+
+    REVIEW_JOBS_BACKEND selects "memory" (default) or "sqlite"; REVIEW_JOBS_PATH sets the SQLite
+    database file.
+
+    Returns:
+        ReviewJobStore: The configured store.
+    """
+    backend = os.getenv("REVIEW_JOBS_BACKEND", "memory")
+
+    if backend == "sqlite":
+        path = os.getenv("REVIEW_JOBS_PATH", "review_jobs.sqlite3")
+        logger.info(f"Using SQLite review job store at {path}")
+        return SQLiteReviewJobStore(path)
+    if backend == "memory":
+        return MemoryReviewJobStore()
+
+    raise ValueError(f"Unknown review job backend: {backend}")
@@ -0,0 +1,180 @@
+import os
+
+from loguru import logger
+from pydantic import BaseModel
+from dotenv import load_dotenv
+
+from src.services.data_structures import CandidateLevel
+from src.services.kv_store import KeyValueStore, MemoryKeyValueStore, SQLiteKeyValueStore
+
+load_dotenv()
+
+# The response header, and field of streamed errors, naming a failed review that can be resumed
+REVIEW_ID_HEADER = "X-Review-Id"
+
+
+class ChunkSnapshot(BaseModel):
+    """
+    The analysis of one chunk of a review, with the blob SHAs of the files it covers.
+
+    Attributes:
+        files (dict[str, str | None]): The blob SHA of every file of the chunk, keyed by path, in chunk order.
+        label (str): The description of the files and part covered by the chunk.
+        analysis (str): The analysis of the chunk.
+    """
+    files: dict[str, str | None]
+    label: str
+    analysis: str
+
+
+class ReviewSnapshot(BaseModel):
+    """
+    Everything needed to re-review a repository without analyzing its unchanged files again.
+
+    Attributes:
+        review_id (str): The identifier of the review.
+        github_repo_url (str): The URL of the reviewed repository.
+        commit_sha (str | None): The reviewed commit, when known.
+        assignment_description (str): The assignment the analyses were made for.
+        candidate_level (CandidateLevel): The candidate level the analyses were made for.
+        chunks (list[ChunkSnapshot]): The chunk analyses, in report order, or in completion order for a
+                                      review that did not complete.
+        complete (bool): Whether the review completed; the analyses of an unfinished review are the ones
+                         checkpointed before it failed or stopped.
+        checkpoints (int): The number of analyses checkpointed while the review ran.
+    """
+    review_id: str
+    github_repo_url: str
+    commit_sha: str | None = None
+    assignment_description: str
+    candidate_level: CandidateLevel
+    chunks: list[ChunkSnapshot]
+    complete: bool = True
+    checkpoints: int = 0
+
+
+class ReviewSnapshotStore:
+    """
+    Stores review snapshots by review id, and finds them by reviewed commit.
+
+    A running review is stored as an incomplete snapshot whose chunk analyses are checkpointed one by
+    one as they complete, so that a review that fails can be resumed from them.
+
+    Attributes:
+        store (KeyValueStore): The store holding the snapshots.
+    """
+
+    def __init__(self, store: KeyValueStore):
+        self.store = store
+
+    def get(self, review_id: str) -> ReviewSnapshot | None:
+        """
+        Retrieves the snapshot of a review, with the checkpointed analyses of a review that did not complete.
+
+        Args:
+            review_id (str): The identifier of the review.
+
+        Returns:
+            ReviewSnapshot | None: The snapshot, or None if it is unknown or was evicted.
+        """
+        snapshot = self.__get_snapshot(review_id)
+        if snapshot is None:
+            return None
+
+        if not snapshot.complete:
+            # Checkpoints are numbered from 0; an evicted one ends the list, its analyses being redone
+            for position in range(snapshot.checkpoints):
+                chunk = self.store.get(f"review-chunk:{review_id}:{position}")
+                if chunk is None:
+                    break
+                snapshot.chunks.append(ChunkSnapshot.model_validate_json(chunk))
+        return snapshot
+
+    def __get_snapshot(self, review_id: str) -> ReviewSnapshot | None:
+        """
+        Retrieves the stored snapshot of a review, without its checkpointed analyses.
+
+        Args:
+            review_id (str): The identifier of the review.
+
+        Returns:
+            ReviewSnapshot | None: The snapshot, or None if it is unknown or was evicted.
+        """
+        data = self.store.get(f"review:{review_id}")
+        return ReviewSnapshot.model_validate_json(data) if data is not None else None
+
+    def find(self, github_repo_url: str, commit_sha: str) -> ReviewSnapshot | None:
+        """
+        Retrieves the latest snapshot of a review of a given commit.
+
+        Args:
+            github_repo_url (str): The URL of the reviewed repository.
+            commit_sha (str): The reviewed commit.
+
+        Returns:
+            ReviewSnapshot | None: The snapshot, or None if the commit was not reviewed.
+        """
+        review_id = self.store.get(f"review-commit:{github_repo_url.rstrip('/')}@{commit_sha}")
+        return self.get(review_id.decode()) if review_id is not None else None
+
+    def put(self, snapshot: ReviewSnapshot) -> None:
+        """
+        Stores a snapshot, making it the latest review of its commit once it is complete.
+
+        Storing the complete snapshot of a review removes the checkpoints recorded in its incomplete one.
+
+        Args:
+            snapshot (ReviewSnapshot): The snapshot to store.
+        """
+        running = self.__get_snapshot(snapshot.review_id) if snapshot.complete else None
+        self.store.set(f"review:{snapshot.review_id}", snapshot.model_dump_json().encode())
+        if not snapshot.complete:
+            return
+
+        if running is not None and not running.complete:
+            for position in range(running.checkpoints):
+                self.store.delete(f"review-chunk:{snapshot.review_id}:{position}")
+        if snapshot.commit_sha is not None:
+            key = f"review-commit:{snapshot.github_repo_url.rstrip('/')}@{snapshot.commit_sha}"
+            self.store.set(key, snapshot.review_id.encode())
+
+    def put_checkpoint(self, review_id: str, position: int, chunk: ChunkSnapshot) -> None:
+        """
+        Stores a chunk analysis of a running review, and counts it in the incomplete snapshot of the review.
+
+        Args:
+            review_id (str): The identifier of the review, stored incomplete beforehand.
+            position (int): The number of analyses of the review checkpointed before this one.
+            chunk (ChunkSnapshot): The analysis.
+        """
+        self.store.set(f"review-chunk:{review_id}:{position}", chunk.model_dump_json().encode())
+
+        running = self.__get_snapshot(review_id)
+        if running is not None and not running.complete and running.checkpoints <= position:
+            running.checkpoints = position + 1
+            self.store.set(f"review:{review_id}", running.model_dump_json().encode())
+
+
+def create_review_snapshot_store() -> ReviewSnapshotStore | None:
+    """
+    Creates the review snapshot store configured through the environment.
+
+    REVIEW_SNAPSHOTS_BACKEND selects "memory" (default), "sqlite" or "none"; REVIEW_SNAPSHOTS_MAX_BYTES
+    bounds the store size and REVIEW_SNAPSHOTS_PATH sets the SQLite database file.
+
+    Returns:
+        ReviewSnapshotStore | None: The configured store, or None if re-reviews are disabled.
+    """
+    backend = os.getenv("REVIEW_SNAPSHOTS_BACKEND", "memory")
+    max_bytes = int(os.getenv("REVIEW_SNAPSHOTS_MAX_BYTES", 64 * 1024 * 1024))
+
+    if backend == "none":
+        return None
+    if backend == "sqlite":
+        path = os.getenv("REVIEW_SNAPSHOTS_PATH", "review_snapshots.sqlite3")
+        logger.info(f"Using SQLite review snapshot store at {path}")
+        return ReviewSnapshotStore(SQLiteKeyValueStore(path, max_bytes=max_bytes))
+    if backend == "memory":
+        return ReviewSnapshotStore(MemoryKeyValueStore(max_bytes=max_bytes))
+
+    raise ValueError(f"Unknown review snapshot backend: {backend}")
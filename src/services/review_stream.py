@@ -0,0 +1,107 @@
+import os
+import json
+import asyncio
+
+from typing import AsyncIterator, AsyncGenerator
+
+from loguru import logger
+from dotenv import load_dotenv
+from fastapi import HTTPException
+
+from src.services.review_snapshots import REVIEW_ID_HEADER
+from src.services.data_structures import AnalysisReport, ChunkAnalysis, BatchReviewResult
+
+load_dotenv()
+
+HEARTBEAT_INTERVAL = float(os.getenv("REVIEW_STREAM_HEARTBEAT", 15))
+
+
+def encode_event(event: ChunkAnalysis | AnalysisReport | BatchReviewResult | None) -> str:
+    """
+    Encodes a review event as an NDJSON line.
+
+    Args:
+        event (ChunkAnalysis | AnalysisReport | BatchReviewResult | None): A chunk analysis, the final report,
+            the result of a review of a batch, or None for a heartbeat.
+
+    Returns:
+        str: The JSON line, ending with a newline.
+    """
+    if event is None:
+        data = {"event": "heartbeat"}
+    elif isinstance(event, ChunkAnalysis):
+        data = {"event": "analysis", **event.model_dump(mode="json")}
+    elif isinstance(event, BatchReviewResult):
+        data = {"event": "result", **event.model_dump(mode="json")}
+    else:
+        data = {"event": "report", "report": event.model_dump(mode="json")}
+    return json.dumps(data) + "\n"
+
+
+async def _next_event(events: AsyncIterator) -> ChunkAnalysis | AnalysisReport | BatchReviewResult | None:
+    """Returns the next event, or None once the events are exhausted."""
+    try:
+        return await anext(events)
+    except StopAsyncIteration:
+        return None
+
+
+async def ndjson_review_events(
+        events: AsyncGenerator[ChunkAnalysis | AnalysisReport | BatchReviewResult, None],
+        heartbeat_interval: float = HEARTBEAT_INTERVAL,
+) -> AsyncIterator[str]:
+    """
+    Streams review events as NDJSON lines, sending a heartbeat whenever no event was sent for a while.
+
+    Heartbeats keep proxies and load balancers from closing the connection while slow requests
+    run. Errors raised once the stream has started are sent as a last "error" event, with the id of
+    the review to resume when its analyses were checkpointed. When the stream is closed early, e.g.
+    because the client disconnected, the events are closed too, which cancels the requests they were
+    waiting on.
+
+    Args:
+        events (AsyncGenerator[ChunkAnalysis | AnalysisReport | BatchReviewResult, None]): The events of the
+            review, or the results of a batch of reviews.
+        heartbeat_interval (float): The number of seconds without events after which a heartbeat is sent.
+
+    Yields:
+        str: The JSON lines.
+    """
+    next_event: asyncio.Task | None = None
+    try:
+        while True:
+            if next_event is None:
+                next_event = asyncio.create_task(_next_event(events))
+
+            done, _ = await asyncio.wait({next_event}, timeout=heartbeat_interval)
+            if not done:
+                yield encode_event(None)
+                continue
+
+            try:
+                event = next_event.result()
+            except HTTPException as e:
+                error = {"event": "error", "status_code": e.status_code, "detail": e.detail}
+                review_id = (e.headers or {}).get(REVIEW_ID_HEADER)
+                if review_id is not None:
+                    error["review_id"] = review_id
+                yield json.dumps(error) + "\n"
+                return
+            except Exception as e:
+                logger.error(f"Error during streamed review: {e}")
+                detail = "An internal error occurred while processing the analysis."
+                yield json.dumps({"event": "error", "status_code": 500, "detail": detail}) + "\n"
+                return
+            finally:
+                next_event = None
+
+            if event is None:
+                return
+            yield encode_event(event)
+
+    finally:
+        if next_event is not None:
+            logger.info("Review stream closed early, cancelling the outstanding analysis")
+            next_event.cancel()
+            await asyncio.gather(next_event, return_exceptions=True)
+        await events.aclose()
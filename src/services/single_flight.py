@@ -0,0 +1,326 @@
+import os
+import time
+import uuid
+import socket
+import asyncio
+import sqlite3
+import threading
+
+from abc import ABC, abstractmethod
+from typing import Any, Awaitable, Callable
+
+from loguru import logger
+from dotenv import load_dotenv
+
+from src.services.kv_store import KeyValueStore, MemoryKeyValueStore, SQLiteKeyValueStore
+from src.services.metrics import observe_wait, SINGLE_FLIGHT
+
+load_dotenv()
+
+# The results kept for the requests joining a computation late; they are only read for a short time
+RESULTS_MAX_BYTES = 64 * 1024 * 1024
+
+
+def worker_identity() -> str:
+    """
+    Builds an identifier unique to this process, for the leases it holds.
+
+    Returns:
+        str: The host name, the process id and a random suffix.
+    """
+    return f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+
+
+class LeaseStore(ABC):
+    """
+    Base class for the stores of expiring exclusive leases on keys, shared by the workers of the service.
+
+    Implementations must be safe to share between the coroutines and threads of one process.
+    """
+
+    @abstractmethod
+    def acquire(self, key: str, owner: str, lease_seconds: float) -> bool:
+        """
+        Takes the lease on a key if no one holds it or its holder let it expire.
+
+        Args:
+            key (str): The key to lease.
+            owner (str): The identifier of the worker taking the lease.
+            lease_seconds (float): How long the lease lasts unless renewed.
+
+        Returns:
+            bool: Whether the lease was taken.
+        """
+
+    @abstractmethod
+    def renew(self, key: str, owner: str, lease_seconds: float) -> bool:
+        """
+        Extends a lease held by the owner.
+
+        Args:
+            key (str): The leased key.
+            owner (str): The identifier of the worker holding the lease.
+            lease_seconds (float): How long the lease lasts from now.
+
+        Returns:
+            bool: Whether the owner still held the lease.
+        """
+
+    @abstractmethod
+    def release(self, key: str, owner: str) -> None:
+        """
+        Gives up a lease held by the owner.
+
+        Args:
+            key (str): The leased key.
+            owner (str): The identifier of the worker holding the lease.
+        """
+
+
+class MemoryLeaseStore(LeaseStore):
+    """An in-process lease store, for a service running a single worker."""
+
+    def __init__(self):
+        self.__leases: dict[str, tuple[str, float]] = {}
+        self.__lock = threading.Lock()
+
+    def acquire(self, key: str, owner: str, lease_seconds: float) -> bool:
+        now = time.time()
+        with self.__lock:
+            lease = self.__leases.get(key)
+            if lease is not None and lease[0] != owner and lease[1] > now:
+                return False
+            self.__leases[key] = (owner, now + lease_seconds)
+            return True
+
+    def renew(self, key: str, owner: str, lease_seconds: float) -> bool:
+        with self.__lock:
+            lease = self.__leases.get(key)
+            if lease is None or lease[0] != owner:
+                return False
+            self.__leases[key] = (owner, time.time() + lease_seconds)
+            return True
+
+    def release(self, key: str, owner: str) -> None:
+        with self.__lock:
+            lease = self.__leases.get(key)
+            if lease is not None and lease[0] == owner:
+                del self.__leases[key]
+
+
+class SQLiteLeaseStore(LeaseStore):
+    """
+    A lease store kept in a SQLite database, shared by every worker process using the file on the same host.
+
+    Attributes:
+        path (str): The path of the database file.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+
+        self.__lock = threading.Lock()
+        self.__connection = sqlite3.connect(path, check_same_thread=False, isolation_level=None, timeout=30)
+        self.__connection.execute("PRAGMA journal_mode=WAL")
+        self.__connection.execute("PRAGMA synchronous=NORMAL")
+        self.__connection.execute(
+            "CREATE TABLE IF NOT EXISTS leases (key TEXT PRIMARY KEY, owner TEXT NOT NULL, expires_at REAL NOT NULL)"
+        )
+
+    def acquire(self, key: str, owner: str, lease_seconds: float) -> bool:
+        now = time.time()
+        with self.__lock:
+            # The upsert only replaces a lease of the same owner or an expired one, atomically
+            cursor = self.__connection.execute(
+                "INSERT INTO leases (key, owner, expires_at) VALUES (?, ?, ?) "
+                "ON CONFLICT (key) DO UPDATE SET owner = excluded.owner, expires_at = excluded.expires_at "
+                "WHERE leases.owner = excluded.owner OR leases.expires_at <= ?",
+                (key, owner, now + lease_seconds, now),
+            )
+            return cursor.rowcount == 1
+
+    def renew(self, key: str, owner: str, lease_seconds: float) -> bool:
+        with self.__lock:
+            cursor = self.__connection.execute(
+                "UPDATE leases SET expires_at = ? WHERE key = ? AND owner = ?",
+                (time.time() + lease_seconds, key, owner),
+            )
+            return cursor.rowcount == 1
+
+    def release(self, key: str, owner: str) -> None:
+        with self.__lock:
+            self.__connection.execute("DELETE FROM leases WHERE key = ? AND owner = ?", (key, owner))
+
+    def close(self) -> None:
+        """Closes the database connection."""
+        with self.__lock:
+            self.__connection.close()
+
+
+class SingleFlight:
+    """
+    Runs a computation once for all the requests asking for the same key at the same time, across workers.
+
+    Within a process, concurrent callers of a key await the same task. Across processes, the first
+    worker to take the lease of the key runs the computation, renewing the lease while it runs, and
+    stores the result; the others poll for the result, and take over if the lease expires or is
+    released without one, e.g. when the leader crashed or failed. Results stay available for
+    result_seconds, so a request arriving just after the run finished joins it too. The events a
+    computation publishes through notify, e.g. its progress, reach every caller of this process
+    waiting for it from the time it joined.
+
+    Attributes:
+        leases (LeaseStore): The leases electing the worker running a computation.
+        results (KeyValueStore): The results of the computations, readable by every worker.
+        lease_seconds (float): How long a lease lasts without being renewed.
+        poll_interval (float): How often waiting workers check for the result.
+        owner (str): The identifier of this worker.
+    """
+
+    def __init__(
+            self,
+            leases: LeaseStore,
+            results: KeyValueStore,
+            lease_seconds: float = 30.0,
+            poll_interval: float = 0.25,
+            owner: str | None = None,
+    ):
+        self.leases = leases
+        self.results = results
+        self.lease_seconds = lease_seconds
+        self.poll_interval = poll_interval
+        self.owner = owner or worker_identity()
+
+        self.__flights: dict[str, asyncio.Task] = {}
+        self.__listeners: dict[str, list[Callable[[Any], None]]] = {}
+
+    async def run(
+            self,
+            key: str,
+            compute: Callable[[], Awaitable[bytes]],
+            listener: Callable[[Any], None] | None = None,
+    ) -> bytes:
+        """
+        Returns the result of the computation of a key, running it unless another request already does.
+
+        Args:
+            key (str): The key identifying the computation.
+            compute (Callable[[], Awaitable[bytes]]): Runs the computation and returns its serialized result.
+            listener (Callable[[Any], None] | None): Called with each event published for the key while this
+                                                      call waits.
+
+        Returns:
+            bytes: The result, computed by this call or by the request it joined.
+
+        Raises:
+            Exception: Any error raised by the computation run for this process.
+        """
+        flight = self.__flights.get(key)
+        if flight is not None:
+            SINGLE_FLIGHT.inc("local_follower")
+        else:
+            flight = self.__flights[key] = asyncio.ensure_future(self.__fly(key, compute))
+            flight.add_done_callback(lambda _: self.__flights.pop(key, None))
+
+        if listener is None:
+            # A caller going away leaves the computation running for the others
+            return await asyncio.shield(flight)
+
+        listeners = self.__listeners.setdefault(key, [])
+        listeners.append(listener)
+        try:
+            return await asyncio.shield(flight)
+        finally:
+            listeners.remove(listener)
+            if not listeners and self.__listeners.get(key) is listeners:
+                del self.__listeners[key]
+
+    def notify(self, key: str, event: Any) -> None:
+        """
+        Passes an event of a running computation to the callers of this process waiting for it.
+
+        Args:
+            key (str): The key identifying the computation.
+            event (Any): The event, e.g. the progress of the computation.
+        """
+        for listener in list(self.__listeners.get(key, ())):
+            listener(event)
+
+    async def __fly(self, key: str, compute: Callable[[], Awaitable[bytes]]) -> bytes:
+        """Runs the computation once the lease is taken, or returns the result stored by another worker."""
+        result_key = f"flight:{key}"
+        waited_from = time.perf_counter()
+        joined = False
+        while True:
+            result = self.results.get(result_key)
+            if result is not None:
+                return self.__joined(result, joined, waited_from)
+
+            if self.leases.acquire(key, self.owner, self.lease_seconds):
+                break
+            if not joined:
+                logger.info(f"Waiting for another worker to finish {key}")
+                joined = True
+            await asyncio.sleep(self.poll_interval)
+
+        try:
+            # The result may have been stored between the lookup and the lease
+            result = self.results.get(result_key)
+            if result is not None:
+                return self.__joined(result, joined, waited_from)
+
+            SINGLE_FLIGHT.inc("leader")
+            heartbeat = asyncio.create_task(self.__renew(key))
+            try:
+                result = await compute()
+            finally:
+                heartbeat.cancel()
+            self.results.set(result_key, result)
+            return result
+        finally:
+            self.leases.release(key, self.owner)
+
+    @staticmethod
+    def __joined(result: bytes, joined: bool, waited_from: float) -> bytes:
+        """Records a result found in the store, computed by another worker or by a recent run."""
+        SINGLE_FLIGHT.inc("remote_follower" if joined else "stored")
+        if joined:
+            observe_wait("single_flight", time.perf_counter() - waited_from)
+        return result
+
+    async def __renew(self, key: str) -> None:
+        """Renews the lease of a running computation until cancelled."""
+        while True:
+            await asyncio.sleep(self.lease_seconds / 3)
+            if not self.leases.renew(key, self.owner, self.lease_seconds):
+                logger.warning(f"Lost the lease of {key}, another worker may run it too")
+
+
+def create_single_flight() -> SingleFlight | None:
+    """
+    Creates the single-flight de-duplication configured through the environment.
+
+    SINGLE_FLIGHT_BACKEND selects "memory", "sqlite" or "none" (default); SINGLE_FLIGHT_PATH sets the
+    SQLite database file, SINGLE_FLIGHT_LEASE_SECONDS the lease duration and SINGLE_FLIGHT_RESULT_SECONDS
+    how long results stay available to the requests joining late.
+
+    Returns:
+        SingleFlight | None: The configured single-flight, or None if it is disabled.
+    """
+    backend = os.getenv("SINGLE_FLIGHT_BACKEND", "none")
+    lease_seconds = float(os.getenv("SINGLE_FLIGHT_LEASE_SECONDS", 30))
+    result_seconds = float(os.getenv("SINGLE_FLIGHT_RESULT_SECONDS", 60))
+
+    if backend == "none":
+        return None
+    if backend == "sqlite":
+        path = os.getenv("SINGLE_FLIGHT_PATH", "single_flight.sqlite3")
+        logger.info(f"Using SQLite single-flight store at {path}")
+        results = SQLiteKeyValueStore(path, max_bytes=RESULTS_MAX_BYTES, ttl_seconds=result_seconds)
+        return SingleFlight(SQLiteLeaseStore(path), results, lease_seconds)
+    if backend == "memory":
+        return SingleFlight(
+            MemoryLeaseStore(), MemoryKeyValueStore(RESULTS_MAX_BYTES, ttl_seconds=result_seconds), lease_seconds
+        )
+
+    raise ValueError(f"Unknown single-flight backend: {backend}")
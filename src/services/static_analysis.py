@@ -0,0 +1,418 @@
+import os
+import re
+import ast
+import asyncio
+import itertools
+import posixpath
+import multiprocessing
+
+from dataclasses import dataclass, field
+from concurrent.futures import ProcessPoolExecutor
+
+from loguru import logger
+from dotenv import load_dotenv
+
+from src.services.data_structures import RepoFilesResponse, Content
+
+load_dotenv()
+
+# A function whose cyclomatic complexity exceeds this is reported
+MAX_COMPLEXITY = int(os.getenv("STATIC_MAX_COMPLEXITY", 10))
+# A file without findings whose functions are all this simple is reviewed from its outline
+OUTLINE_MAX_COMPLEXITY = int(os.getenv("STATIC_OUTLINE_MAX_COMPLEXITY", 5))
+# Files larger than this are sent as they are, without analysis
+MAX_FILE_BYTES = 512 * 1024
+# Repositories smaller than this are analyzed in a thread, which is faster than shipping them to the pool
+INLINE_BYTES = 256 * 1024
+# The number of files sent to a pool process at once
+BATCH_FILES = 64
+
+MAX_LINE_LENGTH = 120
+MAX_FUNCTION_LINES = 60
+MAX_PARAMETERS = 6
+MAX_FINDINGS = 15
+SNAKE_CASE = re.compile(r"_{0,2}[a-z][a-z0-9_]*_{0,2}$")
+CAP_WORDS = re.compile(r"_?[A-Z][A-Za-z0-9]*$")
+
+
+@dataclass
+class FileInsights:
+    """
+    The static analysis of a Python file.
+
+    Attributes:
+        filename (str): The name of the file.
+        outline (str): The imports, classes and function signatures of the file, with their line ranges.
+        findings (list[str]): The likely defects found: complex functions, dead code, bare excepts, mutable
+                              default arguments, or the syntax error of a file that does not parse.
+        style (list[str]): The style issues found: long lines and functions, naming and missing docstrings.
+        max_complexity (int): The highest cyclomatic complexity of the functions of the file.
+        clean (bool): Whether the file parses, has no finding and only simple functions, so that its outline
+                      and style issues are enough for a review.
+    """
+    filename: str
+    outline: str = ""
+    findings: list[str] = field(default_factory=list)
+    style: list[str] = field(default_factory=list)
+    max_complexity: int = 0
+    clean: bool = False
+
+
+def _complexity(function: ast.FunctionDef | ast.AsyncFunctionDef) -> int:
+    """Computes the cyclomatic complexity of a function, without the functions nested in it."""
+    complexity = 1
+    nodes = list(ast.iter_child_nodes(function))
+    while nodes:
+        node = nodes.pop()
+        if isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef, ast.Lambda, ast.ClassDef)):
+            continue
+        if isinstance(node, (ast.If, ast.For, ast.AsyncFor, ast.While, ast.IfExp, ast.ExceptHandler, ast.Assert)):
+            complexity += 1
+        elif isinstance(node, ast.BoolOp):
+            complexity += len(node.values) - 1
+        elif isinstance(node, ast.comprehension):
+            complexity += 1 + len(node.ifs)
+        elif isinstance(node, ast.match_case):
+            complexity += 1
+        nodes.extend(ast.iter_child_nodes(node))
+    return complexity
+
+
+def _argument(argument: ast.arg, default: ast.expr | None = None) -> str:
+    """Formats an argument of a signature, its default value left out."""
+    annotation = f": {ast.unparse(argument.annotation)}" if argument.annotation is not None else ""
+    return f"{argument.arg}{annotation}{'=...' if default is not None else ''}"
+
+
+def _signature(function: ast.FunctionDef | ast.AsyncFunctionDef) -> str:
+    """Formats the signature of a function, default values left out."""
+    arguments = function.args
+    positional = arguments.posonlyargs + arguments.args
+    defaults = [None] * (len(positional) - len(arguments.defaults)) + arguments.defaults
+    parts = [_argument(argument, default) for argument, default in zip(positional, defaults)]
+    if arguments.vararg is not None:
+        parts.append(f"*{_argument(arguments.vararg)}")
+    elif arguments.kwonlyargs:
+        parts.append("*")
+    parts += [_argument(argument, default) for argument, default in zip(arguments.kwonlyargs, arguments.kw_defaults)]
+    if arguments.kwarg is not None:
+        parts.append(f"**{_argument(arguments.kwarg)}")
+
+    prefix = "async def" if isinstance(function, ast.AsyncFunctionDef) else "def"
+    returns = f" -> {ast.unparse(function.returns)}" if function.returns is not None else ""
+    return f"{prefix} {function.name}({', '.join(parts)}){returns}"
+
+
+def _docstring_summary(node: ast.AST) -> str:
+    """Returns the first line of the docstring of a definition, if any."""
+    docstring = ast.get_docstring(node) if isinstance(
+        node, (ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef, ast.Module)
+    ) else None
+    return f'  "{docstring.strip().splitlines()[0][:80]}"' if docstring else ""
+
+
+def _outline(tree: ast.Module, line_count: int) -> str:
+    """Builds the outline of a module: its imports, then its classes and functions with their line ranges."""
+    imports = []
+    lines = [f"{line_count} lines.{_docstring_summary(tree)}"]
+    for node in tree.body:
+        if isinstance(node, ast.Import):
+            imports += [alias.name for alias in node.names]
+        elif isinstance(node, ast.ImportFrom):
+            imports += [f"{'.' * node.level}{node.module or ''}.{alias.name}".lstrip(".") for alias in node.names]
+        elif isinstance(node, ast.ClassDef):
+            bases = ", ".join(ast.unparse(base) for base in node.bases)
+            header = f"class {node.name}({bases})" if bases else f"class {node.name}"
+            lines.append(f"{header}:  # L{node.lineno}-{node.end_lineno}{_docstring_summary(node)}")
+            for member in node.body:
+                if isinstance(member, (ast.FunctionDef, ast.AsyncFunctionDef)):
+                    lines.append(
+                        f"    {_signature(member)}  # L{member.lineno}-{member.end_lineno}, "
+                        f"complexity {_complexity(member)}{_docstring_summary(member)}"
+                    )
+        elif isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef)):
+            lines.append(
+                f"{_signature(node)}  # L{node.lineno}-{node.end_lineno}, "
+                f"complexity {_complexity(node)}{_docstring_summary(node)}"
+            )
+        elif isinstance(node, (ast.Assign, ast.AnnAssign)):
+            targets = node.targets if isinstance(node, ast.Assign) else [node.target]
+            names = [target.id for target in targets if isinstance(target, ast.Name)]
+            if names:
+                lines.append(f"{', '.join(names)} = ...  # L{node.lineno}")
+        elif isinstance(node, ast.If) and "__main__" in ast.unparse(node.test):
+            lines.append(f"if __name__ == '__main__': ...  # L{node.lineno}-{node.end_lineno}")
+
+    if imports:
+        lines.insert(1, f"imports: {', '.join(imports)}")
+    return "\n".join(lines)
+
+
+def _defects(tree: ast.Module, filename: str) -> list[str]:
+    """Finds unreachable statements, unused imports, bare excepts and mutable default arguments."""
+    findings = []
+    for node in ast.walk(tree):
+        if isinstance(node, ast.ExceptHandler) and node.type is None:
+            findings.append(f"L{node.lineno}: bare except")
+        elif isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef)):
+            defaults = node.args.defaults + [default for default in node.args.kw_defaults if default is not None]
+            if any(isinstance(default, (ast.List, ast.Dict, ast.Set)) for default in defaults):
+                findings.append(f"L{node.lineno}: function {node.name} has a mutable default argument")
+
+        for body in (getattr(node, name, None) for name in ("body", "orelse", "finalbody")):
+            if not isinstance(body, list):
+                continue
+            for statement, following in zip(body, body[1:]):
+                if isinstance(statement, (ast.Return, ast.Raise, ast.Continue, ast.Break)):
+                    findings.append(f"L{following.lineno}: unreachable code after {type(statement).__name__.lower()}")
+                    break
+
+    # Package modules re-export their imports
+    if posixpath.basename(filename) == "__init__.py":
+        return findings
+
+    used = {node.id for node in ast.walk(tree) if isinstance(node, ast.Name)}
+    # Names listed in __all__ or used in string annotations are not Name nodes
+    strings = [node.value for node in ast.walk(tree) if isinstance(node, ast.Constant) and isinstance(node.value, str)]
+
+    for node in tree.body:
+        if not isinstance(node, (ast.Import, ast.ImportFrom)) or (
+                isinstance(node, ast.ImportFrom) and node.module == "__future__"):
+            continue
+        for alias in node.names:
+            name = (alias.asname or alias.name).split(".")[0]
+            if name != "*" and name not in used and not any(name in text for text in strings):
+                findings.append(f"L{node.lineno}: unused import {name}")
+    return findings
+
+
+def _style(tree: ast.Module, lines: list[str]) -> list[str]:
+    """Finds style issues: long lines and functions, many parameters, naming and missing docstrings."""
+    findings = []
+    long_lines = [number for number, line in enumerate(lines, 1) if len(line) > MAX_LINE_LENGTH]
+    if long_lines:
+        findings.append(f"{len(long_lines)} lines longer than {MAX_LINE_LENGTH} characters, from L{long_lines[0]}")
+
+    for node in ast.walk(tree):
+        if isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef)):
+            length = node.end_lineno - node.lineno + 1
+            if length > MAX_FUNCTION_LINES:
+                findings.append(f"L{node.lineno}: function {node.name} is {length} lines long")
+            parameters = [arg for arg in node.args.args + node.args.kwonlyargs if arg.arg not in ("self", "cls")]
+            if len(parameters) > MAX_PARAMETERS:
+                findings.append(f"L{node.lineno}: function {node.name} takes {len(parameters)} parameters")
+            if not SNAKE_CASE.match(node.name):
+                findings.append(f"L{node.lineno}: function name {node.name} is not snake_case")
+            if not node.name.startswith("_") and ast.get_docstring(node) is None and length > 5:
+                findings.append(f"L{node.lineno}: public function {node.name} has no docstring")
+        elif isinstance(node, ast.ClassDef):
+            if not CAP_WORDS.match(node.name):
+                findings.append(f"L{node.lineno}: class name {node.name} is not CapWords")
+            if not node.name.startswith("_") and ast.get_docstring(node) is None:
+                findings.append(f"L{node.lineno}: public class {node.name} has no docstring")
+    return findings
+
+
+def _bounded(findings: list[str]) -> list[str]:
+    """Keeps the first findings, so that a messy file does not flood the prompt."""
+    if len(findings) <= MAX_FINDINGS:
+        return findings
+    return findings[:MAX_FINDINGS] + [f"{len(findings) - MAX_FINDINGS} more"]
+
+
+def analyze_source(
+        filename: str,
+        text: str,
+        max_complexity: int = MAX_COMPLEXITY,
+        outline_max_complexity: int = OUTLINE_MAX_COMPLEXITY,
+) -> FileInsights:
+    """
+    Analyzes a Python file: the complexity of its functions, its dead code, its style and its outline.
+
+    Args:
+        filename (str): The name of the file.
+        text (str): The content of the file.
+        max_complexity (int): The cyclomatic complexity above which a function is reported.
+        outline_max_complexity (int): The highest cyclomatic complexity of the functions of a clean file.
+
+    Returns:
+        FileInsights: The analysis of the file.
+    """
+    try:
+        tree = ast.parse(text, filename=filename)
+    except (SyntaxError, ValueError) as e:
+        return FileInsights(filename=filename, findings=[f"does not parse: {e}"])
+
+    lines = text.splitlines()
+    findings = []
+    complexities = {
+        node: _complexity(node) for node in ast.walk(tree) if isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef))
+    }
+    for node, complexity in complexities.items():
+        if complexity > max_complexity:
+            findings.append(f"L{node.lineno}: function {node.name} has cyclomatic complexity {complexity}")
+    findings += _defects(tree, filename)
+    highest = max(complexities.values(), default=0)
+
+    return FileInsights(
+        filename=filename,
+        outline=_outline(tree, len(lines)),
+        findings=_bounded(findings),
+        style=_bounded(_style(tree, lines)),
+        max_complexity=highest,
+        clean=not findings and highest <= outline_max_complexity,
+    )
+
+
+def analyze_batch(
+        files: list[tuple[str, str]],
+        max_complexity: int = MAX_COMPLEXITY,
+        outline_max_complexity: int = OUTLINE_MAX_COMPLEXITY,
+) -> list[FileInsights]:
+    """
+    Analyzes several files, in a pool process.
+
+    Args:
+        files (list[tuple[str, str]]): The names and contents of the files.
+        max_complexity (int): The cyclomatic complexity above which a function is reported.
+        outline_max_complexity (int): The highest cyclomatic complexity of the functions of a clean file.
+
+    Returns:
+        list[FileInsights]: The analyses of the files, in the same order.
+    """
+    return [analyze_source(filename, text, max_complexity, outline_max_complexity) for filename, text in files]
+
+
+class StaticAnalyzer:
+    """
+    Runs the static analysis of the Python files of a repository before they are sent to the LLM.
+
+    Parsing is CPU-bound, so large repositories are analyzed in a pool of processes, created on first
+    use and shared by every review of the process; small ones are analyzed in a thread. The files of
+    a large repository are read a batch at a time as pool processes free up, so spooled contents are
+    only decoded while their batch is analyzed.
+
+    Attributes:
+        workers (int): The number of pool processes.
+        max_complexity (int): The cyclomatic complexity above which a function is reported.
+        outline_max_complexity (int): The highest cyclomatic complexity of the functions of a clean file.
+        outline_clean_files (bool): Whether the clean files are reviewed from their outline.
+    """
+
+    def __init__(
+            self,
+            workers: int | None = None,
+            max_complexity: int = MAX_COMPLEXITY,
+            outline_max_complexity: int = OUTLINE_MAX_COMPLEXITY,
+            outline_clean_files: bool = True,
+    ):
+        self.workers = workers or os.cpu_count() or 1
+        self.max_complexity = max_complexity
+        self.outline_max_complexity = outline_max_complexity
+        self.outline_clean_files = outline_clean_files
+
+        self.__pool: ProcessPoolExecutor | None = None
+
+    async def analyze(self, file_contents: RepoFilesResponse) -> dict[str, FileInsights]:
+        """
+        Analyzes the Python files of a repository.
+
+        Args:
+            file_contents (RepoFilesResponse): The files of the repository.
+
+        Returns:
+            dict[str, FileInsights]: The analyses keyed by file name; other files are left out.
+        """
+        contents = [
+            content for content in file_contents.files
+            if content.filename.endswith(".py") and content.size <= MAX_FILE_BYTES
+        ]
+        if not contents:
+            return {}
+
+        if sum(content.size for content in contents) <= INLINE_BYTES:
+            insights = await asyncio.to_thread(
+                analyze_batch, self.__read(contents), self.max_complexity, self.outline_max_complexity
+            )
+        else:
+            insights = await self.__analyze_in_pool(contents)
+
+        logger.debug(
+            f"Analyzed {len(insights)} Python files statically, {sum(i.clean for i in insights)} of them clean"
+        )
+        return {analysis.filename: analysis for analysis in insights}
+
+    async def __analyze_in_pool(self, contents: list[Content]) -> list[FileInsights]:
+        """
+        Analyzes files in the process pool, with one batch in flight per pool process.
+
+        Args:
+            contents (list[Content]): The files to analyze.
+
+        Returns:
+            list[FileInsights]: The analyses of the files, in completion order.
+        """
+        loop = asyncio.get_running_loop()
+        batches = (contents[start:start + BATCH_FILES] for start in range(0, len(contents), BATCH_FILES))
+        insights: list[FileInsights] = []
+        pending: set[asyncio.Future] = set()
+        try:
+            while True:
+                for batch in itertools.islice(batches, self.workers - len(pending)):
+                    pending.add(loop.run_in_executor(
+                        self.__get_pool(), analyze_batch, self.__read(batch), self.max_complexity,
+                        self.outline_max_complexity,
+                    ))
+                if not pending:
+                    break
+
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for future in done:
+                    insights += future.result()
+
+        finally:
+            for future in pending:
+                future.cancel()
+        return insights
+
+    @staticmethod
+    def __read(contents: list[Content]) -> list[tuple[str, str]]:
+        """Reads the names and texts of files for analyze_batch."""
+        return [(content.filename, content.file_content) for content in contents]
+
+    def close(self) -> None:
+        """Stops the pool processes."""
+        if self.__pool is not None:
+            self.__pool.shutdown(cancel_futures=True)
+            self.__pool = None
+
+    def __get_pool(self) -> ProcessPoolExecutor:
+        """Returns the process pool, starting it on first use."""
+        if self.__pool is None:
+            # Spawned rather than forked, since the service process runs threads
+            self.__pool = ProcessPoolExecutor(self.workers, mp_context=multiprocessing.get_context("spawn"))
+        return self.__pool
+
+
+def create_static_analyzer() -> StaticAnalyzer | None:
+    """
+    Creates the static analysis pre-pass configured through the environment.
+
+    STATIC_ANALYSIS enables the pre-pass (default true), STATIC_ANALYSIS_WORKERS sets the number of
+    pool processes (default the number of CPUs), STATIC_MAX_COMPLEXITY the complexity reported
+    (default 10), STATIC_OUTLINE_MAX_COMPLEXITY the highest complexity of a clean file (default 5) and
+    STATIC_OUTLINE_CLEAN_FILES whether clean files are reviewed from their outline only (default true).
+
+    Returns:
+        StaticAnalyzer | None: The configured analyzer, or None if the pre-pass is disabled.
+    """
+    if os.getenv("STATIC_ANALYSIS", "true").lower() != "true":
+        return None
+
+    workers = os.getenv("STATIC_ANALYSIS_WORKERS")
+    return StaticAnalyzer(
+        workers=int(workers) if workers else None,
+        max_complexity=MAX_COMPLEXITY,
+        outline_max_complexity=OUTLINE_MAX_COMPLEXITY,
+        outline_clean_files=os.getenv("STATIC_OUTLINE_CLEAN_FILES", "true").lower() == "true",
+    )
@@ -1,14 +1,46 @@
+import httpx
+import pytest
+
 from fastapi.testclient import TestClient
+
+import src.api.app as app_module
+import src.services.github_fetcher as github_fetcher
 from src.api.app import app
+from src.services.github_http import GitHubTransport, RateLimitState
+from benchmarks.stub_github import create_stub_github_app
+from tests.test_gpt_code_analyzer import FakeCompletionServer
 
 client = TestClient(app)
 
+REPOSITORY_FILES = {
+    "README.md": b"# GymHelper\n\nTracks workouts.\n",
+    "main.py": b"from bot import run\n\nif __name__ == '__main__':\n    run()\n",
+    "bot/handlers.py": b"def start(message):\n    return f'Hello, {message.user}'\n",
+}
+
+
+@pytest.fixture(autouse=True)
+def offline_services(monkeypatch):
+    """Serve SAYREKAS/GymHelper from a stub GitHub API and answer LLM requests with a fake server."""
+    stub = create_stub_github_app(REPOSITORY_FILES, repository="SAYREKAS/GymHelper")
+    transport = GitHubTransport(httpx.ASGITransport(app=stub), state=RateLimitState(), etags=None)
+    monkeypatch.setattr(github_fetcher, "GITHUB_API_URL", "http://github.test")
+    for name in ("repository_cache", "llm_cache", "review_snapshots", "boilerplate_index"):
+        monkeypatch.setattr(app_module, name, None)
+    app.dependency_overrides[app_module.get_github_client] = lambda: httpx.AsyncClient(transport=transport)
+    app.dependency_overrides[app_module.get_openai_client] = FakeCompletionServer().client
+    try:
+        yield
+    finally:
+        app.dependency_overrides.clear()
+
 
 def test_fetch_files_success():
     response = client.post(url="/files", json={"github_repo_url": "https://github.com/SAYREKAS/GymHelper"})
     assert response.status_code == 200
     assert "files" in response.json()
     assert "count" in response.json()
+    assert response.json()["count"] == len(REPOSITORY_FILES)
 
 
 def test_fetch_files_not_found():
@@ -28,6 +60,7 @@ def test_review_success():
     assert "project_files" in response.json()
     assert "full_report" in response.json()
     assert "conclusion_and_assessment" in response.json()
+    assert sorted(response.json()["project_files"]) == sorted(REPOSITORY_FILES)
 
 
 def test_review_no_files():
@@ -0,0 +1,85 @@
+from src.services.data_structures import Content
+from src.services.chunker import split_code, build_chunks, count_tokens
+
+FUNCTION = "def function_{index}(value):\n" + "    value += 1\n" * 10 + "    return value\n\n\n"
+
+
+def test_small_file_is_not_split():
+    """Test that a file within the budget is returned whole."""
+    assert split_code("a.py", "x = 1\n", max_tokens=100) == ["x = 1\n"]
+
+
+def test_python_file_is_split_on_top_level_definitions():
+    """Test that Python files are split between functions, never inside one."""
+    text = "import os\n\n\n" + "".join(FUNCTION.format(index=index) for index in range(6))
+
+    parts = split_code("module.py", text, max_tokens=100)
+
+    assert "".join(parts) == text
+    assert len(parts) > 1
+    for part in parts:
+        assert count_tokens(part) <= 100
+        assert part.count("def ") == part.count("return value")
+
+
+def test_oversized_class_is_split_on_methods():
+    """Test that a class larger than the budget is split between its methods."""
+    methods = "".join("    " + line if line.strip() else line for line in
+                      "".join(FUNCTION.format(index=index) for index in range(4)).splitlines(keepends=True))
+    text = f"class Service:\n    \"\"\"A service.\"\"\"\n\n{methods}"
+
+    parts = split_code("service.py", text, max_tokens=100)
+
+    assert "".join(parts) == text
+    assert parts[0].startswith("class Service:")
+    assert all(part.count("def ") == part.count("return value") for part in parts)
+
+
+def test_decorators_and_comments_stay_with_their_definition():
+    """Test that decorators and the comments above a definition are not separated from it."""
+    body = "    pass\n" * 40
+    text = f"def first():\n{body}\n# Explains second\n@decorator\ndef second():\n{body}"
+
+    parts = split_code("a.py", text, max_tokens=100)
+
+    assert parts[1].startswith("# Explains second\n@decorator\ndef second")
+
+
+def test_other_languages_are_split_on_top_level_blocks():
+    """Test that non-Python files are split on unindented blocks."""
+    block = "function f() {\n" + "  call();\n" * 20 + "}\n\n"
+    text = block * 4
+
+    parts = split_code("app.js", text, max_tokens=100)
+
+    assert "".join(parts) == text
+    assert all(part.startswith("function f()") for part in parts)
+
+
+def test_invalid_python_and_long_lines_fall_back_to_lines():
+    """Test that unparsable code and lines over the budget are still split within the budget."""
+    text = "def broken(:\n" + "x" * 2000 + "\n"
+
+    parts = split_code("broken.py", text, max_tokens=100)
+
+    assert "".join(parts) == text
+    assert all(count_tokens(part) <= 101 for part in parts)
+
+
+def test_build_chunks_packs_small_files_and_splits_large_ones():
+    """Test that small files share chunks while large files get chunks of their own."""
+    large = "".join(FUNCTION.format(index=index) for index in range(6))
+    files = [
+        Content(filename="a.py", file_content="a = 1\n"),
+        Content(filename="big.py", file_content=large),
+        Content(filename="b.py", file_content="b = 2\n"),
+    ]
+
+    chunks = build_chunks(files, max_tokens=120)
+
+    packed = [chunk for chunk in chunks if len(chunk.parts) > 1]
+    assert [[part.content.filename for part in chunk.parts] for chunk in packed] == [["a.py", "b.py"]]
+    big_parts = [chunk.parts[0] for chunk in chunks if chunk.parts[0].content.filename == "big.py"]
+    assert [part.part_index for part in big_parts] == list(range(1, len(big_parts) + 1))
+    assert "".join(part.text for part in big_parts) == large
+    assert all(chunk.tokens <= 120 for chunk in chunks)
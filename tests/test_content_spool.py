@@ -0,0 +1,38 @@
+import pytest
+
+from src.services.content_spool import ContentSpool
+from src.services.data_structures import Content
+
+
+def test_contents_beyond_the_memory_budget_are_spilled():
+    """Test that contents stay in memory up to the budget, larger and later ones being spilled to disk."""
+    with ContentSpool(max_memory_bytes=100, spill_bytes=60) as spool:
+        small = spool.store(b"a" * 50)
+        large = spool.store(b"b" * 70)
+        over_budget = spool.store(b"c" * 60)
+        last = spool.store(b"d" * 50)
+
+        assert [blob.spilled for blob in (small, large, over_budget, last)] == [False, True, True, False]
+        assert spool.memory_bytes == 100
+        assert spool.spilled_bytes == 130
+        assert large.read() == b"b" * 70
+        assert over_budget.read() == b"c" * 60
+
+    with pytest.raises(ValueError):
+        large.read()
+
+
+def test_spooled_content_is_decoded_piece_by_piece():
+    """Test that reading a spilled file in pieces keeps multi-byte characters whole."""
+    text = "é€ abc \udcff" * 100
+    data = text.encode("utf-8", "surrogateescape")
+
+    with ContentSpool(max_memory_bytes=0) as spool:
+        content = Content(filename="a.txt", file_content=spool.store(data), sha="sha")
+        pieces = list(content.iter_text(chunk_size=7))
+
+        assert content.file_content == data.decode("utf-8", "replace")
+        assert "".join(pieces) == content.file_content
+        assert len(pieces) > 1
+        assert content.size == len(data)
+        assert content.model_dump() == {"filename": "a.txt", "sha": "sha", "file_content": content.file_content}
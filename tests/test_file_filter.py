@@ -0,0 +1,86 @@
+from unittest.mock import patch
+
+from src.services.file_filter import FileFilter, match_patterns
+from src.services.content_spool import ContentSpool, SpooledBlob
+from src.services.data_structures import Content, RepoFilesResponse, SkippedFile
+
+
+def test_patterns_follow_gitignore_rules():
+    """Test unanchored, anchored, directory, double-star and negated patterns."""
+    assert match_patterns(["*.log"], "logs/app.log") == "*.log"
+    assert match_patterns(["/setup.py"], "pkg/setup.py") is None
+    assert match_patterns(["/setup.py"], "setup.py") == "/setup.py"
+    assert match_patterns(["docs/"], "project/docs/index.md") == "docs/"
+    assert match_patterns(["docs/"], "docs") is None
+    assert match_patterns(["src/**/test_*.py"], "src/a/b/test_x.py") == "src/**/test_*.py"
+    assert match_patterns(["*.py", "!keep.py"], "keep.py") is None
+
+
+def test_check_path_reports_reasons():
+    """Test that lockfiles, vendored, generated, binary, oversized and excluded files are detected."""
+    file_filter = FileFilter(exclude=["docs/"], max_file_bytes=1000)
+
+    assert file_filter.check_path("src/app.py", 100) is None
+    assert file_filter.check_path("package-lock.json") == "lockfile"
+    assert file_filter.check_path("vendor/lib/a.go") == "vendored or build directory"
+    assert file_filter.check_path("app/migrations/0001_initial.py") == "generated or minified"
+    assert file_filter.check_path("static/app.min.js") == "generated or minified"
+    assert file_filter.check_path("assets/logo.PNG") == "binary"
+    assert file_filter.check_path("src/big.py", 5000) == "larger than 1000 bytes"
+    assert file_filter.check_path("docs/index.md") == "excluded by pattern 'docs/'"
+
+
+def test_include_patterns_restrict_the_review():
+    """Test that only included files are kept when include patterns are given."""
+    file_filter = FileFilter(include=["src/"])
+
+    assert file_filter.check_path("src/app.py") is None
+    assert file_filter.check_path("scripts/run.py") == "not matched by the include patterns"
+
+
+def test_check_content_sniffs_binary_generated_and_minified_files():
+    """Test that contents that are not reviewable source code are detected."""
+    file_filter = FileFilter()
+
+    def check(filename: str, file_content: str) -> str | None:
+        """Check a file held as a string."""
+        return file_filter.check_content(Content(filename=filename, file_content=file_content))
+
+    assert check("data.bin", "abc\0def") == "binary"
+    assert check("image.txt", "\ufffd" * 100) == "binary"
+    assert check("api.py", "# Code generated by protoc. DO NOT EDIT.\nx = 1\n") == "generated or minified"
+    assert check("bundle.js", "var a=1;" * 1000) == "generated or minified"
+    assert check("app.py", "def main():\n    return 1\n") is None
+
+
+def test_check_content_reads_only_the_head_of_spilled_files():
+    """Test that a spilled file is sniffed from its first piece and sized without being decoded."""
+    with ContentSpool(max_memory_bytes=0) as spool:
+        content = Content(filename="big.py", file_content=spool.store(b"x = 1\n" * 2000))
+
+        with patch.object(SpooledBlob, "text", side_effect=AssertionError("read whole")):
+            assert FileFilter(max_file_bytes=1000).check_content(content) == "larger than 1000 bytes"
+            assert FileFilter(max_file_bytes=None).check_content(content) is None
+
+
+def test_apply_keeps_most_relevant_files_within_token_budget():
+    """Test that source files outrank tests and documentation under the token budget, keeping file order."""
+    files = [
+        Content(filename="README.md", file_content="word " * 200),
+        Content(filename="tests/test_app.py", file_content="assert True\n" * 60),
+        Content(filename="src/app.py", file_content="x = 1\n" * 100),
+        Content(filename="logo.svg", file_content="abc\0"),
+    ]
+    repo_files = RepoFilesResponse(
+        files=files, count=4, skipped_files=[SkippedFile(filename="poetry.lock", reason="lockfile")]
+    )
+
+    result = FileFilter(token_budget=400).apply(repo_files)
+
+    assert [content.filename for content in result.files] == ["tests/test_app.py", "src/app.py"]
+    assert result.count == 2
+    assert {skipped.filename: skipped.reason for skipped in result.skipped_files} == {
+        "poetry.lock": "lockfile",
+        "logo.svg": "binary",
+        "README.md": "over the token budget",
+    }
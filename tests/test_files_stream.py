@@ -0,0 +1,48 @@
+import json
+
+from fastapi.testclient import TestClient
+
+from src.api import app as app_module
+from src.services.content_spool import ContentSpool
+from src.services.files_stream import encode_repo_files
+from src.services.data_structures import Content, RepoFilesResponse, SkippedFile
+
+
+def test_streamed_json_matches_the_model_encoding():
+    """Test that the piecewise encoding is the same document as the pydantic encoding."""
+    with ContentSpool(max_memory_bytes=10) as spool:
+        repo_files = RepoFilesResponse(
+            files=[
+                Content(filename="a.py", file_content='print("é")\n', sha="1"),
+                Content(filename='dir/"b".py', file_content=spool.store("x = '\\t'\n".encode() * 50), sha="2"),
+            ],
+            count=2,
+            commit_sha="commit",
+            skipped_files=[SkippedFile(filename="poetry.lock", reason="lockfile")],
+        )
+
+        pieces = list(encode_repo_files(repo_files, chunk_size=16))
+
+        assert json.loads(b"".join(pieces)) == json.loads(repo_files.model_dump_json())
+        assert len(pieces) > 10
+
+
+def test_files_endpoint_streams_spooled_files(monkeypatch):
+    """Test that /files fetches the contents into the request spool and streams them as JSON."""
+    spools = []
+
+    async def get_repository_files(repo_url, spool=None, **kwargs) -> RepoFilesResponse:
+        spools.append(spool)
+        files = [Content(filename=f"file{index}.py", file_content=spool.store(b"x = 1\n" * 100)) for index in range(3)]
+        return RepoFilesResponse(files=files, count=3, commit_sha="commit")
+
+    monkeypatch.setattr(app_module, "get_repository_files", get_repository_files)
+    response = TestClient(app_module.app).post("/files", json={"github_repo_url": "https://github.com/owner/repo"})
+
+    assert response.status_code == 200
+    assert response.headers["content-type"] == "application/json"
+    body = response.json()
+    assert [content["filename"] for content in body["files"]] == ["file0.py", "file1.py", "file2.py"]
+    assert body["files"][0]["file_content"] == "x = 1\n" * 100
+    assert body["commit_sha"] == "commit"
+    assert isinstance(spools[0], ContentSpool)
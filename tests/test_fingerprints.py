@@ -0,0 +1,57 @@
+from src.services.data_structures import Content, RepoFilesResponse
+from src.services.fingerprints import BoilerplateIndex, fingerprint, find_duplicates
+
+MODULE = "\n".join(f"def handler_{index}(request):\n    return request.get('key_{index}')\n" for index in range(40))
+
+
+def test_fingerprint_ignores_whitespace_and_comments():
+    """Test that reformatting and comments leave the fingerprint unchanged."""
+    reformatted = "# Handlers\n" + MODULE.replace("    return", "  return").replace("')\n", "')  # the value\n")
+
+    assert fingerprint(reformatted).digest == fingerprint(MODULE).digest
+
+
+def test_similarity_separates_near_duplicates_from_different_files():
+    """Test that a lightly edited copy is similar and an unrelated file is not."""
+    edited = MODULE.replace("handler_3(", "renamed_handler(")
+    other = "\n".join(f"class Model{index}:\n    name: str = 'model {index}'\n" for index in range(40))
+
+    assert fingerprint(edited).similarity(fingerprint(MODULE)) >= 0.9
+    assert fingerprint(other).similarity(fingerprint(MODULE)) < 0.2
+
+
+def test_find_duplicates_maps_copies_to_the_first_file():
+    """Test that exact and near copies are mapped to the first file of their group."""
+    files = [
+        Content(filename="app/handlers.py", file_content=MODULE),
+        Content(filename="app/__init__.py", file_content=""),
+        Content(filename="copy/handlers.py", file_content=MODULE.replace("handler_3(", "renamed_handler(")),
+        Content(filename="copy/__init__.py", file_content="\n"),
+        Content(filename="app/models.py", file_content="class Model:\n    pass\n"),
+    ]
+
+    assert find_duplicates(files) == {"copy/handlers.py": "app/handlers.py", "copy/__init__.py": "app/__init__.py"}
+    assert find_duplicates(files, min_similarity=0) == {}
+
+
+def test_boilerplate_index_skips_files_found_in_other_repositories(tmp_path):
+    """Test that files seen in enough other repositories are skipped, the index surviving a restart."""
+    path = str(tmp_path / "boilerplate.sqlite3")
+    index = BoilerplateIndex(path, min_repositories=2)
+    for repository in ("https://github.com/a/one", "https://github.com/a/two", "https://github.com/a/two"):
+        index.add(MODULE, repository)
+    index.close()
+
+    index = BoilerplateIndex(path, min_repositories=2)
+    files = [
+        Content(filename="settings.py", file_content=MODULE.replace("handler_5(", "view(")),
+        Content(filename="app.py", file_content="print('hello')\n"),
+    ]
+    result = index.apply(RepoFilesResponse(files=files, count=2), "https://github.com/a/three/")
+
+    assert [content.filename for content in result.files] == ["app.py"]
+    assert [(skipped.filename, skipped.reason) for skipped in result.skipped_files] == [
+        ("settings.py", "known boilerplate")
+    ]
+    assert index.lookup(MODULE) == 3
+    assert index.lookup("unknown = True\n") == 0
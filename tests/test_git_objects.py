@@ -0,0 +1,115 @@
+import shutil
+import pytest
+import subprocess
+
+from src.services.repo_cache import git_blob_sha
+from src.services.git_objects import GitRepository, GitObjectError, apply_delta
+
+pytestmark = pytest.mark.skipif(shutil.which("git") is None, reason="needs the git binary")
+
+
+def git(directory, *arguments: str) -> str:
+    """Run a git command in a directory and return its output."""
+    return subprocess.run(
+        ["git", "-c", "user.name=Test", "-c", "user.email=test@example.com", "-C", str(directory), *arguments],
+        check=True, capture_output=True, text=True,
+    ).stdout.strip()
+
+
+@pytest.fixture
+def repository(tmp_path):
+    """A clone with two commits of similar files, a branch, an annotated tag, a symlink and an executable."""
+    path = tmp_path / "clone"
+    path.mkdir()
+    git(path, "init", "-q", "-b", "main")
+    for version in range(2):
+        (path / "pkg").mkdir(exist_ok=True)
+        for index in range(20):
+            lines = [f"def function_{index}_{line}():\n    return {line + version}\n" for line in range(40)]
+            (path / "pkg" / f"module_{index}.py").write_text("".join(lines))
+        (path / "README.md").write_text(f"# Project v{version}\n")
+        git(path, "add", "-A")
+        git(path, "commit", "-q", "-m", f"Version {version}")
+        if version == 0:
+            git(path, "tag", "-a", "v0", "-m", "First version")
+            git(path, "branch", "first")
+
+    (path / "run.sh").write_text("#!/bin/sh\necho run\n")
+    (path / "run.sh").chmod(0o755)
+    (path / "link.md").symlink_to("README.md")
+    git(path, "add", "-A")
+    git(path, "commit", "-q", "-m", "Scripts")
+    return path
+
+
+def expected_files(path, revision: str = "HEAD") -> dict[str, str]:
+    """The regular files of a commit as listed by git, by path."""
+    lines = git(path, "ls-tree", "-r", revision).splitlines()
+    return {line.split("\t")[1]: line.split()[2] for line in lines if line.split()[0] in ("100644", "100755")}
+
+
+def read_files(path, revision: str | None = None) -> dict[str, str]:
+    """The regular files of a commit as read by GitRepository, by path, checking every content against its SHA."""
+    with GitRepository(path) as repository:
+        files = dict(repository.walk_tree(repository.commit_tree(repository.resolve(revision))))
+        for sha in files.values():
+            assert git_blob_sha(repository.read_blob(sha)) == sha
+    return files
+
+
+@pytest.mark.parametrize("packed", [False, True])
+def test_files_are_read_from_loose_objects_and_deltified_packs(repository, packed):
+    """Test that the files of every commit match git, whether their objects are loose or in a pack with deltas."""
+    if packed:
+        git(repository, "repack", "-a", "-d", "-q", "--depth=50", "--window=250")
+        git(repository, "prune-packed")
+        indexes = [str(index) for index in (repository / ".git/objects/pack").glob("*.idx")]
+        assert "delta" in git(repository, "verify-pack", "-v", *indexes)
+
+    files = read_files(repository)
+
+    assert files == expected_files(repository)
+    assert "link.md" not in files and "run.sh" in files
+    assert read_files(repository, "first") == expected_files(repository, "first")
+
+
+def test_revisions_resolve_to_commits(repository):
+    """Test that HEAD, branches, annotated tags, packed refs and full SHAs resolve like git rev-parse."""
+    git(repository, "pack-refs", "--all")
+    with GitRepository(repository / ".git") as repository_reader:
+        for revision in ("HEAD", "main", "first", "v0", "refs/tags/v0"):
+            assert repository_reader.resolve(revision) == git(repository, "rev-parse", f"{revision}^{{commit}}")
+        first = git(repository, "rev-parse", "first")
+        assert repository_reader.resolve(first.upper()) == first
+
+        for revision in ("missing", "../../etc/passwd"):
+            with pytest.raises(GitObjectError):
+                repository_reader.resolve(revision)
+
+
+def test_bare_clones_and_alternates_are_read(repository, tmp_path):
+    """Test that a bare mirror and a clone borrowing its objects through alternates are read."""
+    mirror, shared = tmp_path / "mirror.git", tmp_path / "shared"
+    subprocess.run(["git", "clone", "-q", "--mirror", str(repository), str(mirror)], check=True)
+    subprocess.run(["git", "clone", "-q", "--shared", str(mirror), str(shared)], check=True)
+
+    assert read_files(mirror) == expected_files(repository)
+    assert (shared / ".git/objects/info/alternates").is_file()
+    assert read_files(shared) == expected_files(repository)
+
+
+def test_not_a_repository_is_rejected(tmp_path):
+    """Test that a directory without a git repository is reported."""
+    with pytest.raises(GitObjectError):
+        GitRepository(tmp_path)
+
+
+def test_delta_copies_and_inserts():
+    """Test that copy and insert instructions rebuild the target and a wrong base is rejected."""
+    base = b"hello world"
+    # Source size 11, target size 10: copy 5 bytes at offset 0, insert " git", copy 1 byte at offset 10
+    delta = bytes([11, 10, 0x90, 5, 4]) + b" git" + bytes([0x91, 10, 1])
+
+    assert apply_delta(base, delta) == b"hello gitd"
+    with pytest.raises(GitObjectError):
+        apply_delta(b"short", delta)
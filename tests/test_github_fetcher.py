@@ -1,6 +1,17 @@
+import io
+import httpx
+import asyncio
 import pytest
+import tarfile
 from fastapi import HTTPException
-from src.services.github_fetcher import get_repository_files
+from src.services.data_structures import FetchMode
+from src.services.file_filter import FileFilter
+from src.services.repo_cache import RepositoryCache
+from src.services.content_spool import ContentSpool
+from src.services.kv_store import MemoryKeyValueStore
+from src.services.github_http import GitHubTransport, RateLimitState
+import src.services.github_fetcher as github_fetcher
+from src.services.github_fetcher import get_repository_files, fetch_blobs, TarballStreamReader
 from unittest.mock import AsyncMock, patch
 
 
@@ -36,3 +47,253 @@ async def test_get_repository_files_failed_api_call():
 
         assert exc_info.value.status_code == 404
         assert exc_info.value.detail == "Failed to fetch repository files"
+
+
+def build_tarball(files: dict[str, bytes], prefix: str = "owner-repo-abc123") -> bytes:
+    """Build a gzipped tarball laid out like the archives served by GitHub."""
+    buffer = io.BytesIO()
+    with tarfile.open(
+            fileobj=buffer, mode="w:gz", format=tarfile.PAX_FORMAT, pax_headers={"comment": "abc123"}
+    ) as archive:
+        directory = tarfile.TarInfo(prefix)
+        directory.type = tarfile.DIRTYPE
+        archive.addfile(directory)
+        for path, data in files.items():
+            info = tarfile.TarInfo(f"{prefix}/{path}")
+            info.size = len(data)
+            archive.addfile(info, io.BytesIO(data))
+    return buffer.getvalue()
+
+
+ARCHIVE_FILES = {
+    "README.md": b"# Repo\n",
+    "src/main.py": b"print('hello')\n" * 100,
+    "src/" + "nested/" * 20 + "deep.py": b"x = 1\n",
+}
+
+
+@pytest.mark.asyncio
+async def test_get_repository_files_from_archive():
+    """Test that archive mode builds the response from a single tarball request."""
+    requests = []
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        requests.append(request.url.path)
+        if request.url.path == "/repos/owner/repo/tarball":
+            return httpx.Response(200, content=build_tarball(ARCHIVE_FILES))
+        return httpx.Response(404)
+
+    async with httpx.AsyncClient(transport=httpx.MockTransport(handler)) as client:
+        result = await get_repository_files("https://github.com/owner/repo", client=client)
+
+    assert requests == ["/repos/owner/repo/tarball"]
+    assert result.count == 3
+    assert {content.filename: content.file_content.encode() for content in result.files} == ARCHIVE_FILES
+
+
+def test_tarball_stream_reader_handles_small_chunks():
+    """Test that the archive can be fed in chunks that split headers and bodies."""
+    archive = build_tarball(ARCHIVE_FILES)
+    reader = TarballStreamReader()
+
+    files = []
+    for position in range(0, len(archive), 7):
+        files.extend(reader.feed(archive[position:position + 7]))
+    reader.close()
+
+    assert dict(files) == ARCHIVE_FILES
+    assert reader.commit_sha == "abc123"
+
+
+def test_tarball_stream_reader_inflates_large_chunks_gradually(monkeypatch):
+    """Test that a chunk expanding far beyond the inflate limit is inflated piece by piece, without losing files."""
+    monkeypatch.setattr(github_fetcher, "INFLATE_CHUNK_BYTES", 1024)
+    files = {f"file{index}.py": b"x = 1\n" * 2000 for index in range(5)}
+    reader = TarballStreamReader()
+
+    entries = reader.feed(build_tarball(files))
+    assert next(entries)[0] == "file0.py"
+    assert dict(entries) == {name: data for name, data in files.items() if name != "file0.py"}
+    reader.close()
+
+
+def github_tree_handler(blobs: dict[str, bytes], requests: list[str] | None = None):
+    """Build a stub GitHub API that serves a commit tree and its blobs."""
+    shas = {path: f"sha-{index}" for index, path in enumerate(blobs)}
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        if requests is not None:
+            requests.append(request.url.path)
+        if request.url.path == "/repos/owner/repo/commits/HEAD":
+            return httpx.Response(200, text="commit-sha")
+        if request.url.path == "/repos/owner/repo/git/trees/commit-sha":
+            assert request.url.params["recursive"] == "1"
+            tree = [{"path": "src", "type": "tree", "sha": "tree-sha"}]
+            tree += [{"path": path, "type": "blob", "sha": sha, "size": len(blobs[path])} for path, sha in shas.items()]
+            return httpx.Response(200, json={"sha": "commit-sha", "tree": tree, "truncated": False})
+        for path, sha in shas.items():
+            if request.url.path == f"/repos/owner/repo/git/blobs/{sha}":
+                return httpx.Response(200, content=blobs[path])
+        return httpx.Response(404)
+
+    return handler
+
+
+@pytest.mark.asyncio
+async def test_get_repository_files_archive_falls_back_to_per_file():
+    """Test that a failed archive download falls back to the Git Trees API."""
+    handler = github_tree_handler({"main.py": b"print('hello')"})
+
+    async with httpx.AsyncClient(transport=httpx.MockTransport(handler)) as client:
+        result = await get_repository_files("https://github.com/owner/repo", client=client)
+
+    assert result.count == 1
+    assert result.files[0].file_content == "print('hello')"
+
+
+@pytest.mark.asyncio
+async def test_get_repository_files_per_file_lists_tree_once():
+    """Test that per-file mode lists the tree with one call and downloads source files first."""
+    requests = []
+    handler = github_tree_handler({"README.md": b"# Repo", "logo.png": b"\x89PNG", "src/app.py": b"app = 1"}, requests)
+
+    async with httpx.AsyncClient(transport=httpx.MockTransport(handler)) as client:
+        result = await get_repository_files(
+            "https://github.com/owner/repo", fetch_mode=FetchMode.per_file, client=client, max_concurrency=1
+        )
+
+    assert [content.filename for content in result.files] == ["src/app.py", "README.md", "logo.png"]
+    assert requests[:2] == ["/repos/owner/repo/commits/HEAD", "/repos/owner/repo/git/trees/commit-sha"]
+    assert requests[2:] == ["/repos/owner/repo/git/blobs/sha-2", "/repos/owner/repo/git/blobs/sha-0",
+                            "/repos/owner/repo/git/blobs/sha-1"]
+
+
+@pytest.mark.asyncio
+async def test_fetch_blobs_respects_concurrency_limit():
+    """Test that no more blob downloads than the configured limit are in flight."""
+    in_flight = 0
+    peak = 0
+
+    async def handler(request: httpx.Request) -> httpx.Response:
+        nonlocal in_flight, peak
+        in_flight += 1
+        peak = max(peak, in_flight)
+        await asyncio.sleep(0.01)
+        in_flight -= 1
+        return httpx.Response(200, content=b"data")
+
+    entries = [{"path": f"file{index}.py", "sha": f"sha-{index}"} for index in range(20)]
+    async with httpx.AsyncClient(transport=httpx.MockTransport(handler)) as client:
+        files = await fetch_blobs(client, "owner", "repo", entries, max_concurrency=3)
+
+    assert len(files) == 20
+    assert peak == 3
+
+
+@pytest.mark.asyncio
+async def test_get_repository_files_serves_unchanged_commit_from_cache():
+    """Test that a cached commit is served after resolving HEAD, without any other request."""
+    requests = []
+    cache = RepositoryCache(MemoryKeyValueStore())
+    handler = github_tree_handler({"main.py": b"print('hello')", "README.md": b"# Repo"}, requests)
+
+    async with httpx.AsyncClient(transport=httpx.MockTransport(handler)) as client:
+        first = await get_repository_files(
+            "https://github.com/owner/repo", fetch_mode=FetchMode.per_file, client=client, cache=cache
+        )
+        requests.clear()
+        second = await get_repository_files(
+            "https://github.com/owner/repo", fetch_mode=FetchMode.per_file, client=client, cache=cache
+        )
+
+    assert requests == ["/repos/owner/repo/commits/HEAD"]
+    assert second == first
+    assert second.commit_sha == "commit-sha"
+    assert cache.full_hits == 1
+    assert cache.stats.bytes_saved == len("print('hello')# Repo")
+
+
+@pytest.mark.asyncio
+async def test_get_repository_files_fetches_only_changed_blobs():
+    """Test that only the blobs missing from the cache are downloaded for a new commit."""
+    requests = []
+    cache = RepositoryCache(MemoryKeyValueStore())
+    cache.put_blob("sha-0", b"print('hello')")
+    cache.put_blob("sha-1", b"# Repo")
+    handler = github_tree_handler({"main.py": b"print('hello')", "README.md": b"# Repo", "new.py": b"x = 1"}, requests)
+
+    async with httpx.AsyncClient(transport=httpx.MockTransport(handler)) as client:
+        result = await get_repository_files("https://github.com/owner/repo", client=client, cache=cache)
+
+    assert requests == [
+        "/repos/owner/repo/commits/HEAD",
+        "/repos/owner/repo/git/trees/commit-sha",
+        "/repos/owner/repo/git/blobs/sha-2",
+    ]
+    assert [content.filename for content in result.files] == ["main.py", "new.py", "README.md"]
+    assert cache.get_blob("sha-2") == "x = 1"
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("with_spool", [False, True])
+async def test_get_repository_files_caches_raw_blob_bytes(with_spool):
+    """Test that blobs are cached as downloaded, so the cached copy keeps bytes that are not valid UTF-8."""
+    cache = RepositoryCache(MemoryKeyValueStore())
+    data = b"name = 'caf\xe9'\n"
+    handler = github_tree_handler({"main.py": data}, [])
+
+    with ContentSpool(max_memory_bytes=0) as spool:
+        async with httpx.AsyncClient(transport=httpx.MockTransport(handler)) as client:
+            result = await get_repository_files(
+                "https://github.com/owner/repo", fetch_mode=FetchMode.per_file, client=client, cache=cache,
+                spool=spool if with_spool else None,
+            )
+
+        assert result.files[0].file_content == data.decode("utf-8", "replace")
+    assert cache.store.get(f"blob:{result.files[0].sha}") == data
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize(("response", "status_code"), [
+    (httpx.Response(403, headers={"x-ratelimit-remaining": "0", "x-ratelimit-reset": "0"}), 429),
+    (httpx.Response(503), 502),
+])
+async def test_get_repository_files_rate_limited_or_unavailable(response, status_code):
+    """Test that an exhausted GitHub quota is reported as a 429 and persistent server errors as a 502."""
+    async def no_sleep(delay: float) -> None:
+        pass
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        return response
+
+    transport = GitHubTransport(httpx.MockTransport(handler), state=RateLimitState(), sleep=no_sleep)
+    async with httpx.AsyncClient(transport=transport) as client:
+        with pytest.raises(HTTPException) as exc_info:
+            await get_repository_files("https://github.com/owner/repo", client=client)
+
+    assert exc_info.value.status_code == status_code
+
+
+@pytest.mark.asyncio
+async def test_get_repository_files_never_downloads_filtered_blobs():
+    """Test that files skipped by the file filter are reported without being downloaded."""
+    requests = []
+    handler = github_tree_handler({
+        "main.py": b"print('hello')",
+        "poetry.lock": b"[[package]]\n",
+        "node_modules/lib/index.js": b"module.exports = {}",
+        "logo.png": b"\x89PNG",
+    }, requests)
+
+    async with httpx.AsyncClient(transport=httpx.MockTransport(handler)) as client:
+        result = await get_repository_files(
+            "https://github.com/owner/repo", fetch_mode=FetchMode.per_file, client=client, file_filter=FileFilter()
+        )
+
+    assert [content.filename for content in result.files] == ["main.py"]
+    assert {skipped.filename: skipped.reason for skipped in result.skipped_files} == {
+        "poetry.lock": "lockfile",
+        "node_modules/lib/index.js": "vendored or build directory",
+        "logo.png": "binary",
+    }
+    assert [path for path in requests if "/git/blobs/" in path] == ["/repos/owner/repo/git/blobs/sha-0"]
@@ -0,0 +1,121 @@
+import time
+import httpx
+import pytest
+
+from src.services.kv_store import MemoryKeyValueStore
+from src.services.github_http import GitHubTransport, GitHubRateLimitError, GitHubUnavailableError, RateLimitState
+
+
+class RecordingSleep:
+    """Collects the requested delays instead of sleeping."""
+
+    def __init__(self):
+        self.delays = []
+
+    async def __call__(self, delay: float) -> None:
+        self.delays.append(delay)
+
+
+def github_client(handler, **kwargs) -> tuple[httpx.AsyncClient, GitHubTransport]:
+    """Build a client sending requests to a stub handler through a GitHubTransport."""
+    kwargs.setdefault("state", RateLimitState())
+    kwargs.setdefault("etags", MemoryKeyValueStore())
+    transport = GitHubTransport(httpx.MockTransport(handler), **kwargs)
+    return httpx.AsyncClient(transport=transport), transport
+
+
+@pytest.mark.asyncio
+async def test_etag_is_replayed_and_304_served_from_store():
+    """Test that a stored ETag is sent back and a 304 returns the stored body."""
+    seen_etags = []
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        seen_etags.append(request.headers.get("if-none-match"))
+        if request.headers.get("if-none-match") == '"v1"':
+            return httpx.Response(304, headers={"etag": '"v1"'})
+        return httpx.Response(200, headers={"etag": '"v1"'}, json={"name": "repo"})
+
+    client, transport = github_client(handler)
+    async with client:
+        first = await client.get("https://api.github.com/repos/owner/repo")
+        second = await client.get("https://api.github.com/repos/owner/repo")
+
+    assert seen_etags == [None, '"v1"']
+    assert first.json() == second.json() == {"name": "repo"}
+    assert transport.state.not_modified == 1
+
+
+@pytest.mark.asyncio
+async def test_rate_limited_request_is_retried_after_retry_after():
+    """Test that a secondary rate limit response is retried after the Retry-After delay."""
+    responses = [
+        httpx.Response(403, headers={"retry-after": "2"}),
+        httpx.Response(200, headers={"x-ratelimit-remaining": "4999", "x-ratelimit-limit": "5000"}, text="ok"),
+    ]
+    sleep = RecordingSleep()
+
+    client, transport = github_client(lambda request: responses.pop(0), sleep=sleep)
+    async with client:
+        response = await client.get("https://api.github.com/repos/owner/repo")
+
+    assert response.text == "ok"
+    assert sleep.delays == [2.0]
+    assert (transport.state.retries, transport.state.remaining, transport.state.limit) == (1, 4999, 5000)
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("retry_after, expected", [("Wed, 21 Oct 2015 07:28:00 GMT", 0.0), ("soon", None)])
+async def test_retry_after_may_be_an_http_date(retry_after, expected):
+    """Test that a Retry-After date is waited for, and that an unreadable one falls back to the backoff."""
+    responses = [httpx.Response(503, headers={"retry-after": retry_after}), httpx.Response(200, text="ok")]
+    sleep = RecordingSleep()
+
+    client, _ = github_client(lambda request: responses.pop(0), sleep=sleep, base_delay=1.0)
+    async with client:
+        response = await client.get("https://api.github.com/repos/owner/repo")
+
+    assert response.text == "ok"
+    if expected is None:
+        assert 0.5 <= sleep.delays[0] <= 1.0
+    else:
+        assert sleep.delays == [expected]
+
+
+@pytest.mark.asyncio
+async def test_server_errors_use_jittered_exponential_backoff():
+    """Test that server errors are retried with growing, jittered delays and finally give up."""
+    sleep = RecordingSleep()
+
+    client, _ = github_client(lambda request: httpx.Response(502), sleep=sleep, max_retries=3, base_delay=1.0)
+    async with client:
+        with pytest.raises(GitHubUnavailableError):
+            await client.get("https://api.github.com/repos/owner/repo")
+
+    assert len(sleep.delays) == 3
+    for attempt, delay in enumerate(sleep.delays):
+        assert 2 ** attempt / 2 <= delay <= 2 ** attempt
+
+
+@pytest.mark.asyncio
+async def test_requests_are_paced_when_quota_runs_low():
+    """Test that the remaining quota is spread over the rest of the window."""
+    sleep = RecordingSleep()
+    state = RateLimitState(limit=5000, remaining=10, reset_at=time.time() + 100)
+
+    client, _ = github_client(lambda request: httpx.Response(200), state=state, sleep=sleep, min_remaining=50)
+    async with client:
+        await client.get("https://api.github.com/repos/owner/repo")
+
+    assert len(sleep.delays) == 1
+    assert 9 <= sleep.delays[0] <= 10
+
+
+@pytest.mark.asyncio
+async def test_exhausted_quota_beyond_max_delay_fails_fast():
+    """Test that a quota reset too far in the future raises instead of sleeping."""
+    state = RateLimitState(limit=5000, remaining=0, reset_at=time.time() + 3600)
+
+    client, _ = github_client(lambda request: httpx.Response(200), state=state, sleep=RecordingSleep())
+    async with client:
+        with pytest.raises(GitHubRateLimitError):
+            await client.get("https://api.github.com/repos/owner/repo")
@@ -0,0 +1,556 @@
+import json
+import httpx
+import pytest
+import asyncio
+
+from typing import AsyncIterator
+from contextlib import asynccontextmanager
+from openai import AsyncOpenAI
+from fastapi import HTTPException
+
+from src.services.kv_store import MemoryKeyValueStore
+from src.services.chunker import count_tokens
+from src.services.llm_cache import LLMResponseCache
+from src.services.repo_cache import git_blob_sha
+from src.services.review_snapshots import ChunkSnapshot, ReviewSnapshot
+from src.services.llm_limits import LLMRateLimiter, TokenBucket
+from src.services.static_analysis import analyze_source
+from src.services.model_routing import ModelRouter
+from src.services.gpt_code_analyzer import GPTCandidateAnalyzer
+from src.services.data_structures import RepoFilesResponse, Content, CandidateLevel
+
+
+class FakeCompletionServer:
+    """A stand-in for the OpenAI chat completions API answering through an HTTPX mock transport."""
+
+    def __init__(self, reply=None, delay=None):
+        self.prompts = []
+        self.bodies = []
+        self.in_flight = 0
+        self.peak_in_flight = 0
+        self.__reply = reply or (lambda prompt: json.dumps({"flaws": [], "rating": 5, "conclusion": "Good"}))
+        self.__delay = delay or (lambda prompt: 0.0)
+
+    async def __call__(self, request: httpx.Request) -> httpx.Response:
+        body = json.loads(request.content)
+        prompt = body["messages"][-1]["content"]
+        self.bodies.append(body)
+        self.prompts.append(prompt)
+        self.in_flight += 1
+        self.peak_in_flight = max(self.peak_in_flight, self.in_flight)
+        try:
+            await asyncio.sleep(self.__delay(prompt))
+            content = self.__reply(prompt)
+        finally:
+            self.in_flight -= 1
+
+        return httpx.Response(200, json={
+            "id": "chatcmpl-test",
+            "object": "chat.completion",
+            "created": 0,
+            "model": "gpt-4-turbo",
+            "choices": [{"index": 0, "finish_reason": "stop", "message": {"role": "assistant", "content": content}}],
+            "usage": {"prompt_tokens": len(prompt) // 4, "completion_tokens": len(content) // 4,
+                      "total_tokens": (len(prompt) + len(content)) // 4},
+        })
+
+    def client(self) -> AsyncOpenAI:
+        """Build an OpenAI client talking to this server."""
+        http_client = httpx.AsyncClient(transport=httpx.MockTransport(self))
+        return AsyncOpenAI(api_key="test", base_url="http://llm.test/v1", http_client=http_client, max_retries=0)
+
+
+def repository(*files: tuple[str, str]) -> RepoFilesResponse:
+    """Build a repository response from (filename, content) pairs."""
+    contents = [Content(filename=filename, file_content=file_content) for filename, file_content in files]
+    return RepoFilesResponse(files=contents, count=len(contents))
+
+
+def test_analyzer_requires_files():
+    """Test that an empty repository is rejected."""
+    with pytest.raises(HTTPException) as exc_info:
+        GPTCandidateAnalyzer(repository(), CandidateLevel.junior, "Task", client=FakeCompletionServer().client())
+
+    assert exc_info.value.status_code == 400
+
+
+@pytest.mark.asyncio
+async def test_analyze_keeps_file_and_part_order():
+    """Test that parts completing out of order are reported in file and part order."""
+    def reply(prompt: str) -> str:
+        if "structured report" in prompt:
+            return json.dumps({"flaws": [], "rating": 4, "conclusion": "Fine"})
+        return "review of " + prompt.split("def ")[1][:5]
+
+    # Earlier parts answer last
+    server = FakeCompletionServer(reply=reply, delay=lambda prompt: 0.05 if "def first" in prompt else 0.0)
+    body = "    value = 1\n" * 20
+    files = repository(("a.py", f"def first():\n{body}\n\ndef second():\n{body}"), ("c.py", "def third(): pass\n"))
+
+    analyzer = GPTCandidateAnalyzer(files, CandidateLevel.middle, "Task", client=server.client(), max_chunk_tokens=100)
+    report = await analyzer.analyze()
+
+    assert analyzer.file_analysis_parts == [
+        "File a.py, part 1/2:\nreview of first",
+        "File a.py, part 2/2:\nreview of secon",
+        "File c.py:\nreview of third",
+    ]
+    assert report.project_files == ["a.py", "c.py"]
+    assert report.conclusion_and_assessment == {"flaws": [], "rating": 4, "conclusion": "Fine"}
+
+
+@pytest.mark.asyncio
+async def test_analyze_packs_small_files_into_one_request():
+    """Test that small files share a single request."""
+    server = FakeCompletionServer(
+        reply=lambda prompt: json.dumps({"rating": 5}) if "structured report" in prompt else "ok"
+    )
+    files = repository(("a.py", "a = 1"), ("c.py", "c = 3"), ("d.py", "d = 4"))
+
+    analyzer = GPTCandidateAnalyzer(files, CandidateLevel.junior, "Task", client=server.client())
+    await analyzer.analyze()
+
+    assert len(server.prompts) == 2
+    assert analyzer.file_analysis_parts == ["Files a.py, c.py, d.py:\nok"]
+
+
+@pytest.mark.asyncio
+async def test_re_review_only_sends_changed_chunks():
+    """Test that a re-review with a cache only sends the chunks of changed files and the final report."""
+    server = FakeCompletionServer(
+        reply=lambda prompt: json.dumps({"rating": 5}) if "structured report" in prompt else f"ok {len(prompt)}"
+    )
+    cache = LLMResponseCache(MemoryKeyValueStore())
+    files = [(f"file{index}.py", f"x = {index}\n" * 10) for index in range(40)]
+
+    analyzer = GPTCandidateAnalyzer(
+        repository(*files), CandidateLevel.junior, "Task", client=server.client(), max_chunk_tokens=60, cache=cache
+    )
+    await analyzer.analyze()
+    first_review_calls = len(server.prompts)
+
+    files[20] = ("file20.py", "x = 'changed'\n" * 12)
+    server.prompts.clear()
+    analyzer = GPTCandidateAnalyzer(
+        repository(*files), CandidateLevel.junior, "Task", client=server.client(), max_chunk_tokens=60, cache=cache
+    )
+    await analyzer.analyze()
+
+    assert first_review_calls > 10
+    assert len(server.prompts) <= 3
+    assert any("file20.py" in prompt for prompt in server.prompts)
+    assert any("structured report" in prompt for prompt in server.prompts)
+
+
+@pytest.mark.asyncio
+async def test_final_report_of_large_repository_is_reduced_by_directory():
+    """Test that analyses too large for one prompt are summarized first while the full report keeps them all."""
+    def reply(prompt: str) -> str:
+        if "structured report" in prompt:
+            return json.dumps({"rating": 3})
+        if "Summarize" in prompt:
+            return "directory summary"
+        return "analysis " * 40
+
+    server = FakeCompletionServer(reply=reply)
+    files = repository(*((f"pkg{index % 3}/file{index}.py", f"x = {index}\n" * 30) for index in range(30)))
+
+    analyzer = GPTCandidateAnalyzer(
+        files, CandidateLevel.middle, "Task", client=server.client(), max_chunk_tokens=100, max_report_tokens=300
+    )
+    report = await analyzer.analyze()
+
+    summaries = [prompt for prompt in server.prompts if "Summarize" in prompt]
+    assert summaries
+    assert all(count_tokens(prompt) <= 300 + 100 for prompt in summaries + [server.prompts[-1]])
+    assert "directory summary" in server.prompts[-1]
+    assert report.full_report.count("analysis " * 40) == 30
+
+
+@pytest.mark.asyncio
+async def test_failed_report_reduction_is_a_server_error(monkeypatch):
+    """Test that any failure while reducing the analyses is reported as a single server error."""
+    async def reduce_report(*args, **kwargs):
+        raise ExceptionGroup("summaries failed", [RuntimeError("first"), ValueError("second")])
+
+    monkeypatch.setattr("src.services.gpt_code_analyzer.reduce_report", reduce_report)
+    server = FakeCompletionServer()
+    analyzer = GPTCandidateAnalyzer(repository(("a.py", "a")), CandidateLevel.junior, "Task", client=server.client())
+
+    with pytest.raises(HTTPException) as exc_info:
+        await analyzer.analyze()
+
+    assert exc_info.value.status_code == 500
+
+
+@pytest.mark.asyncio
+async def test_analyze_stream_yields_analyses_as_they_complete():
+    """Test that chunk analyses are yielded in completion order, then the report."""
+    def reply(prompt: str) -> str:
+        if "structured report" in prompt:
+            return json.dumps({"rating": 5})
+        return "slow" if "slow.py" in prompt else "fast"
+
+    server = FakeCompletionServer(reply=reply, delay=lambda prompt: 0.05 if "slow.py" in prompt else 0.0)
+    files = repository(("slow.py", "x = 1\n" * 40), ("fast.py", "y = 1\n" * 40))
+
+    analyzer = GPTCandidateAnalyzer(files, CandidateLevel.junior, "Task", client=server.client(), max_chunk_tokens=100)
+    events = [event async for event in analyzer.analyze_stream()]
+
+    assert [(event.index, event.analysis) for event in events[:-1]] == [(1, "fast"), (0, "slow")]
+    assert events[-1].conclusion_and_assessment == {"rating": 5}
+    assert analyzer.file_analysis_parts == []
+
+
+@pytest.mark.asyncio
+async def test_closing_analyze_stream_cancels_requests_in_flight():
+    """Test that abandoning the stream cancels the chunk analyses still running."""
+    server = FakeCompletionServer(delay=lambda prompt: 0.0 if "fast.py" in prompt else 10.0)
+    files = repository(("fast.py", "x = 1\n" * 40), *((f"slow{index}.py", f"y = {index}\n" * 40) for index in range(3)))
+
+    analyzer = GPTCandidateAnalyzer(files, CandidateLevel.junior, "Task", client=server.client(), max_chunk_tokens=100)
+    stream = analyzer.analyze_stream()
+    first = await anext(stream)
+    await stream.aclose()
+    await asyncio.sleep(0)
+
+    assert first.files == ["fast.py"]
+    assert server.in_flight == 0
+
+
+def versioned_repository(*files: tuple[str, str]) -> RepoFilesResponse:
+    """Build a repository response whose files carry their blob SHA."""
+    contents = [
+        Content(filename=filename, file_content=file_content, sha=git_blob_sha(file_content.encode()))
+        for filename, file_content in files
+    ]
+    return RepoFilesResponse(files=contents, count=len(contents), commit_sha="commit")
+
+
+@pytest.mark.asyncio
+async def test_re_review_reuses_analyses_of_unchanged_files():
+    """Test that a re-review only analyzes the files whose blob SHA changed, then regenerates the report."""
+    server = FakeCompletionServer(
+        reply=lambda prompt: json.dumps({"rating": 5}) if "structured report" in prompt else f"ok {len(prompt)}"
+    )
+    files = [(f"pkg/file{index}.py", f"x = {index}\n" * 40) for index in range(10)]
+    analyzer = GPTCandidateAnalyzer(
+        versioned_repository(*files), CandidateLevel.junior, "Task", client=server.client(), max_chunk_tokens=100
+    )
+    first_report = await analyzer.analyze()
+    previous = ReviewSnapshot(
+        review_id="previous", github_repo_url="https://github.com/owner/repo", assignment_description="Task",
+        candidate_level=CandidateLevel.junior, chunks=analyzer.chunk_snapshots,
+    )
+
+    files[4] = ("pkg/file4.py", "x = 44\n" * 40)
+    server.prompts.clear()
+    analyzer = GPTCandidateAnalyzer(
+        versioned_repository(*files), CandidateLevel.junior, "Task",
+        client=server.client(), max_chunk_tokens=100, previous=previous,
+    )
+    report = await analyzer.analyze()
+
+    assert len(server.prompts) == 2
+    assert "pkg/file4.py" in server.prompts[0]
+    assert "structured report" in server.prompts[1]
+    assert report.reused_files == [filename for filename, _ in files if filename != "pkg/file4.py"]
+    assert [part.split(":")[0] for part in analyzer.file_analysis_parts] == [f"File {name}" for name, _ in files]
+    assert report.full_report.split("\n\n")[:4] == first_report.full_report.split("\n\n")[:4]
+
+
+@pytest.mark.asyncio
+async def test_previous_review_of_another_assignment_is_not_reused():
+    """Test that analyses made for another assignment or level are never reused."""
+    server = FakeCompletionServer(
+        reply=lambda prompt: json.dumps({"rating": 5}) if "structured report" in prompt else "ok"
+    )
+    files = versioned_repository(("a.py", "a = 1\n"))
+    previous = ReviewSnapshot(
+        review_id="previous", github_repo_url="https://github.com/owner/repo", assignment_description="Other task",
+        candidate_level=CandidateLevel.junior,
+        chunks=[ChunkSnapshot(files={"a.py": files.files[0].sha}, label="File a.py", analysis="old")],
+    )
+
+    analyzer = GPTCandidateAnalyzer(files, CandidateLevel.junior, "Task", client=server.client(), previous=previous)
+    report = await analyzer.analyze()
+
+    assert len(server.prompts) == 2
+    assert report.reused_files == []
+
+
+@pytest.mark.asyncio
+async def test_duplicate_files_are_analyzed_once():
+    """Test that copies of a file are not sent for analysis but listed in the report."""
+    server = FakeCompletionServer(
+        reply=lambda prompt: json.dumps({"rating": 5}) if "structured report" in prompt else "ok"
+    )
+    files = repository(("a/models.py", "x = 1\n" * 40), ("b/models.py", "x  =  1\n" * 40), ("c.py", "y = 2\n" * 40))
+
+    analyzer = GPTCandidateAnalyzer(files, CandidateLevel.junior, "Task", client=server.client(), max_chunk_tokens=100)
+    report = await analyzer.analyze()
+
+    assert len(server.prompts) == 3
+    assert not any("b/models.py" in prompt for prompt in server.prompts[:-1])
+    assert "b/models.py duplicates a/models.py" in server.prompts[-1]
+    assert report.duplicate_files == {"b/models.py": "a/models.py"}
+    assert report.project_files == ["a/models.py", "b/models.py", "c.py"]
+
+
+@pytest.mark.asyncio
+async def test_static_findings_are_sent_and_clean_files_outlined():
+    """Test that static findings go with the code of their file and clean files are sent as their outline."""
+    server = FakeCompletionServer(
+        reply=lambda prompt: json.dumps({"rating": 5}) if "structured report" in prompt else "ok"
+    )
+    clean = 'def add(a: int, b: int) -> int:\n    """Add two numbers."""\n' + "    a += 0\n" * 10 + "    return a + b\n"
+    messy = "import os\n\n\ndef run():\n    return 1\n    print('done')\n"
+    sources = {"clean.py": clean, "messy.py": messy}
+    files = repository(*sources.items())
+    insights = {filename: analyze_source(filename, text) for filename, text in sources.items()}
+
+    analyzer = GPTCandidateAnalyzer(files, CandidateLevel.junior, "Task", client=server.client(), insights=insights)
+    report = await analyzer.analyze()
+
+    prompt = "\n".join(server.prompts[:-1])
+    assert "'clean.py', which passed static analysis, so only its outline is given" in prompt
+    assert "def add(a: int, b: int) -> int" in prompt and "return a + b" not in prompt
+    assert "print('done')" in prompt
+    assert "- messy.py L6: unreachable code after return" in prompt
+    assert "- messy.py L1: unused import os" in prompt
+    # The chunk analyses leave the findings out, so they reach the final report on their own
+    assert "Static analysis of 'messy.py':\n- L6: unreachable code after return\n- L1: unused import os" in (
+        server.prompts[-1]
+    )
+    assert "L6: unreachable code after return" in report.static_findings["messy.py"]
+    assert "clean.py" not in report.static_findings
+
+
+@pytest.mark.asyncio
+async def test_requests_share_the_assignment_prefix():
+    """Test that the assignment leads every request as a shared system prompt with a stable cache key."""
+    server = FakeCompletionServer(
+        reply=lambda prompt: json.dumps({"rating": 5}) if "structured report" in prompt else "ok"
+    )
+    for name in ("first", "second"):
+        analyzer = GPTCandidateAnalyzer(
+            repository((f"{name}.py", f"{name} = 1\n")), CandidateLevel.junior, "Build a to-do API",
+            client=server.client(),
+        )
+        await analyzer.analyze()
+
+    system_prompts = {body["messages"][0]["content"] for body in server.bodies}
+    assert len(system_prompts) == 1
+    assert "Build a to-do API" in system_prompts.pop()
+    assert not any("Build a to-do API" in prompt for prompt in server.prompts)
+    assert len({body["prompt_cache_key"] for body in server.bodies}) == 1
+
+
+@pytest.mark.asyncio
+async def test_analyze_bounds_requests_in_flight():
+    """Test that chunk analyses run concurrently but never above the configured limit."""
+    server = FakeCompletionServer(delay=lambda prompt: 0.01)
+    files = repository(*((f"file{index}.py", f"x = {index}") for index in range(12)))
+
+    analyzer = GPTCandidateAnalyzer(
+        files, CandidateLevel.senior, "Task",
+        client=server.client(), limiter=LLMRateLimiter(max_concurrency=3), max_chunk_tokens=20,
+    )
+    await analyzer.analyze()
+
+    assert server.peak_in_flight == 3
+    assert len(server.prompts) == 13
+
+
+@pytest.mark.asyncio
+async def test_reviews_sharing_a_limiter_stay_within_its_bound():
+    """Test that concurrent reviews, some drawing from a child limiter, share the in-flight limit of one limiter."""
+    server = FakeCompletionServer(delay=lambda prompt: 0.01)
+    shared = LLMRateLimiter(max_concurrency=3)
+    batch = LLMRateLimiter(max_concurrency=8, parent=shared)
+    files = repository(*((f"file{index}.py", f"x = {index}") for index in range(6)))
+
+    await asyncio.gather(*(
+        GPTCandidateAnalyzer(files, CandidateLevel.senior, f"Task {index}", client=server.client(), limiter=limiter,
+                             max_chunk_tokens=20).analyze()
+        for index, limiter in enumerate([shared, shared, batch])
+    ))
+
+    assert server.peak_in_flight == 3
+    assert len(server.prompts) == 21
+
+
+@pytest.mark.asyncio
+async def test_reviews_sharing_a_limiter_build_prompts_within_its_bound():
+    """Test that concurrent reviews drawing from one limiter hold no more prompts between them than its bound."""
+    class CountingLimiter(LLMRateLimiter):
+        """A limiter recording the most chunk prompts waiting for or holding a request slot at once."""
+
+        def __init__(self, max_concurrency: int):
+            super().__init__(max_concurrency=max_concurrency)
+            self.holding = 0
+            self.peak_holding = 0
+
+        @asynccontextmanager
+        async def slot(self, tokens: int) -> AsyncIterator[None]:
+            # The final reports are not built from chunks, so only the chunk analysis tasks are counted
+            counted = "analyze_chunk" in asyncio.current_task().get_coro().__qualname__
+            self.holding += counted
+            self.peak_holding = max(self.peak_holding, self.holding)
+            try:
+                async with super().slot(tokens):
+                    yield
+            finally:
+                self.holding -= counted
+
+    server = FakeCompletionServer(delay=lambda prompt: 0.01)
+    batch = CountingLimiter(max_concurrency=3)
+    files = repository(*((f"file{index}.py", f"x = {index}") for index in range(6)))
+
+    await asyncio.gather(*(
+        GPTCandidateAnalyzer(files, CandidateLevel.senior, f"Task {index}", client=server.client(), limiter=batch,
+                             max_chunk_tokens=20).analyze()
+        for index in range(4)
+    ))
+
+    assert batch.peak_holding == 3
+    assert len(server.prompts) == 28
+
+
+@pytest.mark.asyncio
+async def test_analyze_fails_when_a_part_fails():
+    """Test that a failing chunk analysis is reported as a server error."""
+    def reply(prompt: str) -> str:
+        raise RuntimeError("upstream failure")
+
+    server = FakeCompletionServer(reply=reply)
+    analyzer = GPTCandidateAnalyzer(
+        repository(("a.py", "a")), CandidateLevel.junior, "Task", client=server.client(), chunk_retries=2,
+        retry_backoff=0,
+    )
+
+    with pytest.raises(HTTPException) as exc_info:
+        await analyzer.analyze()
+
+    assert exc_info.value.status_code == 500
+    assert len(server.prompts) == 3
+
+
+@pytest.mark.asyncio
+async def test_failed_chunk_is_retried_and_completed_chunks_are_checkpointed():
+    """Test that a chunk failing once is sent again, and that every completed analysis is checkpointed."""
+    failed = set()
+
+    def reply(prompt: str) -> str:
+        if "structured report" in prompt:
+            return json.dumps({"rating": 5})
+        if "b.py" in prompt and "b.py" not in failed:
+            failed.add("b.py")
+            raise RuntimeError("upstream failure")
+        return "ok"
+
+    server = FakeCompletionServer(reply=reply)
+    checkpoints = []
+    analyzer = GPTCandidateAnalyzer(
+        repository(("a.py", "a = 1\n" * 40), ("b.py", "b = 2\n" * 40)), CandidateLevel.junior, "Task",
+        client=server.client(), max_chunk_tokens=100, retry_backoff=0,
+        checkpoint=lambda position, chunk: checkpoints.append((position, list(chunk.files))),
+    )
+    report = await analyzer.analyze()
+
+    assert report.conclusion_and_assessment == {"rating": 5}
+    assert len(server.prompts) == 4
+    assert sorted(checkpoints) == [(0, ["a.py"]), (1, ["b.py"])]
+
+
+@pytest.mark.asyncio
+async def test_final_report_is_requested_as_json_and_repaired():
+    """Test that the final report uses JSON mode, and that a malformed answer is repaired rather than failing."""
+    def reply(prompt: str) -> str:
+        if "structured report" in prompt:
+            return "Here is the report: {'rating': 4"
+        if "not valid JSON" in prompt:
+            return '```json\n{"flaws": [], "rating": 4, "conclusion": "Fine"}\n```'
+        return "ok"
+
+    server = FakeCompletionServer(reply=reply)
+    analyzer = GPTCandidateAnalyzer(repository(("a.py", "a = 1")), CandidateLevel.junior, "Task",
+                                    client=server.client())
+    report = await analyzer.analyze()
+
+    assert report.conclusion_and_assessment == {"flaws": [], "rating": 4, "conclusion": "Fine"}
+    assert [body.get("response_format") for body in server.bodies] == [None] + [{"type": "json_object"}] * 2
+    assert "{'rating': 4" in server.prompts[-1]
+
+
+@pytest.mark.asyncio
+async def test_malformed_report_is_not_cached():
+    """Test that a malformed report and its failed repair are asked again on the next try, not served from the cache."""
+    malformed = True
+
+    def reply(prompt: str) -> str:
+        if "structured report" in prompt or "not valid JSON" in prompt:
+            return "no report" if malformed else json.dumps({"rating": 3})
+        return "ok"
+
+    server = FakeCompletionServer(reply=reply)
+    cache = LLMResponseCache(MemoryKeyValueStore())
+    files = repository(("a.py", "a = 1"))
+    with pytest.raises(HTTPException) as error:
+        await GPTCandidateAnalyzer(files, CandidateLevel.junior, "Task", client=server.client(), cache=cache).analyze()
+
+    malformed = False
+    server.prompts.clear()
+    report = await GPTCandidateAnalyzer(files, CandidateLevel.junior, "Task", client=server.client(),
+                                        cache=cache).analyze()
+
+    assert error.value.status_code == 422
+    assert report.conclusion_and_assessment == {"rating": 3}
+    assert len(server.prompts) == 1 and "structured report" in server.prompts[0]
+
+
+@pytest.mark.asyncio
+async def test_simple_chunks_go_to_the_cheap_model_and_low_confidence_is_escalated():
+    """Test that simple chunks use the cheap model, whose low-confidence answers are sent to the strong model."""
+    def reply(prompt: str) -> str:
+        if "structured report" in prompt:
+            return json.dumps({"rating": 5})
+        if "'Confidence: low'" in prompt:
+            return "cheap review\nConfidence: " + ("low" if "unsure.py" in prompt else "high")
+        return "strong review"
+
+    server = FakeCompletionServer(reply=reply)
+    complex_code = "def run(x):\n" + "    if x and x > 1 or x < 0:\n        x -= 1\n" * 12 + "    return x\n"
+    files = repository(("sure.py", "a = 1\n" * 60), ("unsure.py", "b = 2\n" * 60), ("complex.py", complex_code))
+    router = ModelRouter(strong_model="strong", cheap_model="cheap", threshold=0.5)
+    analyzer = GPTCandidateAnalyzer(files, CandidateLevel.junior, "Task", client=server.client(),
+                                    max_chunk_tokens=200, router=router)
+    await analyzer.analyze()
+
+    chunks = sorted(
+        (prompt.split("'")[1], body["model"], "'Confidence: low'" in prompt)
+        for body, prompt in zip(server.bodies[:-1], server.prompts[:-1])
+    )
+    assert chunks == [("complex.py", "strong", False), ("sure.py", "cheap", True),
+                      ("unsure.py", "cheap", True), ("unsure.py", "strong", False)]
+    assert server.bodies[-1]["model"] == "strong"
+    assert "cheap review" in server.prompts[-1] and "Confidence: high" not in server.prompts[-1]
+
+
+@pytest.mark.asyncio
+async def test_token_bucket_waits_for_budget():
+    """Test that spending more than the remaining budget waits for the bucket to refill."""
+    now = 0.0
+    delays = []
+
+    async def sleep(delay: float) -> None:
+        nonlocal now
+        delays.append(delay)
+        now += delay
+
+    bucket = TokenBucket(tokens_per_minute=600, clock=lambda: now, sleep=sleep)
+    await bucket.acquire(600)
+    await bucket.acquire(100)
+    await bucket.acquire(10_000)
+
+    assert delays == [pytest.approx(10.0), pytest.approx(60.0)]
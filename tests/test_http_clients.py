@@ -0,0 +1,42 @@
+from fastapi.testclient import TestClient
+
+from src.api.app import app
+from src.services import http_clients
+from src.services.http_clients import HTTPClientSettings
+
+
+def test_settings_from_env(monkeypatch):
+    """Test that pool limits and timeouts are read from the environment."""
+    monkeypatch.setenv("HTTP_MAX_CONNECTIONS", "42")
+    monkeypatch.setenv("HTTP_TIMEOUT", "5")
+    monkeypatch.setenv("HTTP2", "false")
+
+    settings = HTTPClientSettings.from_env()
+
+    assert settings.limits.max_connections == 42
+    assert settings.timeouts.read == 5
+    assert settings.http2 is False
+
+
+def test_http2_requires_the_h2_package(monkeypatch):
+    """Test that HTTP/2 falls back to HTTP/1.1 when requested without h2 installed."""
+    monkeypatch.setenv("HTTP2", "true")
+    monkeypatch.setattr(http_clients, "HTTP2_AVAILABLE", False)
+
+    assert HTTPClientSettings.from_env().http2 is False
+
+
+def test_lifespan_shares_clients_between_requests(monkeypatch):
+    """Test that the application opens its pooled clients and LLM limits once and closes them on shutdown."""
+    monkeypatch.setenv("OPENAI_API_KEY", "test-key")
+    monkeypatch.setenv("LLM_MAX_CONCURRENCY", "8")
+
+    with TestClient(app):
+        github_client = app.state.github_client
+        openai_client = app.state.openai_client
+        assert not github_client.is_closed
+        assert app.state.llm_limiter.max_concurrency == 8
+
+    assert github_client.is_closed
+    assert not hasattr(app.state, "github_client")
+    assert openai_client.is_closed()
@@ -0,0 +1,129 @@
+import pytest
+import asyncio
+
+from src.services.kv_store import MemoryKeyValueStore, SQLiteKeyValueStore
+from src.services.llm_cache import LLMResponseCache, create_llm_cache
+
+
+class CountingCall:
+    """A fake API call counting how often it runs."""
+
+    def __init__(self, response: str = "review", delay: float = 0.0, error: Exception | None = None):
+        self.calls = 0
+        self.__response = response
+        self.__delay = delay
+        self.__error = error
+
+    async def __call__(self) -> str:
+        self.calls += 1
+        await asyncio.sleep(self.__delay)
+        if self.__error is not None:
+            raise self.__error
+        return self.__response
+
+
+def test_key_depends_on_model_system_prompt_and_prompt():
+    """Test that requests differing in any part get different keys."""
+    keys = {
+        LLMResponseCache.key("gpt-4-turbo", "system", "prompt"),
+        LLMResponseCache.key("gpt-4o", "system", "prompt"),
+        LLMResponseCache.key("gpt-4-turbo", "other", "prompt"),
+        LLMResponseCache.key("gpt-4-turbo", "system", "other"),
+        LLMResponseCache.key("gpt-4-turbo", "systemprompt", ""),
+    }
+
+    assert len(keys) == 5
+
+
+@pytest.mark.asyncio
+async def test_repeated_prompt_is_served_from_cache():
+    """Test that a prompt answered once does not reach the API again."""
+    cache = LLMResponseCache(MemoryKeyValueStore())
+    call = CountingCall()
+
+    first = await cache.get_or_create("gpt-4-turbo", "system", "prompt", call)
+    second = await cache.get_or_create("gpt-4-turbo", "system", "prompt", call)
+
+    assert first == second == "review"
+    assert call.calls == 1
+    assert (cache.stats.hits, cache.stats.misses, cache.stats.bytes_saved) == (1, 1, len("review"))
+
+
+@pytest.mark.asyncio
+async def test_identical_prompts_in_flight_are_coalesced():
+    """Test that concurrent identical prompts share a single API call."""
+    cache = LLMResponseCache(MemoryKeyValueStore())
+    call = CountingCall(delay=0.01)
+
+    responses = await asyncio.gather(*(cache.get_or_create("gpt-4-turbo", "system", "prompt", call) for _ in range(5)))
+
+    assert responses == ["review"] * 5
+    assert call.calls == 1
+    assert cache.coalesced == 4
+
+
+@pytest.mark.asyncio
+async def test_failures_are_shared_but_not_cached():
+    """Test that a failed call fails its waiters and is retried by the next request."""
+    cache = LLMResponseCache(MemoryKeyValueStore())
+    failing = CountingCall(delay=0.01, error=RuntimeError("upstream failure"))
+
+    results = await asyncio.gather(
+        cache.get_or_create("gpt-4-turbo", "system", "prompt", failing),
+        cache.get_or_create("gpt-4-turbo", "system", "prompt", failing),
+        return_exceptions=True,
+    )
+    succeeding = CountingCall()
+    response = await cache.get_or_create("gpt-4-turbo", "system", "prompt", succeeding)
+
+    assert all(isinstance(result, RuntimeError) for result in results)
+    assert failing.calls == 1
+    assert response == "review"
+    assert succeeding.calls == 1
+
+
+@pytest.mark.asyncio
+async def test_cancelled_call_is_taken_over_by_a_waiter():
+    """Test that cancelling the caller whose call is in flight does not cancel the identical calls waiting for it."""
+    cache = LLMResponseCache(MemoryKeyValueStore())
+    call = CountingCall(delay=0.05)
+
+    leader = asyncio.create_task(cache.get_or_create("gpt-4-turbo", "system", "prompt", call))
+    await asyncio.sleep(0.01)
+    follower = asyncio.create_task(cache.get_or_create("gpt-4-turbo", "system", "prompt", call))
+    await asyncio.sleep(0.01)
+    leader.cancel()
+
+    assert await follower == "review"
+    assert leader.cancelled() and not follower.cancelled()
+    assert call.calls == 2
+    assert await cache.get_or_create("gpt-4-turbo", "system", "prompt", call) == "review"
+    assert call.calls == 2
+
+
+@pytest.mark.asyncio
+async def test_expired_responses_are_regenerated():
+    """Test that responses older than the TTL are requested again."""
+    cache = LLMResponseCache(MemoryKeyValueStore(ttl_seconds=-1))
+    call = CountingCall()
+
+    await cache.get_or_create("gpt-4-turbo", "system", "prompt", call)
+    await cache.get_or_create("gpt-4-turbo", "system", "prompt", call)
+
+    assert call.calls == 2
+
+
+def test_create_llm_cache_from_env(monkeypatch, tmp_path):
+    """Test that the backend, TTL and path are read from the environment."""
+    monkeypatch.setenv("LLM_CACHE_BACKEND", "sqlite")
+    monkeypatch.setenv("LLM_CACHE_PATH", str(tmp_path / "llm.sqlite3"))
+    monkeypatch.setenv("LLM_CACHE_TTL", "60")
+
+    cache = create_llm_cache()
+
+    assert isinstance(cache.store, SQLiteKeyValueStore)
+    assert cache.store.ttl_seconds == 60
+    cache.store.close()
+
+    monkeypatch.setenv("LLM_CACHE_BACKEND", "none")
+    assert create_llm_cache() is None
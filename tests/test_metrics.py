@@ -0,0 +1,186 @@
+import json
+import httpx
+import pytest
+import asyncio
+
+from fastapi.testclient import TestClient
+
+from src.api import app as app_module
+from src.services.kv_store import MemoryKeyValueStore
+from src.services.llm_cache import LLMResponseCache
+from src.services.github_http import GitHubTransport, RateLimitState, github_endpoint
+from src.services.review_jobs import ReviewJobManager, MemoryReviewJobStore
+from src.services.metrics import MetricsRegistry, SharedMetrics, ReviewTrace, current_trace, observe_stage, GITHUB_RESPONSE_BYTES
+from src.services.data_structures import (
+    Content, RepoFilesResponse, ReviewRequest, CandidateLevel, AnalysisReport, ReviewJobStatus
+)
+from tests.test_gpt_code_analyzer import FakeCompletionServer
+
+
+def test_metrics_are_rendered_in_prometheus_format():
+    """Test that counters, histograms and callbacks render as Prometheus text samples."""
+    registry = MetricsRegistry()
+    counter = registry.counter("bytes_total", "Bytes.", ("endpoint",))
+    histogram = registry.histogram("latency_seconds", "Latency.", ("kind",), buckets=(0.1, 1.0))
+    registry.gauge_callback("remaining", "Remaining.", lambda: {(): 42})
+    registry.gauge_callback("unknown", "Unknown.", lambda: {(): None})
+
+    counter.inc('say "hi"\n', amount=3)
+    for value in (0.05, 0.5, 5.0):
+        histogram.observe(value, "chunk")
+
+    lines = registry.render().splitlines()
+
+    assert '# TYPE bytes_total counter' in lines
+    assert 'bytes_total{endpoint="say \\"hi\\"\\n"} 3' in lines
+    assert 'latency_seconds_bucket{kind="chunk",le="0.1"} 1' in lines
+    assert 'latency_seconds_bucket{kind="chunk",le="1.0"} 2' in lines
+    assert 'latency_seconds_bucket{kind="chunk",le="+Inf"} 3' in lines
+    assert 'latency_seconds_sum{kind="chunk"} 5.55' in lines
+    assert 'latency_seconds_count{kind="chunk"} 3' in lines
+    assert 'remaining 42' in lines
+    assert not any(line.startswith("unknown ") for line in lines)
+
+
+def test_shared_metrics_sum_counters_and_list_gauges_per_worker(tmp_path):
+    """Test that any worker renders the counters and histograms of all workers, and the gauges of the live ones."""
+    workers = []
+    for name, queued in (("first", 1), ("second", 2), ("stopped", 3)):
+        registry = MetricsRegistry()
+        registry.counter("reviews_total", "Reviews.", ("outcome",)).inc("completed", amount=queued)
+        registry.histogram("latency_seconds", "Latency.", buckets=(1.0,)).observe(0.5 * queued)
+        registry.gauge_callback("queued", "Queued.", lambda queued=queued: {(): queued})
+        workers.append(SharedMetrics(str(tmp_path), registry, name))
+
+    workers[1].publish()
+    workers[2].publish(stopped=True)
+    lines = workers[0].render().splitlines()
+
+    assert 'reviews_total{outcome="completed"} 6' in lines
+    assert 'latency_seconds_bucket{le="1.0"} 2' in lines
+    assert 'latency_seconds_count 3' in lines
+    assert 'queued{worker="first"} 1' in lines
+    assert 'queued{worker="second"} 2' in lines
+    assert not any('worker="stopped"' in line for line in lines)
+
+
+def test_trace_aggregates_spans_of_the_active_review():
+    """Test that stages are recorded into the trace active in the calling task only."""
+    trace = ReviewTrace()
+    observe_stage("fetch", 1.0)
+    with trace.activate():
+        assert current_trace() is trace
+        observe_stage("fetch", 0.5)
+        observe_stage("fetch", 1.5)
+        trace.add("github_bytes", 10)
+    assert current_trace() is None
+
+    report = trace.report()
+    assert [(span.name, span.count, span.total_seconds, span.max_seconds) for span in report.spans] == [
+        ("fetch", 2, 2.0, 1.5)
+    ]
+    assert report.counters == {"github_bytes": 10}
+
+
+def test_github_endpoints_are_named_by_resource():
+    """Test that request paths map to a few endpoint labels."""
+    assert github_endpoint("/repos/owner/repo/git/blobs/abc") == "blobs"
+    assert github_endpoint("/repos/owner/repo/tarball/main") == "tarball"
+    assert github_endpoint("/repos/owner/repo/commits/HEAD") == "commits"
+    assert github_endpoint("/rate_limit") == "other"
+
+
+@pytest.mark.asyncio
+async def test_github_requests_are_recorded_once_their_body_is_read():
+    """Test that streamed GitHub responses record their size and duration into the trace."""
+    async def body():
+        for _ in range(10):
+            yield b"x" * 100
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        return httpx.Response(200, content=body())
+
+    before = GITHUB_RESPONSE_BYTES.value("tarball")
+    transport = GitHubTransport(httpx.MockTransport(handler), state=RateLimitState(), etags=None)
+    trace = ReviewTrace()
+    async with httpx.AsyncClient(transport=transport) as client:
+        with trace.activate():
+            async with client.stream("GET", "https://api.github.com/repos/owner/repo/tarball") as response:
+                assert len(await response.aread()) == 1000
+
+    report = trace.report()
+    assert report.counters == {"github_requests": 1, "github_bytes": 1000}
+    assert report.spans[0].name == "github_request"
+    assert GITHUB_RESPONSE_BYTES.value("tarball") - before == 1000
+
+
+@pytest.mark.asyncio
+async def test_background_review_trace_includes_its_queue_wait():
+    """Test that a queued review runs within a trace holding its time in the queue."""
+    traces = []
+
+    async def review(request: ReviewRequest, report_progress) -> AnalysisReport:
+        traces.append(current_trace().report())
+        return AnalysisReport(project_files=[], full_report="", conclusion_and_assessment={})
+
+    manager = ReviewJobManager(MemoryReviewJobStore(), review, workers=1)
+    request = ReviewRequest(
+        assignment_description="Task", github_repo_url="https://github.com/owner/repo",
+        candidate_level=CandidateLevel.junior,
+    )
+    job = manager.submit(request)
+    manager.start()
+    try:
+        for _ in range(100):
+            if manager.get(job.id).status == ReviewJobStatus.completed:
+                break
+            await asyncio.sleep(0.01)
+    finally:
+        await manager.stop()
+
+    assert [span.name for span in traces[0].spans] == ["review_queue_wait"]
+
+
+def test_review_returns_its_trace_and_updates_metrics(monkeypatch):
+    """Test that /review returns the trace on request and that /metrics exposes the LLM and cache metrics."""
+    server = FakeCompletionServer(
+        reply=lambda prompt: json.dumps({"rating": 5}) if "structured report" in prompt else "ok"
+    )
+
+    async def get_repository_files(repo_url, **kwargs) -> RepoFilesResponse:
+        files = [Content(filename=f"file{index}.py", file_content=f"x = {index}\n" * 1100) for index in range(2)]
+        return RepoFilesResponse(files=files, count=2, commit_sha="commit")
+
+    monkeypatch.setattr(app_module, "get_repository_files", get_repository_files)
+    monkeypatch.setattr(app_module, "llm_cache", LLMResponseCache(MemoryKeyValueStore()))
+    monkeypatch.setattr(app_module, "review_snapshots", None)
+    # The files are analyzed from their code, one chunk each
+    monkeypatch.setattr(app_module, "static_analyzer", None)
+    app_module.app.dependency_overrides[app_module.get_openai_client] = server.client
+    body = {
+        "assignment_description": "Task",
+        "github_repo_url": "https://github.com/owner/repo",
+        "candidate_level": "junior",
+    }
+    try:
+        client = TestClient(app_module.app)
+        untraced = client.post("/review", json=body).json()
+        traced = client.post("/review", json={**body, "trace": True}).json()
+        metrics = client.get("/metrics")
+    finally:
+        app_module.app.dependency_overrides.clear()
+
+    assert untraced["trace"] is None
+    spans = {span["name"]: span for span in traced["trace"]["spans"]}
+    assert {"chunking", "analyze", "report", "review"} <= set(spans)
+    assert traced["trace"]["counters"]["chunks"] == 2
+    # The second review is answered by the response cache
+    assert traced["trace"]["counters"]["llm_cached_responses"] == 3
+    assert "llm_requests" not in traced["trace"]["counters"]
+
+    assert metrics.status_code == 200
+    assert metrics.headers["content-type"].startswith("text/plain")
+    assert 'llm_request_seconds_count{kind="chunk"}' in metrics.text
+    assert 'llm_tokens_total{kind="report",type="prompt"}' in metrics.text
+    assert 'cache_hits_total{cache="llm"} 3' in metrics.text
+    assert 'reviews_total{outcome="completed"}' in metrics.text
@@ -0,0 +1,47 @@
+from src.services.chunker import build_chunks
+from src.services.static_analysis import analyze_source
+from src.services.data_structures import Content
+from src.services.model_routing import ModelRouter, score_chunk, split_confidence, CHEAP_TIER, STRONG_TIER
+
+SIMPLE_SOURCE = 'def add(a: int, b: int) -> int:\n    """Add two numbers."""\n    return a + b\n'
+
+COMPLEX_SOURCE = "def classify(value):\n" + "".join(
+    f"    if value == {index} and value > 0 or value < -{index}:\n        return {index}\n" for index in range(12)
+) + "    return None\n"
+
+
+def chunk_of(filename: str, text: str):
+    """Build the single chunk of a file."""
+    return build_chunks([Content(filename=filename, file_content=text)])[0]
+
+
+def test_documentation_and_simple_code_score_low_and_complex_code_high():
+    """Test that the score grows with complexity, taken from the static analysis when available."""
+    insights = {name: analyze_source(name, text) for name, text in (("simple.py", SIMPLE_SOURCE),
+                                                                    ("complex.py", COMPLEX_SOURCE))}
+
+    assert score_chunk(chunk_of("README.md", "# Title\n" * 200)) == 0.0
+    assert score_chunk(chunk_of("simple.py", SIMPLE_SOURCE), insights) < 0.2
+    assert score_chunk(chunk_of("complex.py", COMPLEX_SOURCE), insights) > 0.75
+    # Without static analysis the complexity is estimated from the branches
+    assert score_chunk(chunk_of("complex.js", COMPLEX_SOURCE.replace("def", "function"))) > 0.75
+
+
+def test_router_sends_chunks_below_the_threshold_to_the_cheap_tier():
+    """Test that routing needs a cheap model, and compares the score with the threshold."""
+    simple, complex_ = chunk_of("simple.py", SIMPLE_SOURCE), chunk_of("complex.py", COMPLEX_SOURCE)
+    router = ModelRouter(strong_model="strong", cheap_model="cheap", threshold=0.5)
+
+    assert ModelRouter().route(simple) == STRONG_TIER
+    assert router.route(simple) == CHEAP_TIER
+    assert router.route(complex_) == STRONG_TIER
+    assert (router.model(CHEAP_TIER), router.model(STRONG_TIER)) == ("cheap", "strong")
+
+
+def test_confidence_line_is_split_from_the_answer():
+    """Test that the last confidence line is removed from the analysis and normalized."""
+    assert split_confidence("Fine code.\n\nConfidence: LOW.") == ("Fine code.", "low")
+    assert split_confidence("Fine code.\nConfidence: high") == ("Fine code.", "high")
+    assert split_confidence("Confidence: high is not stated here, fine code.") == (
+        "Confidence: high is not stated here, fine code.", None
+    )
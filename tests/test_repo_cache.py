@@ -0,0 +1,79 @@
+from src.services.repo_cache import RepositoryCache, git_blob_sha
+from src.services.kv_store import MemoryKeyValueStore, SQLiteKeyValueStore
+
+
+def test_git_blob_sha_matches_git():
+    """Test that blob SHAs are computed the way git computes them."""
+    assert git_blob_sha(b"hello\n") == "ce013625030ba8dba906f756967f9e9ca394464a"
+
+
+def test_memory_store_evicts_least_recently_used():
+    """Test that the memory store evicts the least recently used values once over budget."""
+    store = MemoryKeyValueStore(max_bytes=10)
+    store.set("a", b"1234")
+    store.set("b", b"1234")
+    store.get("a")
+    store.set("c", b"1234")
+
+    assert store.get("a") == b"1234"
+    assert store.get("b") is None
+    assert store.get("c") == b"1234"
+    assert store.size == 8
+
+
+def test_memory_store_expires_values():
+    """Test that values older than the TTL are no longer served."""
+    store = MemoryKeyValueStore(ttl_seconds=-1)
+    store.set("a", b"value")
+
+    assert store.get("a") is None
+
+
+def test_sqlite_store_survives_reopening(tmp_path):
+    """Test that the SQLite store keeps its values across instances."""
+    path = str(tmp_path / "cache.sqlite3")
+    store = SQLiteKeyValueStore(path)
+    store.set("a", b"value")
+    store.close()
+
+    assert SQLiteKeyValueStore(path).get("a") == b"value"
+
+
+def test_sqlite_store_evicts_over_budget(tmp_path):
+    """Test that the SQLite store evicts the least recently used values once over budget."""
+    store = SQLiteKeyValueStore(str(tmp_path / "cache.sqlite3"), max_bytes=10)
+    store.set("a", b"1234")
+    store.set("b", b"1234")
+    store.set("c", b"1234")
+
+    assert store.get("a") is None
+    assert store.get("c") == b"1234"
+    assert store.size == 8
+
+
+def test_sqlite_store_tracks_its_size_across_writes_and_processes(tmp_path):
+    """Test that replacing, deleting and expiring values keep the total size seen by every instance up to date."""
+    path = str(tmp_path / "cache.sqlite3")
+    store = SQLiteKeyValueStore(path, ttl_seconds=-1)
+    store.set("expired", b"123")
+    other = SQLiteKeyValueStore(path)
+    other.set("a", b"1234")
+    other.set("a", b"12")
+    other.set("b", b"12345")
+    other.delete("b")
+    assert store.get("expired") is None
+
+    assert store.size == other.size == 2
+
+
+def test_repository_cache_lookup_counts_hits_and_misses():
+    """Test that lookups split cached and missing entries and update the counters."""
+    cache = RepositoryCache(MemoryKeyValueStore())
+    cache.put_blob("sha-1", b"cached")
+
+    cached, missing = cache.lookup([{"path": "a.py", "sha": "sha-1"}, {"path": "b.py", "sha": "sha-2"}])
+
+    assert cached["a.py"].file_content == "cached"
+    assert missing == [{"path": "b.py", "sha": "sha-2"}]
+    assert (cache.stats.hits, cache.stats.misses, cache.stats.bytes_saved) == (1, 1, 6)
+    assert cache.full_hits == 0
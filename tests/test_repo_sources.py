@@ -0,0 +1,91 @@
+import shutil
+import pytest
+import subprocess
+
+from fastapi import HTTPException
+
+from src.services import repo_sources
+from src.services.file_filter import FileFilter
+from src.services.content_spool import ContentSpool
+from src.services.repo_sources import find_local_repository
+from src.services.github_fetcher import get_repository_files, resolve_repository_commit
+
+pytestmark = pytest.mark.skipif(shutil.which("git") is None, reason="needs the git binary")
+
+
+def git(directory, *arguments: str) -> str:
+    """Run a git command in a directory and return its output."""
+    return subprocess.run(
+        ["git", "-c", "user.name=Test", "-c", "user.email=test@example.com", "-C", str(directory), *arguments],
+        check=True, capture_output=True, text=True,
+    ).stdout.strip()
+
+
+@pytest.fixture
+def mirrors(tmp_path, monkeypatch):
+    """A mirror root holding owner/repo.git, a bare clone of a repository with two commits."""
+    work = tmp_path / "work"
+    work.mkdir()
+    git(work, "init", "-q", "-b", "main")
+    (work / "app.py").write_text("print('v1')\n")
+    git(work, "add", "-A")
+    git(work, "commit", "-q", "-m", "First")
+    (work / "app.py").write_text("print('v2')\n")
+    (work / "big.txt").write_text("x" * 5000)
+    (work / "docs").mkdir()
+    (work / "docs" / "guide.md").write_text("# Guide\n")
+    git(work, "add", "-A")
+    git(work, "commit", "-q", "-m", "Second")
+
+    root = tmp_path / "mirrors"
+    (root / "owner").mkdir(parents=True)
+    subprocess.run(["git", "clone", "-q", "--mirror", str(work), str(root / "owner" / "repo.git")], check=True)
+    monkeypatch.setattr(repo_sources, "LOCAL_GIT_ROOTS", [root])
+    return root
+
+
+@pytest.mark.asyncio
+async def test_mirrored_repository_is_read_locally(mirrors):
+    """Test that a GitHub URL with a local mirror is served from it, with blob and commit SHAs."""
+    clone = mirrors / "owner" / "repo.git"
+    head = git(clone, "rev-parse", "HEAD")
+    spool = ContentSpool()
+
+    with spool:
+        repo_files = await get_repository_files(
+            "https://github.com/owner/repo", file_filter=FileFilter(max_file_bytes=1000), spool=spool
+        )
+        contents = {content.filename: str(content.file_content) for content in repo_files.files}
+
+    assert repo_files.commit_sha == head
+    assert contents == {"app.py": "print('v2')\n", "docs/guide.md": "# Guide\n"}
+    assert [skipped.filename for skipped in repo_files.skipped_files] == ["big.txt"]
+    assert repo_files.files[0].sha == git(clone, "rev-parse", "HEAD:app.py")
+    assert await resolve_repository_commit("https://github.com/owner/repo") == head
+
+
+@pytest.mark.asyncio
+async def test_local_clone_is_read_at_a_commit_by_file_url(mirrors):
+    """Test that a file:// URL under the roots is read at the requested commit."""
+    clone = mirrors / "owner" / "repo.git"
+    first = git(clone, "rev-parse", "HEAD~1")
+
+    repo_files = await get_repository_files(f"file://{clone}", ref=first)
+
+    assert repo_files.commit_sha == first
+    assert [(content.filename, content.file_content) for content in repo_files.files] == [("app.py", "print('v1')\n")]
+
+
+@pytest.mark.asyncio
+async def test_paths_outside_the_roots_are_refused(mirrors, tmp_path):
+    """Test that file:// URLs and mirror lookups never leave the configured roots."""
+    with pytest.raises(HTTPException) as exc_info:
+        await get_repository_files(f"file://{tmp_path / 'work'}")
+
+    assert exc_info.value.status_code == 400
+    with pytest.raises(HTTPException) as exc_info:
+        await resolve_repository_commit(f"file://{tmp_path / 'work'}")
+
+    assert exc_info.value.status_code == 400
+    assert find_local_repository("https://github.com/../work") is None
+    assert find_local_repository("https://github.com/owner/other") is None
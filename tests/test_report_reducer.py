@@ -0,0 +1,59 @@
+import pytest
+
+from src.services.chunker import count_tokens
+from src.services.report_reducer import ReportNode, group_nodes, parent_directory, reduce_report
+
+
+class RecordingSummarizer:
+    """A fake summarizer recording the notes it receives and answering with a short summary."""
+
+    def __init__(self):
+        self.calls: list[tuple[str, list[str]]] = []
+
+    async def __call__(self, directory: str, notes: list[str]) -> str:
+        self.calls.append((directory, notes))
+        return f"summary of {len(notes)} notes"
+
+
+def test_parent_directory_stops_at_root():
+    """Test that directories move up one level at a time until the root."""
+    assert parent_directory("src/services") == "src"
+    assert parent_directory("src") == ""
+    assert parent_directory("") == ""
+
+
+def test_group_nodes_keeps_directories_apart_and_within_budget():
+    """Test that batches never mix directories nor exceed the token budget."""
+    nodes = [ReportNode("a", "x" * 40), ReportNode("b", "y" * 40), ReportNode("a", "z" * 40), ReportNode("a", "w" * 40)]
+
+    batches = group_nodes(nodes, max_tokens=25)
+
+    assert [[node.text[0] for node in batch] for batch in batches] == [["x", "z"], ["w"], ["y"]]
+
+
+@pytest.mark.asyncio
+async def test_notes_that_fit_are_not_summarized():
+    """Test that small reports are joined without any summary."""
+    summarizer = RecordingSummarizer()
+
+    notes = await reduce_report([ReportNode("a", "first"), ReportNode("b", "second")], summarizer, max_tokens=100)
+
+    assert notes == "first\n\nsecond"
+    assert summarizer.calls == []
+
+
+@pytest.mark.asyncio
+async def test_large_reports_are_merged_up_the_directory_tree():
+    """Test that every summary prompt stays within the budget and the result fits."""
+    summarizer = RecordingSummarizer()
+    nodes = [
+        ReportNode(f"pkg{package}/module{module}", f"File {package}/{module}/{index}: " + "issue " * 30)
+        for package in range(4) for module in range(4) for index in range(4)
+    ]
+
+    notes = await reduce_report(nodes, summarizer, max_tokens=200)
+
+    assert count_tokens(notes) <= 200
+    assert summarizer.calls
+    assert all(count_tokens("\n\n".join(batch)) <= 200 for _, batch in summarizer.calls)
+    assert {directory for directory, _ in summarizer.calls} >= {"pkg0/module0", "pkg3/module3"}
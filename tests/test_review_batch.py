@@ -0,0 +1,101 @@
+import json
+import pytest
+import asyncio
+
+from fastapi import HTTPException
+from fastapi.testclient import TestClient
+
+from src.api import app as app_module
+from src.services.review_batch import review_batch
+from src.services.data_structures import AnalysisReport, CandidateLevel, Content, RepoFilesResponse, ReviewRequest
+from tests.test_gpt_code_analyzer import FakeCompletionServer
+
+REPORT = AnalysisReport(project_files=["a.py"], full_report="File a.py:\nok", conclusion_and_assessment={"rating": 5})
+
+
+def requests(count: int) -> list[ReviewRequest]:
+    """Build review requests of the same assignment for several repositories."""
+    return [
+        ReviewRequest(
+            assignment_description="Task",
+            github_repo_url=f"https://github.com/owner/repo{index}",
+            candidate_level=CandidateLevel.junior,
+        )
+        for index in range(count)
+    ]
+
+
+@pytest.mark.asyncio
+async def test_results_are_yielded_as_reviews_finish():
+    """Test that results come in completion order and that a failing review does not stop the others."""
+    async def review(request: ReviewRequest) -> AnalysisReport:
+        if request.github_repo_url.endswith("repo1"):
+            raise HTTPException(status_code=404, detail="Failed to fetch repository files")
+        await asyncio.sleep(0.04 if request.github_repo_url.endswith("repo0") else 0.02)
+        return REPORT
+
+    results = [result async for result in review_batch(requests(3), review)]
+
+    assert [(result.index, result.completed, result.total) for result in results] == [(1, 1, 3), (2, 2, 3), (0, 3, 3)]
+    assert (results[0].status_code, results[0].error) == (404, "Failed to fetch repository files")
+    assert results[2].report == REPORT
+
+
+@pytest.mark.asyncio
+async def test_closing_the_batch_cancels_running_reviews():
+    """Test that abandoning the batch cancels the reviews still running."""
+    cancelled = 0
+
+    async def review(request: ReviewRequest) -> AnalysisReport:
+        nonlocal cancelled
+        if request.github_repo_url.endswith("repo0"):
+            return REPORT
+        try:
+            await asyncio.Event().wait()
+        except asyncio.CancelledError:
+            cancelled += 1
+            raise
+
+    batch = review_batch(requests(3), review)
+    assert (await anext(batch)).index == 0
+    await batch.aclose()
+
+    assert cancelled == 2
+
+
+def test_review_batch_endpoint_shares_one_llm_budget(monkeypatch):
+    """Test that the endpoint streams one result per repository, all LLM requests sharing one budget."""
+    monkeypatch.setenv("BATCH_LLM_MAX_CONCURRENCY", "2")
+    server = FakeCompletionServer(
+        reply=lambda prompt: json.dumps({"rating": 4}) if "structured report" in prompt else "ok",
+        delay=lambda prompt: 0.01,
+    )
+
+    async def get_repository_files(repo_url, **kwargs) -> RepoFilesResponse:
+        name = repo_url.rsplit("/", 1)[-1]
+        files = [Content(filename=f"{name}.py", file_content=f"{name} = 1\n")]
+        return RepoFilesResponse(files=files, count=1)
+
+    monkeypatch.setattr(app_module, "get_repository_files", get_repository_files)
+    monkeypatch.setattr(app_module, "llm_cache", None)
+    monkeypatch.setattr(app_module, "review_snapshots", None)
+    app_module.app.dependency_overrides[app_module.get_openai_client] = server.client
+    try:
+        client = TestClient(app_module.app)
+        response = client.post("/review/batch", json={
+            "reviews": [request.model_dump(mode="json") for request in requests(4)]
+        })
+        mixed = client.post("/review/batch", json={"reviews": [
+            {**requests(1)[0].model_dump(mode="json"), "assignment_description": "Other task"},
+            requests(1)[0].model_dump(mode="json"),
+        ]})
+    finally:
+        app_module.app.dependency_overrides.clear()
+
+    events = [json.loads(line) for line in response.text.splitlines() if '"heartbeat"' not in line]
+    assert response.headers["content-type"] == "application/x-ndjson"
+    assert sorted(event["index"] for event in events) == [0, 1, 2, 3]
+    assert [event["completed"] for event in events] == [1, 2, 3, 4]
+    assert all(event["report"]["conclusion_and_assessment"] == {"rating": 4} for event in events)
+    assert server.peak_in_flight == 2
+    assert mixed.status_code == 422
@@ -0,0 +1,249 @@
+import time
+import pytest
+import asyncio
+
+from fastapi import HTTPException
+from fastapi.testclient import TestClient
+
+from src.api import app as app_module
+from src.services.review_jobs import (
+    ReviewJobManager, ReviewQueueFullError, MemoryReviewJobStore, SQLiteReviewJobStore
+)
+from src.services.single_flight import SQLiteLeaseStore
+from src.services.data_structures import (
+    AnalysisReport, ReviewJobStatus, ReviewProgress, ReviewRequest, CandidateLevel, ReviewJob
+)
+
+REQUEST = ReviewRequest(
+    assignment_description="Task",
+    github_repo_url="https://github.com/owner/repo",
+    candidate_level=CandidateLevel.junior,
+)
+REPORT = AnalysisReport(project_files=["a.py"], full_report="File a.py:\nok", conclusion_and_assessment={"rating": 5})
+
+
+async def successful_review(request: ReviewRequest, report_progress) -> AnalysisReport:
+    """Review immediately, reporting one analyzed chunk."""
+    report_progress(ReviewProgress(stage="analyzing", completed_chunks=1, total_chunks=2))
+    return REPORT
+
+
+async def wait_for(manager: ReviewJobManager, job_id: str) -> ReviewJob:
+    """Wait until a job is finished."""
+    for _ in range(100):
+        job = manager.get(job_id)
+        if job.status in (ReviewJobStatus.completed, ReviewJobStatus.failed):
+            return job
+        await asyncio.sleep(0.01)
+    raise AssertionError(f"Job {job_id} did not finish")
+
+
+@pytest.mark.asyncio
+async def test_submitted_review_runs_in_background():
+    """Test that a submitted job is queued, then completed with its report."""
+    manager = ReviewJobManager(MemoryReviewJobStore(), successful_review, workers=2)
+    manager.start()
+    try:
+        job = manager.submit(REQUEST)
+        assert job.status == ReviewJobStatus.queued
+
+        job = await wait_for(manager, job.id)
+    finally:
+        await manager.stop()
+
+    assert job.status == ReviewJobStatus.completed
+    assert job.result == REPORT
+    assert job.progress == ReviewProgress(stage="done", completed_chunks=1, total_chunks=2)
+
+
+@pytest.mark.asyncio
+async def test_failed_review_keeps_error_detail():
+    """Test that a failing review is marked failed with the error shown to clients."""
+    async def failing_review(request: ReviewRequest, report_progress) -> AnalysisReport:
+        raise HTTPException(status_code=404, detail="Failed to fetch repository files")
+
+    manager = ReviewJobManager(MemoryReviewJobStore(), failing_review)
+    manager.start()
+    try:
+        job = await wait_for(manager, manager.submit(REQUEST).id)
+    finally:
+        await manager.stop()
+
+    assert job.status == ReviewJobStatus.failed
+    assert job.error == "Failed to fetch repository files"
+
+
+@pytest.mark.asyncio
+async def test_workers_bound_concurrent_reviews_and_queue_is_bounded():
+    """Test that at most `workers` reviews run at once and submissions beyond the queue size are refused."""
+    running = 0
+    peak = 0
+    release = asyncio.Event()
+
+    async def slow_review(request: ReviewRequest, report_progress) -> AnalysisReport:
+        nonlocal running, peak
+        running += 1
+        peak = max(peak, running)
+        await release.wait()
+        running -= 1
+        return REPORT
+
+    manager = ReviewJobManager(MemoryReviewJobStore(), slow_review, workers=2, max_queued=2)
+    manager.start()
+    try:
+        jobs = [manager.submit(REQUEST) for _ in range(2)]
+        await asyncio.sleep(0.01)
+        jobs += [manager.submit(REQUEST) for _ in range(2)]
+
+        with pytest.raises(ReviewQueueFullError):
+            manager.submit(REQUEST)
+
+        release.set()
+        finished = [await wait_for(manager, job.id) for job in jobs]
+    finally:
+        await manager.stop()
+
+    assert peak == 2
+    assert all(job.status == ReviewJobStatus.completed for job in finished)
+
+
+@pytest.mark.asyncio
+async def test_sqlite_store_resumes_unfinished_jobs(tmp_path):
+    """Test that jobs left running when the service stopped are run again after a restart."""
+    path = str(tmp_path / "jobs.sqlite3")
+
+    async def interrupted_review(request: ReviewRequest, report_progress) -> AnalysisReport:
+        await asyncio.Event().wait()
+
+    manager = ReviewJobManager(SQLiteReviewJobStore(path), interrupted_review)
+    manager.start()
+    job = manager.submit(REQUEST)
+    await asyncio.sleep(0.01)
+    await manager.stop()
+    assert manager.get(job.id).status == ReviewJobStatus.running
+
+    manager = ReviewJobManager(SQLiteReviewJobStore(path), successful_review)
+    manager.start()
+    try:
+        resumed = await wait_for(manager, job.id)
+    finally:
+        await manager.stop()
+
+    assert resumed.status == ReviewJobStatus.completed
+    assert resumed.result == REPORT
+
+
+@pytest.mark.asyncio
+async def test_processes_sharing_a_store_run_each_job_once(tmp_path):
+    """Test that a job seen by two managers sharing a SQLite store is run by only one of them."""
+    path = str(tmp_path / "jobs.sqlite3")
+    runs = []
+
+    async def slow_review(request: ReviewRequest, report_progress) -> AnalysisReport:
+        runs.append(request)
+        await asyncio.sleep(0.05)
+        return REPORT
+
+    first = ReviewJobManager(SQLiteReviewJobStore(path), slow_review, leases=SQLiteLeaseStore(path))
+    second = ReviewJobManager(SQLiteReviewJobStore(path), slow_review, leases=SQLiteLeaseStore(path))
+    first.start()
+    job = first.submit(REQUEST)
+    # The second process queues the job too, as it would after a restart of the first one
+    second.start()
+    try:
+        finished = await wait_for(second, job.id)
+    finally:
+        await first.stop()
+        await second.stop()
+
+    assert finished.status == ReviewJobStatus.completed
+    assert len(runs) == 1
+
+
+@pytest.mark.asyncio
+async def test_jobs_queued_for_other_processes_do_not_fill_the_queue(tmp_path):
+    """Test that the jobs a process queues on behalf of the others are not counted against its queue size."""
+    path = str(tmp_path / "jobs.sqlite3")
+    busy = ReviewJobManager(SQLiteReviewJobStore(path), successful_review, workers=0, max_queued=2,
+                            leases=SQLiteLeaseStore(path))
+    idle = ReviewJobManager(SQLiteReviewJobStore(path), successful_review, workers=0, max_queued=2,
+                            leases=SQLiteLeaseStore(path))
+    busy.start()
+    try:
+        for _ in range(2):
+            busy.submit(REQUEST)
+        idle.start()
+
+        assert idle.queued == 0
+        idle.submit(REQUEST)
+        with pytest.raises(ReviewQueueFullError):
+            busy.submit(REQUEST)
+    finally:
+        await busy.stop()
+        await idle.stop()
+
+
+@pytest.mark.asyncio
+async def test_jobs_of_a_crashed_process_are_recovered(tmp_path):
+    """Test that a running job whose lease expired is picked up by another process."""
+    path = str(tmp_path / "jobs.sqlite3")
+    store = SQLiteReviewJobStore(path)
+    leases = SQLiteLeaseStore(path)
+    job = ReviewJob(id="crashed", request=REQUEST, status=ReviewJobStatus.running)
+    store.put(job)
+    leases.acquire("review_job:crashed", "dead-process", 0.2)
+
+    manager = ReviewJobManager(store, successful_review, leases=leases, lease_seconds=0.1)
+    manager.start()
+    try:
+        await asyncio.sleep(0.05)
+        assert manager.get(job.id).status == ReviewJobStatus.running
+        recovered = await wait_for(manager, job.id)
+    finally:
+        await manager.stop()
+
+    assert recovered.status == ReviewJobStatus.completed
+
+
+def test_reviews_endpoints(monkeypatch):
+    """Test that POST /reviews answers right away with a job id that GET /reviews/{id} reports on."""
+    monkeypatch.setenv("OPENAI_API_KEY", "test-key")
+    monkeypatch.setenv("REVIEW_QUEUE_SIZE", "1")
+    monkeypatch.setattr(app_module, "review_job_store", MemoryReviewJobStore())
+
+    limiters = []
+
+    async def review_repository(
+            request, github_client, openai_client, report_progress=None, limiter=None
+    ) -> AnalysisReport:
+        limiters.append(limiter)
+        return REPORT
+
+    monkeypatch.setattr(app_module, "review_repository", review_repository)
+
+    with TestClient(app_module.app) as client:
+        response = client.post("/reviews", json=REQUEST.model_dump(mode="json"))
+        assert response.status_code == 202
+        job_id = response.json()["id"]
+
+        for _ in range(100):
+            job = client.get(f"/reviews/{job_id}").json()
+            if job["status"] == "completed":
+                break
+            time.sleep(0.01)
+
+        assert job["result"]["conclusion_and_assessment"] == {"rating": 5}
+        assert limiters == [app_module.app.state.llm_limiter]
+        assert client.get("/reviews/unknown").status_code == 404
+
+
+def test_reviews_endpoint_refuses_when_queue_is_full(monkeypatch):
+    """Test that submissions beyond the queue size are refused with 429."""
+    monkeypatch.setenv("OPENAI_API_KEY", "test-key")
+    monkeypatch.setenv("REVIEW_WORKERS", "0")
+    monkeypatch.setenv("REVIEW_QUEUE_SIZE", "1")
+    monkeypatch.setattr(app_module, "review_job_store", MemoryReviewJobStore())
+
+    with TestClient(app_module.app) as client:
+        assert client.post("/reviews", json=REQUEST.model_dump(mode="json")).status_code == 202
+        assert client.post("/reviews", json=REQUEST.model_dump(mode="json")).status_code == 429
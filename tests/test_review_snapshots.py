@@ -0,0 +1,147 @@
+import json
+import functools
+
+from fastapi.testclient import TestClient
+
+from src.api import app as app_module
+from src.services.kv_store import MemoryKeyValueStore
+from src.services.repo_cache import git_blob_sha
+from src.services.review_snapshots import ReviewSnapshotStore, ReviewSnapshot, ChunkSnapshot
+from src.services.gpt_code_analyzer import GPTCandidateAnalyzer
+from src.services.data_structures import CandidateLevel, Content, RepoFilesResponse
+from tests.test_gpt_code_analyzer import FakeCompletionServer
+
+
+def snapshot(review_id: str, commit_sha: str) -> ReviewSnapshot:
+    """Build the snapshot of a one-file review."""
+    return ReviewSnapshot(
+        review_id=review_id,
+        github_repo_url="https://github.com/owner/repo",
+        commit_sha=commit_sha,
+        assignment_description="Task",
+        candidate_level=CandidateLevel.junior,
+        chunks=[ChunkSnapshot(files={"a.py": "sha-a"}, label="File a.py", analysis="ok")],
+    )
+
+
+def test_snapshots_are_found_by_id_and_by_commit():
+    """Test that snapshots are retrieved by review id and the latest review of a commit by its SHA."""
+    store = ReviewSnapshotStore(MemoryKeyValueStore())
+    store.put(snapshot("first", "commit-1"))
+    store.put(snapshot("second", "commit-1"))
+
+    assert store.get("first") == snapshot("first", "commit-1")
+    assert store.find("https://github.com/owner/repo/", "commit-1").review_id == "second"
+    assert store.find("https://github.com/owner/repo", "commit-2") is None
+    assert store.get("unknown") is None
+
+
+def test_review_endpoint_re_reviews_from_previous_review(monkeypatch):
+    """Test that /review returns a review id that a later re-review of a new commit reuses."""
+    server = FakeCompletionServer(
+        reply=lambda prompt: json.dumps({"rating": 5}) if "structured report" in prompt else f"ok {len(prompt)}"
+    )
+    # Files large enough to be analyzed in their own chunk
+    files = {f"file{index}.py": f"x = {index}\n" * 1100 for index in range(6)}
+    commits = {"commit-1": files, "commit-2": {**files, "file2.py": "y = 2\n" * 1100}}
+    head = "commit-1"
+
+    async def get_repository_files(repo_url, **kwargs) -> RepoFilesResponse:
+        files = [
+            Content(filename=path, file_content=text, sha=git_blob_sha(text.encode()))
+            for path, text in commits[head].items()
+        ]
+        return RepoFilesResponse(files=files, count=len(files), commit_sha=head)
+
+    monkeypatch.setattr(app_module, "get_repository_files", get_repository_files)
+    monkeypatch.setattr(app_module, "llm_cache", None)
+    monkeypatch.setattr(app_module, "review_snapshots", ReviewSnapshotStore(MemoryKeyValueStore()))
+    # The files are analyzed from their code, one chunk each
+    monkeypatch.setattr(app_module, "static_analyzer", None)
+    app_module.app.dependency_overrides[app_module.get_openai_client] = server.client
+    body = {
+        "assignment_description": "Task",
+        "github_repo_url": "https://github.com/owner/repo",
+        "candidate_level": "junior",
+    }
+    try:
+        client = TestClient(app_module.app)
+        first = client.post("/review", json=body).json()
+
+        head = "commit-2"
+        server.prompts.clear()
+        second = client.post("/review", json={**body, "base_commit": "commit-1"}).json()
+        unknown = client.post("/review", json={**body, "previous_review_id": "unknown"})
+    finally:
+        app_module.app.dependency_overrides.clear()
+
+    assert first["commit_sha"] == "commit-1"
+    assert len(server.prompts) == 2
+    assert "file2.py" in server.prompts[0]
+    assert second["reused_files"] == [f"file{index}.py" for index in range(6) if index != 2]
+    assert second["review_id"] != first["review_id"]
+    assert unknown.status_code == 404
+
+
+def test_checkpoints_of_an_unfinished_review_are_kept_until_it_completes():
+    """Test that an incomplete review holds its checkpointed analyses and is not found by commit."""
+    store = ReviewSnapshotStore(MemoryKeyValueStore())
+    store.put(snapshot("running", "commit-1").model_copy(update={"chunks": [], "complete": False}))
+    chunks = [ChunkSnapshot(files={f"{name}.py": f"sha-{name}"}, label=f"File {name}.py", analysis="ok")
+              for name in ("a", "b")]
+    for position, chunk in enumerate(chunks):
+        store.put_checkpoint("running", position, chunk)
+
+    assert store.get("running").chunks == chunks
+    assert store.find("https://github.com/owner/repo", "commit-1") is None
+
+    assert store.get("running").checkpoints == 2
+
+    store.put(snapshot("running", "commit-1"))
+    assert store.get("running").complete
+    assert store.store.get("review-chunk:running:0") is None
+    assert store.store.get("review-chunk:running:1") is None
+
+
+def test_failed_review_is_resumed_from_its_checkpoints(monkeypatch):
+    """Test that a review failing on one chunk names itself, and that resuming it only sends what is missing."""
+    failing = True
+
+    def reply(prompt: str) -> str:
+        if failing and "file4.py" in prompt:
+            raise RuntimeError("upstream failure")
+        return json.dumps({"rating": 5}) if "structured report" in prompt else "ok"
+
+    server = FakeCompletionServer(reply=reply)
+    files = [Content(filename=f"file{index}.py", file_content=f"x = {index}\n" * 1100,
+                     sha=git_blob_sha(f"x = {index}\n".encode() * 1100)) for index in range(6)]
+
+    async def get_repository_files(repo_url, **kwargs) -> RepoFilesResponse:
+        return RepoFilesResponse(files=files, count=len(files), commit_sha="commit-1")
+
+    monkeypatch.setattr(app_module, "get_repository_files", get_repository_files)
+    monkeypatch.setattr(app_module, "llm_cache", None)
+    monkeypatch.setattr(app_module, "static_analyzer", None)
+    monkeypatch.setattr(app_module, "review_snapshots", ReviewSnapshotStore(MemoryKeyValueStore()))
+    monkeypatch.setattr(app_module, "GPTCandidateAnalyzer", functools.partial(GPTCandidateAnalyzer, retry_backoff=0))
+    app_module.app.dependency_overrides[app_module.get_openai_client] = server.client
+    body = {
+        "assignment_description": "Task",
+        "github_repo_url": "https://github.com/owner/repo",
+        "candidate_level": "junior",
+    }
+    try:
+        client = TestClient(app_module.app)
+        failed = client.post("/review", json=body)
+
+        failing = False
+        server.prompts.clear()
+        resumed = client.post("/review", json={**body, "previous_review_id": failed.headers["X-Review-Id"]}).json()
+    finally:
+        app_module.app.dependency_overrides.clear()
+
+    assert failed.status_code == 500
+    assert len(server.prompts) == 2
+    assert "file4.py" in server.prompts[0]
+    assert resumed["reused_files"] == [f"file{index}.py" for index in range(6) if index != 4]
+    assert resumed["conclusion_and_assessment"] == {"rating": 5}
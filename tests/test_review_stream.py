@@ -0,0 +1,94 @@
+import json
+import pytest
+import asyncio
+
+from fastapi import HTTPException
+from fastapi.testclient import TestClient
+
+from src.api import app as app_module
+from src.services.review_stream import ndjson_review_events
+from src.services.data_structures import AnalysisReport, ChunkAnalysis, RepoFilesResponse, Content
+from tests.test_gpt_code_analyzer import FakeCompletionServer
+
+ANALYSIS = ChunkAnalysis(index=0, total=1, files=["a.py"], label="File a.py", analysis="ok")
+REPORT = AnalysisReport(project_files=["a.py"], full_report="", conclusion_and_assessment={"rating": 5})
+
+
+@pytest.mark.asyncio
+async def test_events_are_encoded_as_json_lines_with_heartbeats():
+    """Test that events become JSON lines and heartbeats fill the gaps between slow events."""
+    async def events():
+        yield ANALYSIS
+        await asyncio.sleep(0.05)
+        yield REPORT
+
+    lines = [json.loads(line) async for line in ndjson_review_events(events(), heartbeat_interval=0.01)]
+
+    assert lines[0] == {"event": "analysis", **ANALYSIS.model_dump()}
+    assert {line["event"] for line in lines[1:-1]} == {"heartbeat"}
+    assert lines[-1] == {"event": "report", "report": REPORT.model_dump()}
+
+
+@pytest.mark.asyncio
+async def test_errors_end_the_stream_with_an_error_event():
+    """Test that a failure after the stream started is reported as its last line."""
+    async def events():
+        yield ANALYSIS
+        raise HTTPException(status_code=500, detail="An error occurred while analyzing the file. Please try again.")
+
+    lines = [json.loads(line) async for line in ndjson_review_events(events())]
+
+    assert lines[-1] == {
+        "event": "error", "status_code": 500, "detail": "An error occurred while analyzing the file. Please try again."
+    }
+
+
+@pytest.mark.asyncio
+async def test_closing_the_stream_cancels_pending_events():
+    """Test that a disconnected client cancels the work the stream was waiting on."""
+    cancelled = asyncio.Event()
+
+    async def events():
+        yield ANALYSIS
+        try:
+            await asyncio.Event().wait()
+        finally:
+            cancelled.set()
+        yield REPORT
+
+    stream = ndjson_review_events(events(), heartbeat_interval=0.01)
+    assert json.loads(await anext(stream))["event"] == "analysis"
+    assert json.loads(await anext(stream))["event"] == "heartbeat"
+    await stream.aclose()
+
+    assert cancelled.is_set()
+
+
+def test_review_stream_endpoint(monkeypatch):
+    """Test that the endpoint streams every chunk analysis, then the report."""
+    server = FakeCompletionServer(
+        reply=lambda prompt: json.dumps({"rating": 4}) if "structured report" in prompt else "ok"
+    )
+    files = [Content(filename=f"file{index}.py", file_content=f"x = {index}\n" * 40) for index in range(3)]
+
+    async def get_repository_files(repo_url, **kwargs) -> RepoFilesResponse:
+        return RepoFilesResponse(files=files, count=len(files))
+
+    monkeypatch.setattr(app_module, "get_repository_files", get_repository_files)
+    monkeypatch.setattr(app_module, "llm_cache", None)
+    app_module.app.dependency_overrides[app_module.get_openai_client] = server.client
+    try:
+        response = TestClient(app_module.app).post("/review/stream", json={
+            "assignment_description": "Task",
+            "github_repo_url": "https://github.com/owner/repo",
+            "candidate_level": "junior",
+        })
+    finally:
+        app_module.app.dependency_overrides.clear()
+
+    assert response.status_code == 200
+    assert response.headers["content-type"] == "application/x-ndjson"
+    events = [json.loads(line) for line in response.text.splitlines()]
+    assert sorted(event["index"] for event in events[:-1]) == list(range(len(events) - 1))
+    assert events[-1]["event"] == "report"
+    assert events[-1]["report"]["conclusion_and_assessment"] == {"rating": 4}
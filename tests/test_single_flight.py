@@ -0,0 +1,166 @@
+import time
+import httpx
+import pytest
+import asyncio
+import multiprocessing
+
+from src.api import app as app_module
+from src.services.kv_store import MemoryKeyValueStore, SQLiteKeyValueStore
+from src.services.github_http import GitHubTransport, RateLimitState
+from src.services.single_flight import SingleFlight, MemoryLeaseStore, SQLiteLeaseStore
+from src.services.data_structures import ReviewRequest, CandidateLevel
+import src.services.github_fetcher as github_fetcher
+from benchmarks.stub_github import create_stub_github_app
+from tests.test_gpt_code_analyzer import FakeCompletionServer
+
+
+def sqlite_flight(path: str, **kwargs) -> SingleFlight:
+    """Build a single-flight sharing its leases and results through a SQLite file, as a worker process would."""
+    return SingleFlight(SQLiteLeaseStore(path), SQLiteKeyValueStore(path, ttl_seconds=60), poll_interval=0.01, **kwargs)
+
+
+def run_in_worker(path: str, runs_path: str) -> bytes:
+    """Run a slow computation through a SQLite single-flight in a separate process, recording each run."""
+    async def compute() -> bytes:
+        with open(runs_path, "a") as runs:
+            runs.write("run\n")
+        await asyncio.sleep(0.5)
+        return b"report"
+
+    return asyncio.run(sqlite_flight(path).run("review:owner/repo@abc", compute))
+
+
+@pytest.mark.asyncio
+async def test_concurrent_calls_of_one_process_run_once():
+    """Test that callers asking for the same key at the same time share one computation."""
+    flight = SingleFlight(MemoryLeaseStore(), MemoryKeyValueStore())
+    runs = []
+
+    async def compute() -> bytes:
+        runs.append(1)
+        await asyncio.sleep(0.01)
+        return b"result"
+
+    results = await asyncio.gather(*(flight.run("key", compute) for _ in range(5)))
+
+    assert results == [b"result"] * 5
+    assert len(runs) == 1
+
+
+@pytest.mark.asyncio
+async def test_events_reach_every_caller_waiting_for_the_run():
+    """Test that the events published by a computation are passed to each caller joined to it."""
+    flight = SingleFlight(MemoryLeaseStore(), MemoryKeyValueStore())
+    events = {"leader": [], "follower": []}
+
+    async def compute() -> bytes:
+        await asyncio.sleep(0.01)
+        flight.notify("key", "halfway")
+        return b"result"
+
+    await asyncio.gather(*(flight.run("key", compute, received.append) for received in events.values()))
+    flight.notify("key", "after the run")
+
+    assert events == {"leader": ["halfway"], "follower": ["halfway"]}
+
+
+@pytest.mark.asyncio
+async def test_workers_sharing_a_database_run_once(tmp_path):
+    """Test that two workers sharing the SQLite store run a computation once and both get its result."""
+    path = str(tmp_path / "flight.sqlite3")
+    runs = []
+
+    async def compute() -> bytes:
+        runs.append(1)
+        await asyncio.sleep(0.05)
+        return b"result"
+
+    results = await asyncio.gather(sqlite_flight(path).run("key", compute), sqlite_flight(path).run("key", compute))
+
+    assert results == [b"result", b"result"]
+    assert len(runs) == 1
+
+
+def test_worker_processes_run_once(tmp_path):
+    """Test that two worker processes asked for the same review at the same time produce one run."""
+    path, runs_path = str(tmp_path / "flight.sqlite3"), str(tmp_path / "runs.txt")
+    sqlite_flight(path)
+
+    with multiprocessing.get_context("spawn").Pool(2) as pool:
+        results = pool.starmap(run_in_worker, [(path, runs_path)] * 2)
+
+    assert results == [b"report", b"report"]
+    with open(runs_path) as runs:
+        assert runs.read() == "run\n"
+
+
+@pytest.mark.asyncio
+async def test_failed_run_is_taken_over_by_a_waiting_worker(tmp_path):
+    """Test that the error of a run reaches its own callers while another worker runs the computation again."""
+    path = str(tmp_path / "flight.sqlite3")
+
+    async def failing() -> bytes:
+        await asyncio.sleep(0.05)
+        raise RuntimeError("OpenAI is down")
+
+    async def succeeding() -> bytes:
+        return b"result"
+
+    leader = asyncio.create_task(sqlite_flight(path).run("key", failing))
+    await asyncio.sleep(0.01)
+    follower = await sqlite_flight(path).run("key", succeeding)
+
+    with pytest.raises(RuntimeError):
+        await leader
+    assert follower == b"result"
+
+
+@pytest.mark.asyncio
+async def test_lease_of_a_crashed_worker_expires(tmp_path):
+    """Test that a key leased by a worker that stopped renewing it is computed once the lease expires."""
+    path = str(tmp_path / "flight.sqlite3")
+    SQLiteLeaseStore(path).acquire("key", "crashed-worker", 0.1)
+
+    async def compute() -> bytes:
+        return b"result"
+
+    started = time.monotonic()
+    assert await sqlite_flight(path).run("key", compute) == b"result"
+    assert time.monotonic() - started >= 0.05
+
+
+def test_identical_reviews_of_a_commit_run_once(monkeypatch):
+    """Test that concurrent identical reviews share one fetch and analysis."""
+    files = {"main.py": b"print('hello')\n", "util.py": b"def add(a, b):\n    return a + b\n"}
+    stub = create_stub_github_app(files)
+    transport = GitHubTransport(httpx.ASGITransport(app=stub), state=RateLimitState(), etags=None)
+    server = FakeCompletionServer()
+    monkeypatch.setattr(github_fetcher, "GITHUB_API_URL", "http://github.test")
+    for name in ("repository_cache", "llm_cache", "review_snapshots", "boilerplate_index"):
+        monkeypatch.setattr(app_module, name, None)
+    monkeypatch.setattr(app_module, "single_flight", SingleFlight(MemoryLeaseStore(), MemoryKeyValueStore()))
+    request = ReviewRequest(
+        assignment_description="Task", github_repo_url="https://github.com/owner/repo",
+        candidate_level=CandidateLevel.junior,
+    )
+
+    progress = [[], []]
+
+    async def review_twice():
+        github_client = httpx.AsyncClient(transport=transport)
+        return await asyncio.gather(*(
+            app_module.review_repository(request, github_client, server.client(), received.append)
+            for received in progress
+        ))
+
+    first, second = asyncio.run(review_twice())
+
+    assert first == second
+    assert [[event.stage for event in received][-1] for received in progress] == ["reporting", "reporting"]
+    assert first.commit_sha is not None
+    assert stub.state.calls["tarball"] == 1
+    prompts = len(server.prompts)
+
+    other_level = request.model_copy(update={"candidate_level": CandidateLevel.senior})
+    asyncio.run(app_module.review_repository(other_level, httpx.AsyncClient(transport=transport), server.client()))
+    assert len(server.prompts) == 2 * prompts
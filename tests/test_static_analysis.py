@@ -0,0 +1,102 @@
+import pytest
+
+from src.services import static_analysis
+from src.services.static_analysis import StaticAnalyzer, analyze_source
+from src.services.data_structures import RepoFilesResponse, Content
+
+CLEAN_SOURCE = '''"""Greeting helpers."""
+import os
+
+
+def greet(name: str, punctuation: str = "!") -> str:
+    """Build a greeting."""
+    return f"Hello, {name}{punctuation} from {os.getcwd()}"
+
+
+class Greeter:
+    """Greets people."""
+
+    def greet(self, name: str) -> str:
+        """Greet someone."""
+        return greet(name)
+'''
+
+MESSY_SOURCE = '''import sys
+import json
+
+
+def Classify(value, items=[]):
+    if value > 10:
+        return "big"
+        print("unreachable")
+    elif value > 5 and value < 8:
+        return "medium"
+    for item in items:
+        if item == value:
+            try:
+                return "known"
+            except:
+                pass
+    return "small" if value else "none"
+'''
+
+
+def test_clean_file_is_reviewed_from_its_outline():
+    """Test that a simple file without findings is clean, with an outline of its definitions."""
+    insights = analyze_source("greet.py", CLEAN_SOURCE)
+
+    assert insights.clean
+    assert insights.findings == [] and insights.style == []
+    assert "imports: os" in insights.outline
+    assert 'def greet(name: str, punctuation: str=...) -> str  # L5-7, complexity 1' in insights.outline
+    assert "class Greeter:  # L10-15" in insights.outline and "Greet someone." in insights.outline
+    assert "return" not in insights.outline
+
+
+def test_defects_and_style_issues_are_reported_with_their_lines():
+    """Test that complexity, dead code, unused imports, bare excepts and style issues are found."""
+    insights = analyze_source("classify.py", MESSY_SOURCE, max_complexity=5)
+
+    assert not insights.clean
+    assert insights.max_complexity == 8
+    assert "L5: function Classify has cyclomatic complexity 8" in insights.findings
+    assert "L8: unreachable code after return" in insights.findings
+    assert any(finding.startswith("L1: unused import sys") for finding in insights.findings)
+    assert "L15: bare except" in insights.findings
+    assert "L5: function Classify has a mutable default argument" in insights.findings
+    assert "L5: function name Classify is not snake_case" in insights.style
+
+
+def test_complex_file_without_findings_is_not_clean():
+    """Test that a file is only outlined when its functions are simple enough."""
+    insights = analyze_source("greet.py", CLEAN_SOURCE, outline_max_complexity=0)
+
+    assert insights.findings == []
+    assert not insights.clean
+
+
+def test_file_that_does_not_parse_is_reported():
+    """Test that a syntax error is a finding and leaves the file to be reviewed from its code."""
+    insights = analyze_source("broken.py", "def broken(:\n")
+
+    assert not insights.clean
+    assert insights.findings[0].startswith("does not parse")
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("inline_bytes, workers", [(static_analysis.INLINE_BYTES, 2), (0, 2), (0, 1)])
+async def test_analyzer_covers_python_files_in_a_thread_or_a_pool(monkeypatch, inline_bytes, workers):
+    """Test that small repositories are analyzed in a thread and larger ones in the process pool, batch by batch."""
+    monkeypatch.setattr(static_analysis, "INLINE_BYTES", inline_bytes)
+    monkeypatch.setattr(static_analysis, "BATCH_FILES", 2)
+    files = [Content(filename=f"pkg/module{index}.py", file_content=CLEAN_SOURCE) for index in range(3)]
+    files += [Content(filename="messy.py", file_content=MESSY_SOURCE), Content(filename="README.md", file_content="#")]
+    analyzer = StaticAnalyzer(workers=workers)
+    try:
+        insights = await analyzer.analyze(RepoFilesResponse(files=files, count=len(files)))
+    finally:
+        analyzer.close()
+
+    assert sorted(insights) == ["messy.py", "pkg/module0.py", "pkg/module1.py", "pkg/module2.py"]
+    assert [insights[f"pkg/module{index}.py"].clean for index in range(3)] == [True] * 3
+    assert not insights["messy.py"].clean